@@ -91,6 +91,9 @@ class Settings(BaseSettings):
     MAX_PROMPT_LENGTH: int = 10000
     RATE_LIMIT_REQUESTS_PER_MINUTE: int = 60
     RATE_LIMIT_TOKENS_PER_MINUTE: int = 50000
+    RATE_LIMIT_LEASE_FRACTION: float = 0.05  # share of a provider limit leased to a local bucket (0 disables)
+    RATE_LIMIT_LEASE_BELOW: float = 0.5  # leases only while usage is under this share of the limits
+    RATE_LIMIT_LEASE_TTL: float = 1.0  # seconds a local lease may be used
     
     # Streaming
     WEBSOCKET_TIMEOUT: int = 300
@@ -110,7 +113,76 @@ class Settings(BaseSettings):
     # Performance
     RESPONSE_CACHE_TTL: int = 3600  # 1 hour
     EMBEDDING_CACHE_SIZE: int = 10000
+    EMBEDDING_CACHE_TTL: int = 2592000  # 30 days
+    QUERY_EMBEDDING_CACHE_SIZE: int = 2048
+    QUERY_EMBEDDING_CACHE_MAX_BYTES: int = 33554432  # 32 MB
+    QUERY_EMBEDDING_CACHE_TTL: int = 600  # 10 minutes
+    
+    # Embedding provider routing
+    EMBEDDING_DIMENSIONS: int = 1536  # width of knowledge_embeddings.embedding; fallback never changes it
+    EMBEDDING_ROUTING_WINDOW: int = 300  # seconds of latency/error samples per provider
+    EMBEDDING_HEDGE_AFTER_MS: int = 2000  # start the next provider after this long (0 disables hedging)
+    EMBEDDING_CIRCUIT_COOLDOWN: float = 30.0  # seconds before a failing provider is probed again
     PROMPT_CACHE_SIZE: int = 1000
+    CHUNK_SIZE_TOKENS: int = 300
+    CHUNK_OVERLAP_TOKENS: int = 50
+    
+    # Vector indexes
+    VECTOR_HNSW_M: int = 16
+    VECTOR_HNSW_EF_CONSTRUCTION: int = 64
+    VECTOR_HNSW_EF_SEARCH: Optional[int] = None  # pgvector default (40) when unset
+    VECTOR_IVFFLAT_PROBES: Optional[int] = None  # pgvector default (1) when unset
+    VECTOR_INDEX_MAINTENANCE_WORK_MEM: str = "512MB"
+    DOCUMENT_CENTROID_EXACT_SCAN_MAX: int = 5000  # documents per knowledge base compared without the ANN index
+    
+    # Semantic result cache
+    SEMANTIC_CACHE_ENABLED: bool = True
+    SEMANTIC_CACHE_THRESHOLD: float = 0.97
+    SEMANTIC_CACHE_TTL: int = 3600  # 1 hour
+    SEMANTIC_CACHE_SCAN_LIMIT: int = 1000  # newest live entries per knowledge base compared on lookup
+    
+    # Hybrid search (reciprocal rank fusion)
+    HYBRID_SEARCH_SEMANTIC_WEIGHT: float = 0.7
+    HYBRID_SEARCH_KEYWORD_WEIGHT: float = 0.3
+    HYBRID_SEARCH_CANDIDATE_POOL: int = 50  # candidates per ranking before fusion
+    HYBRID_SEARCH_RRF_K: int = 60
+    
+    # Search analytics sink
+    SEARCH_ANALYTICS_QUEUE_SIZE: int = 10000
+    SEARCH_ANALYTICS_BATCH_SIZE: int = 500
+    SEARCH_ANALYTICS_FLUSH_INTERVAL_MS: int = 250
+    
+    # Document ingestion pipeline
+    EXTRACTION_WORKERS: Optional[int] = None  # CPU count when unset
+    EXTRACTION_TIMEOUT: float = 120.0  # seconds of parsing per worker task
+    EXTRACTION_MEMORY_LIMIT_MB: Optional[int] = 1024  # per worker, beyond its start size
+    EXTRACTION_PAGES_PER_TASK: int = 20
+    INGESTION_EXTRACT_CONCURRENCY: int = 4
+    INGESTION_PERSIST_CONCURRENCY: int = 4
+    INGESTION_EMBED_CONCURRENCY: int = 2
+    INGESTION_EMBED_BATCH_SIZE: int = 100
+    UPLOAD_READ_CHUNK_SIZE: int = 1024 * 1024  # bytes read per step when spooling uploads
+    
+    # Near-duplicate chunk detection (SimHash)
+    NEAR_DUPLICATE_ENABLED: bool = True
+    NEAR_DUPLICATE_MAX_DISTANCE: int = 6  # bits; up to 3 always found, larger with high probability
+    NEAR_DUPLICATE_SHINGLE_SIZE: int = 3  # words per shingle
+    NEAR_DUPLICATE_SEARCH_OVERFETCH: int = 2  # candidates per result when collapsing
+    
+    # Chunk browser and vector export
+    EMBEDDING_PREVIEW_SIZE: int = 10  # leading vector values returned per chunk
+    EMBEDDING_EXPORT_BATCH_SIZE: int = 500  # chunks fetched per step when exporting vectors
+    
+    # Embedding task queue (Redis Streams)
+    EMBEDDING_WORKER_CONCURRENCY: int = 5  # tasks each consumer runs at once
+    EMBEDDING_TASK_VISIBILITY_TIMEOUT: float = 120.0  # seconds without a heartbeat before a task is reclaimed
+    EMBEDDING_TASK_BLOCK_MS: int = 5000  # longest blocking stream read when idle
+    EMBEDDING_TASK_INLINE: bool = True  # API also runs queued tasks; disable when workers are deployed
+    EMBEDDING_TASK_RECONCILE_INTERVAL: float = 3600.0  # seconds between recounts of unfinished tasks
+    EMBEDDING_TASK_MAX_IN_FLIGHT: int = 4  # provider requests in flight per task
+    EMBEDDING_TASK_MAX_WRITES: int = 2  # concurrent chunk writes per task
+    EMBEDDING_BATCH_MAX_TOKENS: int = 100000  # tokens per provider request at most
+    EMBEDDING_RATE_LIMIT_RETRIES: int = 5  # rate-limited attempts per batch before it is skipped
     
     # Email (for notifications)
     SMTP_HOST: Optional[str] = None
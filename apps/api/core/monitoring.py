@@ -4,12 +4,13 @@ Prometheus metrics, health checks, and performance monitoring
 """
 
 import time
+import bisect
 import logging
 import asyncio
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple
 from datetime import datetime, timezone
 from functools import wraps
-from collections import defaultdict, deque
+from collections import defaultdict
 
 try:
     from prometheus_client import Counter, Histogram, Gauge, generate_latest, CONTENT_TYPE_LATEST
@@ -40,6 +41,15 @@ from .config import settings
 
 logger = logging.getLogger(__name__)
 
+# Request metrics are labelled with the route template, never the raw path,
+# so label cardinality is bounded by the number of routes
+UNMATCHED_ROUTE = "unmatched"
+HTTP_METHODS = frozenset({"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"})
+
+# Streaming responses are timed to their last body chunk, so the upper
+# buckets go past the Prometheus defaults
+REQUEST_DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
 # Prometheus metrics
 request_count = Counter(
     'http_requests_total',
@@ -49,8 +59,9 @@ request_count = Counter(
 
 request_duration = Histogram(
     'http_request_duration_seconds',
-    'HTTP request duration',
-    ['method', 'endpoint']
+    'HTTP request duration until the last response byte',
+    ['method', 'endpoint'],
+    buckets=REQUEST_DURATION_BUCKETS
 )
 
 active_connections = Gauge(
@@ -82,6 +93,29 @@ ai_token_usage = Counter(
     ['provider', 'model', 'type']
 )
 
+embedding_cache_hits = Counter(
+    'embedding_cache_hits_total',
+    'Embedding cache hits',
+    ['tier']
+)
+
+embedding_cache_misses = Counter(
+    'embedding_cache_misses_total',
+    'Embedding cache misses sent to a provider'
+)
+
+query_embedding_cache_requests = Counter(
+    'query_embedding_cache_requests_total',
+    'Query embedding cache lookups',
+    ['result']
+)
+
+search_analytics_rows = Counter(
+    'search_analytics_rows_total',
+    'Search history rows handled by the analytics sink',
+    ['result']
+)
+
 memory_usage = Gauge(
     'memory_usage_bytes',
     'Memory usage in bytes'
@@ -93,35 +127,100 @@ cpu_usage = Gauge(
 )
 
 
+def _geometric_buckets(low: float, high: float, growth: float) -> Tuple[float, ...]:
+    bounds = []
+    bound = low
+    while bound < high:
+        bounds.append(bound)
+        bound *= growth
+    bounds.append(high)
+    return tuple(bounds)
+
+
+# 0.5ms to 5min in 10% steps: ~140 counters per histogram
+LATENCY_BUCKETS = _geometric_buckets(0.0005, 300.0, 1.1)
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram
+    
+    Memory does not grow with the number of samples. Buckets grow
+    geometrically, so a percentile read from it is within one bucket
+    (about 10%) of the exact value.
+    """
+    
+    def __init__(self, bounds: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.bounds = bounds
+        # Last counter holds samples above the top bound
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = float('inf')
+        self.max = 0.0
+    
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+    
+    def percentile(self, q: float) -> float:
+        """Estimate the ``q`` quantile (0-1), interpolating within its bucket"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            if bucket_count and seen + bucket_count >= rank:
+                lower = self.bounds[index - 1] if index > 0 else 0.0
+                upper = self.bounds[index] if index < len(self.bounds) else self.max
+                value = lower + (upper - lower) * (rank - seen) / bucket_count
+                return min(max(value, self.min), self.max)
+            seen += bucket_count
+        return self.max
+    
+    def summary(self) -> Dict[str, float]:
+        return {
+            "p50": self.percentile(0.50),
+            "p95": self.percentile(0.95),
+            "p99": self.percentile(0.99),
+        }
+
+
 class PerformanceMonitor:
     """Performance monitoring and metrics collection"""
     
     def __init__(self):
-        self.request_times: deque = deque(maxlen=1000)
+        self.latency = LatencyHistogram()
         self.error_rates: Dict[str, int] = defaultdict(int)
         self.endpoint_stats: Dict[str, Dict[str, Any]] = defaultdict(lambda: {
             'total_requests': 0,
-            'total_time': 0,
-            'min_time': float('inf'),
-            'max_time': 0,
-            'error_count': 0
+            'error_count': 0,
+            'latency': LatencyHistogram()
         })
         self.start_time = datetime.now(timezone.utc)
         
     def record_request(self, method: str, endpoint: str, duration: float, status_code: int):
-        """Record request metrics"""
+        """Record request metrics
+        
+        Args:
+            method: HTTP method
+            endpoint: Route template (e.g. ``/documents/{document_id}``), not
+                the raw request path
+            duration: Seconds until the last response byte was sent
+            status_code: Response status
+        """
         # Prometheus metrics
         request_count.labels(method=method, endpoint=endpoint, status_code=status_code).inc()
         request_duration.labels(method=method, endpoint=endpoint).observe(duration)
         
         # Internal metrics
-        self.request_times.append(duration)
+        self.latency.observe(duration)
         
         stats = self.endpoint_stats[f"{method} {endpoint}"]
         stats['total_requests'] += 1
-        stats['total_time'] += duration
-        stats['min_time'] = min(stats['min_time'], duration)
-        stats['max_time'] = max(stats['max_time'], duration)
+        stats['latency'].observe(duration)
         
         if status_code >= 400:
             stats['error_count'] += 1
@@ -144,22 +243,50 @@ class PerformanceMonitor:
         for token_type, count in tokens_used.items():
             ai_token_usage.labels(provider=provider, model=model, type=token_type).inc(count)
     
+    def record_embedding_cache(self, memory_hits: int, redis_hits: int, misses: int):
+        """Record embedding cache lookups"""
+        if memory_hits:
+            embedding_cache_hits.labels(tier="memory").inc(memory_hits)
+        if redis_hits:
+            embedding_cache_hits.labels(tier="redis").inc(redis_hits)
+        if misses:
+            embedding_cache_misses.inc(misses)
+    
+    def record_query_embedding_cache(self, hit: bool):
+        """Record a query embedding cache lookup"""
+        query_embedding_cache_requests.labels(result="hit" if hit else "miss").inc()
+    
+    def record_search_analytics(self, written: int = 0, dropped: int = 0, failed: int = 0):
+        """Record search analytics rows written, dropped or failed"""
+        if written:
+            search_analytics_rows.labels(result="written").inc(written)
+        if dropped:
+            search_analytics_rows.labels(result="dropped").inc(dropped)
+        if failed:
+            search_analytics_rows.labels(result="failed").inc(failed)
+    
     def get_performance_stats(self) -> Dict[str, Any]:
         """Get current performance statistics"""
         uptime = (datetime.now(timezone.utc) - self.start_time).total_seconds()
         
-        avg_response_time = sum(self.request_times) / len(self.request_times) if self.request_times else 0
+        avg_response_time = self.latency.total / self.latency.count if self.latency.count else 0
         
         return {
             "uptime_seconds": uptime,
-            "total_requests": sum(stats['total_requests'] for stats in self.endpoint_stats.values()),
+            "total_requests": self.latency.count,
             "average_response_time": avg_response_time,
+            "response_time_percentiles": self.latency.summary(),
             "error_rates": dict(self.error_rates),
             "endpoint_stats": {
                 endpoint: {
-                    **stats,
-                    "average_time": stats['total_time'] / stats['total_requests'] if stats['total_requests'] > 0 else 0,
-                    "error_rate": stats['error_count'] / stats['total_requests'] if stats['total_requests'] > 0 else 0
+                    "total_requests": stats['total_requests'],
+                    "error_count": stats['error_count'],
+                    "total_time": stats['latency'].total,
+                    "min_time": stats['latency'].min,
+                    "max_time": stats['latency'].max,
+                    "average_time": stats['latency'].total / stats['total_requests'],
+                    "error_rate": stats['error_count'] / stats['total_requests'],
+                    **stats['latency'].summary()
                 }
                 for endpoint, stats in self.endpoint_stats.items()
             }
@@ -286,8 +413,23 @@ def monitor_performance(func):
         return sync_wrapper
 
 
+def route_template(scope) -> str:
+    """Path template of the route that handled a request
+    
+    The router stores the matched route in the scope, so this is only
+    meaningful once the request has been routed. Requests that matched no
+    route share the ``UNMATCHED_ROUTE`` label.
+    """
+    route = scope.get("route")
+    return getattr(route, "path_format", None) or getattr(route, "path", None) or UNMATCHED_ROUTE
+
+
 class MetricsMiddleware:
-    """Middleware to collect HTTP request metrics"""
+    """Middleware to collect HTTP request metrics
+    
+    Requests are timed until the last body chunk is sent, so streaming
+    responses count their full duration rather than time to headers.
+    """
     
     def __init__(self, app):
         self.app = app
@@ -297,23 +439,35 @@ class MetricsMiddleware:
             await self.app(scope, receive, send)
             return
         
-        start_time = time.time()
+        start_time = time.perf_counter()
+        method = scope["method"] if scope["method"] in HTTP_METHODS else "OTHER"
+        status_code = 500
+        recorded = False
+        
+        def record():
+            nonlocal recorded
+            if recorded:
+                return
+            recorded = True
+            duration = time.perf_counter() - start_time
+            performance_monitor.record_request(method, route_template(scope), duration, status_code)
         
         async def send_with_metrics(message):
+            nonlocal status_code
             if message["type"] == "http.response.start":
-                duration = time.time() - start_time
-                
-                # Extract request info
-                method = scope["method"]
-                path = scope["path"]
                 status_code = message["status"]
-                
-                # Record metrics
-                performance_monitor.record_request(method, path, duration, status_code)
             
             await send(message)
+            
+            # Background tasks run after the last chunk and are not part of the response
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                record()
         
-        await self.app(scope, receive, send_with_metrics)
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            # Errors and client disconnects before the response completed
+            record()
 
 
 def setup_monitoring():
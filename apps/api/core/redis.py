@@ -19,10 +19,13 @@ logger = logging.getLogger(__name__)
 # Global Redis connection pool
 redis_pool: Optional[Redis] = None
 
+# Connection pool for raw bytes values (packed vectors etc.)
+redis_binary_pool: Optional[Redis] = None
+
 
 async def init_redis():
     """Initialize Redis connection pool"""
-    global redis_pool
+    global redis_pool, redis_binary_pool
     
     if redis_pool is None:
         try:
@@ -35,6 +38,12 @@ async def init_redis():
                 max_connections=20
             )
             
+            redis_binary_pool = aioredis.from_url(
+                settings.REDIS_URL,
+                decode_responses=False,
+                max_connections=10
+            )
+            
             # Test connection
             await redis_pool.ping()
             logger.info("Redis connection established successfully")
@@ -42,12 +51,17 @@ async def init_redis():
         except Exception as e:
             logger.error(f"Failed to initialize Redis connection: {e}")
             redis_pool = None
+            redis_binary_pool = None
             raise
 
 
 async def close_redis():
     """Close Redis connection pool"""
-    global redis_pool
+    global redis_pool, redis_binary_pool
+    
+    if redis_binary_pool:
+        await redis_binary_pool.close()
+        redis_binary_pool = None
     
     if redis_pool:
         await redis_pool.close()
@@ -62,6 +76,13 @@ def get_redis() -> Redis:
     return redis_pool
 
 
+def get_binary_redis() -> Redis:
+    """Get Redis connection instance that returns raw bytes"""
+    if redis_binary_pool is None:
+        raise RuntimeError("Redis not initialized. Call init_redis() first.")
+    return redis_binary_pool
+
+
 @asynccontextmanager
 async def get_redis_connection():
     """Get Redis connection context manager"""
@@ -79,8 +100,9 @@ async def get_redis_connection():
 class RedisCache:
     """Redis-based caching utility"""
     
-    def __init__(self, default_ttl: int = 3600):
+    def __init__(self, default_ttl: int = 3600, scan_batch_size: int = 1000):
         self.default_ttl = default_ttl
+        self.scan_batch_size = scan_batch_size
     
     async def get(self, key: str) -> Optional[Any]:
         """Get value from cache"""
@@ -146,25 +168,47 @@ class RedisCache:
             logger.error(f"Failed to set expiration for key {key}: {e}")
             return False
     
-    async def get_keys(self, pattern: str = "*") -> List[str]:
-        """Get keys matching pattern"""
+    async def get_keys(self, pattern: str = "*", limit: Optional[int] = None) -> List[str]:
+        """Get keys matching pattern
+        
+        Iterates with SCAN instead of KEYS, so Redis keeps serving other
+        clients between batches.
+        
+        Args:
+            pattern: Glob-style key pattern
+            limit: Stop after this many keys
+        """
         try:
             redis = get_redis()
-            keys = await redis.keys(pattern)
-            return keys
+            keys = {}
+            async for key in redis.scan_iter(match=pattern, count=self.scan_batch_size):
+                # SCAN may return a key more than once
+                keys[key] = None
+                if limit and len(keys) >= limit:
+                    break
+            return list(keys)
         except Exception as e:
             logger.error(f"Failed to get keys with pattern {pattern}: {e}")
             return []
     
     async def flush_pattern(self, pattern: str) -> int:
-        """Delete all keys matching pattern"""
+        """Delete all keys matching pattern
+        
+        Keys are found with SCAN and removed with UNLINK in batches, which
+        frees their memory off the main Redis thread.
+        """
         try:
             redis = get_redis()
-            keys = await redis.keys(pattern)
-            if keys:
-                result = await redis.delete(*keys)
-                return result
-            return 0
+            deleted = 0
+            batch = []
+            async for key in redis.scan_iter(match=pattern, count=self.scan_batch_size):
+                batch.append(key)
+                if len(batch) >= self.scan_batch_size:
+                    deleted += await redis.unlink(*batch)
+                    batch = []
+            if batch:
+                deleted += await redis.unlink(*batch)
+            return deleted
         except Exception as e:
             logger.error(f"Failed to flush keys with pattern {pattern}: {e}")
             return 0
@@ -324,6 +368,7 @@ __all__ = [
     "init_redis",
     "close_redis",
     "get_redis",
+    "get_binary_redis",
     "get_redis_connection",
     "RedisCache",
     "RedisRateLimiter",
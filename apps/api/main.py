@@ -79,6 +79,10 @@ async def lifespan(app: FastAPI):
         langchain_client = get_langchain_client()
         logger.info("LangChain service client ready")
         
+        # Start search analytics writer
+        from services.search_analytics import search_analytics
+        search_analytics.start()
+        
         logger.info("Arketic Backend initialization complete")
         
     except Exception as e:
@@ -96,6 +100,13 @@ async def lifespan(app: FastAPI):
         from services.langchain_client import cleanup_langchain_client
         await cleanup_langchain_client()
         
+        # Flush queued search analytics before the database closes
+        from services.search_analytics import search_analytics
+        await search_analytics.stop()
+        
+        from services.document_extractor import document_extractor
+        document_extractor.shutdown()
+        
         if security_manager:
             await security_manager.cleanup()
         
@@ -0,0 +1,33 @@
+"""Scope semantic_cache entries to a knowledge base
+
+Revision ID: 012_semantic_cache_kb_scope
+Revises: 011_add_system_settings
+Create Date: 2025-01-12 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '012_semantic_cache_kb_scope'
+down_revision = '011_add_system_settings'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing rows were never read back and hold a single chunk rather than
+    # a result set, so they cannot be served by the result cache
+    op.execute("DELETE FROM semantic_cache")
+
+    op.add_column('semantic_cache',
+        sa.Column('knowledge_base_id', postgresql.UUID(as_uuid=True),
+                  sa.ForeignKey('knowledge_bases.id', ondelete='CASCADE'), nullable=True)
+    )
+    op.create_index('idx_cache_kb_expires', 'semantic_cache', ['knowledge_base_id', 'expires_at'])
+
+
+def downgrade():
+    op.drop_index('idx_cache_kb_expires', 'semantic_cache')
+    op.drop_column('semantic_cache', 'knowledge_base_id')
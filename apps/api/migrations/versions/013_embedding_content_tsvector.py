@@ -0,0 +1,30 @@
+"""Stored tsvector column for full-text search over embedding chunks
+
+Revision ID: 013_embedding_content_tsvector
+Revises: 012_semantic_cache_kb_scope
+Create Date: 2025-01-13 00:00:00.000000
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '013_embedding_content_tsvector'
+down_revision = '012_semantic_cache_kb_scope'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Generated so every insert path (ORM, COPY) keeps it in sync with content
+    op.execute("""
+        ALTER TABLE knowledge_embeddings
+        ADD COLUMN content_tsv tsvector
+        GENERATED ALWAYS AS (to_tsvector('english', coalesce(content, ''))) STORED
+    """)
+    op.create_index('idx_embeddings_content_tsv', 'knowledge_embeddings', ['content_tsv'],
+                    postgresql_using='gin')
+
+
+def downgrade():
+    op.drop_index('idx_embeddings_content_tsv', 'knowledge_embeddings')
+    op.drop_column('knowledge_embeddings', 'content_tsv')
@@ -0,0 +1,29 @@
+"""Per-chunk content hash on knowledge_embeddings
+
+Revision ID: 014_embedding_content_hash
+Revises: 013_embedding_content_tsvector
+Create Date: 2025-01-14 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '014_embedding_content_hash'
+down_revision = '013_embedding_content_tsvector'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Written by the application (hex SHA-256 of the UTF-8 content) so document
+    # updates can match unchanged chunks and skip re-embedding them
+    op.add_column('knowledge_embeddings', sa.Column('content_hash', sa.String(64), nullable=True))
+    op.execute("""
+        UPDATE knowledge_embeddings
+        SET content_hash = encode(sha256(convert_to(content, 'UTF8')), 'hex')
+    """)
+
+
+def downgrade():
+    op.drop_column('knowledge_embeddings', 'content_hash')
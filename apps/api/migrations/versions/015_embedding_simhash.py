@@ -0,0 +1,36 @@
+"""SimHash fingerprints for near-duplicate chunk detection
+
+Revision ID: 015_embedding_simhash
+Revises: 014_embedding_content_hash
+Create Date: 2025-01-15 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '015_embedding_simhash'
+down_revision = '014_embedding_content_hash'
+branch_labels = None
+depends_on = None
+
+# Four 16-bit LSH bands of the 64-bit fingerprint; the expressions must match
+# services.near_duplicate.band_expression for the indexes to be used
+BAND_SHIFTS = (48, 32, 16, 0)
+
+
+def upgrade():
+    # Written by the application; existing rows stay NULL and are never matched
+    op.add_column('knowledge_embeddings', sa.Column('simhash', sa.BigInteger(), nullable=True))
+    for band, shift in enumerate(BAND_SHIFTS):
+        op.execute(f"""
+            CREATE INDEX idx_embeddings_simhash_band_{band}
+            ON knowledge_embeddings (((simhash >> {shift}) & 65535))
+            WHERE simhash IS NOT NULL
+        """)
+
+
+def downgrade():
+    for band in range(len(BAND_SHIFTS)):
+        op.drop_index(f'idx_embeddings_simhash_band_{band}', 'knowledge_embeddings')
+    op.drop_column('knowledge_embeddings', 'simhash')
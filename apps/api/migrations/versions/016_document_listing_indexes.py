@@ -0,0 +1,45 @@
+"""Indexes for metadata-only document listing
+
+Revision ID: 016_document_listing_indexes
+Revises: 015_embedding_simhash
+Create Date: 2025-01-16 00:00:00.000000
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '016_document_listing_indexes'
+down_revision = '015_embedding_simhash'
+branch_labels = None
+depends_on = None
+
+# Sort columns supported by keyset pagination in KnowledgeService.list_documents
+SORT_COLUMNS = ('created_at', 'updated_at', 'title')
+
+
+def upgrade():
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+
+    # Substring title search (ILIKE '%...%') through a trigram index
+    op.execute("CREATE INDEX idx_doc_title_trgm ON knowledge_documents USING gin (title gin_trgm_ops)")
+
+    # Full-text content search; the prefix bound keeps very large documents
+    # under the tsvector size limit
+    op.execute("""
+        ALTER TABLE knowledge_documents
+        ADD COLUMN content_tsv tsvector
+        GENERATED ALWAYS AS (to_tsvector('english', left(coalesce(content, ''), 200000))) STORED
+    """)
+    op.create_index('idx_doc_content_tsv', 'knowledge_documents', ['content_tsv'], postgresql_using='gin')
+
+    # (knowledge base, sort column, id) serves keyset pages in either direction
+    for column in SORT_COLUMNS:
+        op.create_index(f'idx_doc_kb_{column}', 'knowledge_documents', ['knowledge_base_id', column, 'id'])
+
+
+def downgrade():
+    for column in SORT_COLUMNS:
+        op.drop_index(f'idx_doc_kb_{column}', 'knowledge_documents')
+    op.drop_index('idx_doc_content_tsv', 'knowledge_documents')
+    op.drop_column('knowledge_documents', 'content_tsv')
+    op.drop_index('idx_doc_title_trgm', 'knowledge_documents')
@@ -0,0 +1,54 @@
+"""Per-document centroid embeddings for document similarity
+
+Revision ID: 017_document_centroids
+Revises: 016_document_listing_indexes
+Create Date: 2025-01-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+from pgvector.sqlalchemy import Vector
+
+# revision identifiers, used by Alembic.
+revision = '017_document_centroids'
+down_revision = '016_document_listing_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # embedding_sum is the sum of the chunk embeddings; its direction is the
+    # mean's, so cosine distance ranks documents by their centroids
+    op.create_table('knowledge_document_centroids',
+        sa.Column('document_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('knowledge_base_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('embedding_sum', Vector(1536), nullable=False),
+        sa.Column('chunk_count', sa.Integer(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['document_id'], ['knowledge_documents.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['knowledge_base_id'], ['knowledge_bases.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('document_id')
+    )
+    op.create_index('idx_centroid_knowledge_base', 'knowledge_document_centroids', ['knowledge_base_id'])
+    op.execute("""
+        CREATE INDEX idx_centroid_vector_hnsw
+        ON knowledge_document_centroids
+        USING hnsw (embedding_sum vector_cosine_ops)
+        WITH (m = 16, ef_construction = 64)
+    """)
+
+    op.execute("""
+        INSERT INTO knowledge_document_centroids
+            (document_id, knowledge_base_id, embedding_sum, chunk_count, updated_at)
+        SELECT e.document_id, e.knowledge_base_id, sum(e.embedding), count(*), now()
+        FROM knowledge_embeddings e
+        JOIN knowledge_documents d ON d.id = e.document_id
+        GROUP BY e.document_id, e.knowledge_base_id
+    """)
+
+
+def downgrade():
+    op.drop_index('idx_centroid_vector_hnsw', 'knowledge_document_centroids')
+    op.drop_index('idx_centroid_knowledge_base', 'knowledge_document_centroids')
+    op.drop_table('knowledge_document_centroids')
@@ -0,0 +1,33 @@
+"""Document content of queued embedding tasks
+
+Revision ID: 018_embedding_task_payloads
+Revises: 017_document_centroids
+Create Date: 2025-01-18 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '018_embedding_task_payloads'
+down_revision = '017_document_centroids'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Task state stays in Redis; the content is written once at enqueue and
+    # deleted when the task finishes, fails for good or is cancelled
+    op.create_table('embedding_task_payloads',
+        sa.Column('task_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('content', sa.Text(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('task_id')
+    )
+    op.create_index('idx_embedding_task_payloads_created_at', 'embedding_task_payloads', ['created_at'])
+
+
+def downgrade():
+    op.drop_index('idx_embedding_task_payloads_created_at', 'embedding_task_payloads')
+    op.drop_table('embedding_task_payloads')
@@ -0,0 +1,27 @@
+"""Cache generation per knowledge base for semantic cache invalidation
+
+Revision ID: 019_semantic_cache_generation
+Revises: 018_embedding_task_payloads
+Create Date: 2025-01-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '019_semantic_cache_generation'
+down_revision = '018_embedding_task_payloads'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Bumped on every invalidation; cache writes only land while it still
+    # matches the value read before the search, in any process
+    op.add_column('knowledge_bases',
+        sa.Column('cache_generation', sa.Integer(), nullable=False, server_default='0')
+    )
+
+
+def downgrade():
+    op.drop_column('knowledge_bases', 'cache_generation')
@@ -52,6 +52,16 @@ def _safe_get_chat_value(obj, attr_name, default_value):
         # Object might be detached from session, return default
         return default_value
 
+def _rag_knowledge_base_ids(kb_ids) -> List[UUID]:
+    """Parse an assistant's knowledge base IDs for RAG, skipping malformed ones"""
+    valid_ids = []
+    for kb_id in kb_ids or []:
+        try:
+            valid_ids.append(UUID(str(kb_id)))
+        except ValueError:
+            logger.warning(f"AR-75: Skipping invalid knowledge base ID {kb_id!r}")
+    return valid_ids
+
 # Pydantic models for requests/responses
 class CreateChatRequest(BaseModel):
     title: str = Field(..., min_length=1, max_length=200)
@@ -435,34 +445,32 @@ async def generate_streaming_ai_response(
                         user = user_result.scalar_one_or_none()
                         
                         if user:
-                            # Perform semantic search across all knowledge bases
-                            for kb_id in chat.assistant_knowledge_bases:
-                                try:
-                                    search_result = await knowledge_service.semantic_search(
-                                        db=rag_session,
-                                        user=user,
-                                        query=user_query,
-                                        knowledge_base_id=UUID(kb_id),
-                                        k=3,  # Top 3 most relevant chunks per KB
-                                        score_threshold=0.7,
-                                        search_type="semantic"
-                                    )
-                                    
-                                    # Extract context and sources
-                                    for result in search_result.get("results", []):
-                                        rag_context += f"\n[Source: {result['document_title']}]\n{result['content']}\n"
-                                        source_documents.append({
-                                            "title": result["document_title"],
-                                            "document_id": str(result["document_id"]) if result["document_id"] else None,
-                                            "score": result["score"],
-                                            "content": result["content"][:200] + "..." if len(result["content"]) > 200 else result["content"]
-                                        })
-                                    
-                                    logger.info(f"AR-75: Retrieved {len(search_result.get('results', []))} chunks from KB {kb_id}")
-                                    
-                                except Exception as kb_error:
-                                    logger.warning(f"AR-75: Failed to search knowledge base {kb_id}: {kb_error}")
-                                    continue
+                            # Single embedding and similarity query across all knowledge bases
+                            try:
+                                kb_ids = _rag_knowledge_base_ids(chat.assistant_knowledge_bases)
+                                search_result = await knowledge_service.multi_knowledge_base_search(
+                                    db=rag_session,
+                                    user=user,
+                                    query=user_query,
+                                    knowledge_base_ids=kb_ids,
+                                    k=3 * len(kb_ids),  # Top chunks ranked across all KBs
+                                    score_threshold=0.7
+                                )
+                                
+                                # Extract context and sources
+                                for result in search_result.get("results", []):
+                                    rag_context += f"\n[Source: {result['document_title']}]\n{result['content']}\n"
+                                    source_documents.append({
+                                        "title": result["document_title"],
+                                        "document_id": str(result["document_id"]) if result["document_id"] else None,
+                                        "score": result["score"],
+                                        "content": result["content"][:200] + "..." if len(result["content"]) > 200 else result["content"]
+                                    })
+                                
+                                logger.info(f"AR-75: Retrieved {len(search_result.get('results', []))} chunks from {len(kb_ids)} KBs")
+                                
+                            except Exception as kb_error:
+                                logger.warning(f"AR-75: Failed to search knowledge bases: {kb_error}")
                             
                             if rag_context:
                                 logger.info(f"AR-75: Total RAG context length: {len(rag_context)} characters")
@@ -1733,34 +1741,32 @@ async def chat_with_ai(
                     user = user_result.scalar_one_or_none()
                     
                     if user:
-                        # Perform semantic search across all knowledge bases
-                        for kb_id in chat.assistant_knowledge_bases:
-                            try:
-                                search_result = await knowledge_service.semantic_search(
-                                    db=db,
-                                    user=user,
-                                    query=request_body.message,
-                                    knowledge_base_id=UUID(kb_id),
-                                    k=3,  # Top 3 most relevant chunks per KB
-                                    score_threshold=0.7,
-                                    search_type="semantic"
-                                )
-                                
-                                # Extract context and sources
-                                for result in search_result.get("results", []):
-                                    rag_context += f"\n[Source: {result['document_title']}]\n{result['content']}\n"
-                                    source_documents.append({
-                                        "title": result["document_title"],
-                                        "document_id": str(result["document_id"]) if result["document_id"] else None,
-                                        "score": result["score"],
-                                        "content": result["content"][:200] + "..." if len(result["content"]) > 200 else result["content"]
-                                    })
-                                
-                                logger.info(f"AR-75: Retrieved {len(search_result.get('results', []))} chunks from KB {kb_id}")
-                                
-                            except Exception as kb_error:
-                                logger.warning(f"AR-75: Failed to search knowledge base {kb_id}: {kb_error}")
-                                continue
+                        # Single embedding and similarity query across all knowledge bases
+                        try:
+                            kb_ids = _rag_knowledge_base_ids(chat.assistant_knowledge_bases)
+                            search_result = await knowledge_service.multi_knowledge_base_search(
+                                db=db,
+                                user=user,
+                                query=request_body.message,
+                                knowledge_base_ids=kb_ids,
+                                k=3 * len(kb_ids),  # Top chunks ranked across all KBs
+                                score_threshold=0.7
+                            )
+                            
+                            # Extract context and sources
+                            for result in search_result.get("results", []):
+                                rag_context += f"\n[Source: {result['document_title']}]\n{result['content']}\n"
+                                source_documents.append({
+                                    "title": result["document_title"],
+                                    "document_id": str(result["document_id"]) if result["document_id"] else None,
+                                    "score": result["score"],
+                                    "content": result["content"][:200] + "..." if len(result["content"]) > 200 else result["content"]
+                                })
+                            
+                            logger.info(f"AR-75: Retrieved {len(search_result.get('results', []))} chunks from {len(kb_ids)} KBs")
+                            
+                        except Exception as kb_error:
+                            logger.warning(f"AR-75: Failed to search knowledge bases: {kb_error}")
                         
                         if rag_context:
                             logger.info(f"AR-75: Total RAG context length: {len(rag_context)} characters")
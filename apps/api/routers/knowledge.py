@@ -6,6 +6,7 @@ search, RAG queries, and collection management.
 """
 
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query, Body, status, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import List, Optional, Dict, Any
@@ -19,6 +20,7 @@ from schemas.knowledge import (
     DocumentUploadRequest,
     DocumentUploadResponse,
     DocumentFileUploadResponse,
+    UploadBatchResponse,
     DocumentListRequest,
     DocumentListResponse,
     DocumentDetailResponse,
@@ -29,6 +31,8 @@ from schemas.knowledge import (
     RAGQueryResponse,
     SimilarDocumentsRequest,
     SimilarDocumentsResponse,
+    BatchSimilarDocumentsRequest,
+    BatchSimilarDocumentsResponse,
     CollectionCreateRequest,
     CollectionCreateResponse,
     CollectionListRequest,
@@ -158,6 +162,57 @@ async def upload_document_files(
         )
 
 
+@router.post(
+    "/knowledge/upload/batch",
+    response_model=UploadBatchResponse,
+    status_code=status.HTTP_202_ACCEPTED,
+    summary="Queue document files for ingestion",
+    description="Upload multiple files (PDF, TXT, MD, DOCX) and process them in the background"
+)
+async def submit_document_files(
+    knowledge_base_id: Optional[UUID] = Query(None, description="Knowledge base ID (optional)"),
+    files: List[UploadFile] = File(..., description="Files to upload"),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Queue multiple files for ingestion.
+    
+    Returns immediately with a batch ID; poll
+    `/knowledge/upload/batch/{batch_id}` for per-file progress.
+    """
+    try:
+        batch = await knowledge_service.submit_document_files(
+            db=db,
+            user=current_user,
+            knowledge_base_id=knowledge_base_id,
+            files=files
+        )
+        return UploadBatchResponse(**batch)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to queue files: {str(e)}"
+        )
+
+
+@router.get(
+    "/knowledge/upload/batch/{batch_id}",
+    response_model=UploadBatchResponse,
+    summary="Get upload batch progress",
+    description="Get per-file progress of a queued multi-file upload"
+)
+async def get_upload_batch(
+    batch_id: UUID,
+    current_user: User = Depends(get_current_user)
+):
+    """Get per-file progress of an upload batch."""
+    batch = await knowledge_service.get_upload_batch_status(current_user, str(batch_id))
+    return UploadBatchResponse(**batch)
+
+
 @router.get(
     "/knowledge/list",
     response_model=DocumentListResponse,
@@ -173,13 +228,15 @@ async def list_documents(
     search: Optional[str] = Query(None, description="Search in title and content"),
     source_type: Optional[str] = Query(None, description="Filter by source type"),
     status: Optional[str] = Query(None, description="Filter by processing status"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
     """
     List all documents in a knowledge base.
     
-    Supports pagination, sorting, searching, and filtering.
+    Supports pagination, sorting, searching, and filtering. Follow
+    ``pagination.next_cursor`` for deep pages; ``page`` uses OFFSET.
     """
     try:
         # Handle "None" string being passed as knowledge_base_id
@@ -203,7 +260,8 @@ async def list_documents(
             sort_order=sort_order,
             search=search,
             source_type=source_type,
-            status=status
+            status=status,
+            cursor=cursor
         )
         return DocumentListResponse(**result)
     except HTTPException:
@@ -251,24 +309,31 @@ async def get_document_details(
     "/knowledge/{document_id}/embeddings",
     response_model=DocumentEmbeddingsResponse,
     summary="Get document embeddings",
-    description="Retrieve all embeddings for a specific document"
+    description="Browse the chunks of a specific document page by page"
 )
 async def get_document_embeddings(
     document_id: UUID,
+    limit: int = Query(100, ge=1, le=500, description="Chunks per page"),
+    after: Optional[int] = Query(None, ge=0, description="next_after from the previous page"),
+    include_preview: bool = Query(True, description="Include the leading embedding values"),
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
     """
-    Get all embeddings for a document.
+    Get a page of a document's embedding chunks.
     
     Returns embedding chunks with their text content and metadata.
     Useful for debugging and understanding how documents are processed.
+    Full vectors are available from the export endpoint.
     """
     try:
         result = await knowledge_service.get_document_embeddings(
             db=db,
             user=current_user,
-            document_id=document_id
+            document_id=document_id,
+            limit=limit,
+            after=after,
+            include_preview=include_preview
         )
         return DocumentEmbeddingsResponse(**result)
     except HTTPException:
@@ -280,6 +345,49 @@ async def get_document_embeddings(
         )
 
 
+@router.get(
+    "/knowledge/{document_id}/embeddings/export",
+    summary="Export document embeddings",
+    description="Stream a document's full embedding vectors as float32"
+)
+async def export_document_embeddings(
+    document_id: UUID,
+    format: str = Query("npy", pattern="^(npy|f32)$", description="npy (NumPy file) or f32 (raw float32)"),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Export every embedding vector of a document, in chunk order.
+    
+    ``npy`` can be read with ``numpy.load``; ``f32`` is the same little-endian
+    float32 matrix without a header, shaped by the ``X-Embedding-Rows`` and
+    ``X-Embedding-Dimensions`` response headers.
+    """
+    try:
+        export = await knowledge_service.export_document_embeddings(
+            db=db,
+            user=current_user,
+            document_id=document_id,
+            export_format=format
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to export document embeddings: {str(e)}"
+        )
+    return StreamingResponse(
+        export["stream"],
+        media_type="application/octet-stream",
+        headers={
+            "Content-Disposition": f'attachment; filename="{export["filename"]}"',
+            "X-Embedding-Rows": str(export["rows"]),
+            "X-Embedding-Dimensions": str(export["dimensions"])
+        }
+    )
+
+
 @router.delete(
     "/knowledge/{document_id}",
     status_code=status.HTTP_200_OK,
@@ -423,7 +531,8 @@ async def find_similar_documents(
     """
     Find documents similar to a reference document.
     
-    Uses vector similarity to find related content.
+    Compares stored document centroid embeddings within the reference
+    document's knowledge base.
     """
     try:
         result = await knowledge_service.find_similar_documents(
@@ -443,6 +552,39 @@ async def find_similar_documents(
         )
 
 
+@router.post(
+    "/knowledge/similar/batch",
+    response_model=BatchSimilarDocumentsResponse,
+    summary="Find similar documents in batch",
+    description="Find documents similar to each of several reference documents"
+)
+async def find_similar_documents_batch(
+    request: BatchSimilarDocumentsRequest,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Find similar documents for up to 100 reference documents with a single
+    similarity query.
+    """
+    try:
+        results = await knowledge_service.find_similar_documents_batch(
+            db=db,
+            user=current_user,
+            document_ids=request.document_ids,
+            k=request.k,
+            score_threshold=request.score_threshold
+        )
+        return BatchSimilarDocumentsResponse(results=results)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to find similar documents: {str(e)}"
+        )
+
+
 # Collection Management Endpoints
 
 @router.post(
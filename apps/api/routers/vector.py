@@ -11,10 +11,14 @@ from uuid import UUID
 from pydantic import BaseModel, Field
 from datetime import datetime
 
+from core.config import settings
 from core.database import get_db
 from core.dependencies import get_current_user
 from models.user import User
 from services.pgvector_service import pgvector_service
+from services.text_chunker import total_tokens
+from services.document_extractor import document_extractor, ExtractionError
+from services.upload_spool import spool_upload, discard_spool, UploadTooLargeError
 
 router = APIRouter(prefix="/api/vector", tags=["Vector Store"])
 
@@ -47,6 +51,9 @@ class SearchRequest(BaseModel):
     score_threshold: float = Field(default=0.7, ge=0.0, le=1.0)
     search_type: str = Field(default="semantic", pattern="^(semantic|keyword|hybrid)$")
     filters: Optional[Dict[str, Any]] = None
+    ef_search: Optional[int] = Field(default=None, ge=1, le=1000)
+    probes: Optional[int] = Field(default=None, ge=1, le=1000)
+    collapse_duplicates: bool = False
 
 
 class SearchResult(BaseModel):
@@ -67,6 +74,15 @@ class SearchResponse(BaseModel):
     total_results: int
 
 
+class VectorIndexRequest(BaseModel):
+    """Request model for building a vector index"""
+    method: str = Field(default="hnsw", pattern="^(hnsw|ivfflat)$")
+    dimensions: Optional[int] = Field(default=None, ge=1)
+    m: Optional[int] = Field(default=None, ge=2, le=100)
+    ef_construction: Optional[int] = Field(default=None, ge=4, le=1000)
+    lists: Optional[int] = Field(default=None, ge=1, le=32768)
+
+
 class VectorHealthResponse(BaseModel):
     """Response model for vector store health check"""
     status: str
@@ -139,6 +155,11 @@ async def upload_document(
         from uuid import uuid4
         document_id = uuid4()
         
+        # Chunk once; token counts come from the same pass
+        chunks = pgvector_service._chunk_text(request.content)
+        for chunk in chunks:
+            chunk["metadata"] = doc["metadata"]
+        
         # Add to vector store
         chunk_ids = await pgvector_service.add_documents(
             [doc],
@@ -147,14 +168,15 @@ async def upload_document(
             {
                 "uploaded_by": str(current_user.id),
                 "uploaded_at": datetime.utcnow().isoformat()
-            }
+            },
+            chunks=chunks
         )
         
         # Calculate processing time
         processing_time = (datetime.utcnow() - start_time).total_seconds() * 1000
         
         # Get token count
-        token_count = pgvector_service._tiktoken_len(request.content)
+        token_count = total_tokens(chunks)
         
         return DocumentUploadResponse(
             document_id=document_id,
@@ -181,6 +203,8 @@ async def upload_document_file(
     
     Supports PDF, TXT, MD, and DOCX files.
     Automatically extracts text and processes it for embedding.
+    The upload is streamed to disk and rejected as soon as it exceeds
+    MAX_FILE_SIZE.
     """
     # Check file type
     allowed_types = ['.pdf', '.txt', '.md', '.docx']
@@ -193,18 +217,16 @@ async def upload_document_file(
         )
     
     try:
-        # Read file content
-        content = await file.read()
-        
-        # Extract text based on file type
-        if file_ext == '.txt' or file_ext == '.md':
-            text_content = content.decode('utf-8')
-        else:
-            # For PDF and DOCX, would need additional libraries
-            raise HTTPException(
-                status_code=501,
-                detail=f"File type {file_ext} extraction not yet implemented"
-            )
+        spool = await spool_upload(file, settings.MAX_FILE_SIZE)
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    
+    try:
+        # Extract text in the extraction worker pool
+        try:
+            text_content = await document_extractor.extract(file.filename, None, file_ext, spool['path'])
+        except ExtractionError as e:
+            raise HTTPException(status_code=e.status_code, detail=str(e))
         
         # Process as document
         request = DocumentUploadRequest(
@@ -215,14 +237,19 @@ async def upload_document_file(
             metadata={
                 "filename": file.filename,
                 "file_type": file_ext,
-                "file_size": len(content)
+                "file_size": spool['file_size'],
+                "file_hash": spool['file_hash']
             }
         )
         
         return await upload_document(request, current_user, db)
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to process file: {str(e)}")
+    finally:
+        discard_spool(spool['path'])
 
 
 @router.post("/search", response_model=SearchResponse)
@@ -252,15 +279,18 @@ async def search_documents(
                 request.knowledge_base_id,
                 request.k,
                 request.score_threshold,
-                filters
+                filters,
+                ef_search=request.ef_search,
+                probes=request.probes,
+                collapse_duplicates=request.collapse_duplicates
             )
         elif request.search_type == "hybrid":
             results = await pgvector_service.hybrid_search(
                 request.query,
                 request.knowledge_base_id,
                 request.k,
-                keyword_weight=0.3,
-                semantic_weight=0.7
+                ef_search=request.ef_search,
+                collapse_duplicates=request.collapse_duplicates
             )
         else:
             # Keyword search
@@ -273,11 +303,11 @@ async def search_documents(
         search_results = []
         for doc, score in results:
             search_results.append(SearchResult(
-                content=doc.page_content,
+                content=doc['page_content'],
                 score=score,
-                metadata=doc.metadata,
-                document_id=doc.metadata.get('document_id'),
-                chunk_index=doc.metadata.get('chunk_index')
+                metadata=doc['metadata'],
+                document_id=doc.get('document_id') or doc['metadata'].get('document_id'),
+                chunk_index=doc['metadata'].get('chunk_index')
             ))
         
         # Calculate execution time
@@ -313,6 +343,97 @@ async def get_vector_statistics(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/indexes")
+async def get_vector_indexes(
+    current_user: User = Depends(get_current_user)
+):
+    """
+    List ANN indexes on the embeddings table
+    
+    Returns method, build options, size, validity and, for IVFFlat,
+    the recommended list count for the current table size.
+    Admin only endpoint.
+    """
+    if current_user.role not in ['admin', 'super_admin']:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    try:
+        return {"indexes": await pgvector_service.index_manager.get_index_status()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/indexes")
+async def create_vector_index(
+    request: VectorIndexRequest,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Build an HNSW or IVFFlat index
+    
+    The index is built concurrently, so search and ingestion keep running.
+    Admin only endpoint.
+    """
+    if current_user.role not in ['admin', 'super_admin']:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    try:
+        index = await pgvector_service.index_manager.create_index(
+            method=request.method,
+            dimensions=request.dimensions,
+            m=request.m,
+            ef_construction=request.ef_construction,
+            lists=request.lists
+        )
+        return {"status": "success", "index": index}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to build index: {str(e)}")
+
+
+@router.post("/indexes/{index_name}/rebuild")
+async def rebuild_vector_index(
+    index_name: str,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Rebuild a vector index
+    
+    IVFFlat indexes are rebuilt with a list count sized for the current data.
+    Admin only endpoint.
+    """
+    if current_user.role not in ['admin', 'super_admin']:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    try:
+        index = await pgvector_service.index_manager.rebuild_index(index_name)
+        return {"status": "success", "index": index}
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to rebuild index: {str(e)}")
+
+
+@router.post("/indexes/maintain")
+async def maintain_vector_indexes(
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Rebuild IVFFlat indexes whose list count no longer fits the data
+    
+    Admin only endpoint.
+    """
+    if current_user.role not in ['admin', 'super_admin']:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    try:
+        rebuilt = await pgvector_service.index_manager.maintain_indexes()
+        return {"status": "success", "rebuilt": rebuilt}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.delete("/documents/{document_id}")
 async def delete_document(
     document_id: UUID,
@@ -347,10 +468,11 @@ async def update_document(
     """
     Update an existing document
     
-    Deletes old embeddings and creates new ones with updated content.
+    Only chunks whose content changed are re-embedded; unchanged chunks
+    keep their embeddings and are renumbered.
     """
     try:
-        chunk_ids = await pgvector_service.update_document(
+        result = await pgvector_service.update_document(
             document_id,
             request.content,
             request.knowledge_base_id,
@@ -359,14 +481,18 @@ async def update_document(
                 "updated_by": str(current_user.id),
                 "updated_at": datetime.utcnow().isoformat(),
                 **(request.metadata or {})
-            }
+            },
+            current_user.id
         )
         
         return {
             "status": "success",
             "document_id": document_id,
-            "chunk_ids": chunk_ids,
-            "chunk_count": len(chunk_ids)
+            "chunk_ids": result['chunk_ids'],
+            "chunk_count": len(result['chunk_ids']),
+            "reused_chunks": result['reused_chunks'],
+            "embedded_chunks": result['embedded_chunks'],
+            "deleted_chunks": result['deleted_chunks']
         }
         
     except Exception as e:
@@ -389,10 +515,11 @@ async def clear_semantic_cache(
         raise HTTPException(status_code=403, detail="Admin access required")
     
     try:
-        # Implementation would clear the semantic_cache table
+        cleared = await pgvector_service.clear_semantic_cache()
         return {
             "status": "success",
-            "message": "Semantic cache cleared"
+            "message": "Semantic cache cleared",
+            "entries_cleared": cleared
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
@@ -62,6 +62,10 @@ class TaskProgressResponse(BaseModel):
     completed_at: Optional[str] = Field(None, description="Task completion time (ISO format)")
     error_message: Optional[str] = Field(None, description="Error message if failed")
     retry_count: int = Field(0, description="Number of retry attempts")
+    throughput: Optional[Dict[str, Any]] = Field(
+        None,
+        description="Batch embedding metrics of a completed task (chunks/s, tokens/s, rate limits)"
+    )
     
     class Config:
         json_schema_extra = {
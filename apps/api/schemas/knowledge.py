@@ -39,7 +39,7 @@ class DocumentUploadResponse(BaseModel):
 
 class DocumentFileUploadResponse(BaseModel):
     """Response model for file upload"""
-    document_id: UUID
+    document_id: Optional[UUID] = None  # None when the file failed
     chunk_ids: List[UUID]
     chunk_count: int
     token_count: int
@@ -48,6 +48,35 @@ class DocumentFileUploadResponse(BaseModel):
     file_info: Dict[str, Any]
 
 
+class UploadBatchFileStatus(BaseModel):
+    """Progress of one file in an upload batch"""
+    index: int
+    filename: str
+    status: Literal["queued", "extracting", "storing", "embedding", "completed", "failed"]
+    document_id: Optional[UUID] = None
+    file_size: int
+    chunk_count: int
+    embedded_chunks: int
+    token_count: int
+    progress: int = Field(..., ge=0, le=100)
+    error: Optional[str] = None
+    started_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
+
+
+class UploadBatchResponse(BaseModel):
+    """Status of a multi-file upload batch"""
+    batch_id: UUID
+    knowledge_base_id: UUID
+    status: Literal["pending", "processing", "completed", "partial", "failed"]
+    total_files: int
+    completed_files: int
+    failed_files: int
+    created_at: datetime
+    completed_at: Optional[datetime] = None
+    files: List[UploadBatchFileStatus]
+
+
 class DocumentListRequest(BaseModel):
     """Request model for listing documents"""
     knowledge_base_id: UUID
@@ -106,7 +135,9 @@ class EmbeddingChunk(BaseModel):
     chunk_index: int
     chunk_text: str
     token_count: int
-    embedding_preview: List[float] = Field(description="First 10 values of the embedding vector")
+    embedding_preview: Optional[List[float]] = Field(
+        default=None, description="Leading values of the embedding vector (omitted when not requested)"
+    )
     embedding_dimensions: int
     created_at: datetime
 
@@ -120,6 +151,8 @@ class DocumentEmbeddingsResponse(BaseModel):
     embedding_model: str
     embedding_dimensions: int
     chunks: List[EmbeddingChunk]
+    has_more: bool = False
+    next_after: Optional[int] = Field(default=None, description="Pass as 'after' to fetch the next page")
     metadata: Optional[Dict[str, Any]]
 
 
@@ -215,6 +248,16 @@ class SimilarDocumentsResponse(BaseModel):
     total_found: int
 
 
+class BatchSimilarDocumentsRequest(SimilarDocumentsRequest):
+    """Request model for finding similar documents for several documents"""
+    document_ids: List[UUID] = Field(..., min_length=1, max_length=100, description="Reference document IDs")
+
+
+class BatchSimilarDocumentsResponse(BaseModel):
+    """Response model for batch similar documents"""
+    results: List[SimilarDocumentsResponse]
+
+
 # Collection Management Schemas
 
 class CollectionCreateRequest(BaseModel):
@@ -0,0 +1,234 @@
+"""Concurrent Batch Embedding Executor
+
+Embeds a task's chunks with several provider requests in flight instead of
+one batch at a time. Batches are packed by token count up to the request
+limits of the providers they may be routed to, and each batch is written to
+the database while later batches are still being embedded.
+
+When providers report rate limits the executor pauses new requests with
+jittered exponential backoff and halves the number of requests in flight,
+then grows it back one request at a time as batches succeed.
+"""
+
+import time
+import random
+import asyncio
+import logging
+from typing import List, Dict, Any, Optional, Callable, Awaitable
+
+from core.config import settings
+from services.embedding_service import EmbeddingRateLimitError
+
+logger = logging.getLogger(__name__)
+
+
+def plan_batches(docs: List[Dict[str, Any]], max_batch: int, max_tokens: int) -> List[List[Dict[str, Any]]]:
+    """Pack documents into batches in order
+    
+    A batch is closed when adding the next document would exceed
+    ``max_batch`` inputs or ``max_tokens`` tokens; a document larger than
+    ``max_tokens`` gets a batch of its own.
+    
+    Args:
+        docs: Documents with ``token_count``
+        max_batch: Inputs per batch
+        max_tokens: Tokens per batch
+    """
+    batches, batch, tokens = [], [], 0
+    for doc in docs:
+        doc_tokens = doc.get('token_count') or 0
+        if batch and (len(batch) >= max_batch or tokens + doc_tokens > max_tokens):
+            batches.append(batch)
+            batch, tokens = [], 0
+        batch.append(doc)
+        tokens += doc_tokens
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+class BatchEmbeddingExecutor:
+    """Runs embedding requests concurrently and overlaps them with writes"""
+    
+    def __init__(
+        self,
+        max_in_flight: int = 4,
+        max_writes: int = 2,
+        max_retries: int = 5,
+        backoff_base: float = 1.0,
+        backoff_max: float = 60.0
+    ):
+        """Initialize the executor
+        
+        Args:
+            max_in_flight: Provider requests in flight per task
+            max_writes: Concurrent database writes per task
+            max_retries: Rate-limited attempts per batch before it fails
+            backoff_base: First backoff after a rate limit, in seconds
+            backoff_max: Longest backoff, in seconds
+        """
+        self.max_in_flight = max_in_flight
+        self.max_writes = max_writes
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+    
+    async def run(
+        self,
+        docs: List[Dict[str, Any]],
+        embed: Callable[[List[str]], Awaitable[List[List[float]]]],
+        write: Callable[[List[Dict[str, Any]], List[List[float]]], Awaitable[List[Any]]],
+        max_batch: int,
+        max_tokens: int,
+        on_progress: Optional[Callable[[int], Awaitable[None]]] = None
+    ) -> Dict[str, Any]:
+        """Embed and write documents in concurrent batches
+        
+        A batch that fails for any reason other than a rate limit, or stays
+        rate limited for ``max_retries`` attempts, is logged and skipped;
+        the other batches still complete.
+        
+        Args:
+            docs: Documents with ``content`` and ``token_count``
+            embed: Returns one vector per text; raises EmbeddingRateLimitError
+                when providers are rate limited
+            write: Stores a batch with its vectors and returns the created IDs
+            max_batch: Inputs per provider request
+            max_tokens: Tokens per provider request
+            on_progress: Called with the number of documents after each write
+            
+        Returns:
+            ``ids`` of the written documents in batch order and ``metrics``
+            with throughput counters for the run
+        """
+        batches = plan_batches(docs, max_batch, max_tokens)
+        run = _Run(self, len(batches))
+        started = time.monotonic()
+        
+        results = await asyncio.gather(*(
+            run.process(batch, embed, write, on_progress) for batch in batches
+        ))
+        
+        elapsed = time.monotonic() - started
+        metrics = run.metrics
+        metrics.update({
+            'batches': len(batches),
+            'wall_seconds': round(elapsed, 3),
+            'embed_seconds': round(metrics['embed_seconds'], 3),
+            'write_seconds': round(metrics['write_seconds'], 3),
+            'chunks_per_second': round(metrics['chunks'] / elapsed, 1) if elapsed else 0.0,
+            'tokens_per_second': round(metrics['tokens'] / elapsed, 1) if elapsed else 0.0
+        })
+        return {'ids': [chunk_id for ids in results for chunk_id in ids], 'metrics': metrics}
+
+
+class _Run:
+    """Shared state of one ``BatchEmbeddingExecutor.run`` call"""
+    
+    def __init__(self, executor: BatchEmbeddingExecutor, batch_count: int):
+        self.executor = executor
+        self.limit = min(executor.max_in_flight, max(batch_count, 1))
+        self.in_flight = 0
+        self.successes = 0
+        self.resume_at = 0.0
+        self.condition = asyncio.Condition()
+        self.write_slots = asyncio.Semaphore(executor.max_writes)
+        # Bounds batches holding vectors that are not written yet
+        self.outstanding = asyncio.Semaphore(executor.max_in_flight + executor.max_writes)
+        self.metrics = {
+            'chunks': 0, 'tokens': 0, 'failed_batches': 0, 'failed_chunks': 0,
+            'rate_limited': 0, 'peak_in_flight': 0, 'embed_seconds': 0.0, 'write_seconds': 0.0
+        }
+    
+    async def _acquire(self):
+        loop = asyncio.get_running_loop()
+        async with self.condition:
+            while True:
+                wait = self.resume_at - loop.time()
+                if wait <= 0 and self.in_flight < self.limit:
+                    break
+                try:
+                    await asyncio.wait_for(self.condition.wait(), wait if wait > 0 else None)
+                except asyncio.TimeoutError:
+                    pass
+            self.in_flight += 1
+            self.metrics['peak_in_flight'] = max(self.metrics['peak_in_flight'], self.in_flight)
+    
+    async def _release(self, rate_limited: bool, attempt: int):
+        loop = asyncio.get_running_loop()
+        async with self.condition:
+            self.in_flight -= 1
+            if rate_limited:
+                # Multiplicative decrease and a shared pause for every request
+                self.limit = max(1, self.limit // 2)
+                self.successes = 0
+                delay = min(self.executor.backoff_max, self.executor.backoff_base * 2 ** attempt)
+                self.resume_at = max(self.resume_at, loop.time() + delay * random.uniform(0.5, 1.0))
+            else:
+                self.successes += 1
+                if self.successes >= self.limit and self.limit < self.executor.max_in_flight:
+                    self.limit += 1
+                    self.successes = 0
+            self.condition.notify_all()
+    
+    async def process(
+        self,
+        batch: List[Dict[str, Any]],
+        embed: Callable[[List[str]], Awaitable[List[List[float]]]],
+        write: Callable[[List[Dict[str, Any]], List[List[float]]], Awaitable[List[Any]]],
+        on_progress: Optional[Callable[[int], Awaitable[None]]]
+    ) -> List[Any]:
+        texts = [doc['content'] for doc in batch]
+        tokens = sum(doc.get('token_count') or 0 for doc in batch)
+        
+        async with self.outstanding:
+            embeddings = None
+            for attempt in range(self.executor.max_retries):
+                await self._acquire()
+                started = time.monotonic()
+                try:
+                    embeddings = await embed(texts)
+                except EmbeddingRateLimitError as e:
+                    self.metrics['rate_limited'] += 1
+                    await self._release(True, attempt)
+                    logger.warning(f"Embedding batch rate limited (attempt {attempt + 1}): {e}")
+                    continue
+                except Exception as e:
+                    await self._release(False, attempt)
+                    logger.error(f"Failed to embed batch of {len(batch)} chunks: {e}")
+                    break
+                self.metrics['embed_seconds'] += time.monotonic() - started
+                await self._release(False, attempt)
+                break
+            
+            if embeddings is None:
+                self.metrics['failed_batches'] += 1
+                self.metrics['failed_chunks'] += len(batch)
+                return []
+            
+            # The embed slot is already free, so the next provider call
+            # overlaps this write
+            async with self.write_slots:
+                started = time.monotonic()
+                try:
+                    ids = await write(batch, embeddings)
+                except Exception as e:
+                    logger.error(f"Failed to write batch of {len(batch)} chunks: {e}")
+                    self.metrics['failed_batches'] += 1
+                    self.metrics['failed_chunks'] += len(batch)
+                    return []
+                self.metrics['write_seconds'] += time.monotonic() - started
+        
+        self.metrics['chunks'] += len(batch)
+        self.metrics['tokens'] += tokens
+        if on_progress:
+            await on_progress(len(batch))
+        return ids
+
+
+# Global executor instance
+batch_embedding_executor = BatchEmbeddingExecutor(
+    max_in_flight=settings.EMBEDDING_TASK_MAX_IN_FLIGHT,
+    max_writes=settings.EMBEDDING_TASK_MAX_WRITES,
+    max_retries=settings.EMBEDDING_RATE_LIMIT_RETRIES
+)
@@ -0,0 +1,287 @@
+"""Document Centroid Embeddings
+
+Keeps one mean-pooled vector per document in
+``knowledge_document_centroids`` so document-to-document similarity is a
+single ANN query over documents instead of a provider round-trip and a
+chunk search.
+
+Rows store the running *sum* of the document's chunk embeddings together
+with the chunk count. The sum points in the same direction as the mean, so
+cosine distances (and the HNSW index on the column) rank documents exactly
+as the centroid would, while new chunks are folded in with one atomic
+``embedding_sum + EXCLUDED.embedding_sum`` upsert per write batch.
+
+Similar-document lookups are limited to the reference's knowledge base,
+which the HNSW index can only apply after its candidate list is built. A
+knowledge base holding a small share of all centroids would get few or no
+neighbours back, so small knowledge bases are compared exactly and larger
+ones get a candidate list sized to their share of the table.
+"""
+
+import math
+
+import logging
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Sequence
+from uuid import UUID
+
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import settings
+from services.vector_index_manager import VectorIndexManager
+
+logger = logging.getLogger(__name__)
+
+
+class DocumentCentroidIndex:
+    """Maintains and queries per-document centroid embeddings"""
+
+    TABLE_NAME = "knowledge_document_centroids"
+    # pgvector's default and upper bound for hnsw.ef_search
+    DEFAULT_EF_SEARCH = 40
+    MAX_EF_SEARCH = 1000
+
+    def __init__(self, exact_scan_max: int = 5000):
+        """Initialize the index
+
+        Args:
+            exact_scan_max: Knowledge bases with at most this many documents
+                are searched exactly instead of through the HNSW index
+        """
+        self.exact_scan_max = exact_scan_max
+        self.metrics = {
+            'documents_updated': 0, 'chunks_added': 0, 'recomputed': 0, 'exact_scans': 0, 'index_scans': 0
+        }
+
+    async def add_chunks(self, session: AsyncSession, records: Sequence[Dict[str, Any]]):
+        """Fold newly written chunks into their documents' centroids
+
+        Runs in the caller's transaction, next to the chunk write.
+
+        Args:
+            session: Session the chunks were written with
+            records: Rows built with ``EmbeddingBulkWriter.build_record``
+        """
+        documents: Dict[str, Dict[str, Any]] = {}
+        for record in records:
+            document_id = str(record['document_id'])
+            entry = documents.get(document_id)
+            embedding = np.asarray(record['embedding'], dtype=np.float64)
+            if entry is None:
+                documents[document_id] = {
+                    'knowledge_base_id': str(record['knowledge_base_id']),
+                    'sum': embedding.copy(),
+                    'count': 1
+                }
+            else:
+                entry['sum'] += embedding
+                entry['count'] += 1
+        if not documents:
+            return
+
+        await session.execute(
+            text(f"""
+                INSERT INTO {self.TABLE_NAME} AS c
+                    (document_id, knowledge_base_id, embedding_sum, chunk_count, updated_at)
+                SELECT v.document_id, v.knowledge_base_id, CAST(v.embedding_sum AS vector), v.chunk_count, :now
+                FROM unnest(
+                    CAST(:document_ids AS uuid[]), CAST(:knowledge_base_ids AS uuid[]),
+                    CAST(:sums AS text[]), CAST(:counts AS int[])
+                ) AS v(document_id, knowledge_base_id, embedding_sum, chunk_count)
+                ON CONFLICT (document_id) DO UPDATE
+                SET embedding_sum = c.embedding_sum + EXCLUDED.embedding_sum,
+                    chunk_count = c.chunk_count + EXCLUDED.chunk_count,
+                    updated_at = EXCLUDED.updated_at
+            """),
+            {
+                'document_ids': list(documents),
+                'knowledge_base_ids': [entry['knowledge_base_id'] for entry in documents.values()],
+                'sums': ['[' + ','.join(map(str, entry['sum'].astype(np.float32).tolist())) + ']'
+                         for entry in documents.values()],
+                'counts': [entry['count'] for entry in documents.values()],
+                'now': datetime.utcnow()
+            }
+        )
+        self.metrics['documents_updated'] += len(documents)
+        self.metrics['chunks_added'] += len(records)
+
+    async def recompute(self, session: AsyncSession, document_ids: List[UUID]):
+        """Rebuild centroids from the stored chunks (after chunks were removed)"""
+        if not document_ids:
+            return
+        params = {'document_ids': [str(document_id) for document_id in document_ids], 'now': datetime.utcnow()}
+        await session.execute(
+            text(f"""
+                INSERT INTO {self.TABLE_NAME} AS c
+                    (document_id, knowledge_base_id, embedding_sum, chunk_count, updated_at)
+                SELECT document_id, knowledge_base_id, sum(embedding), count(*), :now
+                FROM knowledge_embeddings
+                WHERE document_id = ANY(CAST(:document_ids AS uuid[]))
+                GROUP BY document_id, knowledge_base_id
+                ON CONFLICT (document_id) DO UPDATE
+                SET knowledge_base_id = EXCLUDED.knowledge_base_id,
+                    embedding_sum = EXCLUDED.embedding_sum,
+                    chunk_count = EXCLUDED.chunk_count,
+                    updated_at = EXCLUDED.updated_at
+            """),
+            params
+        )
+        await session.execute(
+            text(f"""
+                DELETE FROM {self.TABLE_NAME} AS c
+                WHERE c.document_id = ANY(CAST(:document_ids AS uuid[]))
+                  AND NOT EXISTS (SELECT 1 FROM knowledge_embeddings e WHERE e.document_id = c.document_id)
+            """),
+            {'document_ids': params['document_ids']}
+        )
+        self.metrics['recomputed'] += len(document_ids)
+
+    async def remove(self, session: AsyncSession, document_ids: List[UUID]):
+        """Drop the centroids of documents whose chunks were deleted"""
+        if document_ids:
+            await session.execute(
+                text(f"DELETE FROM {self.TABLE_NAME} WHERE document_id = ANY(CAST(:document_ids AS uuid[]))"),
+                {'document_ids': [str(document_id) for document_id in document_ids]}
+            )
+
+    async def find_similar(
+        self,
+        session: AsyncSession,
+        document_id: UUID,
+        k: int = 5,
+        score_threshold: float = 0.0
+    ) -> Optional[List[Dict[str, Any]]]:
+        """Documents in the same knowledge base closest to a document
+
+        Args:
+            session: Database session
+            document_id: Reference document
+            k: Maximum documents returned
+            score_threshold: Minimum cosine similarity
+
+        Returns:
+            Documents with ``id``, ``title``, ``metadata``, ``chunk_count`` and
+            ``similarity_score`` in descending similarity, or None if the
+            reference document has no centroid
+        """
+        results = await self.find_similar_batch(session, [document_id], k, score_threshold)
+        return results.get(str(document_id))
+
+    async def find_similar_batch(
+        self,
+        session: AsyncSession,
+        document_ids: List[UUID],
+        k: int = 5,
+        score_threshold: float = 0.0
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """Nearest documents for many reference documents
+
+        Each reference drives a LATERAL scan over the centroids of its own
+        knowledge base: an exact scan for small knowledge bases, otherwise
+        an HNSW scan whose candidate list covers ``k`` documents of the
+        knowledge base. At most one query per scan kind is issued.
+
+        Returns:
+            Map of reference document id to its similar documents; references
+            without a centroid are absent
+        """
+        if not document_ids:
+            return {}
+
+        result = await session.execute(
+            text(f"""
+                SELECT r.document_id, kb.documents,
+                       (SELECT reltuples FROM pg_class WHERE oid = CAST(:table AS regclass)) AS total
+                FROM {self.TABLE_NAME} r
+                CROSS JOIN LATERAL (
+                    SELECT count(*) AS documents FROM {self.TABLE_NAME} c
+                    WHERE c.knowledge_base_id = r.knowledge_base_id
+                ) kb
+                WHERE r.document_id = ANY(CAST(:document_ids AS uuid[]))
+            """),
+            {'table': self.TABLE_NAME, 'document_ids': [str(document_id) for document_id in document_ids]}
+        )
+        references = result.fetchall()
+        # reltuples is an estimate and is -1 before the first ANALYZE
+        total = max([row.total or 0 for row in references] + [row.documents for row in references] + [1])
+
+        exact, indexed, ef_search = [], [], 0
+        for row in references:
+            # HNSW filters after the scan, so the candidate list must be large
+            # enough that about 2k of its entries fall in this knowledge base
+            needed = math.ceil(2 * k * total / max(row.documents, 1))
+            if row.documents <= self.exact_scan_max or needed > self.MAX_EF_SEARCH:
+                exact.append(row.document_id)
+            else:
+                indexed.append(row.document_id)
+                ef_search = max(ef_search, needed)
+
+        rows = []
+        if exact:
+            rows.extend(await self._nearest(session, exact, k, score_threshold, exact=True))
+            self.metrics['exact_scans'] += len(exact)
+        if indexed:
+            ef_search = max(ef_search, settings.VECTOR_HNSW_EF_SEARCH or self.DEFAULT_EF_SEARCH)
+            await VectorIndexManager.apply_search_params(session, ef_search=ef_search)
+            rows.extend(await self._nearest(session, indexed, k, score_threshold, exact=False))
+            self.metrics['index_scans'] += len(indexed)
+
+        similar: Dict[str, List[Dict[str, Any]]] = {}
+        for row in rows:
+            documents = similar.setdefault(str(row.reference_id), [])
+            if row.document_id is None or row.title is None:
+                continue
+            documents.append({
+                'id': row.document_id,
+                'title': row.title,
+                'metadata': row.metadata,
+                'chunk_count': row.chunk_count,
+                'similarity_score': float(1 - row.distance)
+            })
+        return similar
+
+    async def _nearest(
+        self,
+        session: AsyncSession,
+        document_ids: List[UUID],
+        k: int,
+        score_threshold: float,
+        exact: bool
+    ) -> List[Any]:
+        """Run the LATERAL nearest-neighbour query for a set of references"""
+        # The HNSW index only serves an ORDER BY on the bare distance
+        # operator, so ordering by an expression of it forces an exact scan
+        order_by = "(c.embedding_sum <=> r.embedding_sum) + 0" if exact else "distance"
+        result = await session.execute(
+            text(f"""
+                SELECT r.document_id AS reference_id, n.document_id, n.distance,
+                       n.chunk_count, d.title, d.metadata
+                FROM {self.TABLE_NAME} r
+                LEFT JOIN LATERAL (
+                    SELECT c.document_id, c.chunk_count, c.embedding_sum <=> r.embedding_sum AS distance
+                    FROM {self.TABLE_NAME} c
+                    WHERE c.knowledge_base_id = r.knowledge_base_id
+                      AND c.document_id <> r.document_id
+                    ORDER BY {order_by}
+                    LIMIT :k
+                ) n ON 1 - n.distance >= :score_threshold
+                LEFT JOIN knowledge_documents d ON d.id = n.document_id
+                WHERE r.document_id = ANY(CAST(:document_ids AS uuid[]))
+                ORDER BY r.document_id, n.distance
+            """),
+            {
+                'document_ids': [str(document_id) for document_id in document_ids],
+                'k': k,
+                'score_threshold': score_threshold
+            }
+        )
+        return result.fetchall()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return dict(self.metrics)
+
+
+# Global centroid index instance
+document_centroids = DocumentCentroidIndex(exact_scan_max=settings.DOCUMENT_CENTROID_EXACT_SCAN_MAX)
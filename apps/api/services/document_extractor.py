@@ -0,0 +1,400 @@
+"""Document Text Extraction
+
+Parses uploaded PDF, DOCX and plain text files into text. Parsing is
+CPU-bound, so ``DocumentExtractor`` runs the parsers in a process pool
+instead of on the event loop.
+
+PDFs are parsed in page slices: ``iter_pages`` yields each page as soon as
+its slice is parsed, so chunking and embedding can start before the last
+page is read. Every parse task has a timeout enforced inside its worker, and
+each worker process runs under an address-space limit so a hostile or
+corrupt file cannot take the host down.
+"""
+
+import os
+import signal
+import asyncio
+import logging
+import tempfile
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+from typing import Any, List, Optional, Tuple, AsyncIterator
+
+from core.config import settings
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Document processing imports
+try:
+    import pypdf
+except ImportError:
+    pypdf = None
+
+try:
+    from docx import Document as DocxDocument
+except ImportError:
+    DocxDocument = None
+
+try:
+    import chardet
+except ImportError:
+    chardet = None
+
+logger = logging.getLogger(__name__)
+
+
+class ExtractionError(Exception):
+    """Raised when text cannot be extracted from a file"""
+
+    def __init__(self, message: str, status_code: int = 422):
+        super().__init__(message)
+        self.status_code = status_code
+
+    def __reduce__(self):
+        # Keep status_code when raised inside a worker process
+        return (ExtractionError, (str(self), self.status_code))
+
+
+def _init_worker(memory_limit_mb: Optional[int]):
+    """Cap how far a worker's address space may grow beyond its start size"""
+    if not memory_limit_mb or resource is None:
+        return
+    try:
+        with open("/proc/self/statm") as statm:
+            baseline = int(statm.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        baseline = 0
+    limit = baseline + memory_limit_mb * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+class _ParseTimeout(BaseException):
+    """Raised in a worker by its alarm; not an Exception so parsers cannot swallow it"""
+
+
+def _on_alarm(signum, frame):
+    raise _ParseTimeout()
+
+
+def _run_with_timeout(timeout: Optional[float], func, *args):
+    """Run ``func`` in a worker, interrupting it after ``timeout`` seconds
+
+    The timer starts when the worker picks the task up, so time spent queued
+    behind other tasks does not count. The worker survives a timeout.
+
+    Raises:
+        TimeoutError: If the parse runs past ``timeout``
+    """
+    if not timeout or not hasattr(signal, 'setitimer'):
+        return func(*args)
+    previous = signal.signal(signal.SIGALRM, _on_alarm)
+    signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        return func(*args)
+    except _ParseTimeout:
+        raise TimeoutError()
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+# Readers for the spooled PDFs this worker process parsed most recently, so
+# later page slices of a file do not re-parse its page tree
+_worker_readers: "OrderedDict[str, Any]" = OrderedDict()
+_WORKER_READER_CACHE_SIZE = 4
+
+
+def _open_pdf(source):
+    if not isinstance(source, str):
+        return pypdf.PdfReader(source)
+    reader = _worker_readers.pop(source, None)
+    if reader is None:
+        reader = pypdf.PdfReader(source)
+    _worker_readers[source] = reader
+    while len(_worker_readers) > _WORKER_READER_CACHE_SIZE:
+        _worker_readers.popitem(last=False)
+    return reader
+
+
+def _pdf_page_count(path: str) -> int:
+    """Number of pages in a PDF file"""
+    return len(_open_pdf(path).pages)
+
+
+def _pdf_pages(source, start: int, end: int) -> List[Tuple[int, str]]:
+    """Extract text from pages [start, end) as (page number, text) pairs
+
+    Pages without text are skipped.
+    """
+    reader = _open_pdf(source)
+    pages = []
+    for page_num in range(start, int(min(end, len(reader.pages)))):
+        try:
+            page_text = reader.pages[page_num].extract_text().strip()
+        except Exception as e:
+            logger.warning(f"Failed to extract text from page {page_num + 1}: {str(e)}")
+            continue
+        if page_text:
+            pages.append((page_num + 1, page_text))
+    return pages
+
+
+def _text(content: bytes) -> str:
+    """Decode plain text, detecting the encoding when chardet is available"""
+    if chardet:
+        try:
+            detected_encoding = chardet.detect(content)
+            encoding = detected_encoding.get('encoding', 'utf-8')
+            return content.decode(encoding, errors='ignore')
+        except Exception:
+            pass
+    return content.decode('utf-8', errors='ignore')
+
+
+def _docx(content: bytes) -> str:
+    """Extract paragraph and table text from a DOCX file"""
+    doc = DocxDocument(BytesIO(content))
+
+    blocks = [paragraph.text.strip() for paragraph in doc.paragraphs if paragraph.text.strip()]
+    for table in doc.tables:
+        rows = []
+        for row in table.rows:
+            cells = [cell.text.strip() for cell in row.cells if cell.text.strip()]
+            if cells:
+                rows.append(" | ".join(cells))
+        if rows:
+            blocks.append("\n".join(rows))
+    return "\n\n".join(blocks)
+
+
+def format_page(page_number: Optional[int], page_text: str) -> str:
+    """Prefix page text with the marker the chunker uses for page attribution"""
+    if page_number is None:
+        return page_text
+    return f"--- Page {page_number} ---\n{page_text}"
+
+
+def extract_text(filename: str, content: bytes, file_ext: str) -> str:
+    """Extract all text from file content in the calling process
+
+    Raises:
+        ExtractionError: If the file type is unsupported or yields no text
+    """
+    if file_ext in ['.txt', '.md']:
+        return _text(content)
+
+    elif file_ext == '.pdf':
+        if not pypdf:
+            raise ExtractionError("PDF processing library not available. Please install pypdf.", 500)
+        try:
+            pages = _pdf_pages(BytesIO(content), 0, float('inf'))
+        except Exception as e:
+            logger.error(f"Failed to process PDF file: {str(e)}")
+            raise ExtractionError(f"Failed to process PDF file: {str(e)}")
+        text_content = "\n".join(format_page(page_number, page_text) for page_number, page_text in pages)
+        if not text_content:
+            raise ExtractionError(
+                "No text content could be extracted from the PDF. The PDF might be image-based or corrupted."
+            )
+        return text_content
+
+    elif file_ext == '.docx':
+        if not DocxDocument:
+            raise ExtractionError("DOCX processing library not available. Please install python-docx.", 500)
+        try:
+            text_content = _docx(content)
+        except Exception as e:
+            logger.error(f"DOCX extraction failed for {filename}: {str(e)}")
+            raise ExtractionError(f"Failed to extract text from DOCX: {str(e)}")
+        if not text_content:
+            raise ExtractionError("No text content could be extracted from the DOCX file.")
+        return text_content
+
+    raise ExtractionError(f"Unsupported file type: {file_ext}", 400)
+
+
+def extract_file(filename: str, path: str, file_ext: str) -> str:
+    """Extract all text from a file on disk in the calling process"""
+    with open(path, 'rb') as source:
+        content = source.read()
+    return extract_text(filename, content, file_ext)
+
+
+class DocumentExtractor:
+    """Runs text extraction in a process pool with timeouts and memory limits"""
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        timeout: Optional[float] = 120.0,
+        memory_limit_mb: Optional[int] = 1024,
+        pages_per_task: int = 20,
+        prefetch_tasks: int = 2
+    ):
+        """Initialize the extractor
+
+        Args:
+            max_workers: Worker processes; defaults to the CPU count
+            timeout: Seconds a worker may spend on one parse task (a whole
+                file, or one slice of PDF pages)
+            memory_limit_mb: Address space each worker may grow by
+            pages_per_task: PDF pages parsed per worker task
+            prefetch_tasks: Page slices of one file parsed ahead of the consumer
+        """
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.memory_limit_mb = memory_limit_mb
+        self.pages_per_task = pages_per_task
+        self.prefetch_tasks = prefetch_tasks
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._generation = 0
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                initializer=_init_worker,
+                initargs=(self.memory_limit_mb,)
+            )
+        return self._pool
+
+    def _reset_pool(self):
+        """Replace a broken pool"""
+        pool, self._pool = self._pool, None
+        self._generation += 1
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    async def _call(self, filename: str, func, *args):
+        """Run a parser function in the pool, bounded by the per-task timeout"""
+        loop = asyncio.get_running_loop()
+        for attempt in range(2):
+            generation = self._generation
+            future = loop.run_in_executor(self._get_pool(), _run_with_timeout, self.timeout, func, *args)
+            try:
+                return await future
+            except TimeoutError:
+                raise ExtractionError(f"Extraction of {filename} timed out after {self.timeout:.0f}s")
+            except MemoryError:
+                raise ExtractionError(f"Extraction of {filename} exceeded the {self.memory_limit_mb}MB memory limit", 413)
+            except BrokenProcessPool:
+                if generation != self._generation and attempt == 0:
+                    # The pool was replaced under this call (e.g. another file timed out)
+                    continue
+                if generation == self._generation:
+                    self._reset_pool()
+                logger.error(f"Extraction worker crashed while parsing {filename}")
+                raise ExtractionError(f"Extraction worker crashed while parsing {filename}", 500)
+
+    async def iter_pages(
+        self,
+        filename: str,
+        content: Optional[bytes],
+        file_ext: str,
+        path: Optional[str] = None
+    ) -> AsyncIterator[Tuple[Optional[int], str]]:
+        """Yield (page number, text) pairs as they are parsed
+
+        Only PDFs have pages; other formats yield a single ``(None, text)`` pair.
+        When ``path`` is given the file is read from disk by the workers and
+        ``content`` is ignored.
+
+        Raises:
+            ExtractionError: If the file cannot be parsed, times out or
+                exceeds the memory limit
+        """
+        if file_ext == '.pdf':
+            async for page in self._iter_pdf_pages(filename, content, path):
+                yield page
+            return
+
+        if path:
+            yield None, await self._call(filename, extract_file, filename, path, file_ext)
+        else:
+            yield None, await self._call(filename, extract_text, filename, content, file_ext)
+
+    async def _iter_pdf_pages(
+        self,
+        filename: str,
+        content: Optional[bytes],
+        path: Optional[str]
+    ) -> AsyncIterator[Tuple[int, str]]:
+        if not pypdf:
+            raise ExtractionError("PDF processing library not available. Please install pypdf.", 500)
+
+        # Workers read the file from disk instead of receiving a copy per slice
+        spool = path or await asyncio.to_thread(self._spool, content)
+        pending = deque()
+        try:
+            try:
+                page_count = await self._call(filename, _pdf_page_count, spool)
+            except ExtractionError:
+                raise
+            except Exception as e:
+                logger.error(f"Failed to process PDF file: {str(e)}")
+                raise ExtractionError(f"Failed to process PDF file: {str(e)}")
+
+            starts = deque(range(0, page_count, self.pages_per_task))
+            found_text = False
+            while starts or pending:
+                while starts and len(pending) < self.prefetch_tasks:
+                    start = starts.popleft()
+                    pending.append(asyncio.ensure_future(self._call(
+                        filename, _pdf_pages, spool, start, start + self.pages_per_task
+                    )))
+                pages = await pending.popleft()
+                for page in pages:
+                    found_text = True
+                    yield page
+
+            if not found_text:
+                raise ExtractionError(
+                    "No text content could be extracted from the PDF. The PDF might be image-based or corrupted."
+                )
+        finally:
+            for task in pending:
+                task.cancel()
+            if not path:
+                os.unlink(spool)
+
+    @staticmethod
+    def _spool(content: bytes) -> str:
+        with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as spool:
+            spool.write(content)
+            return spool.name
+
+    async def extract(
+        self,
+        filename: str,
+        content: Optional[bytes],
+        file_ext: str,
+        path: Optional[str] = None
+    ) -> str:
+        """Extract all text without blocking the event loop
+
+        Raises:
+            ExtractionError: If the file cannot be parsed
+        """
+        pages = [format_page(page_number, page_text)
+                 async for page_number, page_text in self.iter_pages(filename, content, file_ext, path)]
+        return "\n".join(pages)
+
+    def shutdown(self):
+        """Stop the worker processes"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+# Global extractor instance
+document_extractor = DocumentExtractor(
+    max_workers=settings.EXTRACTION_WORKERS,
+    timeout=settings.EXTRACTION_TIMEOUT,
+    memory_limit_mb=settings.EXTRACTION_MEMORY_LIMIT_MB,
+    pages_per_task=settings.EXTRACTION_PAGES_PER_TASK
+)
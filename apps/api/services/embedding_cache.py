@@ -0,0 +1,239 @@
+"""Embedding Cache
+
+Content-addressed cache in front of the embedding providers. Entries are
+keyed by SHA-256 of the model name and normalized text and stored as packed
+float32 bytes, first in a bounded in-process LRU and then in Redis, so
+re-uploads and boilerplate shared across documents are not re-embedded.
+
+Search queries additionally go through a small per-process TTL cache that
+is consulted before the provider path, so repeated chat questions skip API
+key lookup, rate limiting and Redis entirely.
+"""
+
+import re
+import time
+import hashlib
+import logging
+import unicodedata
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Iterable, Tuple
+
+import numpy as np
+
+from core.config import settings
+from core.redis import get_binary_redis
+from core.monitoring import performance_monitor
+
+logger = logging.getLogger(__name__)
+
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """Normalize text for cache keying (NFC, collapsed whitespace)"""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+
+def normalize_query(query: str) -> str:
+    """Normalize a search query so near-identical questions share an entry"""
+    return normalize_text(query).casefold().rstrip("?!. ")
+
+
+class EmbeddingCache:
+    """Two-tier (memory LRU + Redis) embedding cache"""
+
+    KEY_PREFIX = "emb:"
+
+    def __init__(self, max_entries: int = 10000, ttl: int = 2592000):
+        """Initialize the cache
+
+        Args:
+            max_entries: Maximum vectors held in the in-process LRU
+            ttl: Expiry in seconds for the Redis tier
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self.stats = {
+            'memory_hits': 0,
+            'redis_hits': 0,
+            'misses': 0,
+            'writes': 0,
+            'evictions': 0,
+            'redis_errors': 0
+        }
+
+    def cache_key(self, model: str, text: str) -> str:
+        """Build the content address for a (model, text) pair"""
+        digest = hashlib.sha256(f"{model}\x00{normalize_text(text)}".encode("utf-8")).hexdigest()
+        return f"{self.KEY_PREFIX}{digest}"
+
+    def _remember(self, key: str, vector: np.ndarray):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.stats['evictions'] += 1
+
+    async def get_many(self, keys: Iterable[str]) -> Dict[str, np.ndarray]:
+        """Look up vectors by key, memory first, then Redis
+
+        Returns:
+            Mapping of found keys to float32 vectors
+        """
+        found: Dict[str, np.ndarray] = {}
+        remote_keys: List[str] = []
+        for key in keys:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                found[key] = vector
+            else:
+                remote_keys.append(key)
+        memory_hits = len(found)
+
+        redis_hits = 0
+        if remote_keys:
+            try:
+                values = await get_binary_redis().mget(remote_keys)
+                for key, value in zip(remote_keys, values):
+                    if value:
+                        vector = np.frombuffer(value, dtype="<f4")
+                        found[key] = vector
+                        self._remember(key, vector)
+                        redis_hits += 1
+            except Exception as e:
+                self.stats['redis_errors'] += 1
+                logger.debug(f"Embedding cache Redis lookup failed: {e}")
+
+        misses = len(remote_keys) - redis_hits
+        self.stats['memory_hits'] += memory_hits
+        self.stats['redis_hits'] += redis_hits
+        self.stats['misses'] += misses
+        performance_monitor.record_embedding_cache(memory_hits, redis_hits, misses)
+        return found
+
+    async def set_many(self, items: Dict[str, Any]):
+        """Store vectors in both tiers"""
+        if not items:
+            return
+
+        packed = {}
+        for key, embedding in items.items():
+            vector = np.asarray(embedding, dtype="<f4")
+            self._remember(key, vector)
+            packed[key] = vector.tobytes()
+        self.stats['writes'] += len(items)
+
+        try:
+            async with get_binary_redis().pipeline(transaction=False) as pipe:
+                for key, value in packed.items():
+                    pipe.set(key, value, ex=self.ttl)
+                await pipe.execute()
+        except Exception as e:
+            self.stats['redis_errors'] += 1
+            logger.debug(f"Embedding cache Redis write failed: {e}")
+
+    def clear_memory(self):
+        """Drop the in-process tier"""
+        self._memory.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get hit/miss counters"""
+        hits = self.stats['memory_hits'] + self.stats['redis_hits']
+        lookups = hits + self.stats['misses']
+        return {
+            **self.stats,
+            'hits': hits,
+            'hit_rate': hits / lookups if lookups else 0.0,
+            'memory_entries': len(self._memory),
+            'max_entries': self.max_entries
+        }
+
+
+class QueryEmbeddingCache:
+    """Bounded in-process TTL cache for search query embeddings"""
+
+    def __init__(self, max_entries: int = 2048, max_bytes: int = 32 * 1024 * 1024, ttl: float = 600):
+        """Initialize the cache
+
+        Args:
+            max_entries: Maximum cached queries
+            max_bytes: Maximum memory held by cached vectors
+            ttl: Seconds an entry stays valid
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, np.ndarray]]" = OrderedDict()
+        self._bytes = 0
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'expired': 0,
+            'evictions': 0
+        }
+
+    def _drop(self, key: Tuple[str, str]):
+        _, vector = self._entries.pop(key)
+        self._bytes -= vector.nbytes
+
+    def get(self, model: str, query: str) -> Optional[List[float]]:
+        """Return the cached embedding for a query, if fresh"""
+        key = (model, normalize_query(query))
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] < time.monotonic():
+            self._drop(key)
+            self.stats['expired'] += 1
+            entry = None
+
+        if entry is None:
+            self.stats['misses'] += 1
+            performance_monitor.record_query_embedding_cache(hit=False)
+            return None
+
+        self._entries.move_to_end(key)
+        self.stats['hits'] += 1
+        performance_monitor.record_query_embedding_cache(hit=True)
+        return entry[1].tolist()
+
+    def put(self, model: str, query: str, embedding: Any):
+        """Cache a query embedding, evicting least recently used entries"""
+        key = (model, normalize_query(query))
+        vector = np.asarray(embedding, dtype=np.float32)
+        if key in self._entries:
+            self._drop(key)
+
+        self._entries[key] = (time.monotonic() + self.ttl, vector)
+        self._bytes += vector.nbytes
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            self._drop(next(iter(self._entries)))
+            self.stats['evictions'] += 1
+
+    def clear(self):
+        self._entries.clear()
+        self._bytes = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get hit-rate and memory counters"""
+        lookups = self.stats['hits'] + self.stats['misses']
+        return {
+            **self.stats,
+            'hit_rate': self.stats['hits'] / lookups if lookups else 0.0,
+            'entries': len(self._entries),
+            'memory_bytes': self._bytes,
+            'max_bytes': self.max_bytes
+        }
+
+
+# Singleton instances
+embedding_cache = EmbeddingCache(
+    max_entries=settings.EMBEDDING_CACHE_SIZE,
+    ttl=settings.EMBEDDING_CACHE_TTL
+)
+query_embedding_cache = QueryEmbeddingCache(
+    max_entries=settings.QUERY_EMBEDDING_CACHE_SIZE,
+    max_bytes=settings.QUERY_EMBEDDING_CACHE_MAX_BYTES,
+    ttl=settings.QUERY_EMBEDDING_CACHE_TTL
+)
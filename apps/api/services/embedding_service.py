@@ -16,7 +16,7 @@ from datetime import datetime, timedelta
 from uuid import UUID
 from enum import Enum
 import json
-from collections import defaultdict
+from collections import defaultdict, deque
 
 import numpy as np
 import tiktoken
@@ -29,12 +29,22 @@ from core.config import settings
 from core.database import get_db
 from core.redis import get_redis
 from core.security import SecurityManager
+from services.embedding_cache import embedding_cache
+from services.provider_router import ProviderRouter
 from models.user import UserApiKey
 from routers.settings import SettingsService
 
 logger = logging.getLogger(__name__)
 
 
+class EmbeddingRateLimitError(Exception):
+    """Raised instead of the local fallback when providers are rate limited"""
+
+    def __init__(self, message: str, providers: Optional[List[str]] = None):
+        super().__init__(message)
+        self.providers = providers or []
+
+
 class EmbeddingProvider(str, Enum):
     """Supported embedding providers"""
     OPENAI = "openai"
@@ -108,11 +118,115 @@ class ProviderConfig:
         }
 
 
+# Sliding-window check-and-add in one atomic round-trip. Each admitted call
+# is one sorted-set member "<nonce>:<requests>:<tokens>" scored by its time;
+# running totals live in a hash and are reduced as members leave the window.
+# When usage is below ``lease_below`` of both limits, an extra lease of
+# requests/tokens is reserved for the caller's local bucket.
+SLIDING_WINDOW_SCRIPT = """
+local window_key, totals_key = KEYS[1], KEYS[2]
+local now, window = tonumber(ARGV[1]), tonumber(ARGV[2])
+local request_limit, token_limit = tonumber(ARGV[3]), tonumber(ARGV[4])
+local tokens = tonumber(ARGV[5])
+local lease_requests, lease_tokens = tonumber(ARGV[6]), tonumber(ARGV[7])
+local lease_below = tonumber(ARGV[8])
+local nonce = ARGV[9]
+
+local function usage(members)
+    local requests, used_tokens = 0, 0
+    for _, member in ipairs(members) do
+        local r, t = string.match(member, ':(%d+):(%d+)$')
+        requests = requests + tonumber(r)
+        used_tokens = used_tokens + tonumber(t)
+    end
+    return requests, used_tokens
+end
+
+if redis.call('EXISTS', totals_key) == 0 then
+    -- Totals lost (eviction); rebuild them from the window
+    redis.call('ZREMRANGEBYSCORE', window_key, '-inf', now - window)
+    local requests, used_tokens = usage(redis.call('ZRANGE', window_key, 0, -1))
+    redis.call('HSET', totals_key, 'requests', requests, 'tokens', used_tokens)
+else
+    local expired = redis.call('ZRANGEBYSCORE', window_key, '-inf', now - window)
+    if #expired > 0 then
+        local requests, used_tokens = usage(expired)
+        redis.call('ZREMRANGEBYSCORE', window_key, '-inf', now - window)
+        redis.call('HINCRBY', totals_key, 'requests', -requests)
+        redis.call('HINCRBY', totals_key, 'tokens', -used_tokens)
+    end
+end
+
+local used = redis.call('HMGET', totals_key, 'requests', 'tokens')
+local used_requests, used_tokens = tonumber(used[1]) or 0, tonumber(used[2]) or 0
+local denied = 0
+if used_requests + 1 > request_limit then
+    denied = 1
+elseif used_tokens + tokens > token_limit then
+    denied = 2
+end
+if denied > 0 then
+    local oldest = redis.call('ZRANGE', window_key, 0, 0, 'WITHSCORES')
+    return {0, denied, used_requests, used_tokens, 0, 0, oldest[2] or tostring(now)}
+end
+
+local grant_requests, grant_tokens = 0, 0
+if lease_requests > 0
+    and used_requests + 1 + lease_requests <= request_limit * lease_below
+    and used_tokens + tokens + lease_tokens <= token_limit * lease_below then
+    grant_requests, grant_tokens = lease_requests, lease_tokens
+end
+local add_requests, add_tokens = 1 + grant_requests, tokens + grant_tokens
+redis.call('ZADD', window_key, now, nonce .. ':' .. add_requests .. ':' .. add_tokens)
+redis.call('HINCRBY', totals_key, 'requests', add_requests)
+redis.call('HINCRBY', totals_key, 'tokens', add_tokens)
+local ttl = math.ceil(window * 2000)
+redis.call('PEXPIRE', window_key, ttl)
+redis.call('PEXPIRE', totals_key, ttl)
+return {1, 0, used_requests + add_requests, used_tokens + add_tokens, grant_requests, grant_tokens, tostring(now)}
+"""
+
+
 class RateLimiter:
-    """Rate limiter for API calls"""
+    """Sliding-window rate limiter for API calls
     
-    def __init__(self):
-        self.window_size = 60  # 1 minute window
+    Every check is a single Lua script call, so the check and the update are
+    atomic across workers and cost one Redis round-trip. While usage is well
+    under the limits, Redis also grants a small lease of requests and tokens
+    that later calls consume from a local bucket without touching Redis.
+    Leased units are counted in the shared window when granted, so the
+    limits hold across processes; a lease that expires unused only lowers
+    the capacity left in the current window.
+    """
+    
+    def __init__(
+        self,
+        window_size: int = 60,
+        lease_fraction: float = 0.05,
+        lease_below: float = 0.5,
+        lease_ttl: float = 1.0
+    ):
+        """Initialize the limiter
+        
+        Args:
+            window_size: Sliding window length in seconds
+            lease_fraction: Share of each limit reserved per local lease (0 disables leases)
+            lease_below: Leases are granted only while usage stays under this
+                share of both limits
+            lease_ttl: Seconds a local lease may be used
+        """
+        self.window_size = window_size
+        self.lease_fraction = lease_fraction
+        self.lease_below = lease_below
+        self.lease_ttl = lease_ttl
+        self._script = None
+        self._leases: Dict[str, Dict[str, Any]] = {}
+        self.stats = {'redis_checks': 0, 'local_checks': 0, 'denied': 0}
+    
+    def _get_script(self):
+        if self._script is None:
+            self._script = get_redis().register_script(SLIDING_WINDOW_SCRIPT)
+        return self._script
     
     async def check_rate_limit(
         self,
@@ -122,67 +236,70 @@ class RateLimiter:
         tokens_limit: int,
         tokens_to_add: int = 0
     ) -> Tuple[bool, Dict[str, Any]]:
-        """Check if rate limit allows the request"""
+        """Check if rate limit allows the request, recording it when allowed"""
+        
+        # Hash tag keeps both keys of a user/provider in one cluster slot
+        key = f"rate_limit:{{{user_id}:{provider}}}"
+        
+        lease = self._leases.get(key)
+        if lease is not None:
+            if (time.monotonic() < lease['expires'] and lease['requests'] >= 1
+                    and lease['tokens'] >= tokens_to_add):
+                lease['requests'] -= 1
+                lease['tokens'] -= tokens_to_add
+                self.stats['local_checks'] += 1
+                return True, {
+                    "requests_remaining": lease['requests_remaining'],
+                    "tokens_remaining": lease['tokens_remaining']
+                }
+            del self._leases[key]
         
+        lease_requests = int(requests_limit * self.lease_fraction)
+        lease_tokens = int(tokens_limit * self.lease_fraction)
         current_time = time.time()
-        window_start = current_time - self.window_size
-        
-        # Keys for tracking
-        requests_key = f"rate_limit:{user_id}:{provider}:requests"
-        tokens_key = f"rate_limit:{user_id}:{provider}:tokens"
-        
-        # Get current counts
-        request_count = await self._get_window_count(requests_key, window_start, current_time)
-        token_count = await self._get_window_count(tokens_key, window_start, current_time)
-        
-        # Check limits
-        if request_count >= requests_limit:
-            return False, {
-                "reason": "request_limit_exceeded",
-                "limit": requests_limit,
-                "current": request_count,
-                "reset_in": self.window_size
-            }
-        
-        if token_count + tokens_to_add > tokens_limit:
+        result = await self._get_script()(
+            keys=[f"{key}:window", f"{key}:totals"],
+            args=[
+                current_time, self.window_size, requests_limit, tokens_limit, tokens_to_add,
+                lease_requests, lease_tokens, self.lease_below, os.urandom(8).hex()
+            ]
+        )
+        self.stats['redis_checks'] += 1
+        allowed, reason, request_count, token_count, granted_requests, granted_tokens, oldest = result
+        
+        if not allowed:
+            self.stats['denied'] += 1
+            reset_in = max(float(oldest) + self.window_size - current_time, 0)
+            if reason == 1:
+                return False, {
+                    "reason": "request_limit_exceeded",
+                    "limit": requests_limit,
+                    "current": request_count,
+                    "reset_in": reset_in
+                }
             return False, {
                 "reason": "token_limit_exceeded",
                 "limit": tokens_limit,
                 "current": token_count,
                 "requested": tokens_to_add,
-                "reset_in": self.window_size
+                "reset_in": reset_in
             }
         
-        # Add to counters
-        await self._add_to_window(requests_key, current_time, 1)
-        if tokens_to_add > 0:
-            await self._add_to_window(tokens_key, current_time, tokens_to_add)
-        
-        return True, {
-            "requests_remaining": requests_limit - request_count - 1,
-            "tokens_remaining": tokens_limit - token_count - tokens_to_add
+        info = {
+            "requests_remaining": requests_limit - request_count,
+            "tokens_remaining": tokens_limit - token_count
         }
+        if granted_requests:
+            self._leases[key] = {
+                'requests': granted_requests,
+                'tokens': granted_tokens,
+                'expires': time.monotonic() + self.lease_ttl,
+                **info
+            }
+        return True, info
     
-    async def _get_window_count(self, key: str, window_start: float, current_time: float) -> int:
-        """Get count within the time window"""
-        # Get Redis connection
-        redis = get_redis()
-        
-        # Remove old entries
-        await redis.zremrangebyscore(key, 0, window_start)
-        
-        # Get count in window
-        count = await redis.zcount(key, window_start, current_time)
-        return count or 0
-    
-    async def _add_to_window(self, key: str, timestamp: float, value: int):
-        """Add entry to the time window"""
-        # Get Redis connection
-        redis = get_redis()
-        
-        await redis.zadd(key, {f"{timestamp}:{value}": timestamp})
-        # Set expiry to 2x window size
-        await redis.expire(key, self.window_size * 2)
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, 'active_leases': len(self._leases)}
 
 
 class EmbeddingService:
@@ -192,7 +309,11 @@ class EmbeddingService:
         """Initialize the embedding service"""
         self.security_manager = SecurityManager()
         self.settings_service = SettingsService(self.security_manager)
-        self.rate_limiter = RateLimiter()
+        self.rate_limiter = RateLimiter(
+            lease_fraction=settings.RATE_LIMIT_LEASE_FRACTION,
+            lease_below=settings.RATE_LIMIT_LEASE_BELOW,
+            lease_ttl=settings.RATE_LIMIT_LEASE_TTL
+        )
         
         # Provider priority order for fallback
         self.provider_priority = [
@@ -205,6 +326,11 @@ class EmbeddingService:
         
         # Provider status tracking
         self.provider_status: Dict[EmbeddingProvider, ProviderStatus] = {}
+        self.provider_router = ProviderRouter(
+            window_seconds=settings.EMBEDDING_ROUTING_WINDOW,
+            hedge_after_ms=settings.EMBEDDING_HEDGE_AFTER_MS,
+            cooldown=settings.EMBEDDING_CIRCUIT_COOLDOWN
+        )
         self.provider_last_error: Dict[EmbeddingProvider, str] = {}
         
         # Usage tracking
@@ -308,104 +434,266 @@ class EmbeddingService:
         texts: List[str],
         user_id: Optional[str] = None,
         preferred_provider: Optional[EmbeddingProvider] = None,
-        preferred_model: Optional[str] = None
+        preferred_model: Optional[str] = None,
+        dimensions: Optional[int] = None,
+        raise_on_rate_limit: bool = False
     ) -> Tuple[List[List[float]], Dict[str, Any]]:
-        """Generate embeddings with automatic fallback between providers"""
+        """Generate embeddings, routing between providers by live health
+        
+        Only providers that produce compatible vectors are candidates: those
+        serving ``preferred_model`` when one is given, otherwise those whose
+        default model has ``dimensions`` (the vector store's width by
+        default). Candidates are ordered by ``provider_router``; when the
+        first one exceeds its latency budget the next one is started in
+        parallel and the first successful answer wins.
+        
+        Texts already embedded with the selected model are served from the
+        embedding cache; only unique misses are sent to the provider.
+        
+        Raises:
+            EmbeddingRateLimitError: If ``raise_on_rate_limit`` is set and no
+                provider answered because of rate limits, so the caller can
+                back off instead of receiving placeholder embeddings
+        """
         
         if not user_id:
             user_id = "system"
         
-        # Calculate total tokens
-        total_tokens = sum(self._tiktoken_len(text) for text in texts)
+        if preferred_provider:
+            candidates = [preferred_provider] if preferred_provider in self.provider_priority else []
+        else:
+            candidates = self._compatible_providers(
+                preferred_model, None if preferred_model else dimensions or settings.EMBEDDING_DIMENSIONS
+            )
         
-        # Try providers in order
-        providers = [preferred_provider] if preferred_provider else self.provider_priority
+        queue = deque(self.provider_router.rank(candidates))
+        # task -> (provider, start time, started as a hedge)
+        running: Dict[asyncio.Future, Tuple[EmbeddingProvider, float, bool]] = {}
+        tried: List[EmbeddingProvider] = []
         
-        for provider in providers:
-            if provider not in self.provider_priority:
-                continue
-            
-            try:
-                # Get API key
-                api_key = await self.get_active_api_key(user_id, provider)
-                if not api_key:
-                    self.provider_status[provider] = ProviderStatus.NO_API_KEY
-                    logger.debug(f"No API key for {provider}, trying next")
-                    continue
+        def launch(hedge: bool = False):
+            provider = queue.popleft()
+            tried.append(provider)
+            task = asyncio.ensure_future(self._embed_with_provider(provider, texts, user_id, preferred_model))
+            running[task] = (provider, time.monotonic(), hedge)
+        
+        try:
+            while queue or running:
+                if not running:
+                    launch()
+                timeout = None
+                if queue and len(running) == 1:
+                    provider, started, _ = next(iter(running.values()))
+                    delay = self.provider_router.hedge_delay(provider)
+                    if delay is not None:
+                        timeout = max(started + delay - time.monotonic(), 0)
                 
-                # Get provider config
-                model = preferred_model or self._get_default_model(provider)
-                config = ProviderConfig.get_config(provider, model)
+                done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # Latency budget exceeded: hedge with the next provider
+                    self.provider_router.stats['hedged'] += 1
+                    launch(hedge=True)
+                    continue
                 
+                for task in done:
+                    _, _, hedge = running.pop(task)
+                    result = task.result()
+                    if result is not None:
+                        if hedge:
+                            self.provider_router.stats['hedge_wins'] += 1
+                        return result
+        finally:
+            for task in running:
+                task.cancel()
+        
+        rate_limited = [
+            provider for provider in tried if self.provider_status.get(provider) == ProviderStatus.RATE_LIMITED
+        ]
+        if raise_on_rate_limit and rate_limited:
+            raise EmbeddingRateLimitError(
+                f"Embedding providers rate limited: {', '.join(p.value for p in rate_limited)}",
+                [p.value for p in rate_limited]
+            )
+        
+        # If all providers fail, use local/placeholder embeddings
+        logger.warning("All providers failed, using local embeddings")
+        return await self._generate_local_embeddings(texts), {
+            "provider": EmbeddingProvider.LOCAL,
+            "model": "placeholder",
+            "tokens": sum(self._tiktoken_len(text) for text in texts),
+            "cost": 0,
+            "fallback_reason": "all_providers_failed"
+        }
+    
+    def batch_limits(
+        self,
+        concurrency: int = 1,
+        preferred_model: Optional[str] = None,
+        dimensions: Optional[int] = None
+    ) -> Dict[str, int]:
+        """Request size limits for batches that may go to any compatible provider
+        
+        Uses the tightest limits among the providers a request could be
+        routed to. The token budget per request leaves room for
+        ``concurrency`` requests in flight within half of the provider's
+        per-minute token limit, capped by EMBEDDING_BATCH_MAX_TOKENS.
+        
+        Args:
+            concurrency: Requests the caller keeps in flight
+            preferred_model: Model the embeddings must come from
+            dimensions: Required vector width; defaults to the vector store's
+            
+        Returns:
+            ``max_batch`` inputs and ``max_tokens`` tokens per request
+        """
+        candidates = self._compatible_providers(
+            preferred_model, None if preferred_model else dimensions or settings.EMBEDDING_DIMENSIONS
+        ) or [EmbeddingProvider.LOCAL]
+        max_batch = max_tokens = None
+        for provider in candidates:
+            config = ProviderConfig.get_config(provider, preferred_model or self._get_default_model(provider))
+            tokens_per_minute = config["rate_limit"].get("tokens_per_minute", settings.RATE_LIMIT_TOKENS_PER_MINUTE)
+            # A single input of the model's maximum length must still fit
+            budget = max(
+                config.get("max_tokens", 0),
+                min(settings.EMBEDDING_BATCH_MAX_TOKENS, tokens_per_minute // (2 * max(concurrency, 1)))
+            )
+            batch = config.get("max_batch", 100)
+            max_batch = batch if max_batch is None else min(max_batch, batch)
+            max_tokens = budget if max_tokens is None else min(max_tokens, budget)
+        return {"max_batch": max_batch, "max_tokens": max_tokens}
+    
+    def _compatible_providers(self, model: Optional[str], dimensions: Optional[int]) -> List[EmbeddingProvider]:
+        """Providers, in priority order, whose vectors fit the requested model or width"""
+        providers = []
+        for provider in self.provider_priority:
+            models = ProviderConfig.CONFIGS.get(provider, {}).get("models", {})
+            model_config = models.get(model or self._get_default_model(provider))
+            if model_config is None:
+                continue
+            if dimensions and model_config.get("dimensions") != dimensions:
+                continue
+            providers.append(provider)
+        return providers
+    
+    async def _embed_with_provider(
+        self,
+        provider: EmbeddingProvider,
+        texts: List[str],
+        user_id: str,
+        preferred_model: Optional[str]
+    ) -> Optional[Tuple[List[List[float]], Dict[str, Any]]]:
+        """Embed with one provider, recording its health
+        
+        Returns:
+            Embeddings and metadata, or None if the provider was skipped or failed
+        """
+        start_time = time.monotonic()
+        try:
+            # Get API key
+            api_key = await self.get_active_api_key(user_id, provider)
+            if not api_key:
+                self.provider_status[provider] = ProviderStatus.NO_API_KEY
+                logger.debug(f"No API key for {provider}, trying next")
+                return None
+            
+            # Get provider config
+            model = preferred_model or self._get_default_model(provider)
+            config = ProviderConfig.get_config(provider, model)
+            
+            # Look up cached vectors and deduplicate misses within the batch
+            keys = [embedding_cache.cache_key(model, text) for text in texts]
+            vectors = await embedding_cache.get_many(dict.fromkeys(keys))
+            pending: Dict[str, str] = {}
+            for key, text in zip(keys, texts):
+                if key not in vectors and key not in pending:
+                    pending[key] = text
+            
+            miss_texts = list(pending.values())
+            total_tokens = sum(self._tiktoken_len(text) for text in miss_texts)
+            limit_info = {}
+            
+            if miss_texts:
                 # Check rate limits
                 rate_limit = config.get("rate_limit", {})
+                requests_limit = rate_limit.get("requests_per_minute", 1000)
+                tokens_limit = rate_limit.get("tokens_per_minute", 100000)
                 allowed, limit_info = await self.rate_limiter.check_rate_limit(
                     user_id,
                     provider,
-                    rate_limit.get("requests_per_minute", 1000),
-                    rate_limit.get("tokens_per_minute", 100000),
+                    requests_limit,
+                    tokens_limit,
                     total_tokens
                 )
                 
                 if not allowed:
                     self.provider_status[provider] = ProviderStatus.RATE_LIMITED
+                    self.provider_router.record_headroom(provider, 0.0)
                     logger.warning(f"Rate limit hit for {provider}: {limit_info}")
-                    continue
+                    return None
+                if "requests_remaining" in limit_info:
+                    self.provider_router.record_headroom(provider, min(
+                        limit_info["requests_remaining"] / requests_limit,
+                        limit_info["tokens_remaining"] / tokens_limit
+                    ))
                 
-                # Generate embeddings
-                embeddings = await self._generate_embeddings(
-                    texts, provider, model, api_key, config
-                )
+                # Generate embeddings for cache misses only
+                provider_start = time.monotonic()
+                generated = dict(zip(pending, await self._generate_embeddings(
+                    miss_texts, provider, model, api_key, config
+                )))
+                self.provider_router.record_success(provider, time.monotonic() - provider_start)
+                await embedding_cache.set_many(generated)
+                vectors.update(generated)
                 
                 # Update metrics
                 await self._update_usage_metrics(
-                    user_id, provider, len(texts), total_tokens,
+                    user_id, provider, len(miss_texts), total_tokens,
                     config.get("cost_per_1k_tokens", 0)
                 )
-                
-                # Mark provider as available
-                self.provider_status[provider] = ProviderStatus.AVAILABLE
-                
-                return embeddings, {
-                    "provider": provider,
-                    "model": model,
-                    "tokens": total_tokens,
-                    "cost": (total_tokens / 1000) * config.get("cost_per_1k_tokens", 0),
-                    "rate_limit_info": limit_info
-                }
-                
-            except RateLimitError as e:
-                self.provider_status[provider] = ProviderStatus.RATE_LIMITED
-                self.provider_last_error[provider] = str(e)
-                logger.warning(f"Rate limit error for {provider}: {e}")
-                continue
-                
-            except APIError as e:
-                self.provider_status[provider] = ProviderStatus.ERROR
-                self.provider_last_error[provider] = str(e)
-                logger.error(f"API error for {provider}: {e}")
-                
-                if "invalid_api_key" in str(e).lower():
-                    # Invalidate cached key
-                    cache_key = f"{user_id}:{provider}"
-                    self.api_key_cache.pop(cache_key, None)
-                continue
-                
-            except Exception as e:
-                self.provider_status[provider] = ProviderStatus.ERROR
-                self.provider_last_error[provider] = str(e)
-                logger.error(f"Unexpected error for {provider}: {e}")
-                continue
-        
-        # If all providers fail, use local/placeholder embeddings
-        logger.warning("All providers failed, using local embeddings")
-        return await self._generate_local_embeddings(texts), {
-            "provider": EmbeddingProvider.LOCAL,
-            "model": "placeholder",
-            "tokens": total_tokens,
-            "cost": 0,
-            "fallback_reason": "all_providers_failed"
-        }
+            
+            # Mark provider as available
+            self.provider_status[provider] = ProviderStatus.AVAILABLE
+            
+            embeddings = [
+                vectors[key].tolist() if isinstance(vectors[key], np.ndarray) else vectors[key]
+                for key in keys
+            ]
+            return embeddings, {
+                "provider": provider,
+                "model": model,
+                "tokens": total_tokens,
+                "cost": (total_tokens / 1000) * config.get("cost_per_1k_tokens", 0),
+                "rate_limit_info": limit_info,
+                "cache_hits": len(texts) - len(miss_texts),
+                "cache_misses": len(miss_texts)
+            }
+            
+        except RateLimitError as e:
+            self.provider_status[provider] = ProviderStatus.RATE_LIMITED
+            self.provider_last_error[provider] = str(e)
+            self.provider_router.record_headroom(provider, 0.0)
+            logger.warning(f"Rate limit error for {provider}: {e}")
+            return None
+            
+        except APIError as e:
+            self.provider_status[provider] = ProviderStatus.ERROR
+            self.provider_last_error[provider] = str(e)
+            self.provider_router.record_failure(provider, time.monotonic() - start_time)
+            logger.error(f"API error for {provider}: {e}")
+            
+            if "invalid_api_key" in str(e).lower():
+                # Invalidate cached key
+                cache_key = f"{user_id}:{provider}"
+                self.api_key_cache.pop(cache_key, None)
+            return None
+            
+        except Exception as e:
+            self.provider_status[provider] = ProviderStatus.ERROR
+            self.provider_last_error[provider] = str(e)
+            self.provider_router.record_failure(provider, time.monotonic() - start_time)
+            logger.error(f"Unexpected error for {provider}: {e}")
+            return None
     
     def _get_default_model(self, provider: EmbeddingProvider) -> str:
         """Get default model for provider"""
@@ -611,16 +899,20 @@ class EmbeddingService:
             
             current += timedelta(days=1)
         
+        stats["cache"] = embedding_cache.get_stats()
+        
         return stats
     
     async def get_provider_status(self) -> Dict[str, Any]:
         """Get current status of all providers"""
         
         status = {}
+        routing = self.provider_router.get_stats()['providers']
         for provider in self.provider_priority:
             status[provider.value] = {
                 "status": self.provider_status.get(provider, ProviderStatus.AVAILABLE).value,
                 "last_error": self.provider_last_error.get(provider, None),
+                "routing": routing.get(provider.value),
                 "models": list(ProviderConfig.CONFIGS.get(provider, {}).get("models", {}).keys()),
                 "rate_limits": ProviderConfig.CONFIGS.get(provider, {}).get("rate_limit", {}),
                 "cost_per_1k_tokens": ProviderConfig.CONFIGS.get(provider, {}).get("cost_per_1k_tokens", 0)
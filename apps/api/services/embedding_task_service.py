@@ -1,10 +1,32 @@
 """Async Embedding Task Processing Service
 
-This service handles asynchronous processing of document embeddings using FastAPI BackgroundTasks.
+This service handles asynchronous processing of document embeddings.
+
+Tasks are queued on Redis Streams, one stream per priority, read through the
+``embedding_workers`` consumer group. A claimed entry stays in the group's
+pending list until the task finishes, so work held by a crashed process is
+reclaimed by another consumer once it has been idle for the visibility
+timeout; running tasks refresh their claim to stay invisible. Retries wait
+in a delayed set and are moved back onto their stream when due.
+
+Tasks are consumed by ``python -m workers.embedding_worker`` processes and,
+unless disabled, opportunistically by the API through BackgroundTasks.
+
+Task state lives in a small Redis hash, ``embedding_task:{id}``, whose
+progress fields are updated in place; the document content is written once
+to ``embedding_task_payloads`` in Postgres and read by the worker that runs
+the task.
+
+Status transitions also maintain per-status counters, so queue statistics
+never scan task keys: pending and processing tasks are counted in one hash,
+finished tasks in hourly hashes that expire with the task records. A record
+can expire before its task finishes, so consumers periodically recount the
+unfinished tasks with a SCAN sweep.
 """
 
 import os
 import time
+import socket
 import logging
 import asyncio
 from typing import List, Dict, Any, Optional, Tuple
@@ -14,17 +36,82 @@ from enum import Enum
 import json
 
 from fastapi import BackgroundTasks
+from redis.exceptions import ResponseError
 from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from services.pgvector_service import PGVectorService
 from services.embedding_service import embedding_service
-from core.database import async_session_maker, get_db
+from services.batch_embedding_executor import batch_embedding_executor
+from services.vector_bulk_writer import embedding_bulk_writer
+from services.document_centroids import document_centroids
+from core import database
+from core.config import settings
 from core.redis import get_redis
 
 logger = logging.getLogger(__name__)
 
 
+TASK_KEY_PREFIX = "embedding_task:"
+TASK_TTL = 86400  # 24 hours
+STREAM_KEY_PREFIX = "embedding_tasks:"
+DELAYED_KEY = "embedding_tasks:delayed"
+CONSUMER_GROUP = "embedding_workers"
+STATUS_COUNTS_KEY = "embedding_tasks:status_counts"
+STATUS_RECONCILE_KEY = "embedding_tasks:status_reconciled"
+
+# Task hash fields stored as integers or JSON; empty strings stand for None
+TASK_INT_FIELDS = {'progress', 'total_chunks', 'processed_chunks', 'chunk_count', 'retry_count', 'deliveries'}
+TASK_JSON_FIELDS = {'metadata', 'throughput'}
+
+# Moves due retries onto their priority stream; delayed members are
+# "<priority>:<task_id>" so the move is a single atomic step
+PROMOTE_DUE_SCRIPT = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, tonumber(ARGV[2]))
+for _, member in ipairs(due) do
+    redis.call('ZREM', KEYS[1], member)
+    local sep = string.find(member, ':', 1, true)
+    redis.call('XADD', ARGV[3] .. string.sub(member, 1, sep - 1), '*', 'task_id', string.sub(member, sep + 1))
+end
+return #due
+"""
+
+# Writes task fields and moves the task between status counters atomically.
+# Finished tasks are counted in the hourly hash KEYS[3], remembered in the
+# task's status_bucket field so a later transition (retry) undoes the count
+# in the right hour.
+TRANSITION_SCRIPT = """
+local old = redis.call('HGET', KEYS[1], 'status')
+local old_bucket = redis.call('HGET', KEYS[1], 'status_bucket')
+if #ARGV > 4 then
+    redis.call('HSET', KEYS[1], unpack(ARGV, 5))
+end
+redis.call('HSET', KEYS[1], 'status', ARGV[1])
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+if old == ARGV[1] then
+    return old
+end
+if old then
+    if old_bucket then
+        if redis.call('EXISTS', old_bucket) == 1 then
+            redis.call('HINCRBY', old_bucket, old, -1)
+        end
+    else
+        redis.call('HINCRBY', KEYS[2], old, -1)
+    end
+end
+if ARGV[2] == '1' then
+    redis.call('HINCRBY', KEYS[3], ARGV[1], 1)
+    redis.call('EXPIRE', KEYS[3], ARGV[4])
+    redis.call('HSET', KEYS[1], 'status_bucket', KEYS[3])
+else
+    redis.call('HINCRBY', KEYS[2], ARGV[1], 1)
+    redis.call('HDEL', KEYS[1], 'status_bucket')
+end
+return old
+"""
+
+
 class TaskStatus(str, Enum):
     """Task status enumeration"""
     PENDING = "pending"
@@ -34,6 +121,9 @@ class TaskStatus(str, Enum):
     CANCELLED = "cancelled"
 
 
+FINISHED_STATUSES = {TaskStatus.COMPLETED, TaskStatus.FAILED, TaskStatus.CANCELLED}
+
+
 class TaskPriority(str, Enum):
     """Task priority levels"""
     LOW = "low"
@@ -42,18 +132,48 @@ class TaskPriority(str, Enum):
     CRITICAL = "critical"
 
 
+# Streams in the order consumers read them
+PRIORITY_ORDER = [TaskPriority.CRITICAL, TaskPriority.HIGH, TaskPriority.NORMAL, TaskPriority.LOW]
+
+
 class EmbeddingTaskService:
     """Service for managing async embedding generation tasks"""
     
-    def __init__(self):
-        """Initialize the embedding task service"""
+    def __init__(
+        self,
+        max_concurrent_tasks: int = 5,
+        visibility_timeout: float = 120.0,
+        block_ms: int = 5000,
+        process_inline: bool = True,
+        reconcile_interval: float = 3600.0
+    ):
+        """Initialize the embedding task service
+        
+        Args:
+            max_concurrent_tasks: Tasks a consumer runs at once
+            visibility_timeout: Seconds a claimed task may go without a
+                heartbeat before another consumer reclaims it
+            block_ms: Longest blocking read on the streams when idle
+            process_inline: Let the API consume a task after queueing one
+            reconcile_interval: Seconds between recounts of unfinished tasks
+        """
         self.pgvector_service = PGVectorService()
         self.embedding_service = embedding_service
+        self.batch_executor = batch_embedding_executor
         self.active_tasks: Dict[str, Dict[str, Any]] = {}
-        self.task_queue: List[Dict[str, Any]] = []
-        self.max_concurrent_tasks = 5
+        self.max_concurrent_tasks = max_concurrent_tasks
         self.task_timeout = 300  # 5 minutes timeout
         self.retry_limit = 3
+        self.visibility_timeout = visibility_timeout
+        self.block_ms = block_ms
+        self.process_inline = process_inline
+        self.reconcile_interval = reconcile_interval
+        self._next_reconcile = 0.0
+        self.consumer_name = f"{socket.gethostname()}-{os.getpid()}"
+        self._groups_ready = False
+        self._promote_script = None
+        self._transition_script = None
+        self._last_reclaim = 0.0
         
     async def queue_embedding_task(
         self,
@@ -81,12 +201,11 @@ class EmbeddingTaskService:
         """
         task_id = str(uuid4())
         
-        # Create task record
+        # Create task record; the content is stored separately
         task_data = {
             'task_id': task_id,
             'document_id': str(document_id),
             'knowledge_base_id': str(knowledge_base_id),
-            'content': content,
             'metadata': metadata or {},
             'priority': priority,
             'user_id': str(user_id) if user_id else None,
@@ -98,36 +217,104 @@ class EmbeddingTaskService:
             'created_at': datetime.utcnow().isoformat(),
             'started_at': None,
             'completed_at': None,
-            'retry_count': 0
+            'retry_count': 0,
+            'deliveries': 0,
+            'chunk_count': 0
         }
         
-        # Store task in Redis for persistence
-        redis = get_redis()
-        await redis.setex(
-            f"embedding_task:{task_id}",
-            86400,  # 24 hours TTL
-            json.dumps(task_data)
-        )
+        await self._store_content(task_id, content)
         
-        # Add to priority queue in Redis
-        priority_score = self._get_priority_score(priority)
+        # Store the task record and its stream entry together
         redis = get_redis()
-        await redis.zadd(
-            "embedding_task_queue",
-            {task_id: priority_score}
-        )
+        await self._ensure_groups(redis)
+        key = f"{TASK_KEY_PREFIX}{task_id}"
+        async with redis.pipeline(transaction=True) as pipe:
+            pipe.hset(key, mapping=self._encode_fields(task_data))
+            pipe.expire(key, TASK_TTL)
+            pipe.hincrby(STATUS_COUNTS_KEY, TaskStatus.PENDING.value, 1)
+            pipe.xadd(self._stream_key(priority), {'task_id': task_id})
+            await pipe.execute()
         
-        # If BackgroundTasks is provided, start processing
-        if background_tasks:
-            background_tasks.add_task(
-                self._process_embedding_task,
-                task_id,
-                task_data
-            )
+        # Without a dedicated worker the API consumes the queue itself
+        if background_tasks and self.process_inline:
+            background_tasks.add_task(self.process_next)
         
         logger.info(f"Queued embedding task {task_id} for document {document_id}")
         return task_id
     
+    @staticmethod
+    def _encode_fields(fields: Dict[str, Any]) -> Dict[str, str]:
+        """Flatten task fields into hash values"""
+        encoded = {}
+        for name, value in fields.items():
+            if value is None:
+                value = ""
+            elif isinstance(value, Enum):
+                value = value.value
+            elif isinstance(value, (dict, list)):
+                value = json.dumps(value)
+            encoded[name] = str(value)
+        return encoded
+    
+    @staticmethod
+    def _decode_fields(raw: Dict[str, str]) -> Dict[str, Any]:
+        """Rebuild task fields from hash values"""
+        task_data = {}
+        for name, value in raw.items():
+            if name in TASK_INT_FIELDS:
+                task_data[name] = int(value or 0)
+            elif name in TASK_JSON_FIELDS:
+                task_data[name] = json.loads(value) if value else ({} if name == 'metadata' else None)
+            else:
+                task_data[name] = value or None
+        return task_data
+    
+    async def _store_content(self, task_id: str, content: str):
+        """Write the task's document content to Postgres once"""
+        async with database.async_session_maker() as session:
+            await session.execute(
+                text("""
+                    INSERT INTO embedding_task_payloads (task_id, content, created_at)
+                    VALUES (:task_id, :content, :created_at)
+                """),
+                {'task_id': UUID(task_id), 'content': content, 'created_at': datetime.utcnow()}
+            )
+            await session.commit()
+    
+    async def _load_content(self, task_id: str) -> Optional[str]:
+        async with database.async_session_maker() as session:
+            result = await session.execute(
+                text("SELECT content FROM embedding_task_payloads WHERE task_id = :task_id"),
+                {'task_id': UUID(task_id)}
+            )
+            return result.scalar_one_or_none()
+    
+    async def _delete_content(self, task_id: str):
+        """Drop the content of a task that will not run again"""
+        try:
+            async with database.async_session_maker() as session:
+                await session.execute(
+                    text("DELETE FROM embedding_task_payloads WHERE task_id = :task_id"),
+                    {'task_id': UUID(task_id)}
+                )
+                await session.commit()
+        except Exception as e:
+            logger.error(f"Failed to delete content of task {task_id}: {e}")
+    
+    async def purge_expired_payloads(self) -> int:
+        """Delete content of tasks whose Redis record has expired
+        
+        Returns:
+            Number of payloads deleted
+        """
+        async with database.async_session_maker() as session:
+            result = await session.execute(
+                text("DELETE FROM embedding_task_payloads WHERE created_at < :cutoff"),
+                {'cutoff': datetime.utcnow() - timedelta(seconds=TASK_TTL)}
+            )
+            await session.commit()
+        return result.rowcount
+    
     def _get_priority_score(self, priority: TaskPriority) -> float:
         """Convert priority to numeric score for sorting"""
         priority_scores = {
@@ -139,6 +326,182 @@ class EmbeddingTaskService:
         # Add timestamp component to ensure FIFO within same priority
         return priority_scores[priority] * 1000000 - time.time()
     
+    @staticmethod
+    def _stream_key(priority: TaskPriority) -> str:
+        return f"{STREAM_KEY_PREFIX}{TaskPriority(priority).value}"
+    
+    async def _ensure_groups(self, redis):
+        """Create the priority streams and their consumer group once"""
+        if self._groups_ready:
+            return
+        for priority in PRIORITY_ORDER:
+            try:
+                await redis.xgroup_create(self._stream_key(priority), CONSUMER_GROUP, id='0', mkstream=True)
+            except ResponseError as e:
+                if "BUSYGROUP" not in str(e):
+                    raise
+        self._groups_ready = True
+    
+    async def claim(
+        self,
+        consumer: str,
+        block_ms: Optional[int] = None
+    ) -> List[Tuple[str, str, str]]:
+        """Claim queued tasks for a consumer
+        
+        Entries idle past the visibility timeout are reclaimed first, then
+        the streams are read in priority order. When every stream is empty
+        the call blocks on all of them for up to ``block_ms``.
+        
+        Args:
+            consumer: Consumer name within the group
+            block_ms: Longest wait for new entries; None returns immediately
+            
+        Returns:
+            Claimed (stream, message id, task id) entries, usually one
+        """
+        redis = get_redis()
+        try:
+            await self._ensure_groups(redis)
+            await self._promote_due(redis)
+            
+            reclaimed = await self._reclaim(redis, consumer)
+            if reclaimed:
+                return reclaimed
+            
+            for priority in PRIORITY_ORDER:
+                response = await redis.xreadgroup(
+                    CONSUMER_GROUP, consumer, {self._stream_key(priority): '>'}, count=1
+                )
+                if response and response[0][1]:
+                    return self._entries(response)
+            
+            if block_ms is None:
+                return []
+            response = await redis.xreadgroup(
+                CONSUMER_GROUP, consumer,
+                {self._stream_key(priority): '>' for priority in PRIORITY_ORDER},
+                count=1, block=block_ms
+            )
+            return self._entries(response)
+        except ResponseError as e:
+            if "NOGROUP" in str(e):
+                # The streams were deleted (e.g. Redis was flushed); recreate next time
+                self._groups_ready = False
+            raise
+    
+    @staticmethod
+    def _entries(response) -> List[Tuple[str, str, str]]:
+        return [
+            (stream, message_id, fields.get('task_id'))
+            for stream, messages in response or []
+            for message_id, fields in messages
+        ]
+    
+    async def _reclaim(self, redis, consumer: str) -> List[Tuple[str, str, str]]:
+        """Take over entries whose consumer stopped refreshing them"""
+        now = time.monotonic()
+        if now - self._last_reclaim < self.visibility_timeout / 4:
+            return []
+        self._last_reclaim = now
+        
+        for priority in PRIORITY_ORDER:
+            stream = self._stream_key(priority)
+            response = await redis.xautoclaim(
+                stream, CONSUMER_GROUP, consumer,
+                min_idle_time=int(self.visibility_timeout * 1000), start_id='0-0', count=1
+            )
+            messages = response[1] if response else []
+            if messages:
+                logger.warning(f"Reclaimed embedding task entry {messages[0][0]} from {stream}")
+                return [(stream, message_id, fields.get('task_id')) for message_id, fields in messages if fields]
+        return []
+    
+    async def _promote_due(self, redis, limit: int = 100) -> int:
+        """Move retries whose backoff has elapsed back onto their streams"""
+        if self._promote_script is None:
+            self._promote_script = redis.register_script(PROMOTE_DUE_SCRIPT)
+        return await self._promote_script(keys=[DELAYED_KEY], args=[time.time(), limit, STREAM_KEY_PREFIX])
+    
+    async def _ack(self, stream: str, message_id: str):
+        redis = get_redis()
+        async with redis.pipeline(transaction=True) as pipe:
+            pipe.xack(stream, CONSUMER_GROUP, message_id)
+            pipe.xdel(stream, message_id)
+            await pipe.execute()
+    
+    async def _keep_claimed(self, stream: str, message_id: str, consumer: str):
+        """Reset the entry's idle time so it is not reclaimed while running"""
+        redis = get_redis()
+        while True:
+            await asyncio.sleep(self.visibility_timeout / 3)
+            try:
+                await redis.xclaim(stream, CONSUMER_GROUP, consumer, 0, [message_id], justid=True)
+            except Exception as e:
+                logger.warning(f"Failed to refresh claim on {message_id}: {e}")
+    
+    async def handle_entry(
+        self,
+        consumer: str,
+        stream: str,
+        message_id: str,
+        task_id: Optional[str]
+    ):
+        """Run a claimed task and acknowledge its entry
+        
+        The entry is acknowledged once the task completes, fails for good or
+        is scheduled for retry. If the process dies first the entry stays
+        pending and is reclaimed by another consumer.
+        
+        Args:
+            consumer: Consumer that claimed the entry
+            stream: Stream the entry was read from
+            message_id: Stream entry ID
+            task_id: Task identifier stored in the entry
+        """
+        task_data = await self.get_task_status(task_id) if task_id else None
+        if not task_data or task_data['status'] in (TaskStatus.COMPLETED, TaskStatus.CANCELLED):
+            await self._ack(stream, message_id)
+            return
+        
+        # Entries reclaimed again and again point at a task that kills its worker
+        task_data['deliveries'] = task_data.get('deliveries', 0) + 1
+        if task_data['deliveries'] > self.retry_limit + 1:
+            task_data['retry_count'] = self.retry_limit
+            await self._handle_failure(
+                task_id, task_data, f"Abandoned after {task_data['deliveries'] - 1} deliveries"
+            )
+            await self._ack(stream, message_id)
+            return
+        
+        self.active_tasks[task_id] = task_data
+        heartbeat = asyncio.create_task(self._keep_claimed(stream, message_id, consumer))
+        try:
+            # No whole-task deadline: large documents run as long as the
+            # heartbeat keeps the entry claimed
+            await self._process_embedding_task(task_id, task_data)
+            await self._ack(stream, message_id)
+        finally:
+            heartbeat.cancel()
+            self.active_tasks.pop(task_id, None)
+    
+    async def process_next(self, consumer: Optional[str] = None) -> bool:
+        """Claim and run at most one task without waiting for new entries
+        
+        Returns:
+            True if a task entry was handled
+        """
+        consumer = consumer or self.consumer_name
+        await self._reconcile_if_due()
+        try:
+            entries = await self.claim(consumer)
+        except Exception as e:
+            logger.error(f"Failed to claim embedding task: {e}")
+            return False
+        for entry in entries:
+            await self.handle_entry(consumer, *entry)
+        return bool(entries)
+    
     async def _process_embedding_task(
         self,
         task_id: str,
@@ -151,10 +514,9 @@ class EmbeddingTaskService:
             task_data: Task details
         """
         try:
-            # Update task status to processing
-            task_data['status'] = TaskStatus.PROCESSING
-            task_data['started_at'] = datetime.utcnow().isoformat()
-            await self._update_task_status(task_id, task_data)
+            content = await self._load_content(task_id)
+            if content is None:
+                raise ValueError(f"Content of task {task_id} not found")
             
             # Parse IDs
             document_id = UUID(task_data['document_id'])
@@ -162,63 +524,72 @@ class EmbeddingTaskService:
             user_id = UUID(task_data['user_id']) if task_data.get('user_id') else None
             
             # Split content into chunks
-            chunks = self.pgvector_service._split_text(
-                task_data['content'],
-                chunk_size=1000,
-                chunk_overlap=200
-            )
+            chunks = self.pgvector_service._chunk_text(content)
+            del content
+            
+            # A redelivered or retried task starts over from the first chunk
+            if task_data.get('deliveries', 0) > 1 or task_data.get('retry_count', 0) > 0:
+                await self._discard_partial_writes(task_id, document_id)
+            
+            # Update task status to processing
+            task_data['status'] = TaskStatus.PROCESSING
+            task_data['started_at'] = datetime.utcnow().isoformat()
             task_data['total_chunks'] = len(chunks)
+            task_data['processed_chunks'] = 0
+            task_data['progress'] = 0
+            await self._update_task_status(
+                task_id, task_data,
+                'status', 'started_at', 'total_chunks', 'processed_chunks', 'progress', 'deliveries'
+            )
             
-            # Process chunks in batches
-            batch_size = 50  # Process 50 chunks at a time
-            chunk_ids = []
+            docs = []
+            for index, chunk in enumerate(chunks):
+                chunk_metadata = {
+                    **task_data.get('metadata', {}),
+                    'chunk_index': index,
+                    'total_chunks': len(chunks),
+                    'task_id': task_id
+                }
+                if 'page' in chunk:
+                    chunk_metadata['page'] = chunk['page']
+                docs.append({
+                    'content': chunk['content'],
+                    'token_count': chunk['token_count'],
+                    'metadata': chunk_metadata
+                })
             
-            for i in range(0, len(chunks), batch_size):
-                batch = chunks[i:i + batch_size]
-                batch_docs = []
-                
-                for j, chunk in enumerate(batch):
-                    batch_docs.append({
-                        'content': chunk,
-                        'metadata': {
-                            **task_data.get('metadata', {}),
-                            'chunk_index': i + j,
-                            'total_chunks': len(chunks),
-                            'task_id': task_id
-                        }
-                    })
-                
-                # Generate embeddings for batch
-                try:
-                    batch_chunk_ids = await self._process_batch(
-                        batch_docs,
-                        knowledge_base_id,
-                        document_id,
-                        user_id
-                    )
-                    chunk_ids.extend(batch_chunk_ids)
-                    
-                    # Update progress
-                    task_data['processed_chunks'] = i + len(batch)
-                    task_data['progress'] = int((task_data['processed_chunks'] / task_data['total_chunks']) * 100)
-                    
-                    # Store progress update
-                    await self._update_task_status(task_id, task_data)
-                    
-                    # Send WebSocket notification if available
-                    await self._send_progress_notification(task_id, task_data)
-                    
-                except Exception as e:
-                    logger.error(f"Failed to process batch {i//batch_size + 1}: {e}")
-                    # Continue with next batch instead of failing entire task
-                    continue
+            async def embed(texts: List[str]) -> List[List[float]]:
+                return await self._embed_batch(texts, user_id)
+            
+            async def write(batch_docs: List[Dict[str, Any]], embeddings: List[List[float]]) -> List[UUID]:
+                return await self._write_batch(batch_docs, embeddings, knowledge_base_id, document_id)
+            
+            async def on_progress(count: int):
+                await self._record_progress(task_id, task_data, count)
+                # Send WebSocket notification if available
+                await self._send_progress_notification(task_id, task_data)
+            
+            # Keep several provider requests in flight; failed batches are
+            # skipped instead of failing the entire task
+            limits = self.embedding_service.batch_limits(self.batch_executor.max_in_flight)
+            result = await self.batch_executor.run(
+                docs, embed, write,
+                max_batch=limits['max_batch'],
+                max_tokens=limits['max_tokens'],
+                on_progress=on_progress
+            )
+            chunk_ids = result['ids']
             
             # Mark task as completed
             task_data['status'] = TaskStatus.COMPLETED
             task_data['completed_at'] = datetime.utcnow().isoformat()
             task_data['progress'] = 100
-            task_data['chunk_ids'] = [str(cid) for cid in chunk_ids]
-            await self._update_task_status(task_id, task_data)
+            task_data['chunk_count'] = len(chunk_ids)
+            task_data['throughput'] = result['metrics']
+            await self._update_task_status(
+                task_id, task_data, 'status', 'completed_at', 'progress', 'chunk_count', 'throughput'
+            )
+            await self._delete_content(task_id)
             
             # Update document status
             await self._update_document_status(
@@ -227,33 +598,85 @@ class EmbeddingTaskService:
                 len(chunk_ids)
             )
             
+            # Cached search results for this knowledge base are now stale
+            await self.pgvector_service.invalidate_semantic_cache([knowledge_base_id])
+            
             # Send completion notification
             await self._send_completion_notification(task_id, task_data)
             
-            logger.info(f"Completed embedding task {task_id}: {len(chunk_ids)} chunks processed")
+            logger.info(
+                f"Completed embedding task {task_id}: {len(chunk_ids)} chunks processed "
+                f"({result['metrics']['chunks_per_second']} chunks/s)"
+            )
             
         except Exception as e:
             logger.error(f"Failed to process embedding task {task_id}: {e}")
+            await self._handle_failure(task_id, task_data, str(e))
+    
+    async def _handle_failure(
+        self,
+        task_id: str,
+        task_data: Dict[str, Any],
+        error_message: str
+    ):
+        """Mark a task failed and retry it if within the retry limit
+        
+        Args:
+            task_id: Task identifier
+            task_data: Task data
+            error_message: Reason for the failure
+        """
+        # Update task as failed
+        task_data['status'] = TaskStatus.FAILED
+        task_data['error_message'] = error_message
+        task_data['completed_at'] = datetime.utcnow().isoformat()
+        await self._update_task_status(
+            task_id, task_data, 'status', 'error_message', 'completed_at', 'retry_count', 'deliveries'
+        )
+        
+        # Retry if within limit
+        if task_data['retry_count'] < self.retry_limit:
+            await self._retry_task(task_id, task_data)
+        else:
+            await self._delete_content(task_id)
             
-            # Update task as failed
-            task_data['status'] = TaskStatus.FAILED
-            task_data['error_message'] = str(e)
-            task_data['completed_at'] = datetime.utcnow().isoformat()
-            await self._update_task_status(task_id, task_data)
+            # Update document status as failed
+            await self._update_document_status(
+                UUID(task_data['document_id']),
+                'failed',
+                0
+            )
             
-            # Retry if within limit
-            if task_data['retry_count'] < self.retry_limit:
-                await self._retry_task(task_id, task_data)
-            else:
-                # Update document status as failed
-                await self._update_document_status(
-                    UUID(task_data['document_id']),
-                    'failed',
-                    0
-                )
-                
-                # Send failure notification
-                await self._send_failure_notification(task_id, task_data)
+            # Send failure notification
+            await self._send_failure_notification(task_id, task_data)
+    
+    async def _discard_partial_writes(self, task_id: str, document_id: UUID) -> int:
+        """Delete chunks an earlier attempt of a task already stored
+        
+        Args:
+            task_id: Task identifier recorded in the chunks' metadata
+            document_id: Document the task embeds
+            
+        Returns:
+            Number of chunks deleted
+        """
+        async with database.async_session_maker() as session:
+            result = await session.execute(
+                text("""
+                    DELETE FROM knowledge_embeddings
+                    WHERE document_id = :document_id AND metadata->>'task_id' = :task_id
+                    RETURNING id
+                """),
+                {'document_id': document_id, 'task_id': task_id}
+            )
+            deleted = len(result.fetchall())
+            if deleted:
+                await document_centroids.recompute(session, [document_id])
+            await session.commit()
+        
+        if deleted:
+            logger.info(f"Discarded {deleted} chunks written by an earlier attempt of task {task_id}")
+        return deleted
     
     async def _process_batch(
         self,
@@ -273,47 +696,59 @@ class EmbeddingTaskService:
         Returns:
             List of chunk IDs created
         """
-        texts = [doc['content'] for doc in batch_docs]
+        embeddings = await self._embed_batch([doc['content'] for doc in batch_docs], user_id)
+        return await self._write_batch(batch_docs, embeddings, knowledge_base_id, document_id)
+    
+    async def _embed_batch(
+        self,
+        texts: List[str],
+        user_id: Optional[UUID] = None
+    ) -> List[List[float]]:
+        """Generate embeddings for a batch of chunk texts
         
+        Raises:
+            EmbeddingRateLimitError: If providers are rate limited
+        """
         # Generate embeddings using enhanced service with fallback
         embeddings, metadata = await self.embedding_service.generate_embeddings_with_fallback(
             texts, 
-            user_id=str(user_id) if user_id else None
+            user_id=str(user_id) if user_id else None,
+            raise_on_rate_limit=True
         )
         
         # Log provider used
         logger.info(f"Generated embeddings using {metadata.get('provider', 'unknown')} provider")
+        return embeddings
+    
+    async def _write_batch(
+        self,
+        batch_docs: List[Dict[str, Any]],
+        embeddings: List[List[float]],
+        knowledge_base_id: UUID,
+        document_id: UUID
+    ) -> List[UUID]:
+        """Store a batch of chunks with their embeddings
         
-        chunk_ids = []
+        Returns:
+            List of chunk IDs created
+        """
+        records = [
+            embedding_bulk_writer.build_record(
+                document_id=document_id,
+                knowledge_base_id=knowledge_base_id,
+                chunk_index=doc['metadata'].get('chunk_index', 0),
+                content=doc['content'],
+                embedding=embedding,
+                token_count=doc.get('token_count') or self.pgvector_service._tiktoken_len(doc['content']),
+                metadata=doc.get('metadata')
+            )
+            for doc, embedding in zip(batch_docs, embeddings)
+        ]
         
-        # Store embeddings in database
-        async with async_session_maker() as session:
-            for doc, embedding in zip(batch_docs, embeddings):
-                chunk_id = uuid4()
-                
-                await session.execute(
-                    text("""
-                        INSERT INTO knowledge_embeddings 
-                        (id, document_id, knowledge_base_id, chunk_index, chunk_size, 
-                         content, embedding, token_count, metadata, created_at)
-                        VALUES (:id, :doc_id, :kb_id, :chunk_idx, :chunk_size,
-                                :content, :embedding, :tokens, :metadata, :created_at)
-                    """),
-                    {
-                        'id': chunk_id,
-                        'doc_id': document_id,
-                        'kb_id': knowledge_base_id,
-                        'chunk_idx': doc['metadata'].get('chunk_index', 0),
-                        'chunk_size': len(doc['content']),
-                        'content': doc['content'],
-                        'embedding': f"[{','.join(map(str, embedding))}]",
-                        'tokens': self.pgvector_service._tiktoken_len(doc['content']),
-                        'metadata': json.dumps(doc['metadata']) if doc.get('metadata') else None,
-                        'created_at': datetime.utcnow()
-                    }
-                )
-                chunk_ids.append(chunk_id)
-            
+        # Store embeddings in database with a single binary COPY
+        async with database.async_session_maker() as session:
+            chunk_ids = await embedding_bulk_writer.write(session, records)
+            await document_centroids.add_chunks(session, records)
             await session.commit()
         
         return chunk_ids
@@ -321,21 +756,71 @@ class EmbeddingTaskService:
     async def _update_task_status(
         self,
         task_id: str,
-        task_data: Dict[str, Any]
+        task_data: Dict[str, Any],
+        *fields: str
     ):
         """Update task status in Redis
         
         Args:
             task_id: Task identifier
             task_data: Updated task data
+            fields: Fields of ``task_data`` to write; all when omitted
         """
+        key = f"{TASK_KEY_PREFIX}{task_id}"
+        changed = {name: task_data.get(name) for name in fields} if fields else task_data
         redis = get_redis()
-        await redis.setex(
-            f"embedding_task:{task_id}",
-            86400,  # 24 hours TTL
-            json.dumps(task_data)
+        
+        if 'status' not in changed:
+            async with redis.pipeline(transaction=False) as pipe:
+                pipe.hset(key, mapping=self._encode_fields(changed))
+                pipe.expire(key, TASK_TTL)
+                await pipe.execute()
+            return
+        
+        status = TaskStatus(changed['status'])
+        encoded = self._encode_fields({
+            name: value for name, value in changed.items() if name not in ('status', 'status_bucket')
+        })
+        if self._transition_script is None:
+            self._transition_script = redis.register_script(TRANSITION_SCRIPT)
+        await self._transition_script(
+            keys=[key, STATUS_COUNTS_KEY, self._status_bucket_key()],
+            args=[
+                status.value, int(status in FINISHED_STATUSES), TASK_TTL, TASK_TTL + 3600,
+                *[item for pair in encoded.items() for item in pair]
+            ]
         )
     
+    @staticmethod
+    def _status_bucket_key(hour: Optional[int] = None) -> str:
+        """Hourly counter hash for tasks that finished in ``hour`` (epoch hours)"""
+        if hour is None:
+            hour = int(time.time() // 3600)
+        return f"{STATUS_COUNTS_KEY}:{hour}"
+    
+    async def _record_progress(
+        self,
+        task_id: str,
+        task_data: Dict[str, Any],
+        chunks: int
+    ):
+        """Count processed chunks without rewriting the rest of the task
+        
+        Args:
+            task_id: Task identifier
+            task_data: Task data, updated in place
+            chunks: Chunks processed since the last update
+        """
+        task_data['processed_chunks'] += chunks
+        task_data['progress'] = int((task_data['processed_chunks'] / task_data['total_chunks']) * 100)
+        
+        key = f"{TASK_KEY_PREFIX}{task_id}"
+        redis = get_redis()
+        async with redis.pipeline(transaction=False) as pipe:
+            pipe.hincrby(key, 'processed_chunks', chunks)
+            pipe.hset(key, 'progress', task_data['progress'])
+            await pipe.execute()
+    
     async def _update_document_status(
         self,
         document_id: UUID,
@@ -350,7 +835,7 @@ class EmbeddingTaskService:
             chunk_count: Number of chunks processed
         """
         try:
-            async with async_session_maker() as session:
+            async with database.async_session_maker() as session:
                 await session.execute(
                     text("""
                         UPDATE knowledge_documents
@@ -375,7 +860,7 @@ class EmbeddingTaskService:
         task_id: str,
         task_data: Dict[str, Any]
     ):
-        """Retry a failed task
+        """Schedule a failed task to be queued again after a backoff
         
         Args:
             task_id: Task identifier
@@ -384,20 +869,18 @@ class EmbeddingTaskService:
         task_data['retry_count'] += 1
         task_data['status'] = TaskStatus.PENDING
         task_data['error_message'] = None
+        task_data['deliveries'] = 0
+        await self._update_task_status(task_id, task_data)
         
-        # Exponential backoff
+        # Exponential backoff; the entry is moved onto its stream when due
         delay = min(60 * (2 ** task_data['retry_count']), 300)  # Max 5 minutes
-        await asyncio.sleep(delay)
-        
-        # Requeue task
-        priority_score = self._get_priority_score(TaskPriority(task_data['priority']))
         redis = get_redis()
         await redis.zadd(
-            "embedding_task_queue",
-            {task_id: priority_score}
+            DELAYED_KEY,
+            {f"{TaskPriority(task_data['priority']).value}:{task_id}": time.time() + delay}
         )
         
-        logger.info(f"Retrying task {task_id} (attempt {task_data['retry_count']})")
+        logger.info(f"Retrying task {task_id} in {delay}s (attempt {task_data['retry_count']})")
     
     async def get_task_status(
         self,
@@ -412,9 +895,9 @@ class EmbeddingTaskService:
             Task data if found, None otherwise
         """
         redis = get_redis()
-        task_data = await redis.get(f"embedding_task:{task_id}")
+        task_data = await redis.hgetall(f"{TASK_KEY_PREFIX}{task_id}")
         if task_data:
-            return json.loads(task_data)
+            return self._decode_fields(task_data)
         return None
     
     async def get_task_progress(
@@ -462,7 +945,8 @@ class EmbeddingTaskService:
             'started_at': task_data.get('started_at'),
             'completed_at': task_data.get('completed_at'),
             'error_message': task_data.get('error_message'),
-            'retry_count': task_data.get('retry_count', 0)
+            'retry_count': task_data.get('retry_count', 0),
+            'throughput': task_data.get('throughput')
         }
     
     async def cancel_task(
@@ -485,11 +969,12 @@ class EmbeddingTaskService:
         if task_data['status'] in [TaskStatus.PENDING, TaskStatus.PROCESSING]:
             task_data['status'] = TaskStatus.CANCELLED
             task_data['completed_at'] = datetime.utcnow().isoformat()
-            await self._update_task_status(task_id, task_data)
+            await self._update_task_status(task_id, task_data, 'status', 'completed_at')
             
-            # Remove from queue
+            # Drop a scheduled retry; a queued entry is skipped when claimed
             redis = get_redis()
-            await redis.zrem("embedding_task_queue", task_id)
+            await redis.zrem(DELAYED_KEY, f"{TaskPriority(task_data['priority']).value}:{task_id}")
+            await self._delete_content(task_id)
             
             logger.info(f"Cancelled task {task_id}")
             return True
@@ -499,98 +984,148 @@ class EmbeddingTaskService:
     async def get_queue_status(self) -> Dict[str, Any]:
         """Get overall queue status and statistics
         
+        Reads a fixed number of keys in one round-trip regardless of how
+        many tasks exist. Finished tasks are counted for the last 24 hours.
+        
         Returns:
             Queue statistics
         """
-        # Get queue size
         redis = get_redis()
-        queue_size = await redis.zcard("embedding_task_queue")
-        
-        # Get task counts by status
-        all_tasks = await redis.keys("embedding_task:*")
-        status_counts = {
-            TaskStatus.PENDING: 0,
-            TaskStatus.PROCESSING: 0,
-            TaskStatus.COMPLETED: 0,
-            TaskStatus.FAILED: 0,
-            TaskStatus.CANCELLED: 0
-        }
+        await self._ensure_groups(redis)
+        hour = int(time.time() // 3600)
+        async with redis.pipeline(transaction=False) as pipe:
+            pipe.zcard(DELAYED_KEY)
+            for priority in PRIORITY_ORDER:
+                stream = self._stream_key(priority)
+                pipe.xlen(stream)
+                pipe.xpending(stream, CONSUMER_GROUP)
+            pipe.hgetall(STATUS_COUNTS_KEY)
+            for bucket in range(hour - TASK_TTL // 3600 + 1, hour + 1):
+                pipe.hgetall(self._status_bucket_key(bucket))
+            results = await pipe.execute()
         
-        for task_key in all_tasks:
-            task_data = await redis.get(task_key)
-            if task_data:
-                task = json.loads(task_data)
-                status = task.get('status')
+        # Entries are deleted once acknowledged, so a stream holds waiting
+        # entries plus the ones claimed by some consumer
+        queue_size = results[0]
+        in_flight = 0
+        for index in range(len(PRIORITY_ORDER)):
+            length, pending = results[1 + 2 * index], results[2 + 2 * index]['pending']
+            queue_size += length - pending
+            in_flight += pending
+        
+        status_counts = {status.value: 0 for status in TaskStatus}
+        for counts in results[1 + 2 * len(PRIORITY_ORDER):]:
+            for status, count in (counts or {}).items():
                 if status in status_counts:
-                    status_counts[status] += 1
+                    status_counts[status] += int(count)
+        status_counts = {status: max(count, 0) for status, count in status_counts.items()}
         
         return {
             'queue_size': queue_size,
             'status_counts': status_counts,
             'max_concurrent_tasks': self.max_concurrent_tasks,
-            'active_tasks': len(self.active_tasks)
+            'active_tasks': in_flight
         }
     
-    async def process_queue(self):
-        """Process tasks from the queue
+    async def process_queue(
+        self,
+        consumer: Optional[str] = None,
+        concurrency: Optional[int] = None,
+        stop_event: Optional[asyncio.Event] = None
+    ):
+        """Consume tasks until ``stop_event`` is set
         
-        This method should be called periodically or run in a background worker
+        Runs in worker processes (see ``workers.embedding_worker``). New
+        entries are only claimed while a slot is free; tasks still running
+        when the loop stops are awaited.
+        
+        Args:
+            consumer: Consumer name within the group; unique per process
+            concurrency: Tasks run at once; defaults to ``max_concurrent_tasks``
+            stop_event: Set to stop claiming new tasks
         """
-        while True:
-            try:
-                # Check if we can process more tasks
-                if len(self.active_tasks) >= self.max_concurrent_tasks:
-                    await asyncio.sleep(1)
-                    continue
-                
-                # Get highest priority task from queue
-                redis = get_redis()
-                tasks = await redis.zrevrange(
-                    "embedding_task_queue",
-                    0, 0,
-                    withscores=False
-                )
-                
-                if not tasks:
-                    await asyncio.sleep(5)  # No tasks, wait before checking again
+        consumer = consumer or self.consumer_name
+        concurrency = concurrency or self.max_concurrent_tasks
+        running = set()
+        
+        try:
+            purged = await self.purge_expired_payloads()
+            if purged:
+                logger.info(f"Purged content of {purged} expired embedding tasks")
+        except Exception as e:
+            logger.warning(f"Failed to purge expired task payloads: {e}")
+        
+        try:
+            while not (stop_event and stop_event.is_set()):
+                if len(running) >= concurrency:
+                    done, running = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        if not task.cancelled() and task.exception():
+                            logger.error(f"Embedding task entry failed: {task.exception()}")
                     continue
                 
-                task_id = tasks[0]
-                
-                # Remove from queue
-                await redis.zrem("embedding_task_queue", task_id)
-                
-                # Get task data
-                task_data = await self.get_task_status(task_id)
-                if not task_data:
+                await self._reconcile_if_due()
+                try:
+                    entries = await self.claim(consumer, block_ms=self.block_ms)
+                except Exception as e:
+                    logger.error(f"Error processing queue: {e}")
+                    await asyncio.sleep(1)
                     continue
                 
-                # Add to active tasks
-                self.active_tasks[task_id] = task_data
-                
-                # Process task
-                asyncio.create_task(self._process_and_cleanup(task_id, task_data))
-                
-            except Exception as e:
-                logger.error(f"Error processing queue: {e}")
-                await asyncio.sleep(5)
+                for entry in entries:
+                    running.add(asyncio.create_task(self.handle_entry(consumer, *entry)))
+        finally:
+            if running:
+                logger.info(f"Waiting for {len(running)} running embedding tasks")
+                await asyncio.gather(*running, return_exceptions=True)
     
-    async def _process_and_cleanup(
-        self,
-        task_id: str,
-        task_data: Dict[str, Any]
-    ):
-        """Process a task and cleanup when done
+    async def reconcile_status_counts(self) -> Dict[str, int]:
+        """Recount pending and processing tasks from the task records
         
-        Args:
-            task_id: Task identifier
-            task_data: Task data
+        Unfinished tasks are counted in a hash that never expires, so a task
+        record expiring before its task finishes, or an entry acknowledged
+        after its record is gone, would leave the count behind for good.
+        Transitions racing with the sweep are corrected by the next one.
+        
+        Returns:
+            The recounted unfinished status counts
         """
+        redis = get_redis()
+        counts = {status.value: 0 for status in TaskStatus if status not in FINISHED_STATUSES}
+        keys = []
+        
+        async def count(batch: List[str]):
+            async with redis.pipeline(transaction=False) as pipe:
+                for key in batch:
+                    pipe.hget(key, 'status')
+                for status in await pipe.execute():
+                    if status in counts:
+                        counts[status] += 1
+        
+        async for key in redis.scan_iter(match=f"{TASK_KEY_PREFIX}*", count=1000):
+            keys.append(key)
+            if len(keys) == 1000:
+                await count(keys)
+                keys = []
+        if keys:
+            await count(keys)
+        
+        await redis.hset(STATUS_COUNTS_KEY, mapping=counts)
+        return counts
+    
+    async def _reconcile_if_due(self):
+        """Recount unfinished tasks if no consumer did within the interval"""
+        now = time.monotonic()
+        if now < self._next_reconcile:
+            return
+        self._next_reconcile = now + self.reconcile_interval
         try:
-            await self._process_embedding_task(task_id, task_data)
-        finally:
-            # Remove from active tasks
-            self.active_tasks.pop(task_id, None)
+            redis = get_redis()
+            if await redis.set(STATUS_RECONCILE_KEY, self.consumer_name, nx=True, ex=int(self.reconcile_interval)):
+                counts = await self.reconcile_status_counts()
+                logger.info(f"Reconciled embedding task counts: {counts}")
+        except Exception as e:
+            logger.warning(f"Failed to reconcile embedding task counts: {e}")
     
     async def _send_progress_notification(
         self,
@@ -636,4 +1171,10 @@ class EmbeddingTaskService:
 
 
 # Singleton instance
-embedding_task_service = EmbeddingTaskService()
\ No newline at end of file
+embedding_task_service = EmbeddingTaskService(
+    max_concurrent_tasks=settings.EMBEDDING_WORKER_CONCURRENCY,
+    visibility_timeout=settings.EMBEDDING_TASK_VISIBILITY_TIMEOUT,
+    block_ms=settings.EMBEDDING_TASK_BLOCK_MS,
+    process_inline=settings.EMBEDDING_TASK_INLINE,
+    reconcile_interval=settings.EMBEDDING_TASK_RECONCILE_INTERVAL
+)
\ No newline at end of file
@@ -0,0 +1,587 @@
+"""Document Ingestion Pipeline
+
+Processes multi-file uploads as a staged pipeline instead of one file at a
+time:
+
+    persist document -> extract pages (process pool) -> chunk -> embed -> store
+
+Each stage has its own concurrency limit. Chunks from every file in a batch
+share one queue, so embedding requests are filled up to the provider batch
+size across file boundaries and written with a single COPY per batch.
+Per-file progress is kept in memory and mirrored to Redis under
+``ingestion_batch:{batch_id}``.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+from datetime import datetime
+from typing import List, Dict, Any, Optional
+from uuid import UUID, uuid4
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import settings
+from core.redis import get_redis
+from services.document_centroids import document_centroids
+from services.document_extractor import document_extractor, format_page, ExtractionError
+from services.embedding_service import embedding_service
+from services.near_duplicate import near_duplicate_index
+from services.pgvector_service import pgvector_service
+from services.text_chunker import total_tokens
+from services.upload_spool import discard_spool
+from services.vector_bulk_writer import embedding_bulk_writer
+
+logger = logging.getLogger(__name__)
+
+
+BATCH_KEY_PREFIX = "ingestion_batch:"
+BATCH_TTL = 86400  # 24 hours
+MAX_TRACKED_BATCHES = 1000
+
+
+class IngestionPipeline:
+    """Staged, concurrent ingestion of uploaded files"""
+
+    def __init__(
+        self,
+        extract_concurrency: int = 4,
+        persist_concurrency: int = 4,
+        embed_concurrency: int = 2,
+        embed_batch_size: int = 100,
+        embed_linger_ms: int = 50
+    ):
+        """Initialize the pipeline
+
+        Args:
+            extract_concurrency: Files parsed and chunked at once
+            persist_concurrency: Document rows written at once
+            embed_concurrency: Embedding requests in flight at once
+            embed_batch_size: Chunks per embedding request (across files)
+            embed_linger_ms: Time to wait for more chunks before sending a partial batch
+        """
+        self.extract_concurrency = extract_concurrency
+        self.persist_concurrency = persist_concurrency
+        self.embed_concurrency = embed_concurrency
+        self.embed_batch_size = embed_batch_size
+        self.embed_linger = embed_linger_ms / 1000
+        self.extractor = document_extractor
+        self.batches: Dict[str, Dict[str, Any]] = {}
+        self._tasks = set()
+
+    async def submit(
+        self,
+        user_id: UUID,
+        knowledge_base_id: UUID,
+        files: List[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """Start ingesting files in the background
+
+        Args:
+            user_id: Uploading user
+            knowledge_base_id: Target knowledge base
+            files: Dicts with ``filename``, ``file_ext``, ``content_type`` and
+                either ``content`` or a spooled ``path`` with its ``file_size``
+                and ``file_hash``; files with an ``error`` are recorded as
+                failed. Spool files are removed once processed.
+
+        Returns:
+            Batch status, including the ``batch_id`` to poll
+        """
+        batch = self._create_batch(user_id, knowledge_base_id, files)
+        await self._save(batch)
+
+        task = asyncio.create_task(self._run(batch, files))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+        return self._summary(batch)
+
+    async def run(
+        self,
+        user_id: UUID,
+        knowledge_base_id: UUID,
+        files: List[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """Ingest files and wait for the batch to finish"""
+        batch = self._create_batch(user_id, knowledge_base_id, files)
+        await self._run(batch, files)
+        return batch
+
+    async def get_batch_status(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        """Get batch progress from this process or Redis"""
+        batch = self.batches.get(batch_id)
+        if batch:
+            return self._summary(batch)
+
+        try:
+            data = await get_redis().get(f"{BATCH_KEY_PREFIX}{batch_id}")
+            return json.loads(data) if data else None
+        except Exception as e:
+            logger.error(f"Failed to load ingestion batch {batch_id}: {e}")
+            return None
+
+    def _create_batch(
+        self,
+        user_id: UUID,
+        knowledge_base_id: UUID,
+        files: List[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        # Finished batches stay readable from Redis once evicted here
+        if len(self.batches) >= MAX_TRACKED_BATCHES:
+            for old_id in [key for key, old in self.batches.items() if old['completed_at']]:
+                del self.batches[old_id]
+
+        batch_id = str(uuid4())
+        batch = {
+            'batch_id': batch_id,
+            'knowledge_base_id': str(knowledge_base_id),
+            'user_id': str(user_id),
+            'status': 'pending',
+            'created_at': datetime.utcnow().isoformat(),
+            'completed_at': None,
+            'files': [
+                {
+                    'index': index,
+                    'filename': file['filename'],
+                    'file_ext': file.get('file_ext'),
+                    'file_size': file.get('file_size') or len(file.get('content') or b''),
+                    'content_type': file.get('content_type'),
+                    'status': 'failed' if file.get('error') else 'queued',
+                    'document_id': None,
+                    'chunk_count': 0,
+                    'embedded_chunks': 0,
+                    'token_count': 0,
+                    'chunk_ids': [],
+                    'extracted': False,
+                    'error': file.get('error'),
+                    'started_at': None,
+                    'completed_at': None
+                }
+                for index, file in enumerate(files)
+            ]
+        }
+        self.batches[batch_id] = batch
+        return batch
+
+    async def _run(self, batch: Dict[str, Any], files: List[Dict[str, Any]]):
+        """Drive every file in a batch through the pipeline stages"""
+        batch['status'] = 'processing'
+        extract_slots = asyncio.Semaphore(self.extract_concurrency)
+        persist_slots = asyncio.Semaphore(self.persist_concurrency)
+        # Bounded so extraction pauses when embedding falls behind
+        chunk_queue: asyncio.Queue = asyncio.Queue(maxsize=self.embed_batch_size * self.embed_concurrency * 2)
+        seen_hashes = set()
+
+        embedders = [
+            asyncio.create_task(self._embed_worker(batch, chunk_queue))
+            for _ in range(self.embed_concurrency)
+        ]
+        try:
+            await asyncio.gather(*[
+                self._prepare_file(batch, state, file, extract_slots, persist_slots, chunk_queue, seen_hashes)
+                for state, file in zip(batch['files'], files)
+                if state['status'] == 'queued'
+            ])
+            for _ in embedders:
+                await chunk_queue.put(None)
+            await asyncio.gather(*embedders)
+        except Exception as e:
+            logger.error(f"Ingestion batch {batch['batch_id']} failed: {e}")
+            for worker in embedders:
+                worker.cancel()
+            for state in batch['files']:
+                if state['status'] not in ('completed', 'failed'):
+                    await self._fail_file(state, str(e))
+
+        await self._finish_batch(batch)
+
+    async def _prepare_file(
+        self,
+        batch: Dict[str, Any],
+        state: Dict[str, Any],
+        file: Dict[str, Any],
+        extract_slots: asyncio.Semaphore,
+        persist_slots: asyncio.Semaphore,
+        chunk_queue: asyncio.Queue,
+        seen_hashes: set
+    ):
+        """Persist one file, then extract and chunk it page by page
+
+        Chunks are queued for embedding as each page is parsed, so large
+        PDFs start embedding before their last page is read. Re-uploads of
+        the same file are rejected on its byte hash before anything is
+        embedded; ``_store_content`` catches the same text in another file.
+        """
+        try:
+            file_hash = file.get('file_hash') or hashlib.sha256(file['content']).hexdigest()
+            if file_hash in seen_hashes:
+                raise ExtractionError("Document with same content already exists", 409)
+            seen_hashes.add(file_hash)
+
+            async with persist_slots:
+                state['status'] = 'storing'
+                await self._create_document(batch, state, file_hash)
+
+            metadata = {
+                'title': state['filename'],
+                'source_type': 'file',
+                'document_id': state['document_id'],
+                'user_id': batch['user_id'],
+                'filename': state['filename'],
+                'file_type': state['file_ext'],
+                'uploaded_at': datetime.utcnow().isoformat()
+            }
+            pages = []
+            async with extract_slots:
+                state['status'] = 'extracting'
+                state['started_at'] = datetime.utcnow().isoformat()
+                async for page_number, page_text in self.extractor.iter_pages(
+                    file['filename'], file.get('content'), file['file_ext'], file.get('path')
+                ):
+                    page = format_page(page_number, page_text)
+                    pages.append(page)
+                    chunks = await asyncio.to_thread(pgvector_service._chunk_text, page)
+                    state['token_count'] += total_tokens(chunks)
+                    for chunk in chunks:
+                        index = state['chunk_count']
+                        state['chunk_count'] += 1
+                        chunk['metadata'] = {**metadata, 'chunk_index': index}
+                        if 'page' in chunk:
+                            chunk['metadata']['page'] = chunk['page']
+                        await chunk_queue.put((state, index, chunk))
+                # The raw upload is no longer needed
+                file['content'] = None
+                discard_spool(file.pop('path', None))
+
+            await self._store_content(batch, state, "\n".join(pages), seen_hashes)
+            state['extracted'] = True
+            if state['status'] == 'extracting':
+                state['status'] = 'embedding'
+                if state['embedded_chunks'] == state['chunk_count']:
+                    await self._complete_file(state)
+
+        except ExtractionError as e:
+            await self._fail_file(state, str(e))
+        except Exception as e:
+            logger.error(f"Failed to ingest {state['filename']}: {e}")
+            await self._fail_file(state, str(e))
+        finally:
+            discard_spool(file.pop('path', None))
+            await self._save(batch)
+
+    async def _create_document(
+        self,
+        batch: Dict[str, Any],
+        state: Dict[str, Any],
+        file_hash: str
+    ):
+        """Insert the document row in a short transaction
+
+        The hash of the uploaded bytes is kept in the metadata to reject
+        re-uploads early. Text and its hash are filled in by
+        ``_store_content`` once extraction finishes.
+
+        Raises:
+            ExtractionError: If the knowledge base already holds the file
+        """
+        document_id = uuid4()
+        now = datetime.utcnow()
+        metadata = {
+            'filename': state['filename'],
+            'file_type': state['file_ext'],
+            'file_size': state['file_size'],
+            'content_type': state['content_type'],
+            'file_hash': file_hash,
+            'batch_id': batch['batch_id']
+        }
+        async with pgvector_service.AsyncSessionLocal() as session:
+            existing = await session.execute(
+                text("""
+                    SELECT id FROM knowledge_documents
+                    WHERE knowledge_base_id = :kb_id AND metadata->>'file_hash' = :file_hash
+                """),
+                {'kb_id': UUID(batch['knowledge_base_id']), 'file_hash': file_hash}
+            )
+            if existing.fetchone():
+                raise ExtractionError("Document with same content already exists", 409)
+
+            await session.execute(
+                text("""
+                    INSERT INTO knowledge_documents (
+                        id, knowledge_base_id, uploader_id, title, source_type,
+                        content, file_hash, processing_status, chunk_count, token_count,
+                        metadata, created_at, updated_at
+                    ) VALUES (
+                        :id, :knowledge_base_id, :uploader_id, :title, 'file',
+                        '', NULL, 'processing', 0, 0,
+                        :metadata, :now, :now
+                    )
+                """),
+                {
+                    'id': document_id,
+                    'knowledge_base_id': UUID(batch['knowledge_base_id']),
+                    'uploader_id': UUID(batch['user_id']),
+                    'title': state['filename'],
+                    'metadata': json.dumps(metadata),
+                    'now': now
+                }
+            )
+            await session.commit()
+        state['document_id'] = str(document_id)
+
+    async def _embed_worker(self, batch: Dict[str, Any], chunk_queue: asyncio.Queue):
+        """Embed chunks in provider-sized batches that may span several files"""
+        loop = asyncio.get_running_loop()
+        done = False
+        while not done:
+            item = await chunk_queue.get()
+            if item is None:
+                break
+            items = [item]
+            deadline = loop.time() + self.embed_linger
+            while len(items) < self.embed_batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(chunk_queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    done = True
+                    break
+                items.append(item)
+
+            # Skip chunks of files that already failed
+            items = [(state, index, chunk) for state, index, chunk in items if state['status'] != 'failed']
+            if items:
+                await self._embed_items(batch, items)
+
+    async def _embed_items(self, batch: Dict[str, Any], items: List[tuple]):
+        """Embed and store one coalesced batch of chunks"""
+        try:
+            embeddings, duplicates = await near_duplicate_index.embed(
+                [chunk['content'] for _, _, chunk in items],
+                lambda texts: embedding_service.generate_embeddings_with_fallback(texts, user_id=batch['user_id']),
+                pgvector_service.AsyncSessionLocal,
+                UUID(batch['knowledge_base_id'])
+            )
+            records = []
+            for (state, index, chunk), embedding, duplicate in zip(items, embeddings, duplicates):
+                if duplicate:
+                    chunk['metadata']['near_duplicate_of'] = duplicate
+                records.append(embedding_bulk_writer.build_record(
+                    document_id=UUID(state['document_id']),
+                    knowledge_base_id=UUID(batch['knowledge_base_id']),
+                    chunk_index=index,
+                    content=chunk['content'],
+                    embedding=embedding,
+                    token_count=chunk['token_count'],
+                    metadata=chunk['metadata']
+                ))
+            async with pgvector_service.AsyncSessionLocal() as session:
+                chunk_ids = await embedding_bulk_writer.write(session, records)
+                await document_centroids.add_chunks(session, records)
+                await session.commit()
+        except Exception as e:
+            logger.error(f"Failed to embed {len(items)} chunks: {e}")
+            for state in {id(state): state for state, _, _ in items}.values():
+                await self._fail_file(state, f"Embedding failed: {e}")
+            return
+
+        # Files that failed while this batch was in flight already had their
+        # chunks discarded; remove the ones just written too
+        failed = {id(state): state for state, _, _ in items if state['status'] == 'failed'}
+        if failed:
+            try:
+                async with pgvector_service.AsyncSessionLocal() as session:
+                    for state in failed.values():
+                        await self._discard_chunks(session, state)
+                    await session.commit()
+            except Exception as e:
+                logger.error(f"Failed to discard chunks of failed files: {e}")
+
+        completed = []
+        for (state, _, _), chunk_id in zip(items, chunk_ids):
+            if state['status'] == 'failed':
+                continue
+            state['chunk_ids'].append(str(chunk_id))
+            state['embedded_chunks'] += 1
+            if state.get('extracted') and state['embedded_chunks'] == state['chunk_count']:
+                completed.append(state)
+        for state in completed:
+            await self._complete_file(state)
+        await self._save(batch)
+
+    async def _store_content(
+        self,
+        batch: Dict[str, Any],
+        state: Dict[str, Any],
+        content: str,
+        seen_hashes: set
+    ):
+        """Save the extracted text and its hash on the document row
+
+        The text is hashed the same way as ``upload_document_text`` so a file
+        and a text upload of the same content are duplicates. A duplicate is
+        failed through ``_fail_file``, which removes its chunks.
+
+        Raises:
+            ExtractionError: If the knowledge base already holds the content
+        """
+        content_hash = hashlib.sha256(content.encode()).hexdigest()
+        document_id = UUID(state['document_id'])
+        duplicate = content_hash in seen_hashes
+        seen_hashes.add(content_hash)
+        async with pgvector_service.AsyncSessionLocal() as session:
+            if not duplicate:
+                existing = await session.execute(
+                    text("""
+                        SELECT id FROM knowledge_documents
+                        WHERE knowledge_base_id = :kb_id AND file_hash = :hash AND id != :id
+                    """),
+                    {'kb_id': UUID(batch['knowledge_base_id']), 'hash': content_hash, 'id': document_id}
+                )
+                duplicate = existing.fetchone() is not None
+            if duplicate:
+                raise ExtractionError("Document with same content already exists", 409)
+
+            await session.execute(
+                text("""
+                    UPDATE knowledge_documents
+                    SET content = :content, file_hash = :hash, updated_at = :now
+                    WHERE id = :id
+                """),
+                {'id': document_id, 'content': content, 'hash': content_hash, 'now': datetime.utcnow()}
+            )
+            await session.commit()
+
+    async def _complete_file(self, state: Dict[str, Any]):
+        """Mark a file's document as completed"""
+        state['status'] = 'completed'
+        state['completed_at'] = datetime.utcnow().isoformat()
+        try:
+            async with pgvector_service.AsyncSessionLocal() as session:
+                await session.execute(
+                    text("""
+                        UPDATE knowledge_documents
+                        SET processing_status = 'completed',
+                            chunk_count = :chunk_count,
+                            token_count = :token_count,
+                            processed_at = :now,
+                            updated_at = :now
+                        WHERE id = :id
+                    """),
+                    {
+                        'id': UUID(state['document_id']),
+                        'chunk_count': state['chunk_count'],
+                        'token_count': state['token_count'],
+                        'now': datetime.utcnow()
+                    }
+                )
+                await session.commit()
+        except Exception as e:
+            logger.error(f"Failed to mark document {state['document_id']} completed: {e}")
+
+    async def _fail_file(self, state: Dict[str, Any], error: str):
+        """Record a file failure, discard its chunks and mark its document failed
+
+        The state is marked failed before any database call, so embedding
+        batches still in flight for the file discard what they write.
+        """
+        if state['status'] == 'failed':
+            return
+        state['status'] = 'failed'
+        state['error'] = error
+        state['completed_at'] = datetime.utcnow().isoformat()
+        if not state['document_id']:
+            return
+        try:
+            async with pgvector_service.AsyncSessionLocal() as session:
+                await self._discard_chunks(session, state)
+                await session.execute(
+                    text("""
+                        UPDATE knowledge_documents
+                        SET processing_status = 'failed', error_message = :error, updated_at = :now
+                        WHERE id = :id
+                    """),
+                    {'id': UUID(state['document_id']), 'error': error, 'now': datetime.utcnow()}
+                )
+                await session.commit()
+        except Exception as e:
+            logger.error(f"Failed to mark document {state['document_id']} failed: {e}")
+
+    async def _discard_chunks(self, session: AsyncSession, state: Dict[str, Any]):
+        """Delete the chunks and centroid written so far for a file"""
+        document_id = UUID(state['document_id'])
+        await session.execute(
+            text("DELETE FROM knowledge_embeddings WHERE document_id = :id"),
+            {'id': document_id}
+        )
+        await document_centroids.remove(session, [document_id])
+        state['chunk_ids'] = []
+
+    async def _finish_batch(self, batch: Dict[str, Any]):
+        """Refresh knowledge base totals once and record the batch outcome"""
+        statuses = [state['status'] for state in batch['files']]
+        if statuses and all(status == 'completed' for status in statuses):
+            batch['status'] = 'completed'
+        elif any(status == 'completed' for status in statuses):
+            batch['status'] = 'partial'
+        else:
+            batch['status'] = 'failed'
+        batch['completed_at'] = datetime.utcnow().isoformat()
+
+        if 'completed' in statuses:
+            from services.knowledge_service import knowledge_service
+            knowledge_base_id = UUID(batch['knowledge_base_id'])
+            async with pgvector_service.AsyncSessionLocal() as session:
+                await knowledge_service._update_knowledge_base_stats(session, knowledge_base_id)
+                await session.commit()
+            await pgvector_service.invalidate_semantic_cache([knowledge_base_id])
+
+        await self._save(batch)
+        logger.info(f"Ingestion batch {batch['batch_id']} {batch['status']}: {len(statuses)} files")
+
+    def _summary(self, batch: Dict[str, Any]) -> Dict[str, Any]:
+        """Batch status without per-chunk ids"""
+        files = [
+            {key: value for key, value in state.items() if key != 'chunk_ids'}
+            for state in batch['files']
+        ]
+        for state in files:
+            state['progress'] = (
+                100 if state['status'] == 'completed'
+                else int(state['embedded_chunks'] * 100 / state['chunk_count']) if state['chunk_count']
+                else 0
+            )
+        return {
+            **{key: value for key, value in batch.items() if key != 'files'},
+            'total_files': len(files),
+            'completed_files': sum(1 for state in files if state['status'] == 'completed'),
+            'failed_files': sum(1 for state in files if state['status'] == 'failed'),
+            'files': files
+        }
+
+    async def _save(self, batch: Dict[str, Any]):
+        """Mirror batch progress to Redis for other workers"""
+        try:
+            await get_redis().setex(
+                f"{BATCH_KEY_PREFIX}{batch['batch_id']}",
+                BATCH_TTL,
+                json.dumps(self._summary(batch))
+            )
+        except Exception as e:
+            logger.debug(f"Could not persist ingestion batch {batch['batch_id']}: {e}")
+
+
+# Global pipeline instance
+ingestion_pipeline = IngestionPipeline(
+    extract_concurrency=settings.INGESTION_EXTRACT_CONCURRENCY,
+    persist_concurrency=settings.INGESTION_PERSIST_CONCURRENCY,
+    embed_concurrency=settings.INGESTION_EMBED_CONCURRENCY,
+    embed_batch_size=settings.INGESTION_EMBED_BATCH_SIZE
+)
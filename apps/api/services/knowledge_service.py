@@ -6,45 +6,47 @@ Handles document processing, search, and collection management.
 """
 
 import os
+import json
+import base64
 import hashlib
 import mimetypes
 from typing import List, Dict, Any, Optional, Tuple
 from uuid import UUID, uuid4
 from datetime import datetime
-import logging
 from io import BytesIO
+import logging
 
+import numpy as np
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import and_, or_, func, text
 from sqlalchemy.orm import Session
 from fastapi import HTTPException, UploadFile
 
+from core.config import settings
 from models.user import User
 from services.pgvector_service import pgvector_service
+from services.document_centroids import document_centroids
+from services.text_chunker import total_tokens
+from services.search_analytics import search_analytics
+from services.document_extractor import document_extractor, ExtractionError
+from services.ingestion_pipeline import ingestion_pipeline
+from services.upload_spool import spool_upload, discard_spool, UploadTooLargeError
 from services.langchain_client import get_langchain_client
 
-# Document processing imports
-try:
-    import pypdf
-except ImportError:
-    pypdf = None
-
-try:
-    from docx import Document as DocxDocument
-except ImportError:
-    DocxDocument = None
-
-try:
-    import chardet
-except ImportError:
-    chardet = None
-
 # Import database models (we'll need to create these)
 # from models.knowledge import KnowledgeBase, KnowledgeDocument, KnowledgeEmbedding
 
 logger = logging.getLogger(__name__)
 
 
+# Columns returned by document listings; content is never loaded
+DOCUMENT_LIST_COLUMNS = (
+    "kd.id, kd.title, kd.source_type, kd.file_name, kd.file_type, kd.chunk_count, "
+    "kd.token_count, kd.processing_status, kd.created_at, kd.updated_at, kd.metadata"
+)
+DOCUMENT_SORT_COLUMNS = ("created_at", "updated_at", "title")
+
+
 class KnowledgeService:
     """Service for managing knowledge base operations"""
     
@@ -203,13 +205,23 @@ class KnowledgeService:
                 }
             }
             
+            # Chunk once; token counts come from the same pass
+            try:
+                chunks = pgvector_service._chunk_text(content)
+                for chunk in chunks:
+                    chunk["metadata"] = doc_data["metadata"]
+            except Exception as e:
+                logger.warning(f"Chunking failed, falling back to vector store chunking: {e}")
+                chunks = None
+            
             # Add to vector store (temporarily disabled for PGVector issue)
             try:
                 chunk_ids = await pgvector_service.add_documents(
                     [doc_data],
                     knowledge_base_id,
                     document_id,
-                    {"uploaded_at": datetime.utcnow().isoformat()}
+                    {"uploaded_at": datetime.utcnow().isoformat()},
+                    chunks=chunks
                 )
             except Exception as e:
                 logger.warning(f"PGVector unavailable, creating dummy chunk: {e}")
@@ -226,9 +238,9 @@ class KnowledgeService:
                 WHERE id = :id
             """)
             
-            try:
-                token_count = pgvector_service._tiktoken_len(content)
-            except:
+            if chunks is not None:
+                token_count = total_tokens(chunks)
+            else:
                 # Simple token count fallback
                 token_count = len(content.split())
             
@@ -281,7 +293,13 @@ class KnowledgeService:
         knowledge_base_id: Optional[UUID],
         file: UploadFile
     ) -> Dict[str, Any]:
-        """Upload a file as a document"""
+        """Upload a file as a document
+        
+        The upload is streamed to a spool file, so it is never held in memory
+        whole. Duplicates are detected on the extracted text, the same as
+        text uploads.
+        """
+        spool = None
         try:
             # If no knowledge_base_id provided, create a default one or use user's default
             if not knowledge_base_id:
@@ -294,24 +312,21 @@ class KnowledgeService:
                     detail=f"File type {file_ext} not supported. Allowed: {', '.join(self.allowed_file_types)}"
                 )
             
-            # Read file content
-            content = await file.read()
-            
-            # Check file size
-            if len(content) > self.max_file_size:
-                raise HTTPException(
-                    status_code=413,
-                    detail=f"File size exceeds {self.max_file_size // (1024*1024)}MB limit"
-                )
+            # Stream to disk, enforcing the size limit while reading
+            try:
+                spool = await spool_upload(file, self.max_file_size)
+            except UploadTooLargeError as e:
+                raise HTTPException(status_code=413, detail=str(e))
             
             # Extract text based on file type
-            text_content = await self._extract_text_from_file(file.filename, content, file_ext)
+            text_content = await self._extract_text_from_file(file.filename, None, file_ext, path=spool['path'])
             
             # Process as text document with file metadata
             metadata = {
                 "filename": file.filename,
                 "file_type": file_ext,
-                "file_size": len(content),
+                "file_size": spool['file_size'],
+                "file_hash": spool['file_hash'],
                 "content_type": file.content_type
             }
             
@@ -333,6 +348,9 @@ class KnowledgeService:
         except Exception as e:
             logger.error(f"Failed to upload file: {str(e)}")
             raise HTTPException(status_code=500, detail=f"Failed to process file: {str(e)}")
+        finally:
+            if spool:
+                discard_spool(spool['path'])
     
     async def upload_document_files(
         self,
@@ -341,56 +359,101 @@ class KnowledgeService:
         knowledge_base_id: Optional[UUID],
         files: List[UploadFile]
     ) -> List[Dict[str, Any]]:
-        """Upload multiple files as documents"""
-        results = []
+        """Upload multiple files as documents
         
+        Files go through the ingestion pipeline concurrently; the call returns
+        once every file has finished.
+        """
         # If no knowledge_base_id provided, create a default one or use user's default
-        if not knowledge_base_id:
+        if knowledge_base_id:
+            await self._verify_knowledge_base_access(db, knowledge_base_id, user)
+        else:
             knowledge_base_id = await self._get_or_create_default_kb(db, user)
         
-        for file in files:
-            try:
-                # Process each file individually
-                result = await self.upload_document_file(
-                    db=db,
-                    user=user,
-                    knowledge_base_id=knowledge_base_id,
-                    file=file
-                )
-                results.append(result)
-            except HTTPException as e:
-                # Include failed file in results with error information
-                results.append({
-                    "document_id": None,
-                    "chunk_ids": [],
-                    "chunk_count": 0,
-                    "token_count": 0,
-                    "processing_time_ms": 0,
-                    "status": "failed",
-                    "file_info": {
-                        "filename": file.filename,
-                        "error": e.detail
-                    }
-                })
-                logger.error(f"Failed to upload file {file.filename}: {e.detail}")
-            except Exception as e:
-                # Include failed file in results with error information
-                results.append({
-                    "document_id": None,
-                    "chunk_ids": [],
-                    "chunk_count": 0,
-                    "token_count": 0,
-                    "processing_time_ms": 0,
-                    "status": "failed",
-                    "file_info": {
-                        "filename": file.filename,
-                        "error": str(e)
-                    }
-                })
-                logger.error(f"Failed to upload file {file.filename}: {str(e)}")
+        payloads = [await self._read_upload(file) for file in files]
+        batch = await ingestion_pipeline.run(user.id, knowledge_base_id, payloads)
+        
+        results = []
+        for state in batch['files']:
+            file_info = {
+                "filename": state['filename'],
+                "file_type": state['file_ext'],
+                "file_size": state['file_size'],
+                "content_type": state['content_type']
+            }
+            if state['status'] == 'failed':
+                file_info = {"filename": state['filename'], "error": state['error']}
+                logger.error(f"Failed to upload file {state['filename']}: {state['error']}")
+            
+            processing_time = 0
+            if state['started_at'] and state['completed_at']:
+                processing_time = (
+                    datetime.fromisoformat(state['completed_at']) - datetime.fromisoformat(state['started_at'])
+                ).total_seconds() * 1000
+            
+            results.append({
+                "document_id": state['document_id'] if state['status'] == 'completed' else None,
+                "chunk_ids": state['chunk_ids'] if state['status'] == 'completed' else [],
+                "chunk_count": state['chunk_count'] if state['status'] == 'completed' else 0,
+                "token_count": state['token_count'] if state['status'] == 'completed' else 0,
+                "processing_time_ms": processing_time,
+                "status": state['status'],
+                "file_info": file_info
+            })
         
         return results
     
+    async def submit_document_files(
+        self,
+        db: AsyncSession,
+        user: User,
+        knowledge_base_id: Optional[UUID],
+        files: List[UploadFile]
+    ) -> Dict[str, Any]:
+        """Queue multiple files for ingestion and return without waiting
+        
+        Returns:
+            Batch status with the ``batch_id`` to poll for per-file progress
+        """
+        if knowledge_base_id:
+            await self._verify_knowledge_base_access(db, knowledge_base_id, user)
+        else:
+            knowledge_base_id = await self._get_or_create_default_kb(db, user)
+        
+        payloads = [await self._read_upload(file) for file in files]
+        return await ingestion_pipeline.submit(user.id, knowledge_base_id, payloads)
+    
+    async def get_upload_batch_status(self, user: User, batch_id: str) -> Dict[str, Any]:
+        """Get per-file progress of an upload batch"""
+        batch = await ingestion_pipeline.get_batch_status(batch_id)
+        if not batch or batch['user_id'] != str(user.id):
+            raise HTTPException(status_code=404, detail="Upload batch not found")
+        return batch
+    
+    async def _read_upload(self, file: UploadFile) -> Dict[str, Any]:
+        """Spool and validate an uploaded file for the ingestion pipeline
+        
+        The file is streamed to a spool file that the pipeline removes once
+        extracted. Validation failures are returned as an ``error`` so the
+        rest of the batch still runs.
+        """
+        file_ext = '.' + file.filename.split('.')[-1].lower()
+        payload = {
+            "filename": file.filename,
+            "file_ext": file_ext,
+            "content_type": file.content_type,
+            "content": None
+        }
+        if file_ext.replace('.', '') not in self.allowed_file_types:
+            payload["error"] = f"File type {file_ext} not supported. Allowed: {', '.join(self.allowed_file_types)}"
+            return payload
+        
+        try:
+            payload.update(await spool_upload(file, self.max_file_size))
+        except UploadTooLargeError as e:
+            payload["error"] = str(e)
+        return payload
+    
     async def list_documents(
         self,
         db: AsyncSession,
@@ -402,71 +465,94 @@ class KnowledgeService:
         sort_order: str = "desc",
         search: Optional[str] = None,
         source_type: Optional[str] = None,
-        status: Optional[str] = None
+        status: Optional[str] = None,
+        cursor: Optional[str] = None
     ) -> Dict[str, Any]:
-        """List documents in a knowledge base"""
+        """List documents in a knowledge base
+        
+        Only metadata columns are read. Pages are fetched by keyset on
+        (sort column, id): pass the returned ``next_cursor`` to get the
+        following page. ``page`` without a cursor still works but pays for
+        OFFSET and a total count, so it is meant for shallow pages only.
+        
+        ``search`` matches title substrings (trigram index) and content
+        words (full-text index).
+        """
+        if sort_by not in DOCUMENT_SORT_COLUMNS:
+            raise HTTPException(status_code=400, detail=f"Invalid sort field: {sort_by}")
+        if sort_order.lower() not in ("asc", "desc"):
+            raise HTTPException(status_code=400, detail=f"Invalid sort order: {sort_order}")
+        descending = sort_order.lower() == "desc"
+        
         try:
-            # Build query based on whether knowledge_base_id is provided
             if knowledge_base_id:
                 # Verify access to specific knowledge base
                 await self._verify_knowledge_base_access(db, knowledge_base_id, user)
-                # Build query for specific knowledge base
-                query = text("SELECT * FROM knowledge_documents WHERE knowledge_base_id = :kb_id")
+                from_clause = "knowledge_documents kd"
+                conditions = ["kd.knowledge_base_id = :kb_id"]
                 params = {"kb_id": str(knowledge_base_id)}
             else:
                 # List all documents user has access to
-                query = text("""
-                    SELECT kd.* FROM knowledge_documents kd
-                    JOIN knowledge_bases kb ON kd.knowledge_base_id = kb.id
-                    WHERE kb.creator_id = :user_id OR kb.is_public = true
-                """)
+                from_clause = "knowledge_documents kd JOIN knowledge_bases kb ON kd.knowledge_base_id = kb.id"
+                conditions = ["(kb.creator_id = :user_id OR kb.is_public = true)"]
                 params = {"user_id": str(user.id)}
             
-            # Add filters - we need to rebuild query with conditions
-            conditions = []
             if search:
-                conditions.append("(title ILIKE :search OR content ILIKE :search)")
+                conditions.append(
+                    "(kd.title ILIKE :search OR kd.content_tsv @@ plainto_tsquery('english', :search_query))"
+                )
                 params["search"] = f"%{search}%"
+                params["search_query"] = search
             
             if source_type:
-                conditions.append("source_type = :source_type")
+                conditions.append("kd.source_type = :source_type")
                 params["source_type"] = source_type
             
             if status:
-                conditions.append("processing_status = :status")
+                conditions.append("kd.processing_status = :status")
                 params["status"] = status
             
-            # Rebuild query with conditions
-            if conditions:
-                base_query = query.text if hasattr(query, 'text') else str(query)
-                base_query += " AND " + " AND ".join(conditions)
-                query = text(base_query)
-            
-            # Get total count
-            count_query_text = str(query).replace("SELECT *", "SELECT COUNT(*)")
-            if "kd.*" in count_query_text:
-                count_query_text = count_query_text.replace("SELECT kd.*", "SELECT COUNT(*)")
-            count_query = text(count_query_text)
-            count_result = await db.execute(count_query, params)
-            total = count_result.scalar()
-            
-            # Add sorting and pagination
-            final_query = text(str(query) + f" ORDER BY {sort_by} {sort_order} LIMIT :limit OFFSET :offset")
-            params.update({"limit": limit, "offset": (page - 1) * limit})
-            
-            # Execute query
-            result = await db.execute(final_query, params)
-            documents = []
+            total = None
+            if cursor:
+                cursor_value, cursor_id = self._decode_list_cursor(cursor, sort_by)
+                conditions.append(
+                    f"(kd.{sort_by}, kd.id) {'<' if descending else '>'} (:cursor_value, :cursor_id)"
+                )
+                params.update({"cursor_value": cursor_value, "cursor_id": cursor_id})
+                offset = 0
+            else:
+                count_result = await db.execute(
+                    text(f"SELECT COUNT(*) FROM {from_clause} WHERE {' AND '.join(conditions)}"), params
+                )
+                total = count_result.scalar()
+                offset = (page - 1) * limit
+            
+            direction = "DESC" if descending else "ASC"
+            # One extra row tells whether another page exists
+            result = await db.execute(
+                text(f"""
+                    SELECT {DOCUMENT_LIST_COLUMNS}
+                    FROM {from_clause}
+                    WHERE {' AND '.join(conditions)}
+                    ORDER BY kd.{sort_by} {direction}, kd.id {direction}
+                    LIMIT :limit OFFSET :offset
+                """),
+                {**params, "limit": limit + 1, "offset": offset}
+            )
+            rows = result.fetchall()
+            has_more = len(rows) > limit
+            rows = rows[:limit]
             
-            for row in result:
+            documents = []
+            for row in rows:
                 documents.append({
                     "id": str(row.id),
                     "title": row.title,
                     "source_type": row.source_type,
-                    "file_name": getattr(row, 'file_name', None),
-                    "file_type": getattr(row, 'file_type', None),
-                    "chunk_count": getattr(row, 'chunk_count', 0),
-                    "token_count": getattr(row, 'token_count', 0),
+                    "file_name": row.file_name,
+                    "file_type": row.file_type,
+                    "chunk_count": row.chunk_count or 0,
+                    "token_count": row.token_count or 0,
                     "processing_status": row.processing_status,
                     "created_at": row.created_at,
                     "updated_at": row.updated_at,
@@ -476,10 +562,12 @@ class KnowledgeService:
             return {
                 "documents": documents,
                 "pagination": {
-                    "page": page,
+                    "page": page if not cursor else None,
                     "limit": limit,
                     "total": total,
-                    "total_pages": (total + limit - 1) // limit
+                    "total_pages": (total + limit - 1) // limit if total is not None else None,
+                    "has_more": has_more,
+                    "next_cursor": self._encode_list_cursor(rows[-1], sort_by) if has_more else None
                 }
             }
             
@@ -489,6 +577,29 @@ class KnowledgeService:
             logger.error(f"Failed to list documents: {str(e)}")
             raise HTTPException(status_code=500, detail=f"Failed to list documents: {str(e)}")
     
+    @staticmethod
+    def _encode_list_cursor(row, sort_by: str) -> str:
+        """Opaque cursor pointing just past ``row`` in the listing order"""
+        value = getattr(row, sort_by)
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        payload = json.dumps([sort_by, value, str(row.id)]).encode()
+        return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+    
+    @staticmethod
+    def _decode_list_cursor(cursor: str, sort_by: str) -> Tuple[Any, UUID]:
+        """Decode a listing cursor into (sort value, document id)"""
+        try:
+            payload = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+            cursor_sort, value, document_id = json.loads(payload)
+            if cursor_sort != sort_by:
+                raise ValueError("cursor was issued for a different sort field")
+            if sort_by != "title":
+                value = datetime.fromisoformat(value)
+            return value, UUID(document_id)
+        except (ValueError, TypeError) as e:
+            raise HTTPException(status_code=400, detail=f"Invalid cursor: {e}")
+    
     async def get_document_details(
         self,
         db: AsyncSession,
@@ -641,15 +752,6 @@ class KnowledgeService:
                 logger.info(f"Filtering by document_id: {document_id}")
                 # Also verify the document belongs to the user or is accessible
                 await self._verify_document_access(db, document_id, user)
-                
-                # Check if document has embeddings
-                check_query = text("""
-                    SELECT COUNT(*) FROM knowledge_embeddings 
-                    WHERE document_id = :doc_id
-                """)
-                result = await db.execute(check_query, {"doc_id": str(document_id)})
-                embedding_count = result.scalar()
-                logger.warning(f"Document {document_id} has {embedding_count} embeddings")
             
             # If knowledge base specified, verify access
             if knowledge_base_id:
@@ -671,9 +773,7 @@ class KnowledgeService:
                     results = await pgvector_service.hybrid_search(
                         query,
                         knowledge_base_id,
-                        k,
-                        keyword_weight=0.3,
-                        semantic_weight=0.7
+                        k
                     )
                 else:
                     # Keyword search - implement if needed
@@ -686,33 +786,7 @@ class KnowledgeService:
             # Format results
             search_results = []
             for doc, score in results:
-                # Get document title from metadata or database
-                # Handle both dict and object formats
-                if isinstance(doc, dict):
-                    page_content = doc.get('page_content', '')
-                    metadata = doc.get('metadata', {})
-                else:
-                    page_content = getattr(doc, 'page_content', '')
-                    metadata = getattr(doc, 'metadata', {})
-                
-                doc_id = metadata.get('document_id')
-                title = metadata.get('title', 'Unknown')
-                
-                if doc_id:
-                    title_query = text("SELECT title FROM knowledge_documents WHERE id = :doc_id")
-                    title_result = await db.execute(title_query, {"doc_id": doc_id})
-                    title_row = title_result.fetchone()
-                    if title_row:
-                        title = title_row.title
-                
-                search_results.append({
-                    "content": page_content,
-                    "score": score,
-                    "document_id": UUID(doc_id) if doc_id else None,
-                    "document_title": title,
-                    "chunk_index": metadata.get('chunk_index', 0),
-                    "metadata": metadata
-                })
+                search_results.append(self._format_search_result(doc, score))
             
             execution_time = (datetime.utcnow() - start_time).total_seconds() * 1000
             
@@ -733,6 +807,88 @@ class KnowledgeService:
             logger.error(f"Search failed: {str(e)}")
             raise HTTPException(status_code=500, detail=f"Search failed: {str(e)}")
     
+    async def multi_knowledge_base_search(
+        self,
+        db: AsyncSession,
+        user: User,
+        query: str,
+        knowledge_base_ids: List[UUID],
+        k: int = 5,
+        score_threshold: float = 0.7
+    ) -> Dict[str, Any]:
+        """Perform semantic search across several knowledge bases at once
+        
+        The query is embedded once and a single similarity query ranks chunks
+        from all accessible knowledge bases; the top ``k`` are returned.
+        Knowledge bases the user cannot access are skipped.
+        """
+        start_time = datetime.utcnow()
+        
+        accessible_ids = await self._get_accessible_knowledge_base_ids(db, knowledge_base_ids, user)
+        
+        search_results = []
+        if accessible_ids:
+            try:
+                results = await pgvector_service.search_similar_multi(
+                    query,
+                    accessible_ids,
+                    k,
+                    score_threshold
+                )
+            except Exception as e:
+                logger.warning(f"PGVector search unavailable, using fallback: {e}")
+                results = []
+                for kb_id in accessible_ids:
+                    results.extend(await self._fallback_text_search(db, query, kb_id, k, user))
+                results = sorted(results, key=lambda item: item[1], reverse=True)[:k]
+            
+            for doc, score in results:
+                search_results.append(self._format_search_result(doc, score))
+        
+        execution_time = (datetime.utcnow() - start_time).total_seconds() * 1000
+        
+        # Log search for analytics, one entry per knowledge base searched
+        for kb_id in accessible_ids:
+            kb_results = sum(1 for result in search_results if str(result["knowledge_base_id"]) == str(kb_id))
+            await self._log_search(db, user, kb_id, query, kb_results, "semantic")
+        
+        return {
+            "query": query,
+            "results": search_results,
+            "search_type": "semantic",
+            "knowledge_base_ids": accessible_ids,
+            "execution_time_ms": execution_time,
+            "total_results": len(search_results)
+        }
+    
+    @staticmethod
+    def _format_search_result(doc: Any, score: float) -> Dict[str, Any]:
+        """Format a (document, score) search hit for API responses
+        
+        Vector search hits already carry the joined document title; fallback
+        text search hits are objects with the title and knowledge base in
+        their metadata.
+        """
+        if isinstance(doc, dict):
+            page_content = doc.get('page_content', '')
+            metadata = doc.get('metadata', {})
+        else:
+            page_content = getattr(doc, 'page_content', '')
+            metadata = getattr(doc, 'metadata', {})
+            doc = {}
+        
+        doc_id = doc.get('document_id') or metadata.get('document_id')
+        kb_id = doc.get('knowledge_base_id') or metadata.get('knowledge_base_id')
+        return {
+            "content": page_content,
+            "score": score,
+            "document_id": UUID(str(doc_id)) if doc_id else None,
+            "document_title": doc.get('document_title') or metadata.get('title', 'Unknown'),
+            "knowledge_base_id": UUID(str(kb_id)) if kb_id else None,
+            "chunk_index": metadata.get('chunk_index', 0),
+            "metadata": metadata
+        }
+    
     async def rag_query(
         self,
         db: AsyncSession,
@@ -782,8 +938,10 @@ class KnowledgeService:
                     "execution_time_ms": 0
                 }
             
+            hits = [self._format_search_result(doc, score) for doc, score in search_results[:k]]
+            
             # Build context from search results
-            context = "\n\n".join([doc.page_content for doc, _ in search_results[:k]])
+            context = "\n\n".join([hit["content"] for hit in hits])
             
             # Prepare prompt
             if not system_prompt:
@@ -812,22 +970,12 @@ class KnowledgeService:
             # Prepare sources if requested
             sources = []
             if include_sources:
-                for doc, score in search_results[:k]:
-                    doc_id = doc.metadata.get('document_id')
-                    title = doc.metadata.get('title', 'Unknown')
-                    
-                    if doc_id:
-                        title_query = text("SELECT title FROM knowledge_documents WHERE id = :doc_id")
-                        title_result = await db.execute(title_query, {"doc_id": doc_id})
-                        title_row = title_result.fetchone()
-                        if title_row:
-                            title = title_row.title
-                    
+                for hit in hits:
                     sources.append({
-                        "document_id": UUID(doc_id) if doc_id else None,
-                        "title": title,
-                        "content": doc.page_content,
-                        "score": score
+                        "document_id": hit["document_id"],
+                        "title": hit["document_title"],
+                        "content": hit["content"],
+                        "score": hit["score"]
                     })
             
             execution_time = (datetime.utcnow() - start_time).total_seconds() * 1000
@@ -851,89 +999,94 @@ class KnowledgeService:
         self,
         db: AsyncSession,
         user: User,
-        document_id: UUID
+        document_id: UUID,
+        limit: int = 100,
+        after: Optional[int] = None,
+        include_preview: bool = True
     ) -> Dict[str, Any]:
-        """Get all embeddings for a specific document"""
+        """Get one page of a document's chunks
+        
+        Vectors are never loaded into the application: the preview (the
+        first ``EMBEDDING_PREVIEW_SIZE`` values) is sliced in SQL, or left
+        out entirely when ``include_preview`` is False.
+        
+        Args:
+            db: Database session
+            user: Requesting user
+            document_id: Document to inspect
+            limit: Chunks per page
+            after: ``next_after`` of the previous page; chunks with a higher
+                chunk index are returned
+            include_preview: Include the leading vector values
+        """
         try:
-            # Get document info
-            doc_query = text("""
-                SELECT d.*, kb.is_public, kb.creator_id, kb.embedding_model, kb.embedding_dimensions
-                FROM knowledge_documents d
-                JOIN knowledge_bases kb ON d.knowledge_base_id = kb.id
-                WHERE d.id = :doc_id
-            """)
-            
-            doc_result = await db.execute(doc_query, {"doc_id": str(document_id)})
-            doc = doc_result.fetchone()
+            doc = await self._get_embedding_document(db, user, document_id)
             
-            if not doc:
-                raise HTTPException(status_code=404, detail="Document not found")
+            totals_result = await db.execute(
+                text("""
+                    SELECT COUNT(*) AS chunk_count, COALESCE(SUM(token_count), 0) AS token_count
+                    FROM knowledge_embeddings
+                    WHERE document_id = :doc_id
+                """),
+                {"doc_id": str(document_id)}
+            )
+            totals = totals_result.fetchone()
             
-            # Check access (simplified without organization)
-            if not doc.is_public and str(user.id) != str(doc.creator_id):
-                raise HTTPException(status_code=403, detail="Access denied")
-            
-            # Get embeddings with metadata
-            embed_query = text("""
-                SELECT 
-                    id as chunk_id,
-                    chunk_index,
-                    content as chunk_text,
-                    embedding,
-                    token_count,
-                    created_at
-                FROM knowledge_embeddings
-                WHERE document_id = :doc_id
-                ORDER BY chunk_index ASC
-            """)
+            if not totals.chunk_count:
+                raise HTTPException(status_code=404, detail="No embeddings found for this document")
             
-            embed_result = await db.execute(embed_query, {"doc_id": str(document_id)})
+            params = {"doc_id": str(document_id), "limit": limit + 1}
+            conditions = ["document_id = :doc_id"]
+            if after is not None:
+                conditions.append("chunk_index > :after")
+                params["after"] = after
+            preview_column = ""
+            if include_preview:
+                preview_column = ", (embedding::real[])[1:CAST(:preview_size AS int)] AS embedding_preview"
+                params["preview_size"] = settings.EMBEDDING_PREVIEW_SIZE
+            
+            embed_result = await db.execute(
+                text(f"""
+                    SELECT 
+                        id as chunk_id,
+                        chunk_index,
+                        content as chunk_text,
+                        token_count,
+                        created_at{preview_column}
+                    FROM knowledge_embeddings
+                    WHERE {" AND ".join(conditions)}
+                    ORDER BY chunk_index ASC
+                    LIMIT :limit
+                """),
+                params
+            )
             embeddings = embed_result.fetchall()
+            has_more = len(embeddings) > limit
+            embeddings = embeddings[:limit]
             
-            if not embeddings:
-                raise HTTPException(status_code=404, detail="No embeddings found for this document")
-            
-            # Format embeddings
-            chunks = []
-            total_tokens = 0
-            for embed in embeddings:
-                # Get first 10 values of embedding vector for preview
-                embedding_preview = []
-                if embed.embedding:
-                    # Handle different embedding storage formats
-                    if isinstance(embed.embedding, str):
-                        # If stored as string, parse it
-                        import json
-                        try:
-                            embedding_list = json.loads(embed.embedding)
-                            embedding_preview = embedding_list[:10] if len(embedding_list) >= 10 else embedding_list
-                        except:
-                            embedding_preview = []
-                    elif isinstance(embed.embedding, list):
-                        embedding_preview = embed.embedding[:10]
-                    else:
-                        # For pgvector format, convert to list
-                        embedding_preview = list(embed.embedding)[:10] if embed.embedding else []
-                
-                chunks.append({
+            chunks = [
+                {
                     "chunk_id": str(embed.chunk_id),
                     "chunk_index": embed.chunk_index,
                     "chunk_text": embed.chunk_text,
                     "token_count": embed.token_count or 0,
-                    "embedding_preview": embedding_preview,
+                    "embedding_preview": list(embed.embedding_preview or []) if include_preview else None,
                     "embedding_dimensions": doc.embedding_dimensions or 1536,
                     "created_at": embed.created_at
-                })
-                total_tokens += embed.token_count or 0
+                }
+                for embed in embeddings
+            ]
             
             return {
                 "document_id": document_id,
                 "title": doc.title,
-                "total_chunks": len(chunks),
-                "total_tokens": total_tokens,
+                "total_chunks": totals.chunk_count,
+                "total_tokens": totals.token_count,
                 "embedding_model": doc.embedding_model or "text-embedding-3-small",
                 "embedding_dimensions": doc.embedding_dimensions or 1536,
                 "chunks": chunks,
+                "has_more": has_more,
+                "next_after": embeddings[-1].chunk_index if has_more else None,
                 "metadata": doc.metadata
             }
             
@@ -943,84 +1096,184 @@ class KnowledgeService:
             logger.error(f"Failed to get document embeddings: {str(e)}")
             raise HTTPException(status_code=500, detail=f"Failed to get embeddings: {str(e)}")
     
-    async def find_similar_documents(
+    async def export_document_embeddings(
         self,
         db: AsyncSession,
         user: User,
         document_id: UUID,
-        k: int = 5,
-        score_threshold: float = 0.5
+        export_format: str = "npy"
     ) -> Dict[str, Any]:
-        """Find documents similar to a given document"""
+        """Stream a document's full vectors as float32 for offline analysis
+        
+        Row ``i`` of the export is the chunk with the ``i``-th lowest chunk
+        index. ``npy`` streams a NumPy ``.npy`` file (shape rows x dimensions);
+        ``f32`` streams the same little-endian float32 values without a header.
+        Chunks are read in batches inside one REPEATABLE READ transaction, so
+        the row count sent up front matches the rows streamed.
+        
+        Returns:
+            Dict with ``stream`` (async byte iterator), ``rows``, ``dimensions``
+            and ``filename``
+        """
+        if export_format not in ("npy", "f32"):
+            raise HTTPException(status_code=400, detail=f"Invalid export format: {export_format}")
+        doc = await self._get_embedding_document(db, user, document_id)
+        
+        batch_size = settings.EMBEDDING_EXPORT_BATCH_SIZE
+        session = pgvector_service.AsyncSessionLocal()
         try:
-            # Get reference document
-            doc_query = text("""
-                SELECT d.*, kb.is_public, kb.creator_id
+            await session.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+            count_result = await session.execute(
+                text("SELECT COUNT(*) FROM knowledge_embeddings WHERE document_id = :doc_id"),
+                {"doc_id": str(document_id)}
+            )
+            rows = count_result.scalar() or 0
+            if not rows:
+                raise HTTPException(status_code=404, detail="No embeddings found for this document")
+            first_batch = await self._embedding_batch(session, document_id, None, batch_size)
+        except BaseException:
+            await session.close()
+            raise
+        dimensions = len(first_batch[0].embedding)
+        
+        async def stream():
+            try:
+                if export_format == "npy":
+                    header = BytesIO()
+                    np.lib.format.write_array_header_1_0(
+                        header, {'descr': '<f4', 'fortran_order': False, 'shape': (rows, dimensions)}
+                    )
+                    yield header.getvalue()
+                batch = first_batch
+                while batch:
+                    yield np.asarray([row.embedding for row in batch], dtype='<f4').tobytes()
+                    if len(batch) < batch_size:
+                        break
+                    batch = await self._embedding_batch(session, document_id, batch[-1].chunk_index, batch_size)
+            finally:
+                await session.close()
+        
+        return {
+            "stream": stream(),
+            "rows": rows,
+            "dimensions": dimensions,
+            "filename": f"{document_id}.{export_format}"
+        }
+    
+    @staticmethod
+    async def _embedding_batch(session: AsyncSession, document_id: UUID, after: Optional[int], batch_size: int):
+        """Next batch of (chunk_index, embedding as float4[]) rows for an export"""
+        result = await session.execute(
+            text("""
+                SELECT chunk_index, embedding::real[] AS embedding
+                FROM knowledge_embeddings
+                WHERE document_id = :doc_id AND chunk_index > :after
+                ORDER BY chunk_index ASC
+                LIMIT :limit
+            """),
+            {"doc_id": str(document_id), "after": -1 if after is None else after, "limit": batch_size}
+        )
+        return result.fetchall()
+    
+    async def _get_embedding_document(self, db: AsyncSession, user: User, document_id: UUID):
+        """Document row with its knowledge base's embedding settings, access checked"""
+        doc_result = await db.execute(
+            text("""
+                SELECT d.id, d.title, d.metadata, kb.is_public, kb.creator_id,
+                       kb.embedding_model, kb.embedding_dimensions
                 FROM knowledge_documents d
                 JOIN knowledge_bases kb ON d.knowledge_base_id = kb.id
                 WHERE d.id = :doc_id
-            """)
-            
-            ref_doc_result = await db.execute(doc_query, {"doc_id": str(document_id)})
-            ref_doc = ref_doc_result.fetchone()
-            
-            if not ref_doc:
-                raise HTTPException(status_code=404, detail="Reference document not found")
-            
-            # Check access (simplified without organization)
-            if not ref_doc.is_public and str(user.id) != str(ref_doc.creator_id):
-                raise HTTPException(status_code=403, detail="Access denied")
-            
-            # Get document embeddings
-            embed_query = text("""
-                SELECT content FROM knowledge_embeddings
-                WHERE document_id = :doc_id
-                LIMIT 1
-            """)
-            
-            embed_result = await db.execute(embed_query, {"doc_id": str(document_id)})
-            embed_result = embed_result.fetchone()
-            
-            if not embed_result:
-                raise HTTPException(status_code=404, detail="Document has no embeddings")
-            
-            # Search for similar documents
-            results = await pgvector_service.search_similar(
-                embed_result.content,
-                ref_doc.knowledge_base_id,
-                k + 5,  # Get extra to exclude self
-                score_threshold,
-                {}  # No filters, we'll filter in Python
+            """),
+            {"doc_id": str(document_id)}
+        )
+        doc = doc_result.fetchone()
+        
+        if not doc:
+            raise HTTPException(status_code=404, detail="Document not found")
+        
+        # Check access (simplified without organization)
+        if not doc.is_public and str(user.id) != str(doc.creator_id):
+            raise HTTPException(status_code=403, detail="Access denied")
+        return doc
+    
+    async def find_similar_documents(
+        self,
+        db: AsyncSession,
+        user: User,
+        document_id: UUID,
+        k: int = 5,
+        score_threshold: float = 0.5
+    ) -> Dict[str, Any]:
+        """Find documents similar to a given document
+        
+        Ranks the documents of the same knowledge base by the cosine
+        similarity of their centroid embeddings to the reference document's,
+        with one ANN query and no embedding provider call.
+        """
+        results = await self.find_similar_documents_batch(db, user, [document_id], k, score_threshold)
+        return results[0]
+    
+    async def find_similar_documents_batch(
+        self,
+        db: AsyncSession,
+        user: User,
+        document_ids: List[UUID],
+        k: int = 5,
+        score_threshold: float = 0.5
+    ) -> List[Dict[str, Any]]:
+        """Find similar documents for several reference documents at once
+        
+        Returns:
+            One result per reference document, in input order, shaped like
+            ``find_similar_documents``
+        """
+        try:
+            document_ids = list(dict.fromkeys(document_ids))
+            ref_result = await db.execute(
+                text("""
+                    SELECT d.id, d.title, kb.is_public, kb.creator_id
+                    FROM knowledge_documents d
+                    JOIN knowledge_bases kb ON d.knowledge_base_id = kb.id
+                    WHERE d.id = ANY(:doc_ids)
+                """),
+                {"doc_ids": [str(document_id) for document_id in document_ids]}
             )
+            references = {str(row.id): row for row in ref_result.fetchall()}
+            
+            for document_id in document_ids:
+                ref_doc = references.get(str(document_id))
+                if not ref_doc:
+                    raise HTTPException(status_code=404, detail=f"Reference document {document_id} not found")
+                # Check access (simplified without organization)
+                if not ref_doc.is_public and str(user.id) != str(ref_doc.creator_id):
+                    raise HTTPException(status_code=403, detail="Access denied")
             
-            # Format results
-            similar_docs = []
-            for doc, score in results:
-                if doc.metadata.get('document_id') != str(document_id):
-                    doc_id = doc.metadata.get('document_id')
-                    
-                    # Get document info
-                    info_query = text("SELECT title, metadata FROM knowledge_documents WHERE id = :doc_id")
-                    info_result = await db.execute(info_query, {"doc_id": doc_id})
-                    info_result = info_result.fetchone()
-                    
-                    if info_result:
-                        similar_docs.append({
-                            "id": UUID(doc_id),
-                            "title": info_result.title,
-                            "similarity_score": score,
-                            "chunk_overlap": 0,  # Calculate if needed
-                            "metadata": info_result.metadata
-                        })
+            similar = await document_centroids.find_similar_batch(db, document_ids, k, score_threshold)
             
-            return {
-                "reference_document": {
-                    "id": document_id,
-                    "title": ref_doc.title
-                },
-                "similar_documents": similar_docs[:k],
-                "total_found": len(similar_docs)
-            }
+            results = []
+            for document_id in document_ids:
+                similar_docs = similar.get(str(document_id))
+                if similar_docs is None:
+                    raise HTTPException(status_code=404, detail=f"Document {document_id} has no embeddings")
+                results.append({
+                    "reference_document": {
+                        "id": document_id,
+                        "title": references[str(document_id)].title
+                    },
+                    "similar_documents": [
+                        {
+                            "id": doc["id"],
+                            "title": doc["title"],
+                            "similarity_score": doc["similarity_score"],
+                            "chunk_overlap": 0,  # Calculate if needed
+                            "metadata": doc["metadata"]
+                        }
+                        for doc in similar_docs
+                    ],
+                    "total_found": len(similar_docs)
+                })
+            return results
             
         except HTTPException:
             raise
@@ -1056,6 +1309,31 @@ class KnowledgeService:
         
         return row
     
+    async def _get_accessible_knowledge_base_ids(
+        self,
+        db: AsyncSession,
+        knowledge_base_ids: List[UUID],
+        user: User
+    ) -> List[UUID]:
+        """Filter knowledge base IDs down to those the user can access"""
+        if not knowledge_base_ids:
+            return []
+        
+        query = text("""
+            SELECT id FROM knowledge_bases
+            WHERE id = ANY(:kb_ids) AND (
+                is_public = true OR
+                creator_id = :user_id
+            )
+        """)
+        
+        result = await db.execute(query, {
+            "kb_ids": [UUID(str(kb_id)) for kb_id in knowledge_base_ids],
+            "user_id": str(user.id)
+        })
+        
+        return [row.id for row in result.fetchall()]
+    
     async def _verify_document_access(
         self,
         db: AsyncSession,
@@ -1150,112 +1428,15 @@ class KnowledgeService:
     async def _extract_text_from_file(
         self,
         filename: str,
-        content: bytes,
-        file_ext: str
+        content: Optional[bytes],
+        file_ext: str,
+        path: Optional[str] = None
     ) -> str:
-        """Extract text from file content"""
-        if file_ext in ['.txt', '.md']:
-            # Try to detect encoding if chardet is available
-            if chardet:
-                try:
-                    detected_encoding = chardet.detect(content)
-                    encoding = detected_encoding.get('encoding', 'utf-8')
-                    return content.decode(encoding, errors='ignore')
-                except Exception:
-                    pass
-            return content.decode('utf-8', errors='ignore')
-        
-        elif file_ext == '.pdf':
-            if not pypdf:
-                raise HTTPException(
-                    status_code=500, 
-                    detail="PDF processing library not available. Please install pypdf."
-                )
-            
-            try:
-                # Create a BytesIO object from the content
-                pdf_file = BytesIO(content)
-                
-                # Read the PDF
-                pdf_reader = pypdf.PdfReader(pdf_file)
-                
-                # Extract text from all pages
-                text_content = ""
-                for page_num, page in enumerate(pdf_reader.pages):
-                    try:
-                        page_text = page.extract_text()
-                        if page_text.strip():
-                            text_content += f"\n--- Page {page_num + 1} ---\n"
-                            text_content += page_text.strip() + "\n"
-                    except Exception as e:
-                        logger.warning(f"Failed to extract text from page {page_num + 1}: {str(e)}")
-                        continue
-                
-                if not text_content.strip():
-                    raise HTTPException(
-                        status_code=422, 
-                        detail="No text content could be extracted from the PDF. The PDF might be image-based or corrupted."
-                    )
-                
-                return text_content.strip()
-            
-            except Exception as e:
-                logger.error(f"Failed to process PDF file: {str(e)}")
-                raise HTTPException(
-                    status_code=422,
-                    detail=f"Failed to process PDF file: {str(e)}"
-                )
-        
-        elif file_ext == '.docx':
-            if not DocxDocument:
-                raise HTTPException(
-                    status_code=500,
-                    detail="DOCX processing library not available. Please install python-docx."
-                )
-            
-            try:
-                # Create a BytesIO object from the content
-                docx_file = BytesIO(content)
-                
-                # Read the DOCX file
-                doc = DocxDocument(docx_file)
-                
-                # Extract text from all paragraphs
-                text_content = ""
-                for paragraph in doc.paragraphs:
-                    if paragraph.text.strip():
-                        text_content += paragraph.text.strip() + "\n\n"
-                
-                # Also extract text from tables
-                for table in doc.tables:
-                    for row in table.rows:
-                        row_text = []
-                        for cell in row.cells:
-                            if cell.text.strip():
-                                row_text.append(cell.text.strip())
-                        if row_text:
-                            text_content += " | ".join(row_text) + "\n"
-                    text_content += "\n"
-                
-                if not text_content.strip():
-                    raise HTTPException(
-                        status_code=422,
-                        detail="No text content could be extracted from the DOCX file."
-                    )
-                
-                return text_content.strip()
-                
-            except Exception as e:
-                logger.error(f"DOCX extraction failed for {filename}: {str(e)}")
-                if "No text content could be extracted" in str(e):
-                    raise
-                raise HTTPException(
-                    status_code=422,
-                    detail=f"Failed to extract text from DOCX: {str(e)}"
-                )
-        
-        else:
-            raise HTTPException(status_code=400, detail=f"Unsupported file type: {file_ext}")
+        """Extract text from file content, or a file on disk, in the extraction worker pool"""
+        try:
+            return await document_extractor.extract(filename, content, file_ext, path)
+        except ExtractionError as e:
+            raise HTTPException(status_code=e.status_code, detail=str(e))
     
     async def _update_knowledge_base_stats(self, db: AsyncSession, knowledge_base_id: UUID):
         """Update knowledge base statistics"""
@@ -1294,26 +1475,14 @@ class KnowledgeService:
         results_count: int,
         search_type: str
     ):
-        """Log search for analytics"""
-        try:
-            log_query = text("""
-                INSERT INTO knowledge_search_history (
-                    id, knowledge_base_id, user_id, query,
-                    results_count, search_type, created_at
-                ) VALUES (:id, :kb_id, :user_id, :query, :count, :type, :created_at)
-            """)
-            
-            await db.execute(log_query, {
-                "id": str(uuid4()),
-                "kb_id": str(knowledge_base_id) if knowledge_base_id else None,
-                "user_id": str(user.id),
-                "query": query,
-                "count": results_count,
-                "type": search_type,
-                "created_at": datetime.utcnow()
-            })
-        except Exception as e:
-            logger.error(f"Failed to log search: {str(e)}")
+        """Queue search for analytics (written in background batches)"""
+        search_analytics.record(
+            knowledge_base_id,
+            query,
+            results_count,
+            search_type=search_type,
+            user_id=user.id
+        )
     
     async def _fallback_text_search(
         self,
@@ -1327,7 +1496,7 @@ class KnowledgeService:
         try:
             # Build search query using PostgreSQL full-text search
             search_query = text("""
-                SELECT d.id, d.title, d.content, d.metadata, d.created_at,
+                SELECT d.id, d.knowledge_base_id, d.title, d.content, d.metadata, d.created_at,
                        ts_rank(to_tsvector('english', d.content), plainto_tsquery('english', :query)) as score
                 FROM knowledge_documents d
                 JOIN knowledge_bases kb ON d.knowledge_base_id = kb.id
@@ -1367,6 +1536,7 @@ class KnowledgeService:
                     'page_content': row.content,
                     'metadata': {
                         'document_id': str(row.id),
+                        'knowledge_base_id': str(row.knowledge_base_id),
                         'title': row.title,
                         'created_at': row.created_at
                     }
@@ -0,0 +1,326 @@
+"""Near-Duplicate Chunk Detection
+
+SimHash fingerprints over word shingles identify chunks that are nearly
+identical (re-exports of the same manual, boilerplate with a changed date)
+even when their bytes differ. Fingerprints are 64-bit and stored in
+``knowledge_embeddings.simhash``; near duplicates are found with a banded
+LSH lookup: the fingerprint is split into ``SIMHASH_BANDS`` 16-bit bands,
+and any two fingerprints within ``SIMHASH_BANDS - 1`` bits share at least
+one band exactly (pairs a few bits further apart usually do too). Each band
+has an expression index, so a lookup is one indexed query per embedding
+batch.
+
+At ingestion, chunks that nearly duplicate a stored chunk of the same
+knowledge base, or an earlier chunk of the same batch, reuse that chunk's
+embedding instead of calling a provider. Stored matches are linked through
+``near_duplicate_of`` chunk metadata. Lookups never leave the target
+knowledge base: the uploader can already read it, every chunk in it uses
+its embedding model, and no other tenant's chunk ids end up in metadata.
+Search can collapse near-duplicate results with ``collapse``.
+"""
+
+import zlib
+import string
+import asyncio
+import logging
+from typing import List, Dict, Any, Optional, Tuple, Callable, Awaitable
+from uuid import UUID
+
+import numpy as np
+from sqlalchemy import text
+
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+SIMHASH_BITS = 64
+SIMHASH_BANDS = 4
+BAND_BITS = SIMHASH_BITS // SIMHASH_BANDS
+BAND_MASK = (1 << BAND_BITS) - 1
+
+_PUNCTUATION = str.maketrans(string.punctuation, " " * len(string.punctuation))
+
+
+def _mix(values: np.ndarray) -> np.ndarray:
+    """splitmix64 finalizer, so every output bit depends on every input bit"""
+    values = (values ^ (values >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    values = (values ^ (values >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return values ^ (values >> np.uint64(31))
+
+
+def simhash(content: str, shingle_size: int = 3) -> int:
+    """64-bit SimHash of a text over word shingles
+
+    Each distinct word is hashed once (CRC-32, widened by a mixing step);
+    shingle hashes are combined from the word hashes with vectorized
+    arithmetic.
+
+    Returns:
+        Unsigned fingerprint; texts without words hash to 0, which is
+        never matched as a near duplicate
+    """
+    tokens = content.casefold().translate(_PUNCTUATION).split()
+    if not tokens:
+        return 0
+
+    vocabulary: Dict[str, int] = {}
+    token_ids = [vocabulary.setdefault(token, len(vocabulary)) for token in tokens]
+    word_hashes = _mix(np.array([zlib.crc32(word.encode('utf-8')) for word in vocabulary], dtype=np.uint64))
+    word_hashes = word_hashes[token_ids]
+
+    width = min(shingle_size, len(word_hashes))
+    count = len(word_hashes) - width + 1
+    with np.errstate(over='ignore'):
+        shingles = np.zeros(count, dtype=np.uint64)
+        for offset in range(width):
+            shingles = _mix(shingles ^ word_hashes[offset:offset + count])
+
+    bits = np.unpackbits(shingles.astype('<u8').view(np.uint8).reshape(-1, 8), axis=1, bitorder='little')
+    majority = bits.sum(axis=0) * 2 > count
+    return int(np.packbits(majority, bitorder='little').view('<u8')[0])
+
+
+def to_signed(fingerprint: int) -> int:
+    """Fingerprint as a signed 64-bit value for a BIGINT column"""
+    return fingerprint - (1 << SIMHASH_BITS) if fingerprint >= 1 << (SIMHASH_BITS - 1) else fingerprint
+
+
+def hamming_distance(a: int, b: int) -> int:
+    """Number of differing bits between two fingerprints"""
+    return bin((a ^ b) & ((1 << SIMHASH_BITS) - 1)).count("1")
+
+
+def bands(fingerprint: int) -> List[int]:
+    """Split a fingerprint into its LSH bands, most significant first"""
+    return [
+        (fingerprint >> (BAND_BITS * (SIMHASH_BANDS - 1 - band))) & BAND_MASK
+        for band in range(SIMHASH_BANDS)
+    ]
+
+
+def band_expression(band: int, column: str = "simhash") -> str:
+    """SQL expression for one band; matches the migration's index expressions"""
+    return f"(({column} >> {BAND_BITS * (SIMHASH_BANDS - 1 - band)}) & {BAND_MASK})"
+
+
+class SimHashLSH:
+    """In-memory banded LSH table over SimHash fingerprints"""
+
+    def __init__(self):
+        self.buckets: Dict[Tuple[int, int], List[Tuple[int, Any]]] = {}
+
+    def add(self, fingerprint: int, key: Any):
+        for band, value in enumerate(bands(fingerprint)):
+            self.buckets.setdefault((band, value), []).append((fingerprint, key))
+
+    def nearest(self, fingerprint: int, max_distance: int) -> Optional[Tuple[Any, int]]:
+        """Closest stored key within ``max_distance`` bits, as (key, distance)"""
+        best = None
+        for band, value in enumerate(bands(fingerprint)):
+            for candidate, key in self.buckets.get((band, value), ()):
+                distance = hamming_distance(fingerprint, candidate)
+                if distance <= max_distance and (best is None or distance < best[1]):
+                    best = (key, distance)
+        return best
+
+
+class NearDuplicateIndex:
+    """Finds near-duplicate chunks at ingestion and in search results"""
+
+    def __init__(
+        self,
+        enabled: bool = True,
+        max_distance: int = 6,
+        shingle_size: int = 3,
+        max_candidates: int = 5000
+    ):
+        """Initialize the index
+
+        Args:
+            enabled: Reuse embeddings of near-duplicate chunks at ingestion
+            max_distance: Largest Hamming distance treated as a near duplicate;
+                matches are guaranteed up to ``SIMHASH_BANDS - 1`` bits and
+                found with high probability beyond that
+            shingle_size: Words per shingle
+            max_candidates: Stored rows examined per lookup
+        """
+        self.enabled = enabled
+        self.max_distance = max_distance
+        self.shingle_size = shingle_size
+        self.max_candidates = max_candidates
+        self.stats = {'chunks': 0, 'stored_matches': 0, 'batch_matches': 0, 'lookup_errors': 0}
+
+    def fingerprint(self, content: str) -> int:
+        return simhash(content, self.shingle_size)
+
+    async def embed(
+        self,
+        contents: List[str],
+        embed: Callable[[List[str]], Awaitable[Tuple[List[List[float]], Dict[str, Any]]]],
+        session_factory: Callable,
+        knowledge_base_id: UUID
+    ) -> Tuple[List[List[float]], List[Optional[str]]]:
+        """Embed chunks, reusing embeddings of near duplicates
+
+        Args:
+            contents: Chunk texts
+            embed: Provider call returning ``(embeddings, metadata)``
+            session_factory: Async session factory for the stored-chunk lookup
+            knowledge_base_id: Knowledge base the chunks are written to; only
+                its stored chunks are candidates
+
+        Returns:
+            Embeddings aligned with ``contents`` and, per chunk, the id of the
+            stored chunk it duplicates (or None)
+        """
+        if not self.enabled or not contents:
+            embeddings, _ = await embed(contents)
+            return embeddings, [None] * len(contents)
+
+        fingerprints = await asyncio.to_thread(lambda: [self.fingerprint(content) for content in contents])
+        self.stats['chunks'] += len(contents)
+
+        # Near duplicates within the batch share one representative;
+        # chunks without words have no fingerprint to match on
+        batch_table = SimHashLSH()
+        representative = []
+        for index, fingerprint in enumerate(fingerprints):
+            if not fingerprint:
+                representative.append(index)
+                continue
+            match = batch_table.nearest(fingerprint, self.max_distance)
+            if match is None:
+                batch_table.add(fingerprint, index)
+                representative.append(index)
+            else:
+                representative.append(match[0])
+                self.stats['batch_matches'] += 1
+        leaders = [index for index, leader in enumerate(representative) if leader == index]
+
+        stored = await self._find_stored(
+            session_factory, knowledge_base_id,
+            {index: fingerprints[index] for index in leaders if fingerprints[index]}
+        )
+
+        embeddings: List[Optional[List[float]]] = [None] * len(contents)
+        links: List[Optional[str]] = [None] * len(contents)
+        for index, (chunk_id, embedding) in stored.items():
+            embeddings[index] = embedding
+            links[index] = chunk_id
+
+        missing = [index for index in leaders if index not in stored]
+        if missing:
+            vectors, _ = await embed([contents[index] for index in missing])
+            for index, vector in zip(missing, vectors):
+                embeddings[index] = vector
+
+        for index, leader in enumerate(representative):
+            if leader != index:
+                embeddings[index] = embeddings[leader]
+                links[index] = links[leader]
+        return embeddings, links
+
+    async def _find_stored(
+        self,
+        session_factory: Callable,
+        knowledge_base_id: UUID,
+        fingerprints: Dict[int, int]
+    ) -> Dict[int, Tuple[str, List[float]]]:
+        """Match fingerprints against a knowledge base's stored chunks with one banded lookup
+
+        Returns:
+            Map of input key to (chunk id, embedding) for matched fingerprints
+        """
+        if not fingerprints:
+            return {}
+
+        conditions = []
+        params: Dict[str, Any] = {'limit': self.max_candidates, 'kb_id': knowledge_base_id}
+        for band in range(SIMHASH_BANDS):
+            conditions.append(f"{band_expression(band)} = ANY(:band_{band})")
+            params[f'band_{band}'] = sorted({bands(fingerprint)[band] for fingerprint in fingerprints.values()})
+
+        try:
+            async with session_factory() as session:
+                result = await session.execute(
+                    text(f"""
+                        SELECT id, simhash FROM knowledge_embeddings
+                        WHERE knowledge_base_id = :kb_id
+                          AND simhash IS NOT NULL AND ({' OR '.join(conditions)})
+                        LIMIT :limit
+                    """),
+                    params
+                )
+                table = SimHashLSH()
+                for row in result.fetchall():
+                    if row.simhash:
+                        table.add(row.simhash & ((1 << SIMHASH_BITS) - 1), row.id)
+
+                matches = {}
+                for key, fingerprint in fingerprints.items():
+                    match = table.nearest(fingerprint, self.max_distance)
+                    if match is not None:
+                        matches[key] = match[0]
+                if not matches:
+                    return {}
+
+                result = await session.execute(
+                    text("""
+                        SELECT id, embedding::text AS embedding FROM knowledge_embeddings
+                        WHERE id = ANY(:ids) AND knowledge_base_id = :kb_id
+                    """),
+                    {'ids': list(set(matches.values())), 'kb_id': knowledge_base_id}
+                )
+                vectors = {row.id: [float(value) for value in row.embedding.strip("[]").split(",")]
+                           for row in result.fetchall()}
+        except Exception as e:
+            # Dedup is an optimization; fall back to embedding everything
+            self.stats['lookup_errors'] += 1
+            logger.warning(f"Near-duplicate lookup failed: {e}")
+            return {}
+
+        stored = {
+            key: (str(chunk_id), vectors[chunk_id])
+            for key, chunk_id in matches.items() if chunk_id in vectors
+        }
+        self.stats['stored_matches'] += len(stored)
+        return stored
+
+    def collapse(
+        self,
+        results: List[Tuple[Dict[str, Any], float]],
+        limit: Optional[int] = None
+    ) -> List[Tuple[Dict[str, Any], float]]:
+        """Drop search results that nearly duplicate a higher-ranked result
+
+        Args:
+            results: (document, score) pairs in rank order
+            limit: Maximum results to keep
+
+        Returns:
+            Results with near duplicates removed, in the original order
+        """
+        table = SimHashLSH()
+        kept = []
+        for document, score in results:
+            fingerprint = self.fingerprint(document.get('page_content') or "")
+            if fingerprint:
+                if table.nearest(fingerprint, self.max_distance) is not None:
+                    continue
+                table.add(fingerprint, len(kept))
+            kept.append((document, score))
+            if limit is not None and len(kept) >= limit:
+                break
+        return kept
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, 'enabled': self.enabled, 'max_distance': self.max_distance}
+
+
+# Global index instance
+near_duplicate_index = NearDuplicateIndex(
+    enabled=settings.NEAR_DUPLICATE_ENABLED,
+    max_distance=settings.NEAR_DUPLICATE_MAX_DISTANCE,
+    shingle_size=settings.NEAR_DUPLICATE_SHINGLE_SIZE
+)
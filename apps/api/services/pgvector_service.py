@@ -4,6 +4,7 @@ This service handles all vector database operations using PGVector extension.
 """
 
 import os
+import json
 import time
 import logging
 from typing import List, Dict, Any, Optional, Tuple
@@ -18,7 +19,6 @@ from sqlalchemy import create_engine, text, pool, select, and_
 from sqlalchemy.orm import sessionmaker, Session
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from pgvector.asyncpg import register_vector
-import tiktoken
 from openai import AsyncOpenAI
 from openai import RateLimitError, APIError, APITimeoutError
 
@@ -27,6 +27,13 @@ from core.database import get_db
 from core.security import SecurityManager
 from models.user import UserApiKey
 from services.embedding_service import embedding_service
+from services.embedding_cache import query_embedding_cache
+from services.vector_bulk_writer import embedding_bulk_writer, chunk_content_hash
+from services.document_centroids import document_centroids
+from services.text_chunker import get_chunker, get_encoding
+from services.vector_index_manager import VectorIndexManager
+from services.search_analytics import search_analytics
+from services.near_duplicate import near_duplicate_index
 
 logger = logging.getLogger(__name__)
 
@@ -44,8 +51,9 @@ class PGVectorService:
         self.database_url = settings.DATABASE_URL
         self.embedding_model = embedding_model
         self.embedding_dimensions = 1536  # text-embedding-3-small dimensions
-        self.chunk_size = 1000
-        self.chunk_overlap = 200
+        self.chunk_size = settings.CHUNK_SIZE_TOKENS
+        self.chunk_overlap = settings.CHUNK_OVERLAP_TOKENS
+        self.chunker = get_chunker(chunk_size=self.chunk_size, chunk_overlap=self.chunk_overlap)
         self.batch_size = min(batch_size, 100)  # OpenAI API max batch size is 100
         self.max_retries = 3
         self.retry_delay = 1.0  # Initial retry delay in seconds
@@ -87,19 +95,27 @@ class PGVectorService:
         )
         self.AsyncSessionLocal = async_sessionmaker(self.async_engine, class_=AsyncSession)
         
+        # ANN index management and per-query tuning
+        self.index_manager = VectorIndexManager(self.async_engine)
+        
+        # Fire-and-forget work kept off the request path (cache writes)
+        self._background_tasks = set()
+        self.max_background_tasks = 100
+        self._semantic_cache_writes = 0
+        
         # Performance metrics
         self.metrics = {
             'insert_times': [],
             'search_times': [],
             'total_vectors': 0,
             'cache_hits': 0,
-            'cache_misses': 0
+            'cache_misses': 0,
+            'background_dropped': 0
         }
     
     def _tiktoken_len(self, text: str) -> int:
         """Calculate token length using tiktoken"""
-        tokenizer = tiktoken.get_encoding("cl100k_base")
-        tokens = tokenizer.encode(text, disallowed_special=())
+        tokens = get_encoding("cl100k_base").encode(text, disallowed_special=())
         return len(tokens)
     
     def configure_embedding_settings(self, model: Optional[str] = None, batch_size: Optional[int] = None):
@@ -177,23 +193,36 @@ class PGVectorService:
         knowledge_base_id: UUID,
         document_id: UUID,
         metadata: Optional[Dict[str, Any]] = None,
-        user_id: Optional[UUID] = None
+        user_id: Optional[UUID] = None,
+        chunks: Optional[List[Dict[str, Any]]] = None
     ) -> List[UUID]:
-        """Add documents to PGVector with automatic chunking"""
+        """Add documents to PGVector with automatic chunking
+        
+        Args:
+            documents: Documents with ``content``/``page_content`` and optional metadata
+            knowledge_base_id: Target knowledge base
+            document_id: Owning document
+            metadata: Extra metadata merged into every chunk
+            user_id: User whose API key is used for embeddings
+            chunks: Chunks already produced by ``_chunk_text``; ``documents``
+                is not re-chunked when given
+        """
         start_time = time.time()
         chunk_ids = []
         
         try:
-            # Simple text chunking without langchain
-            chunks = []
-            for doc in documents:
-                content = doc.get('page_content', doc.get('content', ''))
-                doc_chunks = self._split_text(content)
-                for chunk in doc_chunks:
-                    chunks.append({
-                        'content': chunk,
-                        'metadata': {**doc.get('metadata', {}), **(metadata or {})}
-                    })
+            if chunks is None:
+                chunks = []
+                for doc in documents:
+                    content = doc.get('page_content', doc.get('content', ''))
+                    for chunk in self._chunk_text(content):
+                        chunk['metadata'] = {**doc.get('metadata', {}), **(metadata or {})}
+                        chunks.append(chunk)
+            else:
+                chunks = [
+                    {**chunk, 'metadata': {**chunk.get('metadata', {}), **(metadata or {})}}
+                    for chunk in chunks
+                ]
             
             # Generate embeddings in batches
             batch_size = 100
@@ -201,48 +230,37 @@ class PGVectorService:
                 batch = chunks[i:i + batch_size]
                 texts = [chunk['content'] for chunk in batch]
                 
-                # Generate embeddings using enhanced service with fallback
-                embeddings, metadata = await embedding_service.generate_embeddings_with_fallback(
-                    texts, 
-                    user_id=str(user_id) if user_id else None
+                # Near-duplicate chunks reuse stored embeddings; the rest go to
+                # the enhanced service with fallback
+                embeddings, duplicates = await near_duplicate_index.embed(
+                    texts, self._embedder(user_id), self.AsyncSessionLocal, knowledge_base_id
                 )
-                logger.info(f"Generated embeddings using {metadata.get('provider', 'unknown')} provider")
                 
-                # Store in PGVector
+                # Store in PGVector with a single binary COPY per batch
+                records = []
+                for j, (chunk, embedding) in enumerate(zip(batch, embeddings)):
+                    chunk_metadata = {
+                        **(chunk['metadata'] or {}),
+                        'chunk_index': i + j,
+                        'total_chunks': len(chunks)
+                    }
+                    if 'page' in chunk:
+                        chunk_metadata['page'] = chunk['page']
+                    if duplicates[j]:
+                        chunk_metadata['near_duplicate_of'] = duplicates[j]
+                    records.append(embedding_bulk_writer.build_record(
+                        document_id=document_id,
+                        knowledge_base_id=knowledge_base_id,
+                        chunk_index=i + j,
+                        content=chunk['content'],
+                        embedding=embedding,
+                        token_count=chunk['token_count'],
+                        metadata=chunk_metadata
+                    ))
+                
                 async with self.AsyncSessionLocal() as session:
-                    for j, (chunk, embedding) in enumerate(zip(batch, embeddings)):
-                        chunk_id = uuid4()
-                        chunk_metadata = {
-                            **(chunk['metadata'] or {}),
-                            'chunk_index': i + j,
-                            'total_chunks': len(chunks)
-                        }
-                        
-                        import json
-                        await session.execute(
-                            text("""
-                                INSERT INTO knowledge_embeddings 
-                                (id, document_id, knowledge_base_id, chunk_index, chunk_size, 
-                                 content, embedding, token_count, metadata, created_at, updated_at)
-                                VALUES (:id, :doc_id, :kb_id, :chunk_idx, :chunk_size,
-                                        :content, :embedding, :tokens, :metadata, :created_at, :updated_at)
-                            """),
-                            {
-                                'id': chunk_id,
-                                'doc_id': document_id,
-                                'kb_id': knowledge_base_id,
-                                'chunk_idx': i + j,
-                                'chunk_size': len(chunk['content']),
-                                'content': chunk['content'],
-                                'embedding': f"[{','.join(map(str, embedding))}]",  # Format as vector string
-                                'tokens': self._tiktoken_len(chunk['content']),
-                                'metadata': json.dumps(chunk_metadata) if chunk_metadata else None,
-                                'created_at': datetime.utcnow(),
-                                'updated_at': datetime.utcnow()
-                            }
-                        )
-                        chunk_ids.append(chunk_id)
-                    
+                    chunk_ids.extend(await embedding_bulk_writer.write(session, records))
+                    await document_centroids.add_chunks(session, records)
                     await session.commit()
             
             # Update metrics
@@ -256,28 +274,35 @@ class PGVectorService:
             # Update document status
             await self._update_document_status(document_id, 'completed', len(chunks))
             
+            # Cached search results for this knowledge base are now stale
+            await self.invalidate_semantic_cache([knowledge_base_id])
+            
             return chunk_ids
             
         except Exception as e:
             logger.error(f"Failed to add documents to PGVector: {e}")
             raise
     
-    def _split_text(self, text: str, chunk_size: int = None, chunk_overlap: int = None) -> List[str]:
-        """Simple text splitter without langchain"""
-        chunk_size = chunk_size or self.chunk_size
-        chunk_overlap = chunk_overlap or self.chunk_overlap
-        
-        chunks = []
-        start = 0
-        text_len = len(text)
-        
-        while start < text_len:
-            end = start + chunk_size
-            chunk = text[start:end]
-            chunks.append(chunk)
-            start = end - chunk_overlap
-            
-        return chunks
+    @staticmethod
+    def _embedder(user_id: Optional[UUID] = None):
+        """Provider call used for chunk embeddings on behalf of a user"""
+        async def embed(texts: List[str]):
+            embeddings, metadata = await embedding_service.generate_embeddings_with_fallback(
+                texts,
+                user_id=str(user_id) if user_id else None
+            )
+            logger.info(f"Generated embeddings using {metadata.get('provider', 'unknown')} provider")
+            return embeddings, metadata
+        return embed
+    
+    def _chunk_text(self, text: str) -> List[Dict[str, Any]]:
+        """Split text into token-budgeted chunks
+        
+        Returns:
+            Chunk dicts with ``content``, ``token_count``, ``overlap_tokens``,
+            ``chunk_index`` and, for paged documents, ``page``
+        """
+        return self.chunker.split(text)
     
     async def search_similar(
         self,
@@ -286,84 +311,100 @@ class PGVectorService:
         k: int = 5,
         score_threshold: float = 0.7,
         filters: Optional[Dict[str, Any]] = None,
-        user_id: Optional[UUID] = None
+        user_id: Optional[UUID] = None,
+        ef_search: Optional[int] = None,
+        probes: Optional[int] = None,
+        collapse_duplicates: bool = False
     ) -> List[Tuple[Dict, float]]:
-        """Search for similar documents using cosine similarity"""
+        """Search for similar documents using cosine similarity
+        
+        ``ef_search`` (HNSW) and ``probes`` (IVFFlat) trade latency for
+        recall on this query only; settings defaults apply when omitted.
+        With ``collapse_duplicates`` extra candidates are fetched and results
+        that nearly duplicate a higher-ranked result are dropped.
+        """
         start_time = time.time()
         
         try:
             logger.info(f"PgVector search_similar called - Query: '{query}', Filters: {filters}")
             
-            # Generate query embedding using enhanced service with fallback
-            embeddings, metadata = await embedding_service.generate_embeddings_with_fallback(
-                [query], 
-                user_id=str(user_id) if user_id else None
-            )
-            query_embedding = embeddings[0]
-            logger.info(f"Query embedding generated using {metadata.get('provider', 'unknown')} provider, embedding length: {len(query_embedding)}")
+            query_embedding = await self._embed_query(query, user_id)
             
             # Build filter conditions
             where_conditions = ["1=1"]
             params = {'embedding': f"[{','.join(map(str, query_embedding))}]", 'k': k}
+            if collapse_duplicates:
+                params['k'] = k * settings.NEAR_DUPLICATE_SEARCH_OVERFETCH
             
             if knowledge_base_id:
-                where_conditions.append("knowledge_base_id = :kb_id")
+                where_conditions.append("e.knowledge_base_id = :kb_id")
                 params['kb_id'] = knowledge_base_id
             
             if filters:
-                for key, value in filters.items():
+                for i, (key, value) in enumerate(filters.items()):
                     if key == 'document_id':
                         # Handle document_id filter directly on the column
-                        where_conditions.append("document_id = :document_id")
+                        where_conditions.append("e.document_id = :document_id")
                         params['document_id'] = value
                     else:
                         # Handle other filters as metadata
-                        where_conditions.append(f"metadata->>{key} = :{key}")
-                        params[key] = value
+                        where_conditions.append(f"e.metadata->>:filter_key_{i} = :filter_value_{i}")
+                        params[f'filter_key_{i}'] = key
+                        params[f'filter_value_{i}'] = str(value)
             
             where_clause = " AND ".join(where_conditions)
             
-            # Perform similarity search
+            # Result cache is scoped to a knowledge base and unfiltered searches
+            cacheable = (settings.SEMANTIC_CACHE_ENABLED and knowledge_base_id is not None
+                         and not filters and not collapse_duplicates)
+            
+            # Perform similarity search; titles are joined in the same query
             async with self.AsyncSessionLocal() as session:
-                # First check if there are any embeddings at all
-                count_query = text(f"""
-                    SELECT COUNT(*) FROM knowledge_embeddings WHERE {where_clause}
-                """)
-                count_params = {k: v for k, v in params.items() if k != 'embedding'}
-                count_result = await session.execute(count_query, count_params)
-                total_embeddings = count_result.scalar()
-                logger.warning(f"Total embeddings matching filters: {total_embeddings}")
+                await self.index_manager.apply_search_params(session, ef_search, probes)
                 
-                if total_embeddings == 0:
-                    logger.warning(f"No embeddings found for filters: {filters}")
-                    return []
+                if cacheable:
+                    generation, cached = await self._lookup_semantic_cache(
+                        session, knowledge_base_id, params['embedding'], k, score_threshold
+                    )
+                    if cached is not None:
+                        self.metrics['cache_hits'] += 1
+                        elapsed_time = time.time() - start_time
+                        self.metrics['search_times'].append(elapsed_time)
+                        await self._log_search_history(
+                            knowledge_base_id, query, query_embedding,
+                            len(cached), cached[0][1] if cached else None,
+                            elapsed_time * 1000,
+                            user_id
+                        )
+                        return cached
+                    self.metrics['cache_misses'] += 1
                 
                 result = await session.execute(
                     text(f"""
                         SELECT 
-                            id, content, metadata,
-                            1 - (embedding <=> :embedding) as similarity
-                        FROM knowledge_embeddings
+                            e.id, e.content, e.metadata, e.document_id, e.knowledge_base_id,
+                            d.title,
+                            1 - (e.embedding <=> :embedding) as similarity
+                        FROM knowledge_embeddings e
+                        JOIN knowledge_documents d ON d.id = e.document_id
                         WHERE {where_clause}
-                        ORDER BY embedding <=> :embedding
+                        ORDER BY e.embedding <=> :embedding
                         LIMIT :k
                     """),
                     params
                 )
-                logger.info(f"Executed similarity search query")
                 
-                results = []
                 rows = result.fetchall()
-                logger.info(f"Got {len(rows)} rows from database")
+                if not rows:
+                    logger.info(f"No embeddings found for filters: {filters}")
                 
+                results = []
                 for row in rows:
-                    logger.debug(f"Row similarity: {row[3]}, threshold: {score_threshold}")
-                    if row[3] >= score_threshold:
-                        doc = {
-                            'page_content': row[1],
-                            'metadata': row[2] or {}
-                        }
-                        results.append((doc, row[3]))
+                    if row.similarity >= score_threshold:
+                        results.append((self._row_to_document(row), row.similarity))
+                
+                if collapse_duplicates:
+                    results = near_duplicate_index.collapse(results, k)
                 
                 logger.info(f"Filtered to {len(results)} results above threshold {score_threshold}")
                 
@@ -371,18 +412,19 @@ class PGVectorService:
                 elapsed_time = time.time() - start_time
                 self.metrics['search_times'].append(elapsed_time)
                 
-                # Cache frequently asked questions
-                if len(results) > 0 and results[0][1] > 0.95:
-                    await self._update_semantic_cache(query, query_embedding, results[0][0])
-                    self.metrics['cache_hits'] += 1
-                else:
-                    self.metrics['cache_misses'] += 1
+                # Cache the result set without delaying the response
+                if cacheable and generation is not None:
+                    self._run_in_background(self._store_semantic_cache(
+                        knowledge_base_id, generation, query, params['embedding'],
+                        results, k, score_threshold
+                    ))
                 
                 # Log search history
                 await self._log_search_history(
                     knowledge_base_id, query, query_embedding, 
                     len(results), results[0][1] if results else None,
-                    elapsed_time * 1000
+                    elapsed_time * 1000,
+                    user_id
                 )
                 
                 return results
@@ -391,68 +433,226 @@ class PGVectorService:
             logger.error(f"PGVector search failed: {e}")
             raise
     
+    async def search_similar_multi(
+        self,
+        query: str,
+        knowledge_base_ids: List[UUID],
+        k: int = 5,
+        score_threshold: float = 0.7,
+        user_id: Optional[UUID] = None,
+        ef_search: Optional[int] = None,
+        probes: Optional[int] = None
+    ) -> List[Tuple[Dict, float]]:
+        """Search several knowledge bases with one embedding and one query
+        
+        Results are ranked globally across all knowledge bases.
+        
+        Args:
+            query: Search text
+            knowledge_base_ids: Knowledge bases to search
+            k: Number of results across all knowledge bases
+            score_threshold: Minimum cosine similarity
+            user_id: User whose API key is used for the query embedding
+            ef_search: HNSW candidate list size for this query
+            probes: IVFFlat lists scanned for this query
+            
+        Returns:
+            List of (document, similarity) tuples; documents carry
+            ``document_id``, ``knowledge_base_id`` and ``document_title``
+        """
+        if not knowledge_base_ids:
+            return []
+        
+        start_time = time.time()
+        
+        try:
+            query_embedding = await self._embed_query(query, user_id)
+            
+            async with self.AsyncSessionLocal() as session:
+                await self.index_manager.apply_search_params(session, ef_search, probes)
+                result = await session.execute(
+                    text("""
+                        SELECT 
+                            e.id, e.content, e.metadata, e.document_id, e.knowledge_base_id,
+                            d.title,
+                            1 - (e.embedding <=> :embedding) as similarity
+                        FROM knowledge_embeddings e
+                        JOIN knowledge_documents d ON d.id = e.document_id
+                        WHERE e.knowledge_base_id = ANY(:kb_ids)
+                        ORDER BY e.embedding <=> :embedding
+                        LIMIT :k
+                    """),
+                    {
+                        'embedding': f"[{','.join(map(str, query_embedding))}]",
+                        'kb_ids': [UUID(str(kb_id)) for kb_id in knowledge_base_ids],
+                        'k': k
+                    }
+                )
+                
+                results = []
+                for row in result.fetchall():
+                    if row.similarity >= score_threshold:
+                        results.append((self._row_to_document(row), row.similarity))
+            
+            elapsed_time = time.time() - start_time
+            self.metrics['search_times'].append(elapsed_time)
+            logger.info(f"Multi-KB search over {len(knowledge_base_ids)} knowledge bases returned "
+                        f"{len(results)} results in {elapsed_time:.3f}s")
+            
+            return results
+            
+        except Exception as e:
+            logger.error(f"PGVector multi-KB search failed: {e}")
+            raise
+    
+    @staticmethod
+    def _row_to_document(row) -> Dict[str, Any]:
+        """Build a search result document from a chunk row joined with its title"""
+        return {
+            'page_content': row.content,
+            'metadata': row.metadata or {},
+            'document_id': row.document_id,
+            'knowledge_base_id': row.knowledge_base_id,
+            'document_title': row.title
+        }
+    
+    @staticmethod
+    def _cached_document(doc: Dict[str, Any]) -> Dict[str, Any]:
+        """Restore the UUID fields a cached result document lost to JSON"""
+        for key in ('document_id', 'knowledge_base_id'):
+            if doc.get(key) is not None:
+                doc[key] = UUID(doc[key])
+        return doc
+    
+    async def _embed_query(self, query: str, user_id: Optional[UUID] = None) -> List[float]:
+        """Generate the embedding for a search query
+        
+        Repeated queries are served from the per-process query embedding
+        cache; only embeddings produced by this service's model are cached.
+        """
+        cached = query_embedding_cache.get(self.embedding_model, query)
+        if cached is not None:
+            return cached
+        
+        embeddings, metadata = await embedding_service.generate_embeddings_with_fallback(
+            [query], 
+            user_id=str(user_id) if user_id else None
+        )
+        logger.info(f"Query embedding generated using {metadata.get('provider', 'unknown')} provider, embedding length: {len(embeddings[0])}")
+        
+        if metadata.get('model') == self.embedding_model:
+            query_embedding_cache.put(self.embedding_model, query, embeddings[0])
+        return embeddings[0]
+    
     async def hybrid_search(
         self,
         query: str,
         knowledge_base_id: Optional[UUID] = None,
         k: int = 5,
-        keyword_weight: float = 0.3,
-        semantic_weight: float = 0.7,
-        user_id: Optional[UUID] = None
+        keyword_weight: Optional[float] = None,
+        semantic_weight: Optional[float] = None,
+        user_id: Optional[UUID] = None,
+        candidate_pool: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        collapse_duplicates: bool = False
     ) -> List[Tuple[Dict, float]]:
-        """Perform hybrid search combining keyword and semantic search"""
-        # Semantic search
-        semantic_results = await self.search_similar(query, knowledge_base_id, k * 2, user_id=user_id)
+        """Perform hybrid search fusing semantic and keyword rankings
         
-        # Keyword search using PostgreSQL full-text search
-        async with self.AsyncSessionLocal() as session:
-            keyword_query = text("""
-                SELECT id, content, metadata,
-                       ts_rank(to_tsvector('english', content), 
-                              plainto_tsquery('english', :query)) as rank
-                FROM knowledge_embeddings
-                WHERE to_tsvector('english', content) @@ plainto_tsquery('english', :query)
-                AND (:kb_id IS NULL OR knowledge_base_id = :kb_id)
-                ORDER BY rank DESC
-                LIMIT :k
-            """)
+        Vector and full-text candidates are ranked in CTEs and combined with
+        weighted reciprocal rank fusion (RRF) by chunk id in a single statement.
+        
+        Args:
+            query: Search query
+            knowledge_base_id: Knowledge base to search (all when None)
+            k: Number of results
+            keyword_weight: RRF weight of the full-text ranking
+            semantic_weight: RRF weight of the vector ranking
+            user_id: User ID for API key lookup
+            candidate_pool: Candidates taken from each ranking before fusion
+            ef_search: HNSW candidate list size override
+            collapse_duplicates: Drop results that nearly duplicate a
+                higher-ranked result
             
-            result = await session.execute(
-                keyword_query,
-                {'query': query, 'kb_id': knowledge_base_id, 'k': k * 2}
+        Returns:
+            List of (document, score) tuples; a chunk ranked first by both
+            rankings scores 1.0
+        """
+        keyword_weight = settings.HYBRID_SEARCH_KEYWORD_WEIGHT if keyword_weight is None else keyword_weight
+        semantic_weight = settings.HYBRID_SEARCH_SEMANTIC_WEIGHT if semantic_weight is None else semantic_weight
+        candidate_pool = max(candidate_pool or settings.HYBRID_SEARCH_CANDIDATE_POOL, k)
+        rrf_k = settings.HYBRID_SEARCH_RRF_K
+        
+        query_embedding = await self._embed_query(query, user_id)
+        
+        kb_condition = ""
+        params = {
+            'embedding': '[' + ','.join(map(str, query_embedding)) + ']',
+            'query': query,
+            'pool': candidate_pool,
+            'k': k * settings.NEAR_DUPLICATE_SEARCH_OVERFETCH if collapse_duplicates else k,
+            'rrf_k': rrf_k,
+            'semantic_weight': semantic_weight,
+            'keyword_weight': keyword_weight
+        }
+        if knowledge_base_id:
+            kb_condition = "AND e.knowledge_base_id = :kb_id"
+            params['kb_id'] = knowledge_base_id
+        
+        hybrid_query = text(f"""
+            WITH semantic AS (
+                SELECT id, ROW_NUMBER() OVER (ORDER BY distance) AS rank
+                FROM (
+                    SELECT e.id, e.embedding <=> :embedding AS distance
+                    FROM knowledge_embeddings e
+                    WHERE TRUE {kb_condition}
+                    ORDER BY distance
+                    LIMIT :pool
+                ) candidates
+            ),
+            keyword AS (
+                SELECT id, ROW_NUMBER() OVER (ORDER BY text_rank DESC) AS rank
+                FROM (
+                    SELECT e.id, ts_rank_cd(e.content_tsv, q) AS text_rank
+                    FROM knowledge_embeddings e, plainto_tsquery('english', :query) q
+                    WHERE e.content_tsv @@ q {kb_condition}
+                    ORDER BY text_rank DESC
+                    LIMIT :pool
+                ) candidates
+            ),
+            fused AS (
+                -- Binds are cast so Postgres does not infer integers from the ranks
+                SELECT COALESCE(s.id, kw.id) AS id,
+                       COALESCE(CAST(:semantic_weight AS double precision)
+                                / (CAST(:rrf_k AS double precision) + s.rank), 0)
+                     + COALESCE(CAST(:keyword_weight AS double precision)
+                                / (CAST(:rrf_k AS double precision) + kw.rank), 0) AS score
+                FROM semantic s
+                FULL OUTER JOIN keyword kw ON kw.id = s.id
+                ORDER BY score DESC
+                LIMIT :k
             )
-            
-            keyword_results = []
-            for row in result.fetchall():
-                doc = {'page_content': row[1], 'metadata': row[2] or {}}
-                keyword_results.append((doc, float(row[3])))
-        
-        # Combine and rerank results
-        combined_scores = {}
-        for doc, score in semantic_results:
-            key = doc['page_content'][:100]  # Use first 100 chars as key
-            combined_scores[key] = combined_scores.get(key, 0) + score * semantic_weight
-        
-        for doc, score in keyword_results:
-            key = doc['page_content'][:100]
-            if key not in combined_scores:
-                combined_scores[key] = 0
-            # Normalize keyword score to 0-1 range
-            normalized_score = min(score * 10, 1.0)
-            combined_scores[key] += normalized_score * keyword_weight
-        
-        # Sort by combined score and return top k
-        sorted_results = sorted(combined_scores.items(), key=lambda x: x[1], reverse=True)
-        
-        final_results = []
-        for content_key, score in sorted_results[:k]:
-            # Find the original document
-            for doc, _ in semantic_results + keyword_results:
-                if doc['page_content'][:100] == content_key:
-                    final_results.append((doc, score))
-                    break
-        
-        return final_results
+            SELECT e.id, e.content, e.metadata, e.document_id, e.knowledge_base_id,
+                   d.title, f.score
+            FROM fused f
+            JOIN knowledge_embeddings e ON e.id = f.id
+            JOIN knowledge_documents d ON d.id = e.document_id
+            ORDER BY f.score DESC
+        """)
+        
+        # HNSW returns at most ef_search rows, so the pool needs a matching candidate list
+        ef_search = ef_search or max(candidate_pool, settings.VECTOR_HNSW_EF_SEARCH or 0)
+        
+        async with self.AsyncSessionLocal() as session:
+            await self.index_manager.apply_search_params(session, ef_search=ef_search)
+            result = await session.execute(hybrid_query, params)
+            rows = result.fetchall()
+        
+        # Scale so the best possible fused score is 1.0
+        max_score = (semantic_weight + keyword_weight) / (rrf_k + 1) or 1.0
+        results = [(self._row_to_document(row), float(row.score) / max_score) for row in rows]
+        if collapse_duplicates:
+            results = near_duplicate_index.collapse(results, k)
+        return results
     
     async def delete_documents(
         self,
@@ -465,11 +665,16 @@ class PGVectorService:
                     text("""
                         DELETE FROM knowledge_embeddings 
                         WHERE document_id = ANY(:doc_ids)
-                        RETURNING id
+                        RETURNING id, knowledge_base_id
                     """),
                     {'doc_ids': document_ids}
                 )
-                deleted_count = len(result.fetchall())
+                rows = result.fetchall()
+                deleted_count = len(rows)
+                await document_centroids.remove(session, document_ids)
+                await self.invalidate_semantic_cache(
+                    list({row.knowledge_base_id for row in rows}), session
+                )
                 await session.commit()
                 
                 self.metrics['total_vectors'] -= deleted_count
@@ -486,14 +691,126 @@ class PGVectorService:
         knowledge_base_id: UUID,
         metadata: Optional[Dict[str, Any]] = None,
         user_id: Optional[UUID] = None
-    ) -> List[UUID]:
-        """Update a document by deleting old embeddings and adding new ones"""
-        # Delete old embeddings
-        await self.delete_documents([document_id])
+    ) -> Dict[str, Any]:
+        """Update a document, re-embedding only chunks whose content changed
         
-        # Add new document
-        doc = {'page_content': new_content, 'metadata': metadata or {}}
-        return await self.add_documents([doc], knowledge_base_id, document_id, metadata, user_id)
+        The new content is chunked and each chunk's content hash is matched
+        against the stored chunks. Matching rows are kept and renumbered,
+        new or changed chunks are embedded and inserted, and rows no longer
+        present are deleted. When ``knowledge_base_id`` differs from the
+        stored one, kept rows are moved to it with the rest of the document.
+        
+        Returns:
+            Dict with the document's ``chunk_ids`` in order and counts of
+            ``reused_chunks``, ``embedded_chunks`` and ``deleted_chunks``
+        """
+        start_time = time.time()
+        chunks = self._chunk_text(new_content)
+        
+        async with self.AsyncSessionLocal() as session:
+            result = await session.execute(
+                text("""
+                    SELECT id, content_hash, knowledge_base_id FROM knowledge_embeddings
+                    WHERE document_id = :doc_id
+                    ORDER BY chunk_index
+                """),
+                {'doc_id': document_id}
+            )
+            existing = result.fetchall()
+        
+        # Multiset match so repeated chunks (boilerplate) each reuse one row
+        available: Dict[str, List[UUID]] = {}
+        for row in existing:
+            if row.content_hash:
+                available.setdefault(row.content_hash, []).append(row.id)
+        
+        chunk_ids: List[Optional[UUID]] = []
+        chunk_metadata = []
+        changed = []
+        for index, chunk in enumerate(chunks):
+            row_ids = available.get(chunk_content_hash(chunk['content']))
+            chunk_ids.append(row_ids.pop(0) if row_ids else None)
+            if chunk_ids[-1] is None:
+                changed.append(index)
+            chunk_meta = {**(metadata or {}), 'chunk_index': index, 'total_chunks': len(chunks)}
+            if 'page' in chunk:
+                chunk_meta['page'] = chunk['page']
+            chunk_metadata.append(chunk_meta)
+        reused = [index for index, chunk_id in enumerate(chunk_ids) if chunk_id is not None]
+        stale = [row_id for row_ids in available.values() for row_id in row_ids]
+        stale.extend(row.id for row in existing if not row.content_hash)
+        moved_from = {row.knowledge_base_id for row in existing} - {knowledge_base_id}
+        
+        # Embed before opening the write transaction
+        records = []
+        for i in range(0, len(changed), 100):
+            batch = changed[i:i + 100]
+            embeddings, duplicates = await near_duplicate_index.embed(
+                [chunks[index]['content'] for index in batch], self._embedder(user_id),
+                self.AsyncSessionLocal, knowledge_base_id
+            )
+            for index, embedding, duplicate in zip(batch, embeddings, duplicates):
+                if duplicate:
+                    chunk_metadata[index]['near_duplicate_of'] = duplicate
+                record = embedding_bulk_writer.build_record(
+                    document_id=document_id,
+                    knowledge_base_id=knowledge_base_id,
+                    chunk_index=index,
+                    content=chunks[index]['content'],
+                    embedding=embedding,
+                    token_count=chunks[index]['token_count'],
+                    metadata=chunk_metadata[index]
+                )
+                chunk_ids[index] = record['id']
+                records.append(record)
+        
+        async with self.AsyncSessionLocal() as session:
+            if stale:
+                await session.execute(
+                    text("DELETE FROM knowledge_embeddings WHERE id = ANY(:ids)"),
+                    {'ids': stale}
+                )
+            if reused:
+                await session.execute(
+                    text("""
+                        UPDATE knowledge_embeddings AS e
+                        SET chunk_index = v.chunk_index,
+                            metadata = CAST(v.metadata AS json),
+                            knowledge_base_id = :kb_id,
+                            updated_at = :updated_at
+                        FROM unnest(CAST(:ids AS uuid[]), CAST(:indexes AS int[]), CAST(:metadata AS text[]))
+                            AS v(id, chunk_index, metadata)
+                        WHERE e.id = v.id
+                    """),
+                    {
+                        'ids': [chunk_ids[index] for index in reused],
+                        'indexes': reused,
+                        'metadata': [json.dumps(chunk_metadata[index]) for index in reused],
+                        'kb_id': knowledge_base_id,
+                        'updated_at': datetime.utcnow()
+                    }
+                )
+            await embedding_bulk_writer.write(session, records)
+            if stale or moved_from:
+                await document_centroids.recompute(session, [document_id])
+            else:
+                await document_centroids.add_chunks(session, records)
+            await self.invalidate_semantic_cache([knowledge_base_id, *moved_from], session)
+            await session.commit()
+        
+        self.metrics['total_vectors'] += len(records) - len(stale)
+        await self._update_document_status(document_id, 'completed', len(chunks))
+        logger.info(
+            f"Updated document {document_id} in {time.time() - start_time:.2f}s: "
+            f"{len(reused)} chunks reused, {len(records)} embedded, {len(stale)} deleted"
+        )
+        
+        return {
+            'chunk_ids': chunk_ids,
+            'reused_chunks': len(reused),
+            'embedded_chunks': len(records),
+            'deleted_chunks': len(stale)
+        }
     
     async def get_statistics(
         self,
@@ -524,17 +841,8 @@ class PGVectorService:
             result = await session.execute(stats_query, params)
             stats = result.fetchone()
             
-            # Get index statistics
-            index_query = text("""
-                SELECT 
-                    schemaname, tablename, indexname, 
-                    pg_size_pretty(pg_relation_size(indexrelid)) as index_size
-                FROM pg_stat_user_indexes
-                WHERE indexname LIKE '%embedding%'
-            """)
-            
-            index_result = await session.execute(index_query)
-            indexes = [dict(row) for row in index_result.fetchall()]
+            # Get ANN index status
+            indexes = await self.index_manager.get_index_status()
             
             return {
                 'document_count': stats[0] or 0,
@@ -553,7 +861,8 @@ class PGVectorService:
             'avg_insert_time': np.mean(self.metrics['insert_times'][-100:]) if self.metrics['insert_times'] else 0,
             'avg_search_time': np.mean(self.metrics['search_times'][-100:]) if self.metrics['search_times'] else 0,
             'total_vectors': self.metrics['total_vectors'],
-            'cache_hit_rate': self.metrics['cache_hits'] / max(self.metrics['cache_hits'] + self.metrics['cache_misses'], 1)
+            'cache_hit_rate': self.metrics['cache_hits'] / max(self.metrics['cache_hits'] + self.metrics['cache_misses'], 1),
+            'query_embedding_cache': query_embedding_cache.get_stats()
         }
     
     async def _get_openai_api_key(self, user_id: Optional[UUID] = None) -> Optional[str]:
@@ -707,97 +1016,224 @@ class PGVectorService:
         except Exception as e:
             logger.error(f"Failed to update document status: {e}")
     
-    async def _update_semantic_cache(
+    def _run_in_background(self, coro):
+        """Schedule a coroutine off the request path, dropping it when saturated"""
+        if len(self._background_tasks) >= self.max_background_tasks:
+            coro.close()
+            self.metrics['background_dropped'] += 1
+            return
+        task = asyncio.create_task(coro)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+    
+    async def _lookup_semantic_cache(
         self,
+        session: AsyncSession,
+        knowledge_base_id: UUID,
+        embedding: str,
+        k: int,
+        score_threshold: float
+    ) -> Tuple[Optional[int], Optional[List[Tuple[Dict, float]]]]:
+        """Return cached results for a near-identical query in the same knowledge base
+        
+        An entry is usable when its query is at least SEMANTIC_CACHE_THRESHOLD
+        similar and it was stored with at least ``k`` results at an equal or
+        lower score threshold. The knowledge base's newest live entries are
+        compared exactly: the global ANN index post-filters on knowledge base
+        and would miss entries of small knowledge bases.
+        
+        Returns:
+            The knowledge base's cache generation, read in the same query so a
+            result set computed after it can be stored against it (None if the
+            lookup failed), and the cached results or None on a miss
+        """
+        try:
+            result = await session.execute(
+                text("""
+                    SELECT kb.cache_generation AS generation,
+                           c.id, c.response, c.metadata, c.similarity
+                    FROM knowledge_bases kb
+                    LEFT JOIN LATERAL (
+                        SELECT id, response, metadata, 1 - distance as similarity
+                        FROM (
+                            SELECT id, response, metadata,
+                                   query_embedding <=> :embedding AS distance
+                            FROM semantic_cache
+                            WHERE knowledge_base_id = kb.id
+                            AND model_used = :model
+                            AND expires_at > :now
+                            ORDER BY expires_at DESC
+                            LIMIT :scan_limit
+                        ) recent
+                        ORDER BY distance
+                        LIMIT 1
+                    ) c ON true
+                    WHERE kb.id = :kb_id
+                """),
+                {
+                    'embedding': embedding,
+                    'kb_id': knowledge_base_id,
+                    'model': self.embedding_model,
+                    'now': datetime.utcnow(),
+                    'scan_limit': settings.SEMANTIC_CACHE_SCAN_LIMIT
+                }
+            )
+            row = result.fetchone()
+        except Exception as e:
+            logger.error(f"Semantic cache lookup failed: {e}")
+            return None, None
+        
+        if not row:
+            return None, None
+        if row.id is None or row.similarity < settings.SEMANTIC_CACHE_THRESHOLD:
+            return row.generation, None
+        
+        stored = row.metadata or {}
+        if stored.get('k', 0) < k or stored.get('score_threshold', 1.0) > score_threshold:
+            return row.generation, None
+        
+        self._run_in_background(self._touch_semantic_cache(row.id))
+        return row.generation, [
+            (self._cached_document(doc), score) for doc, score in json.loads(row.response)
+            if score >= score_threshold
+        ][:k]
+    
+    async def _store_semantic_cache(
+        self,
+        knowledge_base_id: UUID,
+        generation: int,
         query: str,
-        query_embedding: List[float],
-        response_doc: Dict
+        embedding: str,
+        results: List[Tuple[Dict, float]],
+        k: int,
+        score_threshold: float
     ):
-        """Update semantic cache for frequently asked questions"""
+        """Store a search result set in the semantic cache (runs in background)
+        
+        Nothing is stored if the knowledge base was invalidated since
+        ``generation`` was read, in this or any other process. The row lock
+        taken on the knowledge base orders the insert against a concurrent
+        invalidation, whose DELETE then sees it.
+        """
         try:
+            now = datetime.utcnow()
             async with self.AsyncSessionLocal() as session:
-                # Check if similar query exists
-                result = await session.execute(
+                await session.execute(
                     text("""
-                        SELECT id, hit_count
-                        FROM semantic_cache
-                        WHERE 1 - (query_embedding <=> :embedding) > 0.95
-                        LIMIT 1
+                        INSERT INTO semantic_cache
+                        (id, knowledge_base_id, query, query_embedding, response, model_used,
+                         hit_count, last_accessed_at, expires_at, metadata, created_at, updated_at)
+                        SELECT :id, kb.id, :query, :embedding, :response, :model,
+                               0, :now, :expires, :metadata, :now, :now
+                        FROM knowledge_bases kb
+                        WHERE kb.id = :kb_id AND kb.cache_generation = :generation
+                        FOR SHARE
                     """),
-                    {'embedding': f"[{','.join(map(str, query_embedding))}]"}
+                    {
+                        'id': uuid4(),
+                        'kb_id': knowledge_base_id,
+                        'generation': generation,
+                        'query': query,
+                        'embedding': embedding,
+                        'response': json.dumps(results, default=str),
+                        'model': self.embedding_model,
+                        'now': now,
+                        'expires': now + timedelta(seconds=settings.SEMANTIC_CACHE_TTL),
+                        'metadata': json.dumps({'k': k, 'score_threshold': score_threshold})
+                    }
                 )
-                existing = result.fetchone()
                 
-                if existing:
-                    # Update hit count
-                    await session.execute(
-                        text("""
-                            UPDATE semantic_cache
-                            SET hit_count = hit_count + 1,
-                                last_accessed_at = :now
-                            WHERE id = :id
-                        """),
-                        {'id': existing[0], 'now': datetime.utcnow()}
-                    )
-                else:
-                    # Insert new cache entry
+                # Evict expired entries periodically
+                self._semantic_cache_writes += 1
+                if self._semantic_cache_writes % 100 == 0:
                     await session.execute(
-                        text("""
-                            INSERT INTO semantic_cache
-                            (id, query, query_embedding, response,
-                             expires_at, created_at)
-                            VALUES (:id, :query, :embedding, :response,
-                                    :expires, :created)
-                        """),
-                        {
-                            'id': uuid4(),
-                            'query': query,
-                            'embedding': f"[{','.join(map(str, query_embedding))}]",
-                            'response': response_doc['page_content'],
-                            'expires': datetime.utcnow() + timedelta(days=7),
-                            'created': datetime.utcnow()
-                        }
+                        text("DELETE FROM semantic_cache WHERE expires_at < :now"),
+                        {'now': now}
                     )
                 await session.commit()
         except Exception as e:
             logger.error(f"Failed to update semantic cache: {e}")
     
-    async def _log_search_history(
-        self,
-        knowledge_base_id: Optional[UUID],
-        query: str,
-        query_embedding: List[float],
-        results_count: int,
-        top_score: Optional[float],
-        execution_time_ms: float
-    ):
-        """Log search history for analytics"""
+    async def _touch_semantic_cache(self, cache_id: UUID):
+        """Record a semantic cache hit (runs in background)"""
         try:
             async with self.AsyncSessionLocal() as session:
                 await session.execute(
                     text("""
-                        INSERT INTO knowledge_search_history
-                        (id, knowledge_base_id, user_id, query, query_embedding,
-                         results_count, top_score, execution_time_ms, search_type, created_at)
-                        VALUES (:id, :kb_id, :user_id, :query, :embedding,
-                                :count, :score, :time, :type, :created)
+                        UPDATE semantic_cache
+                        SET hit_count = hit_count + 1,
+                            last_accessed_at = :now
+                        WHERE id = :id
                     """),
-                    {
-                        'id': uuid4(),
-                        'kb_id': knowledge_base_id,
-                        'user_id': None,  # TODO: Get from context
-                        'query': query,
-                        'embedding': f"[{','.join(map(str, query_embedding))}]",
-                        'count': results_count,
-                        'score': top_score,
-                        'time': int(execution_time_ms),
-                        'type': 'semantic',
-                        'created': datetime.utcnow()
-                    }
+                    {'id': cache_id, 'now': datetime.utcnow()}
                 )
                 await session.commit()
         except Exception as e:
-            logger.error(f"Failed to log search history: {e}")
+            logger.error(f"Failed to update semantic cache hit: {e}")
+    
+    async def invalidate_semantic_cache(
+        self,
+        knowledge_base_ids: List[UUID],
+        session: Optional[AsyncSession] = None
+    ):
+        """Drop cached results for knowledge bases whose documents changed
+        
+        Args:
+            knowledge_base_ids: Knowledge bases to invalidate
+            session: Session to run in (its transaction is not committed here)
+        """
+        if not knowledge_base_ids:
+            return
+        
+        # Bumping the generation drops cache writes of searches still running
+        bump = text("""
+            UPDATE knowledge_bases SET cache_generation = cache_generation + 1
+            WHERE id = ANY(:kb_ids)
+        """)
+        delete = text("DELETE FROM semantic_cache WHERE knowledge_base_id = ANY(:kb_ids)")
+        params = {'kb_ids': [UUID(str(kb_id)) for kb_id in knowledge_base_ids]}
+        if session is not None:
+            await session.execute(bump, params)
+            await session.execute(delete, params)
+            return
+        
+        try:
+            async with self.AsyncSessionLocal() as own_session:
+                await own_session.execute(bump, params)
+                await own_session.execute(delete, params)
+                await own_session.commit()
+        except Exception as e:
+            logger.error(f"Failed to invalidate semantic cache: {e}")
+    
+    async def clear_semantic_cache(self) -> int:
+        """Remove every semantic cache entry"""
+        async with self.AsyncSessionLocal() as session:
+            await session.execute(text("UPDATE knowledge_bases SET cache_generation = cache_generation + 1"))
+            result = await session.execute(text("DELETE FROM semantic_cache"))
+            await session.commit()
+            return result.rowcount
+    
+    async def _log_search_history(
+        self,
+        knowledge_base_id: Optional[UUID],
+        query: str,
+        query_embedding: List[float],
+        results_count: int,
+        top_score: Optional[float],
+        execution_time_ms: float,
+        user_id: Optional[UUID] = None
+    ):
+        """Queue search history for analytics (written in background batches)"""
+        search_analytics.record(
+            knowledge_base_id,
+            query,
+            results_count,
+            search_type='semantic',
+            user_id=user_id,
+            query_embedding=query_embedding,
+            top_score=top_score,
+            execution_time_ms=execution_time_ms
+        )
 
 
 # Singleton instance
@@ -0,0 +1,209 @@
+"""Adaptive Embedding Provider Routing
+
+Tracks each embedding provider's recent latency, error rate and rate-limit
+headroom in a sliding window and orders providers for each request:
+
+* healthy providers keep their configured priority;
+* degraded providers (high error rate, slow p95 or little headroom) move
+  behind healthy ones;
+* providers whose circuit is open (repeated failures) are skipped until a
+  cooldown passes, then receive one probe request at their normal position,
+  protected by hedging. A successful probe closes the circuit; a failed one
+  reopens it with a doubled cooldown.
+
+``hedge_delay`` gives the latency budget after which the caller should start
+the next provider in parallel (a hedged request) and keep whichever answers
+first.
+"""
+
+import time
+import logging
+from collections import deque
+from typing import List, Dict, Any, Optional, Hashable
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class ProviderHealth:
+    """Sliding-window health of one provider"""
+
+    def __init__(self, window_seconds: float, max_samples: int):
+        self.window_seconds = window_seconds
+        # (timestamp, latency seconds, succeeded)
+        self.samples: deque = deque(maxlen=max_samples)
+        self.headroom = 1.0
+        self.headroom_at = 0.0
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self.cooldown = 0.0
+        self.last_probe = 0.0
+
+    def _recent(self, now: float) -> List[tuple]:
+        while self.samples and self.samples[0][0] < now - self.window_seconds:
+            self.samples.popleft()
+        return list(self.samples)
+
+    def summary(self, now: float) -> Dict[str, Any]:
+        samples = self._recent(now)
+        latencies = [latency for _, latency, ok in samples if ok]
+        errors = sum(1 for _, _, ok in samples if not ok)
+        p50, p95 = np.percentile(latencies, [50, 95]).tolist() if latencies else (None, None)
+        return {
+            'samples': len(samples),
+            'error_rate': errors / len(samples) if samples else 0.0,
+            'p50_ms': p50 * 1000 if p50 is not None else None,
+            'p95_ms': p95 * 1000 if p95 is not None else None,
+            'headroom': self.headroom
+        }
+
+
+class ProviderRouter:
+    """Orders providers by live health and decides when to hedge"""
+
+    def __init__(
+        self,
+        window_seconds: float = 300.0,
+        max_samples: int = 500,
+        min_samples: int = 5,
+        error_threshold: float = 0.5,
+        degraded_error_rate: float = 0.2,
+        failure_threshold: int = 3,
+        cooldown: float = 30.0,
+        max_cooldown: float = 300.0,
+        hedge_after_ms: Optional[float] = 2000.0,
+        min_headroom: float = 0.1
+    ):
+        """Initialize the router
+
+        Args:
+            window_seconds: Age of the oldest sample considered
+            max_samples: Samples kept per provider
+            min_samples: Samples needed before error rate and p95 are trusted
+            error_threshold: Error rate that opens a provider's circuit
+            degraded_error_rate: Error rate that moves a provider behind healthy ones
+            failure_threshold: Consecutive failures that open the circuit
+            cooldown: Seconds before an open circuit is probed
+            max_cooldown: Upper bound for the cooldown after failed probes
+            hedge_after_ms: Default latency budget before hedging; 0 or None disables hedging
+            min_headroom: Rate-limit headroom below which a provider counts as degraded
+        """
+        self.window_seconds = window_seconds
+        self.max_samples = max_samples
+        self.min_samples = min_samples
+        self.error_threshold = error_threshold
+        self.degraded_error_rate = degraded_error_rate
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.hedge_after = hedge_after_ms / 1000 if hedge_after_ms else None
+        self.min_headroom = min_headroom
+        self.providers: Dict[Hashable, ProviderHealth] = {}
+        self.stats = {'hedged': 0, 'hedge_wins': 0, 'probes': 0, 'circuit_opened': 0}
+
+    def _health(self, provider: Hashable) -> ProviderHealth:
+        health = self.providers.get(provider)
+        if health is None:
+            health = self.providers[provider] = ProviderHealth(self.window_seconds, self.max_samples)
+        return health
+
+    def record_success(self, provider: Hashable, latency: float):
+        health = self._health(provider)
+        health.samples.append((time.monotonic(), latency, True))
+        health.consecutive_failures = 0
+        if health.open_until:
+            logger.info(f"Embedding provider {provider} recovered")
+        health.open_until = 0.0
+        health.cooldown = 0.0
+
+    def record_failure(self, provider: Hashable, latency: float):
+        now = time.monotonic()
+        health = self._health(provider)
+        health.samples.append((now, latency, False))
+        health.consecutive_failures += 1
+
+        summary = health.summary(now)
+        if health.open_until:
+            # Failed probe: stay open for longer
+            health.cooldown = min(health.cooldown * 2, self.max_cooldown)
+            health.open_until = now + health.cooldown
+        elif (health.consecutive_failures >= self.failure_threshold
+              or (summary['samples'] >= self.min_samples and summary['error_rate'] >= self.error_threshold)):
+            health.cooldown = self.base_cooldown
+            health.open_until = now + health.cooldown
+            self.stats['circuit_opened'] += 1
+            logger.warning(f"Embedding provider {provider} circuit opened for {health.cooldown:.0f}s")
+
+    def record_headroom(self, provider: Hashable, headroom: float):
+        """Share of the provider's rate limit still available (0 when limited)"""
+        health = self._health(provider)
+        health.headroom = max(0.0, min(1.0, headroom))
+        health.headroom_at = time.monotonic()
+
+    def _is_degraded(self, health: ProviderHealth, now: float) -> bool:
+        if health.headroom < self.min_headroom and now - health.headroom_at < self.window_seconds:
+            return True
+        summary = health.summary(now)
+        if summary['samples'] < self.min_samples:
+            return False
+        if summary['error_rate'] >= self.degraded_error_rate:
+            return True
+        return bool(self.hedge_after and summary['p95_ms'] and summary['p95_ms'] > 2 * self.hedge_after * 1000)
+
+    def rank(self, providers: List[Hashable]) -> List[Hashable]:
+        """Order candidate providers for one request
+
+        Args:
+            providers: Candidates in configured priority order
+
+        Returns:
+            Healthy providers (and due probes) in priority order, then
+            degraded providers by error rate, then open circuits as a last
+            resort
+        """
+        now = time.monotonic()
+        healthy, degraded, unavailable = [], [], []
+        for provider in providers:
+            health = self._health(provider)
+            if health.open_until:
+                if now >= health.open_until and now - health.last_probe >= health.cooldown:
+                    # One probe per cooldown period, at the provider's usual position
+                    health.last_probe = now
+                    self.stats['probes'] += 1
+                    healthy.append(provider)
+                else:
+                    unavailable.append(provider)
+            elif self._is_degraded(health, now):
+                degraded.append(provider)
+            else:
+                healthy.append(provider)
+        degraded.sort(key=lambda provider: self.providers[provider].summary(now)['error_rate'])
+        return healthy + degraded + unavailable
+
+    def hedge_delay(self, provider: Hashable) -> Optional[float]:
+        """Seconds to wait on a provider before hedging (None: never hedge)
+
+        The budget is the provider's p95 latency when known, but never less
+        than the configured budget.
+        """
+        if not self.hedge_after:
+            return None
+        summary = self._health(provider).summary(time.monotonic())
+        if summary['samples'] >= self.min_samples and summary['p95_ms']:
+            return max(self.hedge_after, summary['p95_ms'] / 1000)
+        return self.hedge_after
+
+    def get_stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            **self.stats,
+            'providers': {
+                str(getattr(provider, 'value', provider)): {
+                    **health.summary(now),
+                    'circuit': 'open' if health.open_until else 'closed',
+                    'consecutive_failures': health.consecutive_failures
+                }
+                for provider, health in self.providers.items()
+            }
+        }
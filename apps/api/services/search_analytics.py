@@ -0,0 +1,195 @@
+"""Search Analytics Sink
+
+Buffers knowledge search history rows in a bounded asyncio queue and writes
+them in batches with multi-row INSERTs from a background flusher, so search
+requests never wait on analytics writes.
+
+When the queue is full new rows are dropped and counted instead of blocking
+the caller. The flusher is started lazily on first use (or explicitly from
+the application lifespan) and ``stop()`` drains whatever is still queued.
+"""
+
+import asyncio
+import logging
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Callable
+from uuid import UUID, uuid4
+
+from sqlalchemy import text
+
+from core import database
+from core.config import settings
+from core.monitoring import performance_monitor
+
+logger = logging.getLogger(__name__)
+
+
+SEARCH_HISTORY_COLUMNS = (
+    "id", "knowledge_base_id", "user_id", "query", "query_embedding",
+    "results_count", "top_score", "execution_time_ms", "search_type", "created_at"
+)
+
+
+class SearchAnalyticsSink:
+    """Batched background writer for knowledge_search_history"""
+
+    def __init__(
+        self,
+        max_queue_size: int = 10000,
+        batch_size: int = 500,
+        flush_interval_ms: int = 250,
+        session_factory: Optional[Callable] = None
+    ):
+        """Initialize the sink
+
+        Args:
+            max_queue_size: Rows buffered before new rows are dropped
+            batch_size: Maximum rows per INSERT statement
+            flush_interval_ms: Longest time a row waits before being written
+            session_factory: Async session factory; defaults to the app's session maker
+        """
+        self.max_queue_size = max_queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.session_factory = session_factory
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+        self.stats = {'queued': 0, 'written': 0, 'dropped': 0, 'failed': 0, 'batches': 0}
+
+    def start(self):
+        """Start the background flusher on the running event loop"""
+        if self._task and not self._task.done():
+            return
+        self._closing = False
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = 10.0):
+        """Stop accepting rows and write everything still queued"""
+        if not self._task:
+            return
+        self._closing = True
+        task, self._task = self._task, None
+        try:
+            await asyncio.wait_for(task, timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Timed out draining search analytics queue ({self._queue.qsize()} rows left)")
+        logger.info(f"Search analytics sink stopped: {self.stats}")
+
+    def record(
+        self,
+        knowledge_base_id: Optional[UUID],
+        query: str,
+        results_count: int,
+        search_type: str = "semantic",
+        user_id: Optional[UUID] = None,
+        query_embedding: Optional[List[float]] = None,
+        top_score: Optional[float] = None,
+        execution_time_ms: Optional[float] = None
+    ) -> bool:
+        """Queue a search history row without waiting for the write
+
+        Returns:
+            False if the row was dropped
+        """
+        if knowledge_base_id is None:
+            # knowledge_search_history.knowledge_base_id is NOT NULL
+            return False
+
+        if self._closing:
+            self.stats['dropped'] += 1
+            performance_monitor.record_search_analytics(dropped=1)
+            return False
+        if not self._task or self._task.done():
+            self.start()
+
+        row = {
+            'id': uuid4(),
+            'knowledge_base_id': UUID(str(knowledge_base_id)),
+            'user_id': UUID(str(user_id)) if user_id else None,
+            'query': query,
+            'query_embedding': f"[{','.join(map(str, query_embedding))}]" if query_embedding else None,
+            'results_count': results_count,
+            'top_score': top_score,
+            'execution_time_ms': int(execution_time_ms) if execution_time_ms is not None else None,
+            'search_type': search_type,
+            'created_at': datetime.utcnow()
+        }
+        try:
+            self._queue.put_nowait(row)
+        except asyncio.QueueFull:
+            self.stats['dropped'] += 1
+            performance_monitor.record_search_analytics(dropped=1)
+            return False
+
+        self.stats['queued'] += 1
+        return True
+
+    async def _run(self):
+        """Collect rows into batches and flush them"""
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                batch = [await asyncio.wait_for(self._queue.get(), self.flush_interval)]
+            except asyncio.TimeoutError:
+                if self._closing:
+                    return
+                continue
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            await self._flush(batch)
+
+    async def _flush(self, rows: List[Dict[str, Any]]):
+        """Write rows with a single multi-row INSERT"""
+        if not rows:
+            return
+
+        values = []
+        params = {}
+        for i, row in enumerate(rows):
+            values.append("(" + ", ".join(f":{column}_{i}" for column in SEARCH_HISTORY_COLUMNS) + ")")
+            params.update({f"{column}_{i}": row[column] for column in SEARCH_HISTORY_COLUMNS})
+
+        statement = text(
+            f"INSERT INTO knowledge_search_history ({', '.join(SEARCH_HISTORY_COLUMNS)}) "
+            f"VALUES {', '.join(values)}"
+        )
+
+        session_factory = self.session_factory or database.async_session_maker
+        try:
+            if session_factory is None:
+                raise RuntimeError("Database not initialized")
+            async with session_factory() as session:
+                await session.execute(statement, params)
+                await session.commit()
+            self.stats['written'] += len(rows)
+            self.stats['batches'] += 1
+            performance_monitor.record_search_analytics(written=len(rows))
+        except Exception as e:
+            self.stats['failed'] += len(rows)
+            performance_monitor.record_search_analytics(failed=len(rows))
+            logger.error(f"Failed to write {len(rows)} search history rows: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Sink counters and current queue depth"""
+        return {
+            **self.stats,
+            'pending': self._queue.qsize() if self._queue else 0,
+            'max_queue_size': self.max_queue_size
+        }
+
+
+# Global sink instance
+search_analytics = SearchAnalyticsSink(
+    max_queue_size=settings.SEARCH_ANALYTICS_QUEUE_SIZE,
+    batch_size=settings.SEARCH_ANALYTICS_BATCH_SIZE,
+    flush_interval_ms=settings.SEARCH_ANALYTICS_FLUSH_INTERVAL_MS
+)
@@ -0,0 +1,254 @@
+"""Token-Aware Text Chunking
+
+Structure-preserving chunker used by every ingestion path. Documents are
+tokenized once; chunk boundaries are then chosen on page, paragraph, line,
+sentence and word separators so chunks never cut words mid-way, and every
+chunk is sized against a token budget. Token counts fall out of the same
+pass, so callers do not need to re-tokenize chunk text.
+"""
+
+import re
+import logging
+from bisect import bisect_left
+from itertools import accumulate
+from typing import List, Dict, Any, Optional, Callable, Tuple
+
+import tiktoken
+
+logger = logging.getLogger(__name__)
+
+
+# Page markers emitted by KnowledgeService PDF extraction
+PAGE_MARKER_PATTERN = re.compile(r"^--- Page (\d+) ---[ \t]*$", re.MULTILINE)
+
+# Separators from coarsest to finest; text is split after each match
+DEFAULT_SEPARATORS = [
+    r"\n[ \t]*\n\s*",       # paragraphs
+    r"\n",                  # lines
+    r"(?<=[.!?])\s+",       # sentences
+    r"\s+",                 # words
+]
+
+# Type of a tokenizer hook: returns the start character offset of every token
+TokenOffsets = Callable[[str], List[int]]
+
+_encodings: Dict[str, Any] = {}
+
+
+def get_encoding(encoding_name: str = "cl100k_base"):
+    """Get a cached tiktoken encoding"""
+    if encoding_name not in _encodings:
+        _encodings[encoding_name] = tiktoken.get_encoding(encoding_name)
+    return _encodings[encoding_name]
+
+
+def tiktoken_offsets(text: str, encoding_name: str = "cl100k_base") -> List[int]:
+    """Tokenize text once and return the start character offset of each token"""
+    encoding = get_encoding(encoding_name)
+    tokens = encoding.encode(text, disallowed_special=())
+    if text.isascii():
+        # One byte per character, so byte offsets are character offsets
+        lengths = [len(token) for token in encoding.decode_tokens_bytes(tokens)]
+        return [0, *accumulate(lengths)][:len(tokens)]
+    _, offsets = encoding.decode_with_offsets(tokens)
+    return offsets
+
+
+def total_tokens(chunks: List[Dict[str, Any]]) -> int:
+    """Token count of the source text, excluding tokens repeated by overlap"""
+    return sum(chunk['token_count'] - chunk.get('overlap_tokens', 0) for chunk in chunks)
+
+
+class BaseChunker:
+    """Interface for chunking strategies"""
+
+    def split(self, text: str) -> List[Dict[str, Any]]:
+        """Split text into chunks
+
+        Returns:
+            List of chunk dicts with at least ``content``, ``token_count``,
+            ``overlap_tokens`` and ``chunk_index``
+        """
+        raise NotImplementedError
+
+    def split_documents(self, texts: List[str]) -> List[List[Dict[str, Any]]]:
+        """Split several texts independently"""
+        return [self.split(text) for text in texts]
+
+
+class RecursiveTokenChunker(BaseChunker):
+    """Recursive separator chunker with token-budgeted windows"""
+
+    def __init__(
+        self,
+        chunk_size: int = 300,
+        chunk_overlap: int = 50,
+        separators: Optional[List[str]] = None,
+        respect_pages: bool = True,
+        token_offsets: Optional[TokenOffsets] = None
+    ):
+        """Initialize the chunker
+
+        Args:
+            chunk_size: Maximum tokens per chunk
+            chunk_overlap: Maximum tokens carried over from the previous chunk
+            separators: Regex separators from coarsest to finest
+            respect_pages: Never merge text across ``--- Page N ---`` markers
+            token_offsets: Tokenizer hook, defaults to tiktoken cl100k_base
+        """
+        if chunk_overlap >= chunk_size:
+            raise ValueError("chunk_overlap must be smaller than chunk_size")
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.separators = [re.compile(s) for s in (separators or DEFAULT_SEPARATORS)]
+        self.respect_pages = respect_pages
+        self.token_offsets = token_offsets or tiktoken_offsets
+
+    def split(self, text: str) -> List[Dict[str, Any]]:
+        """Split text into token-budgeted, structure-aligned chunks"""
+        if not text or not text.strip():
+            return []
+
+        offsets = self.token_offsets(text)
+        chunks: List[Dict[str, Any]] = []
+
+        for page, start, end in self._page_spans(text):
+            spans = self._split_span(text, offsets, start, end, 0)
+            self._merge_spans(text, spans, page, chunks)
+
+        return chunks
+
+    def _page_spans(self, text: str) -> List[Tuple[Optional[int], int, int]]:
+        """Split text into (page number, start, end) regions without markers"""
+        if not self.respect_pages:
+            return [(None, 0, len(text))]
+
+        spans = []
+        page, start = None, 0
+        for match in PAGE_MARKER_PATTERN.finditer(text):
+            if match.start() > start:
+                spans.append((page, start, match.start()))
+            page, start = int(match.group(1)), match.end()
+        if start < len(text):
+            spans.append((page, start, len(text)))
+        return spans
+
+    @staticmethod
+    def _count(offsets: List[int], start: int, end: int) -> int:
+        """Number of tokens starting inside [start, end)"""
+        return bisect_left(offsets, end) - bisect_left(offsets, start)
+
+    def _split_span(
+        self,
+        text: str,
+        offsets: List[int],
+        start: int,
+        end: int,
+        level: int
+    ) -> List[Tuple[int, int, int]]:
+        """Recursively split a span until every piece fits the token budget"""
+        tokens = self._count(offsets, start, end)
+        if tokens <= self.chunk_size:
+            return [(start, end, tokens)]
+
+        if level >= len(self.separators):
+            return self._split_by_tokens(offsets, start, end)
+
+        boundaries = [
+            match.end()
+            for match in self.separators[level].finditer(text, start, end)
+            if start < match.end() < end
+        ]
+        if not boundaries:
+            return self._split_span(text, offsets, start, end, level + 1)
+
+        pieces = []
+        piece_start = start
+        for boundary in boundaries + [end]:
+            pieces.extend(self._split_span(text, offsets, piece_start, boundary, level + 1))
+            piece_start = boundary
+        return pieces
+
+    def _split_by_tokens(self, offsets: List[int], start: int, end: int) -> List[Tuple[int, int, int]]:
+        """Last resort: cut an unbreakable span into fixed token windows"""
+        first, last = bisect_left(offsets, start), bisect_left(offsets, end)
+        pieces = []
+        piece_start = start
+        for index in range(first + self.chunk_size, last, self.chunk_size):
+            pieces.append((piece_start, offsets[index], self.chunk_size))
+            piece_start = offsets[index]
+        pieces.append((piece_start, end, self._count(offsets, piece_start, end)))
+        return pieces
+
+    def _merge_spans(
+        self,
+        text: str,
+        spans: List[Tuple[int, int, int]],
+        page: Optional[int],
+        chunks: List[Dict[str, Any]]
+    ):
+        """Greedily pack spans into chunks with token overlap"""
+        current: List[Tuple[int, int, int]] = []
+        current_tokens = 0
+        overlap_tokens = 0
+
+        for span in spans:
+            if current and current_tokens + span[2] > self.chunk_size:
+                self._emit(text, current, current_tokens, overlap_tokens, page, chunks)
+
+                # Carry trailing spans into the next chunk as overlap
+                carry: List[Tuple[int, int, int]] = []
+                carried = 0
+                for previous in reversed(current):
+                    if carried + previous[2] > self.chunk_overlap:
+                        break
+                    carry.insert(0, previous)
+                    carried += previous[2]
+                while carry and carried + span[2] > self.chunk_size:
+                    carried -= carry.pop(0)[2]
+
+                current, current_tokens, overlap_tokens = carry, carried, carried
+
+            current.append(span)
+            current_tokens += span[2]
+
+        if current:
+            self._emit(text, current, current_tokens, overlap_tokens, page, chunks)
+
+    @staticmethod
+    def _emit(
+        text: str,
+        spans: List[Tuple[int, int, int]],
+        token_count: int,
+        overlap_tokens: int,
+        page: Optional[int],
+        chunks: List[Dict[str, Any]]
+    ):
+        start, end = spans[0][0], spans[-1][1]
+        content = text[start:end].strip()
+        if not content:
+            return
+        chunk = {
+            'content': content,
+            'token_count': token_count,
+            'overlap_tokens': overlap_tokens,
+            'chunk_index': len(chunks),
+            'start_char': start,
+            'end_char': end
+        }
+        if page is not None:
+            chunk['page'] = page
+        chunks.append(chunk)
+
+
+# Registered chunking strategies
+CHUNKERS = {
+    "recursive_token": RecursiveTokenChunker,
+}
+
+
+def get_chunker(strategy: str = "recursive_token", **kwargs) -> BaseChunker:
+    """Create a chunker for the given strategy"""
+    if strategy not in CHUNKERS:
+        raise ValueError(f"Unknown chunking strategy: {strategy}")
+    return CHUNKERS[strategy](**kwargs)
@@ -0,0 +1,90 @@
+"""Upload Spooling
+
+Copies an uploaded file to a temporary file in fixed-size reads instead of
+reading it into memory. The SHA-256 hash and size are computed while the file
+is copied, and the copy stops as soon as the size limit is exceeded, so memory
+per upload stays at one read buffer however large the file is.
+
+The extractor reads the spool file by path. Callers own the spool and remove
+it with ``discard_spool`` once extraction is done.
+"""
+
+import os
+import asyncio
+import hashlib
+import logging
+import tempfile
+from typing import Dict, Any, Optional
+
+from fastapi import UploadFile
+
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class UploadTooLargeError(Exception):
+    """Raised when an upload exceeds the size limit"""
+
+    def __init__(self, max_size: int):
+        super().__init__(f"File size exceeds {max_size // (1024*1024)}MB limit")
+        self.max_size = max_size
+
+
+async def spool_upload(
+    file: UploadFile,
+    max_size: int,
+    chunk_size: Optional[int] = None
+) -> Dict[str, Any]:
+    """Copy an upload to a temporary file, hashing it on the way
+
+    Args:
+        file: Uploaded file
+        max_size: Largest accepted size in bytes
+        chunk_size: Bytes read per step; defaults to UPLOAD_READ_CHUNK_SIZE
+
+    Returns:
+        Dict with the spool ``path``, ``file_size`` and hex ``file_hash``
+
+    Raises:
+        UploadTooLargeError: If the upload is larger than ``max_size``
+    """
+    chunk_size = chunk_size or settings.UPLOAD_READ_CHUNK_SIZE
+
+    # Reject early when the size is already known
+    if getattr(file, 'size', None) and file.size > max_size:
+        raise UploadTooLargeError(max_size)
+
+    suffix = os.path.splitext(file.filename or "")[1]
+    spool = tempfile.NamedTemporaryFile(prefix="upload-", suffix=suffix, delete=False)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        while True:
+            chunk = await file.read(chunk_size)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_size:
+                raise UploadTooLargeError(max_size)
+            digest.update(chunk)
+            await asyncio.to_thread(spool.write, chunk)
+        spool.close()
+    except BaseException:
+        spool.close()
+        discard_spool(spool.name)
+        raise
+
+    return {'path': spool.name, 'file_size': size, 'file_hash': digest.hexdigest()}
+
+
+def discard_spool(path: Optional[str]):
+    """Remove a spool file, ignoring files that are already gone"""
+    if not path:
+        return
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logger.warning(f"Failed to remove upload spool {path}: {e}")
@@ -0,0 +1,220 @@
+"""Bulk Embedding Writer
+
+Streams batches of embedding rows into ``knowledge_embeddings`` using
+PostgreSQL binary COPY over the underlying asyncpg connection. Vectors are
+encoded straight from float32 buffers, so no per-float string formatting
+happens on the ingestion path.
+
+Used by both ``PGVectorService.add_documents`` and
+``EmbeddingTaskService._process_batch``.
+"""
+
+import json
+import struct
+import hashlib
+import logging
+from typing import List, Dict, Any, Optional, Sequence, Iterable, AsyncIterator
+from datetime import datetime
+from uuid import UUID, uuid4
+
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from services.near_duplicate import simhash, to_signed
+
+logger = logging.getLogger(__name__)
+
+
+# PGCOPY binary format constants
+_COPY_SIGNATURE = b"PGCOPY\n\xff\r\n\x00"
+_COPY_HEADER = _COPY_SIGNATURE + struct.pack(">ii", 0, 0)
+_COPY_TRAILER = struct.pack(">h", -1)
+_PG_EPOCH = datetime(2000, 1, 1)
+_NULL_FIELD = struct.pack(">i", -1)
+
+
+def chunk_content_hash(content: str) -> str:
+    """Hex SHA-256 of chunk content, as stored in ``content_hash``"""
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+def encode_vector(embedding: Any) -> bytes:
+    """Encode an embedding in the pgvector binary wire format
+
+    Layout is ``uint16 dim, uint16 unused`` followed by big-endian float32
+    values, matching ``vector_recv`` on the server.
+    """
+    values = np.asarray(embedding, dtype=">f4")
+    if values.ndim != 1:
+        raise ValueError("Embedding must be a 1-dimensional vector")
+    return struct.pack(">HH", values.shape[0], 0) + values.tobytes()
+
+
+def _field(payload: Optional[bytes]) -> bytes:
+    """Prefix a binary field with its length (or encode NULL)"""
+    if payload is None:
+        return _NULL_FIELD
+    return struct.pack(">i", len(payload)) + payload
+
+
+def _encode_timestamp(value: datetime) -> bytes:
+    """Encode a naive datetime as microseconds since the PostgreSQL epoch"""
+    delta = value - _PG_EPOCH
+    micros = (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds
+    return struct.pack(">q", micros)
+
+
+class EmbeddingBulkWriter:
+    """Writes embedding rows to knowledge_embeddings in bulk"""
+
+    TABLE_NAME = "knowledge_embeddings"
+    COLUMNS = (
+        "id", "document_id", "knowledge_base_id", "chunk_index", "chunk_size",
+        "content", "content_hash", "simhash", "embedding", "token_count", "metadata",
+        "created_at", "updated_at"
+    )
+
+    def __init__(self, rows_per_copy: int = 5000):
+        """Initialize the writer
+
+        Args:
+            rows_per_copy: Number of rows encoded per buffer handed to COPY
+        """
+        self.rows_per_copy = rows_per_copy
+        self.metrics = {
+            'rows_written': 0,
+            'copy_batches': 0,
+            'fallback_batches': 0
+        }
+
+    def build_record(
+        self,
+        document_id: UUID,
+        knowledge_base_id: UUID,
+        chunk_index: int,
+        content: str,
+        embedding: Any,
+        token_count: int,
+        metadata: Optional[Dict[str, Any]] = None,
+        chunk_id: Optional[UUID] = None
+    ) -> Dict[str, Any]:
+        """Build a single embedding row ready for ``write``"""
+        now = datetime.utcnow()
+        return {
+            'id': chunk_id or uuid4(),
+            'document_id': document_id,
+            'knowledge_base_id': knowledge_base_id,
+            'chunk_index': chunk_index,
+            'chunk_size': len(content),
+            'content': content,
+            'content_hash': chunk_content_hash(content),
+            'simhash': to_signed(simhash(content)),
+            'embedding': embedding,
+            'token_count': token_count,
+            'metadata': metadata,
+            'created_at': now,
+            'updated_at': now
+        }
+
+    def encode_rows(self, records: Iterable[Dict[str, Any]]) -> bytes:
+        """Encode rows as PGCOPY binary tuples (without header/trailer)"""
+        column_count = struct.pack(">h", len(self.COLUMNS))
+        parts: List[bytes] = []
+        for record in records:
+            metadata = record.get('metadata')
+            parts.append(column_count)
+            parts.append(_field(UUID(str(record['id'])).bytes))
+            parts.append(_field(UUID(str(record['document_id'])).bytes))
+            parts.append(_field(UUID(str(record['knowledge_base_id'])).bytes))
+            parts.append(_field(struct.pack(">i", record['chunk_index'])))
+            parts.append(_field(struct.pack(">i", record['chunk_size'])))
+            parts.append(_field(record['content'].encode('utf-8')))
+            parts.append(_field(record['content_hash'].encode('ascii')))
+            parts.append(_field(struct.pack(">q", record['simhash'])))
+            parts.append(_field(encode_vector(record['embedding'])))
+            parts.append(_field(struct.pack(">i", record['token_count'])))
+            parts.append(_field(json.dumps(metadata).encode('utf-8') if metadata else None))
+            parts.append(_field(_encode_timestamp(record['created_at'])))
+            parts.append(_field(_encode_timestamp(record['updated_at'])))
+        return b"".join(parts)
+
+    async def _copy_stream(self, records: Sequence[Dict[str, Any]]) -> AsyncIterator[bytes]:
+        """Yield the COPY payload in bounded buffers"""
+        yield _COPY_HEADER
+        for start in range(0, len(records), self.rows_per_copy):
+            yield self.encode_rows(records[start:start + self.rows_per_copy])
+        yield _COPY_TRAILER
+
+    async def write(
+        self,
+        session: AsyncSession,
+        records: Sequence[Dict[str, Any]]
+    ) -> List[UUID]:
+        """Write embedding rows using the session's connection
+
+        The COPY joins the session's transaction when one is already open on
+        the driver connection; otherwise it runs in its own transaction.
+        Drivers other than asyncpg fall back to a multi-row executemany.
+
+        Args:
+            session: Active async database session
+            records: Rows built with ``build_record``
+
+        Returns:
+            List of chunk IDs written, in input order
+        """
+        if not records:
+            return []
+
+        connection = await session.connection()
+        raw_connection = await connection.get_raw_connection()
+        driver_connection = getattr(raw_connection, 'driver_connection', None)
+
+        if driver_connection is not None and hasattr(driver_connection, 'copy_to_table'):
+            if driver_connection.is_in_transaction():
+                await self._copy(driver_connection, records)
+            else:
+                async with driver_connection.transaction():
+                    await self._copy(driver_connection, records)
+            self.metrics['copy_batches'] += 1
+        else:
+            await self._insert_many(session, records)
+            self.metrics['fallback_batches'] += 1
+
+        self.metrics['rows_written'] += len(records)
+        return [record['id'] for record in records]
+
+    async def _copy(self, driver_connection, records: Sequence[Dict[str, Any]]):
+        """Stream rows through binary COPY"""
+        await driver_connection.copy_to_table(
+            self.TABLE_NAME,
+            source=self._copy_stream(records),
+            columns=list(self.COLUMNS),
+            format='binary'
+        )
+
+    async def _insert_many(self, session: AsyncSession, records: Sequence[Dict[str, Any]]):
+        """Fallback path for drivers without COPY support"""
+        await session.execute(
+            text("""
+                INSERT INTO knowledge_embeddings
+                (id, document_id, knowledge_base_id, chunk_index, chunk_size,
+                 content, content_hash, simhash, embedding, token_count, metadata, created_at, updated_at)
+                VALUES (:id, :document_id, :knowledge_base_id, :chunk_index, :chunk_size,
+                        :content, :content_hash, :simhash, :embedding, :token_count, :metadata,
+                        :created_at, :updated_at)
+            """),
+            [
+                {
+                    **record,
+                    'embedding': '[' + ','.join(map(str, record['embedding'])) + ']',
+                    'metadata': json.dumps(record['metadata']) if record.get('metadata') else None
+                }
+                for record in records
+            ]
+        )
+
+
+# Singleton instance
+embedding_bulk_writer = EmbeddingBulkWriter()
@@ -0,0 +1,254 @@
+"""Vector Index Manager
+
+Builds, rebuilds and inspects the approximate nearest neighbour (ANN)
+indexes on ``knowledge_embeddings.embedding`` and applies per-query
+recall/latency tuning (``hnsw.ef_search`` / ``ivfflat.probes``).
+
+Index builds run with CREATE INDEX CONCURRENTLY on an autocommit
+connection so ingestion and search keep working while an index is built.
+"""
+
+import math
+import logging
+from typing import List, Dict, Any, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+# pgvector index access methods and their build options
+INDEX_METHODS = {
+    "hnsw": ("m", "ef_construction"),
+    "ivfflat": ("lists",),
+}
+
+# pgvector cannot index vector columns wider than this
+MAX_INDEXED_DIMENSIONS = 2000
+
+# IVFFlat indexes are rebuilt when their list count drifts this far from the recommendation
+IVFFLAT_REBUILD_FACTOR = 2.0
+
+
+def recommended_lists(row_count: int) -> int:
+    """IVFFlat list count recommended by pgvector for a table size"""
+    if row_count <= 1_000_000:
+        return max(row_count // 1000, 10)
+    return int(math.sqrt(row_count))
+
+
+class VectorIndexManager:
+    """Manages ANN indexes on knowledge_embeddings"""
+
+    TABLE_NAME = "knowledge_embeddings"
+    COLUMN_NAME = "embedding"
+
+    def __init__(self, engine: AsyncEngine):
+        """Initialize the manager
+
+        Args:
+            engine: Async engine used for index DDL
+        """
+        self.engine = engine
+
+    @staticmethod
+    def index_name(method: str, dimensions: int) -> str:
+        """Name of the managed index for a method and dimension"""
+        return f"idx_embedding_vector_{method}_{dimensions}"
+
+    async def _column_dimensions(self, conn) -> Optional[int]:
+        """Declared dimension of the embedding column (None if unconstrained)"""
+        result = await conn.execute(text("""
+            SELECT atttypmod FROM pg_attribute
+            WHERE attrelid = CAST(:table AS regclass) AND attname = :column
+        """), {'table': self.TABLE_NAME, 'column': self.COLUMN_NAME})
+        typmod = result.scalar()
+        return typmod if typmod and typmod > 0 else None
+
+    async def _estimated_rows(self, conn) -> int:
+        """Planner row estimate for the embeddings table"""
+        result = await conn.execute(text("""
+            SELECT GREATEST(reltuples, 0)::bigint FROM pg_class
+            WHERE oid = CAST(:table AS regclass)
+        """), {'table': self.TABLE_NAME})
+        return result.scalar() or 0
+
+    def _create_sql(self, name: str, method: str, options: Dict[str, int]) -> str:
+        with_clause = ", ".join(f"{key} = {int(value)}" for key, value in options.items())
+        return (
+            f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} "
+            f"ON {self.TABLE_NAME} USING {method} ({self.COLUMN_NAME} vector_cosine_ops) "
+            f"WITH ({with_clause})"
+        )
+
+    async def _execute_ddl(self, statements: List[str]):
+        """Run DDL outside a transaction block (required for CONCURRENTLY)"""
+        async with self.engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            await conn.execute(text(f"SET maintenance_work_mem = '{settings.VECTOR_INDEX_MAINTENANCE_WORK_MEM}'"))
+            try:
+                for statement in statements:
+                    logger.info(f"Vector index DDL: {statement}")
+                    await conn.execute(text(statement))
+            finally:
+                await conn.execute(text("RESET maintenance_work_mem"))
+
+    async def create_index(
+        self,
+        method: str = "hnsw",
+        dimensions: Optional[int] = None,
+        m: Optional[int] = None,
+        ef_construction: Optional[int] = None,
+        lists: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """Create an ANN index for an embedding dimension
+
+        Args:
+            method: ``hnsw`` or ``ivfflat``
+            dimensions: Embedding dimension; defaults to the column's dimension
+            m: HNSW max connections per layer
+            ef_construction: HNSW candidate list size during build
+            lists: IVFFlat list count; derived from the table size when omitted
+
+        Returns:
+            Status of the created index
+        """
+        if method not in INDEX_METHODS:
+            raise ValueError(f"Unsupported vector index method: {method}")
+
+        async with self.engine.connect() as conn:
+            column_dimensions = await self._column_dimensions(conn)
+            row_count = await self._estimated_rows(conn)
+
+        dimensions = dimensions or column_dimensions
+        if column_dimensions and dimensions != column_dimensions:
+            raise ValueError(
+                f"{self.TABLE_NAME}.{self.COLUMN_NAME} is vector({column_dimensions}); "
+                f"cannot index {dimensions}-dimensional embeddings"
+            )
+        if not dimensions or dimensions > MAX_INDEXED_DIMENSIONS:
+            raise ValueError(f"Vector indexes support 1-{MAX_INDEXED_DIMENSIONS} dimensions, got {dimensions}")
+
+        if method == "hnsw":
+            options = {
+                'm': m or settings.VECTOR_HNSW_M,
+                'ef_construction': ef_construction or settings.VECTOR_HNSW_EF_CONSTRUCTION
+            }
+        else:
+            if row_count == 0:
+                logger.warning("Building IVFFlat index on an empty table; rebuild once data is loaded")
+            options = {'lists': lists or recommended_lists(row_count)}
+
+        name = self.index_name(method, dimensions)
+        await self._execute_ddl([self._create_sql(name, method, options)])
+
+        return next(
+            (index for index in await self.get_index_status() if index['name'] == name),
+            {'name': name, 'method': method, 'options': options}
+        )
+
+    async def rebuild_index(self, name: str) -> Dict[str, Any]:
+        """Rebuild an index; IVFFlat lists are resized for the current table size"""
+        index = next((index for index in await self.get_index_status() if index['name'] == name), None)
+        if not index:
+            raise ValueError(f"Vector index not found: {name}")
+
+        if index['method'] == "ivfflat":
+            temp_name = f"{name}_rebuild"
+            await self._execute_ddl([
+                f"DROP INDEX CONCURRENTLY IF EXISTS {temp_name}",
+                self._create_sql(temp_name, "ivfflat", {'lists': index['recommended_lists']}),
+                f"DROP INDEX CONCURRENTLY IF EXISTS {name}",
+                f"ALTER INDEX {temp_name} RENAME TO {name}",
+            ])
+        else:
+            await self._execute_ddl([f"REINDEX INDEX CONCURRENTLY {name}"])
+
+        return next(index for index in await self.get_index_status() if index['name'] == name)
+
+    async def maintain_indexes(self) -> List[str]:
+        """Rebuild IVFFlat indexes whose list count no longer fits the data
+
+        Returns:
+            Names of rebuilt indexes
+        """
+        rebuilt = []
+        for index in await self.get_index_status():
+            if index.get('needs_rebuild'):
+                await self.rebuild_index(index['name'])
+                rebuilt.append(index['name'])
+        return rebuilt
+
+    async def get_index_status(self) -> List[Dict[str, Any]]:
+        """Describe all ANN indexes on the embeddings table"""
+        async with self.engine.connect() as conn:
+            row_count = await self._estimated_rows(conn)
+            column_dimensions = await self._column_dimensions(conn)
+            result = await conn.execute(text("""
+                SELECT c.relname AS name, am.amname AS method, c.reloptions AS options,
+                       pg_relation_size(c.oid) AS size_bytes, i.indisvalid AS is_valid,
+                       pg_get_indexdef(c.oid) AS definition
+                FROM pg_index i
+                JOIN pg_class c ON c.oid = i.indexrelid
+                JOIN pg_am am ON am.oid = c.relam
+                WHERE i.indrelid = CAST(:table AS regclass)
+                AND am.amname IN ('hnsw', 'ivfflat')
+                ORDER BY c.relname
+            """), {'table': self.TABLE_NAME})
+            rows = result.fetchall()
+
+        indexes = []
+        for row in rows:
+            options = {}
+            for option in row.options or []:
+                key, _, value = option.partition("=")
+                options[key] = int(value) if value.isdigit() else value
+
+            index = {
+                'name': row.name,
+                'method': row.method,
+                'options': options,
+                'dimensions': column_dimensions,
+                'size_bytes': row.size_bytes,
+                'is_valid': row.is_valid,
+                'estimated_rows': row_count,
+                'definition': row.definition
+            }
+            if row.method == "ivfflat":
+                target = recommended_lists(row_count)
+                current = options.get('lists', 100)
+                index['recommended_lists'] = target
+                index['needs_rebuild'] = (
+                    current * IVFFLAT_REBUILD_FACTOR < target or current > target * IVFFLAT_REBUILD_FACTOR
+                )
+            indexes.append(index)
+        return indexes
+
+    @staticmethod
+    async def apply_search_params(
+        session: AsyncSession,
+        ef_search: Optional[int] = None,
+        probes: Optional[int] = None
+    ):
+        """Set ANN tuning for the session's current transaction
+
+        Args:
+            session: Session the similarity query will run on
+            ef_search: HNSW candidate list size (higher = better recall, slower)
+            probes: IVFFlat lists scanned (higher = better recall, slower)
+        """
+        ef_search = ef_search or settings.VECTOR_HNSW_EF_SEARCH
+        probes = probes or settings.VECTOR_IVFFLAT_PROBES
+        if ef_search:
+            await session.execute(
+                text("SELECT set_config('hnsw.ef_search', :value, true)"),
+                {'value': str(int(ef_search))}
+            )
+        if probes:
+            await session.execute(
+                text("SELECT set_config('ivfflat.probes', :value, true)"),
+                {'value': str(int(probes))}
+            )
@@ -0,0 +1,139 @@
+"""Shared fixtures for the API test suite"""
+
+import re
+import pytest
+from unittest.mock import MagicMock
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy.sql.elements import TextClause
+from sqlalchemy.dialects.postgresql import asyncpg
+
+_DIALECT = asyncpg.dialect()
+_ARITHMETIC = "+-*/"
+
+
+def check_sql(statement, params=None):
+    """Compile a raw SQL statement the way asyncpg receives it
+
+    Postgres infers the type of an untyped parameter from the other operand,
+    so ``$1 / ($2 + rank)`` next to an integer rank becomes integer
+    arithmetic (or rejects a float). Parameters used as arithmetic operands
+    must be cast.
+
+    Raises:
+        AssertionError: If a parameter is missing or used untyped in arithmetic
+    """
+    if not isinstance(statement, TextClause):
+        return
+    compiled = statement.compile(dialect=_DIALECT)
+    try:
+        compiled.construct_params(params or {})
+    except Exception as e:
+        raise AssertionError(str(e))
+
+    sql = compiled.string
+    for position, name in enumerate(compiled.positiontup or [], start=1):
+        for match in re.finditer(rf"\${position}(?!\d)", sql):
+            start, end = match.span()
+            if re.search(r"CAST\(\s*$", sql[:start]) or sql.startswith("::", end):
+                continue
+            before = sql[:start].rstrip()[-1:]
+            after = sql[end:].lstrip()[:2]
+            if (before and before in _ARITHMETIC) or (
+                after[:1] and after[:1] in _ARITHMETIC and after not in ("->", "--")
+            ):
+                raise AssertionError(f"Parameter :{name} is an untyped arithmetic operand in:\n{sql}")
+
+
+class FakeSession:
+    """Async session stand-in recording statements and returning canned rows
+
+    Statements return the rows of the first ``respond`` rule whose fragments
+    all occur in the SQL, otherwise ``rows``. Rows may be a callable taking
+    the statement parameters. Every raw SQL statement goes through
+    ``check_sql``; failures are collected in ``sql_errors`` because services
+    often catch database errors.
+    """
+
+    def __init__(self, rows=None, scalar=None):
+        self.rows = rows if rows is not None else []
+        self.scalar = scalar
+        self.rules = []
+        self.statements = []
+        self.sql_errors = []
+        self.commits = 0
+        self.closed = False
+        self.execution_options = None
+
+    def respond(self, *fragments, rows=None, scalar=None):
+        """Answer statements containing all ``fragments`` with ``rows``"""
+        self.rules.append((fragments, rows if rows is not None else [], scalar))
+        return self
+
+    def reset(self, rows=None, scalar=None):
+        """Forget recorded statements and replace the default rows"""
+        self.statements = []
+        self.rows = rows if rows is not None else []
+        self.scalar = scalar
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return False
+
+    async def execute(self, statement, params=None):
+        sql = str(statement)
+        self.statements.append((sql, params))
+        try:
+            check_sql(statement, params)
+        except AssertionError as e:
+            self.sql_errors.append(str(e))
+
+        rows, scalar = self.rows, self.scalar
+        for fragments, rule_rows, rule_scalar in self.rules:
+            if all(fragment in sql for fragment in fragments):
+                rows, scalar = rule_rows, rule_scalar
+                break
+        if callable(rows):
+            rows = rows(params or {})
+
+        result = MagicMock()
+        result.fetchall.return_value = list(rows)
+        result.__iter__.side_effect = lambda: iter(list(rows))
+        result.fetchone.return_value = rows[0] if rows else None
+        result.scalar.return_value = scalar
+        return result
+
+    async def commit(self):
+        self.commits += 1
+
+    async def rollback(self):
+        pass
+
+    async def connection(self, execution_options=None):
+        self.execution_options = execution_options
+
+    async def close(self):
+        self.closed = True
+
+    def sql(self, fragment: str = "") -> list:
+        """SQL of the recorded statements containing ``fragment``"""
+        return [sql for sql, _ in self.statements if fragment in sql]
+
+    def params(self, fragment: str) -> dict:
+        """Parameters of the first recorded statement containing ``fragment``"""
+        return next(params for sql, params in self.statements if fragment in sql)
+
+    def selects(self) -> list:
+        return [sql for sql in self.sql() if sql.strip().upper().startswith("SELECT")]
+
+
+@pytest.fixture
+def fake_session():
+    session = FakeSession()
+    yield session
+    assert not session.sql_errors, "\n\n".join(session.sql_errors)
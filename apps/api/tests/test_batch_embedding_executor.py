@@ -0,0 +1,109 @@
+"""Tests for the concurrent batch embedding executor"""
+
+import asyncio
+import pytest
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.batch_embedding_executor import BatchEmbeddingExecutor, plan_batches
+from services.embedding_service import EmbeddingRateLimitError
+
+
+def _docs(count, tokens=10):
+    return [{'content': f"chunk {i}", 'token_count': tokens} for i in range(count)]
+
+
+async def _write(batch, embeddings):
+    return [doc['content'] for doc in batch]
+
+
+def test_batches_are_packed_by_count_and_tokens():
+    docs = _docs(5, tokens=40) + [{'content': "huge", 'token_count': 500}] + _docs(3, tokens=10)
+
+    batches = plan_batches(docs, max_batch=3, max_tokens=100)
+
+    assert [len(batch) for batch in batches] == [2, 2, 1, 1, 3]
+    assert batches[3][0]['content'] == "huge"
+
+
+@pytest.mark.asyncio
+async def test_requests_run_concurrently_up_to_the_limit():
+    active = peak = 0
+
+    async def embed(texts):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.02)
+        active -= 1
+        return [[0.0]] * len(texts)
+
+    result = await BatchEmbeddingExecutor(max_in_flight=3).run(_docs(20), embed, _write, max_batch=2, max_tokens=1000)
+
+    assert peak == 3
+    assert result['ids'] == [f"chunk {i}" for i in range(20)]
+    assert result['metrics']['batches'] == 10
+    assert result['metrics']['chunks'] == 20 and result['metrics']['tokens'] == 200
+
+
+@pytest.mark.asyncio
+async def test_writes_overlap_later_provider_calls():
+    events = []
+
+    async def embed(texts):
+        events.append(("embed", texts[0]))
+        await asyncio.sleep(0.01)
+        return [[0.0]] * len(texts)
+
+    async def write(batch, embeddings):
+        events.append(("write start", batch[0]['content']))
+        await asyncio.sleep(0.05)
+        events.append(("write end", batch[0]['content']))
+        return [doc['content'] for doc in batch]
+
+    await BatchEmbeddingExecutor(max_in_flight=1).run(_docs(3), embed, write, max_batch=1, max_tokens=1000)
+
+    # With one request in flight the second call still starts before the first write ends
+    assert events.index(("embed", "chunk 1")) < events.index(("write end", "chunk 0"))
+
+
+@pytest.mark.asyncio
+async def test_rate_limited_batches_back_off_and_retry():
+    calls = 0
+
+    async def embed(texts):
+        nonlocal calls
+        calls += 1
+        if calls <= 2:
+            raise EmbeddingRateLimitError("slow down", ["openai"])
+        return [[0.0]] * len(texts)
+
+    executor = BatchEmbeddingExecutor(max_in_flight=4, backoff_base=0.01, backoff_max=0.05)
+    result = await executor.run(_docs(8), embed, _write, max_batch=2, max_tokens=1000)
+
+    assert len(result['ids']) == 8
+    assert result['metrics']['rate_limited'] == 2
+    assert result['metrics']['failed_batches'] == 0
+
+
+@pytest.mark.asyncio
+async def test_failed_batches_are_skipped():
+    async def embed(texts):
+        if texts[0] == "chunk 2":
+            raise RuntimeError("provider down")
+        return [[0.0]] * len(texts)
+
+    progress = []
+
+    async def on_progress(count):
+        progress.append(count)
+
+    result = await BatchEmbeddingExecutor(max_in_flight=2, max_retries=2).run(
+        _docs(6), embed, _write, max_batch=2, max_tokens=1000, on_progress=on_progress
+    )
+
+    assert result['ids'] == ["chunk 0", "chunk 1", "chunk 4", "chunk 5"]
+    assert result['metrics']['failed_chunks'] == 2
+    assert sum(progress) == 4
@@ -0,0 +1,93 @@
+"""Tests for the paginated chunk browser and the vector export"""
+
+import pytest
+import numpy as np
+from io import BytesIO
+from datetime import datetime
+from uuid import uuid4
+from unittest.mock import MagicMock, patch
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.knowledge_service import KnowledgeService
+
+DOCUMENT = MagicMock(title="Manual", metadata={}, is_public=True, creator_id=None,
+                     embedding_model="text-embedding-3-small", embedding_dimensions=4)
+
+
+def _chunk_session(session, vectors):
+    """Serve a document's chunks by chunk index"""
+    def chunks(params):
+        after = params.get("after", -1)
+        rows = [
+            MagicMock(chunk_id=uuid4(), chunk_index=index, chunk_text=f"chunk {index}", token_count=10,
+                      created_at=datetime(2025, 1, 1), embedding=vector,
+                      embedding_preview=vector[:params.get("preview_size", 0)])
+            for index, vector in enumerate(vectors) if index > after
+        ]
+        return rows[:params["limit"]]
+
+    session.respond("JOIN knowledge_bases kb", rows=[DOCUMENT])
+    session.respond("COUNT(*)", rows=[MagicMock(chunk_count=len(vectors), token_count=10 * len(vectors))],
+                    scalar=len(vectors))
+    session.rows = chunks
+    return session
+
+
+def _vectors(count, dimensions=4):
+    return [[float(row * dimensions + column) for column in range(dimensions)] for row in range(count)]
+
+
+@pytest.mark.asyncio
+async def test_browser_pages_without_loading_vectors(fake_session):
+    session = _chunk_session(fake_session, _vectors(5))
+    service = KnowledgeService.__new__(KnowledgeService)
+
+    first = await service.get_document_embeddings(session, MagicMock(), uuid4(), limit=2)
+    page_sql = session.statements[-1][0]
+    second = await service.get_document_embeddings(session, MagicMock(), uuid4(), limit=2,
+                                                   after=first["next_after"], include_preview=False)
+
+    assert "embedding::real[])[1:" in page_sql
+    assert [chunk["chunk_index"] for chunk in first["chunks"]] == [0, 1]
+    assert first["has_more"] and first["next_after"] == 1
+    assert first["total_chunks"] == 5 and first["total_tokens"] == 50
+    assert [chunk["chunk_index"] for chunk in second["chunks"]] == [2, 3]
+    assert second["chunks"][0]["embedding_preview"] is None
+    assert "real[]" not in session.statements[-1][0]
+
+
+@pytest.mark.asyncio
+async def test_npy_export_streams_all_rows_in_batches(fake_session):
+    vectors = _vectors(7)
+    session = _chunk_session(fake_session, vectors)
+    service = KnowledgeService.__new__(KnowledgeService)
+
+    with patch("services.knowledge_service.pgvector_service.AsyncSessionLocal", MagicMock(return_value=session)), \
+         patch("services.knowledge_service.settings.EMBEDDING_EXPORT_BATCH_SIZE", 3):
+        export = await service.export_document_embeddings(session, MagicMock(), uuid4(), "npy")
+        parts = [part async for part in export["stream"]]
+
+    array = np.load(BytesIO(b"".join(parts)))
+    assert export["rows"] == 7 and export["dimensions"] == 4
+    assert array.dtype == np.float32
+    np.testing.assert_array_equal(array, np.array(vectors, dtype=np.float32))
+    # header + batches of 3, 3 and 1 rows
+    assert len(parts) == 4
+    assert session.execution_options == {"isolation_level": "REPEATABLE READ"}
+    assert session.closed
+
+
+@pytest.mark.asyncio
+async def test_raw_export_has_no_header(fake_session):
+    vectors = _vectors(2)
+    session = _chunk_session(fake_session, vectors)
+    service = KnowledgeService.__new__(KnowledgeService)
+
+    with patch("services.knowledge_service.pgvector_service.AsyncSessionLocal", MagicMock(return_value=session)):
+        export = await service.export_document_embeddings(session, MagicMock(), uuid4(), "f32")
+        payload = b"".join([part async for part in export["stream"]])
+
+    np.testing.assert_array_equal(np.frombuffer(payload, dtype="<f4").reshape(2, 4), np.array(vectors))
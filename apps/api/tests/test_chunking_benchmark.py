@@ -0,0 +1,123 @@
+"""Chunking Throughput Benchmark
+
+Compares the previous character-window splitter (followed by a tiktoken
+call per chunk to get token counts) against RecursiveTokenChunker, which
+tokenizes each document once. Reports MB/s and chunks/s on large
+synthetic paged documents.
+
+Usage:
+    python tests/test_chunking_benchmark.py [--pages 100,500,2000] [--chunk-size 300]
+"""
+
+import argparse
+import json
+import random
+import string
+import time
+from typing import List, Dict, Any
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.text_chunker import RecursiveTokenChunker, get_encoding, total_tokens
+
+
+class ChunkingBenchmark:
+    """Benchmark suite for document chunking"""
+
+    def __init__(self, chunk_size: int = 300, chunk_overlap: int = 50):
+        self.chunker = RecursiveTokenChunker(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+        self.encoding = get_encoding()
+        self.results: List[Dict[str, Any]] = []
+
+    def generate_document(self, pages: int) -> str:
+        """Generate a paged document with paragraphs and sentences"""
+        rng = random.Random(42)
+        parts = []
+        for page in range(1, pages + 1):
+            parts.append(f"--- Page {page} ---")
+            for _ in range(rng.randint(3, 6)):
+                sentences = []
+                for _ in range(rng.randint(3, 8)):
+                    words = [
+                        ''.join(rng.choices(string.ascii_lowercase, k=rng.randint(2, 10)))
+                        for _ in range(rng.randint(6, 20))
+                    ]
+                    sentences.append(' '.join(words).capitalize() + '.')
+                parts.append(' '.join(sentences))
+                parts.append('')
+        return '\n'.join(parts)
+
+    def run_legacy(self, text: str) -> Dict[str, Any]:
+        """Character window splitter plus per-chunk token counting"""
+        start = time.perf_counter()
+        chunks = []
+        position = 0
+        while position < len(text):
+            chunk = text[position:position + 1000]
+            chunks.append((chunk, len(self.encoding.encode(chunk, disallowed_special=()))))
+            position += 800
+        elapsed = time.perf_counter() - start
+        return {'seconds': elapsed, 'chunks': len(chunks)}
+
+    def run_chunker(self, text: str) -> Dict[str, Any]:
+        """Token-aware chunker, single tokenization pass"""
+        start = time.perf_counter()
+        chunks = self.chunker.split(text)
+        elapsed = time.perf_counter() - start
+        return {
+            'seconds': elapsed,
+            'chunks': len(chunks),
+            'tokens': total_tokens(chunks),
+            'max_chunk_tokens': max(chunk['token_count'] for chunk in chunks)
+        }
+
+    def benchmark_document(self, pages: int) -> Dict[str, Any]:
+        text = self.generate_document(pages)
+        megabytes = len(text.encode('utf-8')) / (1024 * 1024)
+        print(f"\n📊 Chunking {pages} pages ({megabytes:.1f} MB)...")
+
+        legacy = self.run_legacy(text)
+        chunker = self.run_chunker(text)
+
+        result = {
+            'pages': pages,
+            'megabytes': megabytes,
+            'legacy_mb_per_second': megabytes / legacy['seconds'],
+            'legacy_chunks': legacy['chunks'],
+            'chunker_mb_per_second': megabytes / chunker['seconds'],
+            'chunker_chunks_per_second': chunker['chunks'] / chunker['seconds'],
+            'chunker_chunks': chunker['chunks'],
+            'chunker_tokens': chunker['tokens'],
+            'max_chunk_tokens': chunker['max_chunk_tokens']
+        }
+        print(f"   Legacy:  {result['legacy_mb_per_second']:.2f} MB/s, {legacy['chunks']} chunks")
+        print(f"   Chunker: {result['chunker_mb_per_second']:.2f} MB/s, {chunker['chunks']} chunks "
+              f"({result['chunker_chunks_per_second']:.0f} chunks/s)")
+
+        self.results.append(result)
+        return result
+
+    def run(self, page_counts: List[int]) -> List[Dict[str, Any]]:
+        for pages in page_counts:
+            self.benchmark_document(pages)
+        return self.results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark document chunking throughput")
+    parser.add_argument("--pages", default="100,500,2000")
+    parser.add_argument("--chunk-size", type=int, default=300)
+    parser.add_argument("--chunk-overlap", type=int, default=50)
+    args = parser.parse_args()
+
+    benchmark = ChunkingBenchmark(chunk_size=args.chunk_size, chunk_overlap=args.chunk_overlap)
+    results = benchmark.run([int(p) for p in args.pages.split(",")])
+
+    print("\n" + "=" * 60)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
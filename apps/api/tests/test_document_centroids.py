@@ -0,0 +1,121 @@
+"""Tests for document centroid maintenance and similar-document lookup"""
+
+import pytest
+from uuid import uuid4
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import HTTPException
+
+from services.document_centroids import DocumentCentroidIndex
+from services.knowledge_service import KnowledgeService
+
+
+def _kb_size(document_id, documents, total=None):
+    return MagicMock(document_id=document_id, documents=documents, total=total)
+
+
+def _record(document_id, kb_id, embedding):
+    return {'document_id': document_id, 'knowledge_base_id': kb_id, 'embedding': embedding}
+
+
+@pytest.mark.asyncio
+async def test_add_chunks_sums_embeddings_per_document(fake_session):
+    doc_a, doc_b, kb_id = uuid4(), uuid4(), uuid4()
+    session = fake_session
+
+    await DocumentCentroidIndex().add_chunks(session, [
+        _record(doc_a, kb_id, [1.0, 0.0]),
+        _record(doc_b, kb_id, [0.0, 2.0]),
+        _record(doc_a, kb_id, [0.5, 1.5]),
+    ])
+
+    assert len(session.statements) == 1
+    sql, params = session.statements[0]
+    assert "embedding_sum + EXCLUDED.embedding_sum" in sql
+    assert params['document_ids'] == [str(doc_a), str(doc_b)]
+    assert params['sums'] == ["[1.5,1.5]", "[0.0,2.0]"]
+    assert params['counts'] == [2, 1]
+
+
+@pytest.mark.asyncio
+async def test_find_similar_batch_groups_rows_by_reference(fake_session):
+    ref_a, ref_b, match = uuid4(), uuid4(), uuid4()
+    rows = [
+        MagicMock(reference_id=ref_a, document_id=match, distance=0.1, chunk_count=4, title="Match", metadata={}),
+        MagicMock(reference_id=ref_b, document_id=None, distance=None, chunk_count=None, title=None, metadata=None),
+    ]
+    session = fake_session
+    session.respond("AS documents", rows=[_kb_size(ref_a, 10), _kb_size(ref_b, 10)])
+    session.rows = rows
+
+    with patch("services.document_centroids.VectorIndexManager.apply_search_params", AsyncMock()):
+        similar = await DocumentCentroidIndex().find_similar_batch(session, [ref_a, ref_b, uuid4()], k=3)
+
+    assert len(session.statements) == 2
+    assert "LATERAL" in session.statements[1][0]
+    assert similar[str(ref_a)][0]['id'] == match
+    assert similar[str(ref_a)][0]['similarity_score'] == pytest.approx(0.9)
+    # Reference with a centroid but nothing above the threshold
+    assert similar[str(ref_b)] == []
+    assert len(similar) == 2
+
+
+@pytest.mark.asyncio
+async def test_small_knowledge_bases_are_scanned_exactly(fake_session):
+    small, large, sparse = uuid4(), uuid4(), uuid4()
+    fake_session.respond("AS documents", rows=[
+        _kb_size(small, 50, total=100000),
+        _kb_size(large, 10000, total=100000),
+        # 0.5% of the table: HNSW would need a candidate list above pgvector's limit
+        _kb_size(sparse, 500, total=100000),
+    ])
+    index = DocumentCentroidIndex(exact_scan_max=100)
+
+    with patch("services.document_centroids.VectorIndexManager.apply_search_params", AsyncMock()) as apply:
+        await index.find_similar_batch(fake_session, [small, large, sparse], k=5)
+
+    exact_sql, indexed_sql = fake_session.sql("LEFT JOIN LATERAL")
+    assert fake_session.params("(c.embedding_sum <=> r.embedding_sum) + 0")['document_ids'] == [
+        str(small), str(sparse)
+    ]
+    assert "+ 0" not in indexed_sql
+    # 2k of the candidates should fall in a knowledge base holding 10% of the table
+    assert apply.await_args.kwargs['ef_search'] == 100
+    assert index.metrics['exact_scans'] == 2 and index.metrics['index_scans'] == 1
+
+
+@pytest.mark.asyncio
+async def test_find_similar_documents_needs_no_provider_call(fake_session):
+    document_id, match, user = uuid4(), uuid4(), MagicMock(id=uuid4())
+    references = [MagicMock(id=document_id, title="Reference", is_public=True, creator_id=None)]
+    similar = {str(document_id): [{'id': match, 'title': "Match", 'metadata': {}, 'chunk_count': 2,
+                                   'similarity_score': 0.8}]}
+    service = KnowledgeService.__new__(KnowledgeService)
+    fake_session.rows = references
+
+    with patch("services.knowledge_service.document_centroids.find_similar_batch",
+               AsyncMock(return_value=similar)), \
+         patch("services.knowledge_service.pgvector_service.search_similar", AsyncMock()) as search:
+        result = await service.find_similar_documents(fake_session, user, document_id)
+
+    search.assert_not_awaited()
+    assert result['reference_document'] == {'id': document_id, 'title': "Reference"}
+    assert [doc['id'] for doc in result['similar_documents']] == [match]
+
+
+@pytest.mark.asyncio
+async def test_document_without_centroid_is_reported(fake_session):
+    document_id = uuid4()
+    references = [MagicMock(id=document_id, title="Reference", is_public=True, creator_id=None)]
+    service = KnowledgeService.__new__(KnowledgeService)
+    fake_session.rows = references
+
+    with patch("services.knowledge_service.document_centroids.find_similar_batch", AsyncMock(return_value={})):
+        with pytest.raises(HTTPException) as error:
+            await service.find_similar_documents(fake_session, MagicMock(), document_id)
+
+    assert error.value.status_code == 404
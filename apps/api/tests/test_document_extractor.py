@@ -0,0 +1,125 @@
+"""Tests for process-pool document extraction"""
+
+import asyncio
+import pickle
+import time
+import pytest
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.document_extractor import DocumentExtractor, ExtractionError, extract_text
+
+
+def build_pdf(page_texts):
+    """Build a minimal PDF with one line of Helvetica text per page"""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None,
+               b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for page_text in page_texts:
+        escaped = page_text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+        stream = f"BT /F1 12 Tf 72 720 Td ({escaped}) Tj ET".encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        kids.append(len(objects) + 1)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % (len(objects))
+        )
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % kid for kid in kids), len(kids)
+    )
+
+    pdf = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(pdf))
+        pdf += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(pdf)
+    pdf += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    pdf += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    pdf += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(pdf)
+
+
+def _sleep(seconds):
+    time.sleep(seconds)
+    return seconds
+
+
+@pytest.fixture
+def extractor():
+    extractor = DocumentExtractor(max_workers=2, timeout=30, pages_per_task=2)
+    yield extractor
+    extractor.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_pdf_pages_are_yielded_in_order(extractor):
+    content = build_pdf([f"Page body {i}" for i in range(1, 6)])
+
+    pages = [page async for page in extractor.iter_pages("doc.pdf", content, ".pdf")]
+
+    assert [number for number, _ in pages] == [1, 2, 3, 4, 5]
+    assert pages[2][1] == "Page body 3"
+    assert await extractor.extract("doc.pdf", content, ".pdf") == extract_text("doc.pdf", content, ".pdf")
+
+
+@pytest.mark.asyncio
+async def test_spooled_files_are_read_from_disk(extractor, tmp_path):
+    pdf = tmp_path / "doc.pdf"
+    pdf.write_bytes(build_pdf(["First", "Second"]))
+    note = tmp_path / "note.txt"
+    note.write_bytes(b"plain text")
+
+    pages = [page async for page in extractor.iter_pages("doc.pdf", None, ".pdf", str(pdf))]
+
+    assert pages == [(1, "First"), (2, "Second")]
+    assert pdf.exists()
+    assert await extractor.extract("note.txt", None, ".txt", str(note)) == "plain text"
+
+
+@pytest.mark.asyncio
+async def test_pdf_without_text_is_rejected(extractor):
+    with pytest.raises(ExtractionError) as exc:
+        await extractor.extract("blank.pdf", build_pdf([""]), ".pdf")
+
+    assert exc.value.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_timeout_stops_only_the_slow_parse(extractor):
+    extractor.timeout = 1.0
+
+    async def other_file():
+        await asyncio.sleep(0.5)
+        return await extractor._call("other.pdf", _sleep, 0.8)
+
+    slow, other = await asyncio.gather(
+        extractor._call("slow.pdf", _sleep, 30), other_file(), return_exceptions=True
+    )
+
+    assert isinstance(slow, ExtractionError) and "timed out" in str(slow)
+    assert other == 0.8
+    assert await extractor.extract("a.txt", b"still working", ".txt") == "still working"
+
+
+@pytest.mark.asyncio
+async def test_time_between_pages_does_not_count_against_the_timeout(extractor):
+    extractor.timeout = 1.0
+    content = build_pdf([f"Page body {i}" for i in range(1, 7)])
+
+    pages = []
+    async for page in extractor.iter_pages("doc.pdf", content, ".pdf"):
+        pages.append(page)
+        # A consumer held up by embedding backpressure
+        await asyncio.sleep(0.3)
+
+    assert len(pages) == 6
+
+
+def test_extraction_error_keeps_status_code_across_processes():
+    error = pickle.loads(pickle.dumps(ExtractionError("Unsupported file type: .exe", 400)))
+
+    assert error.status_code == 400
+    assert str(error) == "Unsupported file type: .exe"
@@ -0,0 +1,102 @@
+"""Tests for metadata-only, keyset-paginated document listing"""
+
+import pytest
+from datetime import datetime, timedelta
+from uuid import uuid4
+from unittest.mock import AsyncMock, MagicMock
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import HTTPException
+
+from services.knowledge_service import KnowledgeService
+
+
+def _document(index):
+    return MagicMock(
+        id=uuid4(), title=f"Doc {index}", source_type="file", file_name=f"doc{index}.pdf",
+        file_type=".pdf", chunk_count=3, token_count=120, processing_status="completed",
+        created_at=datetime(2025, 1, 1) - timedelta(minutes=index),
+        updated_at=datetime(2025, 1, 1), metadata={}
+    )
+
+
+def _listing(session, rows, total=0):
+    """Serve ``rows`` up to the statement's limit and ``total`` as the count"""
+    session.reset(lambda params: rows[:params.get("limit", len(rows))], scalar=total)
+    return session
+
+
+def _service():
+    service = KnowledgeService.__new__(KnowledgeService)
+    service._verify_knowledge_base_access = AsyncMock()
+    return service
+
+
+@pytest.mark.asyncio
+async def test_listing_reads_only_metadata_columns(fake_session):
+    db = _listing(fake_session, [_document(i) for i in range(3)], total=3)
+
+    result = await _service().list_documents(db, MagicMock(), uuid4(), limit=5, search="policy")
+
+    listing_sql = db.statements[-1][0]
+    assert "SELECT *" not in listing_sql
+    assert "kd.content," not in listing_sql and "kd.content " not in listing_sql
+    assert "content ILIKE" not in listing_sql
+    assert "content_tsv @@ plainto_tsquery" in listing_sql
+    assert result["pagination"]["total"] == 3
+    assert result["pagination"]["has_more"] is False
+    assert result["pagination"]["next_cursor"] is None
+
+
+@pytest.mark.asyncio
+async def test_cursor_pages_use_keyset_without_count_or_offset(fake_session):
+    rows = [_document(i) for i in range(5)]
+    service = _service()
+    first = await service.list_documents(_listing(fake_session, rows, total=5), MagicMock(), uuid4(), limit=2)
+
+    assert first["pagination"]["has_more"] is True
+    cursor = first["pagination"]["next_cursor"]
+
+    db = _listing(fake_session, rows[2:])
+    second = await service.list_documents(db, MagicMock(), uuid4(), limit=2, cursor=cursor)
+
+    assert len(db.statements) == 1
+    sql, params = db.statements[0]
+    assert "(kd.created_at, kd.id) < (:cursor_value, :cursor_id)" in sql
+    assert params["offset"] == 0
+    assert params["cursor_value"] == rows[1].created_at
+    assert params["cursor_id"] == rows[1].id
+    assert [doc["title"] for doc in second["documents"]] == ["Doc 2", "Doc 3"]
+
+
+@pytest.mark.asyncio
+async def test_ascending_title_cursor_compares_forward(fake_session):
+    rows = [_document(i) for i in range(3)]
+    service = _service()
+    first = await service.list_documents(_listing(fake_session, rows), MagicMock(), uuid4(), limit=1,
+                                         sort_by="title", sort_order="asc")
+
+    db = _listing(fake_session, rows[1:])
+    await service.list_documents(db, MagicMock(), uuid4(), limit=1, sort_by="title", sort_order="asc",
+                                 cursor=first["pagination"]["next_cursor"])
+
+    sql, params = db.statements[0]
+    assert "(kd.title, kd.id) > (:cursor_value, :cursor_id)" in sql
+    assert "ORDER BY kd.title ASC, kd.id ASC" in sql
+    assert params["cursor_value"] == "Doc 0"
+
+
+@pytest.mark.asyncio
+async def test_invalid_sort_and_cursor_are_rejected(fake_session):
+    service = _service()
+
+    with pytest.raises(HTTPException) as exc:
+        await service.list_documents(fake_session, MagicMock(), uuid4(), sort_by="content; DROP TABLE")
+    assert exc.value.status_code == 400
+
+    with pytest.raises(HTTPException) as exc:
+        await service.list_documents(fake_session, MagicMock(), uuid4(), cursor="not-a-cursor")
+    assert exc.value.status_code == 400
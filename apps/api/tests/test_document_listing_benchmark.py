@@ -0,0 +1,175 @@
+"""Document Listing Benchmark: SELECT * with OFFSET vs metadata keyset pages
+
+Seeds one knowledge base with synthetic documents (100k by default, ~3KB of
+content each) and times the previous listing query (``SELECT *``,
+``content ILIKE`` search, OFFSET pagination) against
+``KnowledgeService.list_documents`` (metadata projection, trigram/full-text
+search, keyset cursors) at shallow and deep pages and with a search filter.
+
+Usage:
+    python tests/test_document_listing_benchmark.py [--documents 100000] [--limit 20] [--repeats 20]
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from datetime import datetime
+from typing import List, Dict, Any, Optional
+from unittest.mock import AsyncMock, MagicMock, patch
+from uuid import uuid4
+
+from sqlalchemy import text
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.knowledge_service import KnowledgeService
+from services.pgvector_service import pgvector_service
+
+VOCABULARY = (
+    "invoice payment refund policy contract renewal employee onboarding security "
+    "password network latency database backup restore migration schedule holiday "
+    "travel expense approval budget forecast revenue customer support ticket"
+).split()
+
+
+async def legacy_list_documents(session, knowledge_base_id, page: int, limit: int,
+                                search: Optional[str] = None) -> List[Dict[str, Any]]:
+    """The previous listing query, kept here as the comparison baseline"""
+    query = "SELECT * FROM knowledge_documents WHERE knowledge_base_id = :kb_id"
+    params = {"kb_id": str(knowledge_base_id), "limit": limit, "offset": (page - 1) * limit}
+    if search:
+        query += " AND (title ILIKE :search OR content ILIKE :search)"
+        params["search"] = f"%{search}%"
+    count = await session.execute(text(query.replace("SELECT *", "SELECT COUNT(*)")), params)
+    count.scalar()
+    result = await session.execute(
+        text(query + " ORDER BY created_at desc LIMIT :limit OFFSET :offset"), params
+    )
+    return [{"id": str(row.id), "title": row.title} for row in result]
+
+
+class ListingBenchmark:
+    """Latency comparison of the two listing implementations"""
+
+    def __init__(self, limit: int = 20):
+        self.limit = limit
+        self.knowledge_base_id = uuid4()
+        self.service = KnowledgeService.__new__(KnowledgeService)
+        self.service._verify_knowledge_base_access = AsyncMock()
+
+    async def seed(self, documents: int):
+        """Create a knowledge base with synthetic documents, generated server-side"""
+        now = datetime.utcnow()
+        words = "ARRAY[" + ",".join(f"'{word}'" for word in VOCABULARY) + "]"
+        async with pgvector_service.AsyncSessionLocal() as session:
+            await session.execute(text("""
+                INSERT INTO knowledge_bases (id, name, type, is_public, is_active, embedding_model,
+                    embedding_dimensions, total_documents, total_chunks, total_tokens, created_at, updated_at)
+                VALUES (:id, 'listing-benchmark', 'general', false, true, 'text-embedding-3-small',
+                    1536, 0, 0, 0, :now, :now)
+            """), {'id': self.knowledge_base_id, 'now': now})
+            for start in range(0, documents, 10000):
+                await session.execute(text(f"""
+                    INSERT INTO knowledge_documents (id, knowledge_base_id, title, source_type, content,
+                        chunk_count, token_count, processing_status, created_at, updated_at)
+                    SELECT gen_random_uuid(), :kb_id,
+                           'Document ' || i || ' ' || ({words})[1 + i % {len(VOCABULARY)}],
+                           'file',
+                           repeat(md5(i::text) || ' ' || ({words})[1 + (i * 7) % {len(VOCABULARY)}] || ' ', 80),
+                           10, 2000, 'completed',
+                           :now - make_interval(secs => i), :now - make_interval(secs => i)
+                    FROM generate_series(:start, :end) AS i
+                """), {'kb_id': self.knowledge_base_id, 'now': now,
+                       'start': start + 1, 'end': min(start + 10000, documents)})
+                await session.commit()
+            await session.execute(text("ANALYZE knowledge_documents"))
+            await session.commit()
+
+    async def cleanup(self):
+        async with pgvector_service.AsyncSessionLocal() as session:
+            await session.execute(text("DELETE FROM knowledge_bases WHERE id = :id"), {'id': self.knowledge_base_id})
+            await session.commit()
+
+    async def _time(self, call, repeats: int) -> Dict[str, float]:
+        latencies = []
+        for _ in range(repeats):
+            async with pgvector_service.AsyncSessionLocal() as session:
+                start = time.perf_counter()
+                await call(session)
+                latencies.append((time.perf_counter() - start) * 1000)
+        latencies.sort()
+        return {
+            'p50_ms': statistics.median(latencies),
+            'p95_ms': latencies[max(int(len(latencies) * 0.95) - 1, 0)]
+        }
+
+    async def _cursor_at(self, page: int) -> Optional[str]:
+        """Cursor for a page, found outside the timed section"""
+        if page == 1:
+            return None
+        async with pgvector_service.AsyncSessionLocal() as session:
+            result = await session.execute(text("""
+                SELECT id, created_at FROM knowledge_documents
+                WHERE knowledge_base_id = :kb_id
+                ORDER BY created_at DESC, id DESC
+                LIMIT 1 OFFSET :offset
+            """), {'kb_id': self.knowledge_base_id, 'offset': (page - 1) * self.limit - 1})
+            return self.service._encode_list_cursor(result.fetchone(), "created_at")
+
+    async def run(self, documents: int, repeats: int) -> Dict[str, Any]:
+        results = {}
+        last_page = max(documents // self.limit, 1)
+        for page in sorted({1, 100, 1000, last_page}):
+            if page > last_page:
+                continue
+            cursor = await self._cursor_at(page)
+            legacy = await self._time(
+                lambda session: legacy_list_documents(session, self.knowledge_base_id, page, self.limit), repeats
+            )
+            keyset = await self._time(
+                lambda session: self.service.list_documents(
+                    session, MagicMock(), self.knowledge_base_id, page=page, limit=self.limit, cursor=cursor
+                ), repeats
+            )
+            results[f'page_{page}'] = {'legacy': legacy, 'keyset': keyset}
+            print(f"   page {page:>6}: legacy p50={legacy['p50_ms']:.2f}ms  keyset p50={keyset['p50_ms']:.2f}ms")
+
+        for term in ("budget", "Document 4242"):
+            legacy = await self._time(
+                lambda session: legacy_list_documents(session, self.knowledge_base_id, 1, self.limit, term), repeats
+            )
+            indexed = await self._time(
+                lambda session: self.service.list_documents(
+                    session, MagicMock(), self.knowledge_base_id, limit=self.limit, search=term
+                ), repeats
+            )
+            results[f'search_{term}'] = {'legacy': legacy, 'indexed': indexed}
+            print(f"   search {term!r}: legacy p50={legacy['p50_ms']:.2f}ms  indexed p50={indexed['p50_ms']:.2f}ms")
+        return results
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark document listing")
+    parser.add_argument("--documents", type=int, default=100000)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    benchmark = ListingBenchmark(limit=args.limit)
+    print(f"\n📊 Seeding {args.documents} documents...")
+    await benchmark.seed(args.documents)
+    try:
+        result = await benchmark.run(args.documents, args.repeats)
+    finally:
+        await benchmark.cleanup()
+
+    print("\n" + "=" * 60)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,197 @@
+"""Tests for the content-addressed embedding cache"""
+
+import pytest
+from unittest.mock import AsyncMock, patch
+from uuid import uuid4
+
+import numpy as np
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.embedding_cache import EmbeddingCache, QueryEmbeddingCache, normalize_text
+from services.embedding_service import EmbeddingService, EmbeddingProvider
+
+
+class FakeBinaryRedis:
+    """In-memory stand-in for the bytes Redis client"""
+
+    def __init__(self):
+        self.store = {}
+
+    async def mget(self, keys):
+        return [self.store.get(key) for key in keys]
+
+    def pipeline(self, transaction=False):
+        return FakePipeline(self.store)
+
+
+class FakePipeline:
+    def __init__(self, store):
+        self.store = store
+        self.pending = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return False
+
+    def set(self, key, value, ex=None):
+        self.pending.append((key, value))
+
+    async def execute(self):
+        self.store.update(self.pending)
+
+
+@pytest.fixture
+def fake_redis():
+    redis = FakeBinaryRedis()
+    with patch("services.embedding_cache.get_binary_redis", return_value=redis):
+        yield redis
+
+
+def test_cache_key_normalizes_text_and_includes_model():
+    cache = EmbeddingCache()
+
+    assert normalize_text("  hello \n\t world ") == "hello world"
+    assert cache.cache_key("m1", "hello  world") == cache.cache_key("m1", "hello world\n")
+    assert cache.cache_key("m1", "hello") != cache.cache_key("m2", "hello")
+
+
+@pytest.mark.asyncio
+async def test_round_trip_through_redis_tier(fake_redis):
+    cache = EmbeddingCache(max_entries=10)
+    key = cache.cache_key("m", "text")
+    await cache.set_many({key: [0.25, -1.5, 3.0]})
+
+    assert len(fake_redis.store[key]) == 12  # packed float32
+
+    cache.clear_memory()
+    found = await cache.get_many([key, "emb:missing"])
+
+    assert found[key].tolist() == [0.25, -1.5, 3.0]
+    stats = cache.get_stats()
+    assert stats['redis_hits'] == 1
+    assert stats['misses'] == 1
+
+    await cache.get_many([key])
+    assert cache.get_stats()['memory_hits'] == 1
+
+
+@pytest.mark.asyncio
+async def test_memory_tier_is_bounded(fake_redis):
+    cache = EmbeddingCache(max_entries=2)
+    await cache.set_many({f"emb:{i}": [float(i)] for i in range(3)})
+
+    stats = cache.get_stats()
+    assert stats['memory_entries'] == 2
+    assert stats['evictions'] == 1
+
+
+@pytest.mark.asyncio
+async def test_memory_tier_works_without_redis():
+    cache = EmbeddingCache()
+    with patch("services.embedding_cache.get_binary_redis", side_effect=RuntimeError("down")):
+        await cache.set_many({"emb:a": [1.0, 2.0]})
+        found = await cache.get_many(["emb:a", "emb:b"])
+
+    assert list(found) == ["emb:a"]
+    assert cache.get_stats()['redis_errors'] == 2
+
+
+@pytest.mark.asyncio
+async def test_only_unique_misses_reach_provider(fake_redis):
+    cache = EmbeddingCache()
+    service = EmbeddingService()
+    service.provider_priority = [EmbeddingProvider.OPENAI]
+    service.get_active_api_key = AsyncMock(return_value="sk-test")
+    service.rate_limiter.check_rate_limit = AsyncMock(return_value=(True, {}))
+    service._update_usage_metrics = AsyncMock()
+    service._tiktoken_len = lambda text: len(text.split())
+
+    async def fake_generate(texts, provider, model, api_key, config):
+        return [[float(len(text)), 1.0] for text in texts]
+
+    service._generate_embeddings = AsyncMock(side_effect=fake_generate)
+
+    with patch("services.embedding_service.embedding_cache", cache):
+        first, meta = await service.generate_embeddings_with_fallback(["aa", "bbb", "aa"])
+        second, meta_cached = await service.generate_embeddings_with_fallback(["bbb", "aa"])
+
+    assert service._generate_embeddings.await_args_list[0].args[0] == ["aa", "bbb"]
+    assert service._generate_embeddings.await_count == 1
+    assert first == [[2.0, 1.0], [3.0, 1.0], [2.0, 1.0]]
+    assert second == [[3.0, 1.0], [2.0, 1.0]]
+    assert meta['cache_misses'] == 2
+    assert meta_cached['cache_hits'] == 2
+    assert meta_cached['tokens'] == 0
+
+
+def test_query_cache_matches_near_identical_questions():
+    cache = QueryEmbeddingCache()
+    cache.put("m", "What is the refund policy?", [1.0, 2.0])
+
+    assert cache.get("m", "  what is the   refund policy ") == [1.0, 2.0]
+    assert cache.get("other-model", "What is the refund policy?") is None
+    stats = cache.get_stats()
+    assert stats['hits'] == 1
+    assert stats['misses'] == 1
+    assert stats['hit_rate'] == 0.5
+
+
+def test_query_cache_entries_expire():
+    cache = QueryEmbeddingCache(ttl=60)
+    with patch("services.embedding_cache.time.monotonic", return_value=1000.0):
+        cache.put("m", "question", [1.0])
+    with patch("services.embedding_cache.time.monotonic", return_value=1061.0):
+        assert cache.get("m", "question") is None
+
+    assert cache.get_stats()['expired'] == 1
+    assert cache.get_stats()['entries'] == 0
+
+
+def test_query_cache_respects_memory_limit():
+    cache = QueryEmbeddingCache(max_entries=100, max_bytes=3 * 4 * 4)
+    for i in range(5):
+        cache.put("m", f"question {i}", [0.0] * 4)
+
+    stats = cache.get_stats()
+    assert stats['entries'] == 3
+    assert stats['memory_bytes'] <= stats['max_bytes']
+    assert cache.get("m", "question 0") is None
+    assert cache.get("m", "question 4") == [0.0] * 4
+
+
+@pytest.mark.asyncio
+async def test_repeated_search_query_is_embedded_once():
+    from services.pgvector_service import PGVectorService
+
+    service = PGVectorService.__new__(PGVectorService)
+    service.embedding_model = "text-embedding-3-small"
+    generate = AsyncMock(return_value=([[0.5, 0.5]], {'model': "text-embedding-3-small"}))
+
+    with patch("services.pgvector_service.query_embedding_cache", QueryEmbeddingCache()), \
+         patch("services.pgvector_service.embedding_service.generate_embeddings_with_fallback", generate):
+        first = await service._embed_query("How do I reset my password?", uuid4())
+        second = await service._embed_query("how do I reset my password", uuid4())
+
+    assert first == second == [0.5, 0.5]
+    generate.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_placeholder_query_embeddings_are_not_cached():
+    from services.pgvector_service import PGVectorService
+
+    service = PGVectorService.__new__(PGVectorService)
+    service.embedding_model = "text-embedding-3-small"
+    generate = AsyncMock(return_value=([[0.1]], {'model': "placeholder"}))
+
+    with patch("services.pgvector_service.query_embedding_cache", QueryEmbeddingCache()), \
+         patch("services.pgvector_service.embedding_service.generate_embeddings_with_fallback", generate):
+        await service._embed_query("question")
+        await service._embed_query("question")
+
+    assert generate.await_count == 2
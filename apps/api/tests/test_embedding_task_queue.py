@@ -0,0 +1,448 @@
+"""Tests for the Redis Streams embedding task queue"""
+
+import json
+import asyncio
+import pytest
+from uuid import uuid4
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.embedding_task_service import (
+    EmbeddingTaskService, TaskStatus, TaskPriority, CONSUMER_GROUP, DELAYED_KEY, STATUS_COUNTS_KEY
+)
+
+
+class FakePipeline:
+    """Transaction pipeline stand-in recording queued commands"""
+
+    def __init__(self, redis):
+        self.redis = redis
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return False
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.redis.commands.append((name, args, kwargs))
+            return self
+        return queue
+
+    async def execute(self):
+        return self.redis.pipeline_results
+
+
+def _redis(records=None):
+    redis = MagicMock()
+    redis.commands = []
+    redis.records = records or {}
+    redis.pipeline_results = []
+    redis.pipeline = lambda transaction=True: FakePipeline(redis)
+    redis.hgetall = AsyncMock(side_effect=lambda key: redis.records.get(key, {}))
+    redis.zadd = AsyncMock()
+    redis.xgroup_create = AsyncMock()
+    redis.xreadgroup = AsyncMock(return_value=[])
+    redis.xautoclaim = AsyncMock(return_value=["0-0", [], []])
+    redis.xclaim = AsyncMock()
+
+    def register_script(source):
+        async def run(keys=None, args=None):
+            redis.commands.append(("script", tuple(keys), {'args': list(args)}))
+            return 0
+        return run
+
+    redis.register_script.side_effect = register_script
+    return redis
+
+
+def _service(redis, **kwargs):
+    service = EmbeddingTaskService(**kwargs)
+    service._store_content = AsyncMock()
+    service._delete_content = AsyncMock()
+    patcher = patch("services.embedding_task_service.get_redis", return_value=redis)
+    patcher.start()
+    return service, patcher
+
+
+def _record(task_id, **fields):
+    return EmbeddingTaskService._encode_fields({
+        'task_id': task_id, 'document_id': str(uuid4()), 'knowledge_base_id': str(uuid4()),
+        'metadata': {}, 'priority': TaskPriority.NORMAL, 'status': TaskStatus.PENDING,
+        'retry_count': 0, 'deliveries': 0, **fields
+    })
+
+
+def _written(redis):
+    """Task hash fields written so far, merged in order"""
+    fields = {}
+    for name, args, kwargs in redis.commands:
+        if name == "hset" and 'mapping' in kwargs:
+            fields.update(kwargs['mapping'])
+        elif name == "script" and args[0].startswith("embedding_task:"):
+            pairs = kwargs['args'][4:]
+            fields.update(zip(pairs[::2], pairs[1::2]))
+            fields['status'] = kwargs['args'][0]
+    return fields
+
+
+@pytest.mark.asyncio
+async def test_queue_writes_record_and_stream_entry_together():
+    redis = _redis()
+    service, patcher = _service(redis)
+    background_tasks = MagicMock()
+    try:
+        task_id = await service.queue_embedding_task(
+            uuid4(), uuid4(), "text", priority=TaskPriority.HIGH, background_tasks=background_tasks
+        )
+    finally:
+        patcher.stop()
+
+    assert [name for name, _, _ in redis.commands] == ["hset", "expire", "hincrby", "xadd"]
+    assert redis.commands[2][1] == (STATUS_COUNTS_KEY, "pending", 1)
+    assert redis.commands[3][1] == ("embedding_tasks:high", {'task_id': task_id})
+    background_tasks.add_task.assert_called_once_with(service.process_next)
+    # Content goes to the payload table, not the task hash
+    service._store_content.assert_awaited_once_with(task_id, "text")
+    assert 'content' not in _written(redis)
+    assert _written(redis)['status'] == "pending"
+
+
+@pytest.mark.asyncio
+async def test_claim_reads_streams_in_priority_order():
+    redis = _redis()
+    entry = [["embedding_tasks:high", [("1-0", {'task_id': "t1"})]]]
+    redis.xreadgroup.side_effect = [[], entry]
+    service, patcher = _service(redis)
+    try:
+        claimed = await service.claim("worker-1", block_ms=1000)
+    finally:
+        patcher.stop()
+
+    assert claimed == [("embedding_tasks:high", "1-0", "t1")]
+    streams = [call.args[2] for call in redis.xreadgroup.call_args_list]
+    assert streams == [{"embedding_tasks:critical": '>'}, {"embedding_tasks:high": '>'}]
+    assert all(call.args[0] == CONSUMER_GROUP for call in redis.xreadgroup.call_args_list)
+
+
+@pytest.mark.asyncio
+async def test_idle_claim_blocks_on_all_streams():
+    redis = _redis()
+    service, patcher = _service(redis)
+    try:
+        claimed = await service.claim("worker-1", block_ms=1000)
+    finally:
+        patcher.stop()
+
+    assert claimed == []
+    blocking = redis.xreadgroup.call_args_list[-1]
+    assert blocking.kwargs['block'] == 1000
+    assert len(blocking.args[2]) == 4
+
+
+@pytest.mark.asyncio
+async def test_stale_entries_are_reclaimed_before_new_ones():
+    redis = _redis()
+    redis.xautoclaim.return_value = ["0-0", [("7-0", {'task_id': "stale"})], []]
+    service, patcher = _service(redis, visibility_timeout=60)
+    try:
+        claimed = await service.claim("worker-2")
+        await service.claim("worker-2")
+    finally:
+        patcher.stop()
+
+    assert claimed == [("embedding_tasks:critical", "7-0", "stale")]
+    assert redis.xautoclaim.call_args.kwargs['min_idle_time'] == 60000
+    # Reclaim scans are spaced out instead of running on every claim
+    assert redis.xautoclaim.await_count == 1
+
+
+@pytest.mark.asyncio
+async def test_entry_is_acknowledged_after_processing():
+    redis = _redis({"embedding_task:t1": _record("t1")})
+    service, patcher = _service(redis)
+    service._process_embedding_task = AsyncMock()
+    try:
+        await service.handle_entry("worker-1", "embedding_tasks:normal", "1-0", "t1")
+    finally:
+        patcher.stop()
+
+    service._process_embedding_task.assert_awaited_once()
+    assert service._process_embedding_task.call_args.args[1]['deliveries'] == 1
+    assert [name for name, _, _ in redis.commands] == ["xack", "xdel"]
+    assert not service.active_tasks
+
+
+@pytest.mark.asyncio
+async def test_long_running_task_is_not_cut_short():
+    redis = _redis({"embedding_task:t1": _record("t1")})
+    service, patcher = _service(redis, visibility_timeout=0.03)
+    service.task_timeout = 0.01
+
+    async def process(task_id, task_data):
+        await asyncio.sleep(0.05)
+
+    service._process_embedding_task = process
+    service._handle_failure = AsyncMock()
+    try:
+        await service.handle_entry("worker-1", "embedding_tasks:normal", "1-0", "t1")
+    finally:
+        patcher.stop()
+
+    service._handle_failure.assert_not_awaited()
+    assert redis.xclaim.await_count >= 1
+    assert [name for name, _, _ in redis.commands] == ["xack", "xdel"]
+
+
+@pytest.mark.asyncio
+async def test_cancelled_task_is_dropped_without_processing():
+    redis = _redis({"embedding_task:t1": _record("t1", status=TaskStatus.CANCELLED)})
+    service, patcher = _service(redis)
+    service._process_embedding_task = AsyncMock()
+    try:
+        await service.handle_entry("worker-1", "embedding_tasks:normal", "1-0", "t1")
+    finally:
+        patcher.stop()
+
+    service._process_embedding_task.assert_not_awaited()
+    assert [name for name, _, _ in redis.commands] == ["xack", "xdel"]
+
+
+@pytest.mark.asyncio
+async def test_repeatedly_reclaimed_task_is_abandoned():
+    redis = _redis({"embedding_task:t1": _record("t1", deliveries=4)})
+    service, patcher = _service(redis)
+    service._process_embedding_task = AsyncMock()
+    service._update_document_status = AsyncMock()
+    try:
+        await service.handle_entry("worker-1", "embedding_tasks:normal", "1-0", "t1")
+    finally:
+        patcher.stop()
+
+    service._process_embedding_task.assert_not_awaited()
+    stored = _written(redis)
+    assert stored['status'] == "failed"
+    assert "Abandoned" in stored['error_message']
+    assert service._update_document_status.call_args.args[1] == 'failed'
+    service._delete_content.assert_awaited_once_with("t1")
+
+
+@pytest.mark.asyncio
+async def test_retry_is_scheduled_without_sleeping():
+    redis = _redis()
+    service, patcher = _service(redis)
+    task_data = EmbeddingTaskService._decode_fields(_record("t1", priority=TaskPriority.HIGH, deliveries=1))
+    try:
+        with patch("services.embedding_task_service.asyncio.sleep") as sleep:
+            await service._retry_task("t1", task_data)
+    finally:
+        patcher.stop()
+
+    sleep.assert_not_called()
+    key, members = redis.zadd.call_args.args
+    assert key == DELAYED_KEY
+    assert list(members) == ["high:t1"]
+    assert _written(redis)['status'] == "pending"
+    assert task_data['deliveries'] == 0
+    service._delete_content.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_progress_updates_only_touch_progress_fields():
+    redis = _redis()
+    service, patcher = _service(redis)
+    service._load_content = AsyncMock(return_value="text")
+    service.pgvector_service._chunk_text = MagicMock(
+        return_value=[{'content': f"chunk {i}", 'token_count': 2} for i in range(120)]
+    )
+    service._embed_batch = AsyncMock(side_effect=lambda texts, user_id: [[0.1]] * len(texts))
+    service._write_batch = AsyncMock(side_effect=lambda docs, *args: [uuid4() for _ in docs])
+    service._update_document_status = AsyncMock()
+    service.pgvector_service.invalidate_semantic_cache = AsyncMock()
+    task_data = EmbeddingTaskService._decode_fields(_record("t1"))
+    limits = {'max_batch': 50, 'max_tokens': 10 ** 6}
+    try:
+        with patch.object(service.embedding_service, 'batch_limits', return_value=limits):
+            await service._process_embedding_task("t1", task_data)
+    finally:
+        patcher.stop()
+
+    increments = sorted(args[2] for name, args, _ in redis.commands if name == "hincrby")
+    assert increments == [20, 50, 50]
+    assert all(len(kwargs.get('mapping', {})) <= 6 for name, _, kwargs in redis.commands if name == "hset")
+    stored = _written(redis)
+    assert stored['status'] == "completed" and stored['chunk_count'] == "120"
+    assert json.loads(stored['throughput'])['chunks'] == 120
+    service._delete_content.assert_awaited_once_with("t1")
+
+
+def test_task_fields_round_trip():
+    task_data = {
+        'task_id': "t1", 'metadata': {'source': "upload"}, 'status': TaskStatus.PROCESSING,
+        'user_id': None, 'progress': 40, 'retry_count': 1
+    }
+
+    decoded = EmbeddingTaskService._decode_fields(EmbeddingTaskService._encode_fields(task_data))
+
+    assert decoded == {**task_data, 'status': "processing"}
+
+
+@pytest.mark.asyncio
+async def test_worker_loop_finishes_running_tasks_on_stop():
+    redis = _redis()
+    service, patcher = _service(redis)
+    stop_event = asyncio.Event()
+    finished = []
+
+    async def claim(consumer, block_ms=None):
+        stop_event.set()
+        return [("embedding_tasks:normal", "1-0", "t1")]
+
+    async def handle_entry(consumer, stream, message_id, task_id):
+        await asyncio.sleep(0.01)
+        finished.append(task_id)
+
+    service.claim = claim
+    service.handle_entry = handle_entry
+    try:
+        await asyncio.wait_for(service.process_queue("worker-1", 2, stop_event), 1)
+    finally:
+        patcher.stop()
+
+    assert finished == ["t1"]
+
+
+@pytest.mark.asyncio
+async def test_status_transition_moves_counters_in_one_script_call():
+    redis = _redis()
+    service, patcher = _service(redis)
+    task_data = {'status': TaskStatus.COMPLETED, 'completed_at': "2025-01-01T00:00:00", 'progress': 100}
+    try:
+        await service._update_task_status("t1", task_data, 'status', 'completed_at', 'progress')
+    finally:
+        patcher.stop()
+
+    [(name, keys, kwargs)] = redis.commands
+    assert name == "script"
+    assert keys[:2] == ("embedding_task:t1", STATUS_COUNTS_KEY)
+    assert keys[2].startswith(f"{STATUS_COUNTS_KEY}:")
+    args = kwargs['args']
+    assert args[:2] == ["completed", 1]
+    assert args[4:] == ["completed_at", "2025-01-01T00:00:00", "progress", "100"]
+
+
+@pytest.mark.asyncio
+async def test_queue_status_reads_counters_without_scanning_tasks():
+    redis = _redis()
+    redis.keys = AsyncMock()
+    pending = {'pending': 1}
+    buckets = [{'completed': "3", 'failed': "1"}] + [{}] * 22 + [{'completed': "2", 'cancelled': "1"}]
+    redis.pipeline_results = (
+        [2]                                   # delayed retries
+        + [4, pending, 0, {'pending': 0}] * 2  # stream length and pending entries per priority
+        + [{'pending': "3", 'processing': "1"}]
+        + buckets
+    )
+    service, patcher = _service(redis)
+    try:
+        status = await service.get_queue_status()
+    finally:
+        patcher.stop()
+
+    redis.keys.assert_not_called()
+    assert status['queue_size'] == 2 + 3 + 3
+    assert status['active_tasks'] == 2
+    assert status['status_counts'] == {
+        'pending': 3, 'processing': 1, 'completed': 5, 'failed': 1, 'cancelled': 1
+    }
+    assert sum(1 for name, _, _ in redis.commands if name == "hgetall") == 25
+
+
+@pytest.mark.asyncio
+async def test_reconcile_recounts_unfinished_tasks():
+    redis = _redis()
+    keys = [f"embedding_task:t{i}" for i in range(4)]
+
+    async def scan_iter(match=None, count=None):
+        assert match == "embedding_task:*"
+        for key in keys:
+            yield key
+
+    redis.scan_iter = scan_iter
+    redis.pipeline_results = ["pending", "processing", "completed", None]
+    redis.hset = AsyncMock()
+    service, patcher = _service(redis)
+    try:
+        counts = await service.reconcile_status_counts()
+    finally:
+        patcher.stop()
+
+    assert counts == {'pending': 1, 'processing': 1}
+    redis.hset.assert_awaited_once_with(STATUS_COUNTS_KEY, mapping={'pending': 1, 'processing': 1})
+    assert sum(1 for name, _, _ in redis.commands if name == "hget") == 4
+
+
+@pytest.mark.asyncio
+async def test_reconcile_runs_once_per_interval_across_consumers():
+    redis = _redis()
+    redis.set = AsyncMock(side_effect=[True, None])
+    service, patcher = _service(redis, reconcile_interval=0)
+    other = EmbeddingTaskService(reconcile_interval=3600)
+    service.reconcile_status_counts = AsyncMock(return_value={})
+    other.reconcile_status_counts = AsyncMock(return_value={})
+    try:
+        await service._reconcile_if_due()
+        # Another consumer finds the sweep taken and waits out its interval
+        await other._reconcile_if_due()
+        await other._reconcile_if_due()
+    finally:
+        patcher.stop()
+
+    service.reconcile_status_counts.assert_awaited_once()
+    other.reconcile_status_counts.assert_not_awaited()
+    assert redis.set.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_redelivered_task_discards_chunks_of_earlier_attempt():
+    redis = _redis()
+    service, patcher = _service(redis)
+    calls = []
+    service._load_content = AsyncMock(return_value="text")
+    service.pgvector_service._chunk_text = MagicMock(return_value=[{'content': "chunk", 'token_count': 1}])
+    service._discard_partial_writes = AsyncMock(side_effect=lambda *args: calls.append("discard"))
+    service._embed_batch = AsyncMock(side_effect=lambda texts, user_id: [[0.1]] * len(texts))
+    service._write_batch = AsyncMock(side_effect=lambda docs, *args: calls.append("write") or [uuid4()])
+    service._update_document_status = AsyncMock()
+    service.pgvector_service.invalidate_semantic_cache = AsyncMock()
+    first = EmbeddingTaskService._decode_fields(_record("t1", deliveries=1))
+    redelivered = EmbeddingTaskService._decode_fields(_record("t2", deliveries=2))
+    limits = {'max_batch': 50, 'max_tokens': 10 ** 6}
+    try:
+        with patch.object(service.embedding_service, 'batch_limits', return_value=limits):
+            await service._process_embedding_task("t1", first)
+            await service._process_embedding_task("t2", redelivered)
+    finally:
+        patcher.stop()
+
+    assert calls == ["write", "discard", "write"]
+    assert service._discard_partial_writes.await_args.args[0] == "t2"
+
+
+@pytest.mark.asyncio
+async def test_discarding_partial_writes_rebuilds_the_centroid(fake_session):
+    service = EmbeddingTaskService()
+    document_id = uuid4()
+    fake_session.respond("DELETE FROM knowledge_embeddings", rows=[MagicMock(id=uuid4()), MagicMock(id=uuid4())])
+
+    with patch("services.embedding_task_service.database.async_session_maker", MagicMock(return_value=fake_session)):
+        deleted = await service._discard_partial_writes("t1", document_id)
+
+    assert deleted == 2
+    assert fake_session.params("DELETE FROM knowledge_embeddings") == {'document_id': document_id, 'task_id': "t1"}
+    assert fake_session.sql("INSERT INTO knowledge_document_centroids")
+    assert fake_session.commits == 1
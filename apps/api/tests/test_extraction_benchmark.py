@@ -0,0 +1,116 @@
+"""Document Extraction Benchmark: in-loop parsing vs the process pool
+
+Generates text PDFs of 100-500 pages and compares the previous extraction
+(pypdf called synchronously on the event loop) with ``DocumentExtractor``,
+which parses page slices in worker processes and streams pages back.
+
+For each document size reports total extraction time, time until the first
+page is available, and the worst event-loop stall observed by a ticker
+coroutine running alongside extraction - the latency every other request
+served by the same worker would see.
+
+Usage:
+    python tests/test_extraction_benchmark.py [--pages 100,250,500] [--files 4] [--workers 4]
+"""
+
+import argparse
+import asyncio
+import time
+from typing import List, Dict, Any
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.document_extractor import DocumentExtractor, extract_text
+from tests.test_document_extractor import build_pdf
+
+TICK_SECONDS = 0.005
+
+
+def make_document(pages: int) -> bytes:
+    """A PDF whose pages each hold one line of distinct text"""
+    return build_pdf([
+        f"Section {page} covers invoice approval, expense policy and travel budget item {page * 7}"
+        for page in range(1, pages + 1)
+    ])
+
+
+async def measure_loop_lag(stop: asyncio.Event) -> float:
+    """Largest delay between when a tick was due and when it ran"""
+    loop = asyncio.get_running_loop()
+    worst = 0.0
+    while not stop.is_set():
+        due = loop.time() + TICK_SECONDS
+        await asyncio.sleep(TICK_SECONDS)
+        worst = max(worst, loop.time() - due)
+    return worst
+
+
+async def legacy_extract(content: bytes) -> float:
+    """Previous path: parse the whole PDF on the event loop; returns time to first page"""
+    started = time.perf_counter()
+    extract_text("doc.pdf", content, ".pdf")
+    return time.perf_counter() - started
+
+
+async def pooled_extract(extractor: DocumentExtractor, content: bytes) -> float:
+    """Streamed path; returns time to first page"""
+    started = time.perf_counter()
+    first_page = None
+    async for _ in extractor.iter_pages("doc.pdf", content, ".pdf"):
+        if first_page is None:
+            first_page = time.perf_counter() - started
+    return first_page
+
+
+async def run_case(name: str, extract, documents: List[bytes]) -> Dict[str, Any]:
+    """Extract documents concurrently while measuring event-loop lag"""
+    stop = asyncio.Event()
+    ticker = asyncio.create_task(measure_loop_lag(stop))
+    await asyncio.sleep(TICK_SECONDS * 2)
+
+    started = time.perf_counter()
+    first_pages = await asyncio.gather(*(extract(document) for document in documents))
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    return {
+        'path': name,
+        'total_s': elapsed,
+        'first_page_ms': min(first_pages) * 1000,
+        'max_loop_lag_ms': await ticker * 1000
+    }
+
+
+async def run(page_counts: List[int], files: int, workers: int):
+    extractor = DocumentExtractor(max_workers=workers, timeout=None)
+    try:
+        # Start the worker processes outside the measurement
+        await extractor.extract("warmup.pdf", make_document(1), ".pdf")
+
+        print(f"{'pages':>6} {'path':>8} {'total s':>9} {'first page ms':>14} {'max loop lag ms':>16}")
+        for pages in page_counts:
+            documents = [make_document(pages) for _ in range(files)]
+            for result in (
+                await run_case("legacy", legacy_extract, documents),
+                await run_case("pool", lambda document: pooled_extract(extractor, document), documents),
+            ):
+                print(f"{pages:>6} {result['path']:>8} {result['total_s']:>9.2f} "
+                      f"{result['first_page_ms']:>14.1f} {result['max_loop_lag_ms']:>16.1f}")
+    finally:
+        extractor.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark document text extraction")
+    parser.add_argument("--pages", default="100,250,500", help="Comma-separated page counts")
+    parser.add_argument("--files", type=int, default=4, help="Documents extracted concurrently per case")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Extraction worker processes")
+    args = parser.parse_args()
+
+    asyncio.run(run([int(pages) for pages in args.pages.split(",")], args.files, args.workers))
+
+
+if __name__ == "__main__":
+    main()
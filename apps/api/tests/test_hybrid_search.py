@@ -0,0 +1,72 @@
+"""Tests for single-statement RRF hybrid search"""
+
+import re
+import pytest
+from uuid import uuid4
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.pgvector_service import PGVectorService
+from services.vector_index_manager import VectorIndexManager
+
+
+def _service(session):
+    service = PGVectorService.__new__(PGVectorService)
+    service._embed_query = AsyncMock(return_value=[0.1, 0.2])
+    service.AsyncSessionLocal = MagicMock(return_value=session)
+    service.index_manager = VectorIndexManager(MagicMock())
+    return service
+
+
+def _fused_row(score):
+    return MagicMock(
+        content="chunk", metadata={}, document_id=uuid4(),
+        knowledge_base_id=uuid4(), title="Doc", score=score
+    )
+
+
+@pytest.mark.asyncio
+async def test_hybrid_search_is_one_fused_statement(fake_session):
+    session = fake_session
+    session.rows = [_fused_row(1.0 / 61), _fused_row(0.7 / 62)]
+    service = _service(session)
+
+    results = await service.hybrid_search("query", uuid4(), k=2,
+                                          keyword_weight=0.3, semantic_weight=0.7)
+
+    searches = [sql for sql in session.sql() if "set_config" not in sql]
+    assert len(searches) == 1
+    assert "FULL OUTER JOIN keyword" in searches[0]
+    assert "content_tsv @@" in searches[0]
+    assert "to_tsvector" not in searches[0]
+    # A chunk ranked first by both rankings scores 1.0
+    assert results[0][1] == pytest.approx(1.0)
+    assert results[1][1] == pytest.approx(0.7 / 62 * 61)
+
+
+@pytest.mark.asyncio
+async def test_hybrid_search_candidate_list_covers_pool(fake_session):
+    session = fake_session
+    service = _service(session)
+
+    with patch.object(VectorIndexManager, "apply_search_params", new_callable=AsyncMock) as apply:
+        await service.hybrid_search("query", k=5, candidate_pool=120)
+
+    assert apply.await_args.kwargs['ef_search'] == 120
+
+
+@pytest.mark.asyncio
+async def test_fusion_weights_are_typed_as_floats(fake_session):
+    session = fake_session
+    service = _service(session)
+
+    await service.hybrid_search("query", k=5, keyword_weight=0.3, semantic_weight=0.7)
+
+    # Untyped binds next to the integer ranks make Postgres infer integer division
+    search = [sql for sql in session.sql() if "set_config" not in sql][0]
+    for bind in ("semantic_weight", "keyword_weight", "rrf_k"):
+        uses = re.findall(rf"(CAST\()?:{bind}\b( AS double precision)?", search)
+        assert uses and all(cast and typed for cast, typed in uses), bind
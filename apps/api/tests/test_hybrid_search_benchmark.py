@@ -0,0 +1,230 @@
+"""Hybrid Search Benchmark: Python fusion vs single-statement RRF
+
+Seeds a knowledge base with synthetic chunks drawn from a small vocabulary,
+then times the previous hybrid search (full semantic search, a keyword query
+computing ``to_tsvector`` per row, and fusion in Python keyed on the first
+100 characters of content) against the current single-statement reciprocal
+rank fusion query over the stored ``content_tsv`` column. Reports p50/p95
+latency, statements per search and top-k overlap between the two.
+
+Query embeddings are synthetic; only the database path is measured.
+
+Usage:
+    python tests/test_hybrid_search_benchmark.py [--chunks 20000] [--searches 100] [--pool 50]
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from datetime import datetime
+from typing import List, Dict, Any, Tuple
+from unittest.mock import patch
+from uuid import uuid4
+
+import numpy as np
+from sqlalchemy import event, text
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.pgvector_service import pgvector_service
+from services.vector_bulk_writer import embedding_bulk_writer
+
+VOCABULARY = (
+    "invoice payment refund policy contract renewal employee onboarding security "
+    "password network latency database backup restore migration schedule holiday "
+    "travel expense approval budget forecast revenue customer support ticket "
+    "escalation release deployment incident outage monitoring alert dashboard"
+).split()
+
+
+async def legacy_hybrid_search(query: str, knowledge_base_id, k: int,
+                               keyword_weight: float = 0.3,
+                               semantic_weight: float = 0.7) -> List[Tuple[Dict, float]]:
+    """The previous hybrid search, kept here as the comparison baseline"""
+    semantic_results = await pgvector_service.search_similar(
+        query, knowledge_base_id, k * 2, score_threshold=-1.0
+    )
+
+    async with pgvector_service.AsyncSessionLocal() as session:
+        result = await session.execute(text("""
+            SELECT e.id, e.content, e.metadata, e.document_id, e.knowledge_base_id,
+                   d.title,
+                   ts_rank(to_tsvector('english', e.content),
+                          plainto_tsquery('english', :query)) as rank
+            FROM knowledge_embeddings e
+            JOIN knowledge_documents d ON d.id = e.document_id
+            WHERE to_tsvector('english', e.content) @@ plainto_tsquery('english', :query)
+            AND e.knowledge_base_id = :kb_id
+            ORDER BY rank DESC
+            LIMIT :k
+        """), {'query': query, 'kb_id': knowledge_base_id, 'k': k * 2})
+        keyword_results = [
+            (pgvector_service._row_to_document(row), float(row.rank)) for row in result.fetchall()
+        ]
+
+    combined_scores = {}
+    for doc, score in semantic_results:
+        key = doc['page_content'][:100]
+        combined_scores[key] = combined_scores.get(key, 0) + score * semantic_weight
+    for doc, score in keyword_results:
+        key = doc['page_content'][:100]
+        combined_scores[key] = combined_scores.get(key, 0) + min(score * 10, 1.0) * keyword_weight
+
+    final_results = []
+    for content_key, score in sorted(combined_scores.items(), key=lambda x: x[1], reverse=True)[:k]:
+        for doc, _ in semantic_results + keyword_results:
+            if doc['page_content'][:100] == content_key:
+                final_results.append((doc, score))
+                break
+    return final_results
+
+
+class HybridSearchBenchmark:
+    """Latency comparison of the two hybrid search implementations"""
+
+    def __init__(self, dimensions: int = 1536):
+        self.dimensions = dimensions
+        self.rng = np.random.default_rng(13)
+        self.statements: List[str] = []
+        self.knowledge_base_id = uuid4()
+        self.document_id = uuid4()
+
+    def _record_statement(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def _random_vector(self) -> List[float]:
+        vector = self.rng.standard_normal(self.dimensions).astype(np.float32)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def _sentence(self, words: int) -> str:
+        return " ".join(self.rng.choice(VOCABULARY, words))
+
+    async def seed(self, chunks: int):
+        """Create a knowledge base with one document of synthetic chunks"""
+        now = datetime.utcnow()
+        async with pgvector_service.AsyncSessionLocal() as session:
+            await session.execute(text("""
+                INSERT INTO knowledge_bases (id, name, type, is_public, is_active, embedding_model,
+                    embedding_dimensions, total_documents, total_chunks, total_tokens, created_at, updated_at)
+                VALUES (:id, 'hybrid-benchmark', 'general', false, true, 'text-embedding-3-small',
+                    :dims, 0, 0, 0, :now, :now)
+            """), {'id': self.knowledge_base_id, 'dims': self.dimensions, 'now': now})
+            await session.execute(text("""
+                INSERT INTO knowledge_documents (id, knowledge_base_id, title, source_type,
+                    chunk_count, token_count, processing_status, created_at, updated_at)
+                VALUES (:id, :kb_id, 'hybrid-benchmark', 'text', 0, 0, 'completed', :now, :now)
+            """), {'id': self.document_id, 'kb_id': self.knowledge_base_id, 'now': now})
+            await session.commit()
+
+        for start in range(0, chunks, 5000):
+            vectors = self.rng.standard_normal((min(5000, chunks - start), self.dimensions), dtype=np.float32)
+            records = [
+                embedding_bulk_writer.build_record(
+                    document_id=self.document_id,
+                    knowledge_base_id=self.knowledge_base_id,
+                    chunk_index=start + i,
+                    content=f"Chunk {start + i}: {self._sentence(60)}",
+                    embedding=vector / np.linalg.norm(vector),
+                    token_count=60
+                )
+                for i, vector in enumerate(vectors)
+            ]
+            async with pgvector_service.AsyncSessionLocal() as session:
+                await embedding_bulk_writer.write(session, records)
+                await session.commit()
+
+        async with pgvector_service.AsyncSessionLocal() as session:
+            await session.execute(text("ANALYZE knowledge_embeddings"))
+            await session.commit()
+
+    async def cleanup(self):
+        async with pgvector_service.AsyncSessionLocal() as session:
+            await session.execute(text("DELETE FROM knowledge_bases WHERE id = :id"), {'id': self.knowledge_base_id})
+            await session.commit()
+
+    async def _time(self, name: str, search, queries: List[Tuple[str, List[float]]]) -> Dict[str, Any]:
+        latencies = []
+        statements = []
+        top_ids = []
+        sync_engine = pgvector_service.async_engine.sync_engine
+        event.listen(sync_engine, "before_cursor_execute", self._record_statement)
+        try:
+            for query, vector in queries:
+                self.statements.clear()
+                # Skip analytics and result cache so only search queries are timed
+                with patch.object(pgvector_service, '_embed_query', return_value=vector), \
+                     patch.object(pgvector_service, '_log_search_history'), \
+                     patch.object(pgvector_service, '_lookup_semantic_cache', return_value=(None, None)), \
+                     patch.object(pgvector_service, '_run_in_background', side_effect=lambda coro: coro.close()):
+                    start = time.perf_counter()
+                    results = await search(query)
+                    latencies.append((time.perf_counter() - start) * 1000)
+                statements.append(len([sql for sql in self.statements if "set_config" not in sql]))
+                top_ids.append([doc['page_content'] for doc, _ in results])
+        finally:
+            event.remove(sync_engine, "before_cursor_execute", self._record_statement)
+
+        latencies.sort()
+        result = {
+            'p50_ms': statistics.median(latencies),
+            'p95_ms': latencies[max(int(len(latencies) * 0.95) - 1, 0)],
+            'mean_ms': statistics.mean(latencies),
+            'statements_per_search': max(statements)
+        }
+        print(f"   {name:<8} p50={result['p50_ms']:.2f}ms p95={result['p95_ms']:.2f}ms "
+              f"statements={result['statements_per_search']}")
+        return result, top_ids
+
+    async def run(self, searches: int, k: int, pool: int) -> Dict[str, Any]:
+        queries = [(self._sentence(3), self._random_vector()) for _ in range(searches)]
+
+        legacy, legacy_top = await self._time(
+            "legacy", lambda query: legacy_hybrid_search(query, self.knowledge_base_id, k), queries
+        )
+        fused, fused_top = await self._time(
+            "rrf", lambda query: pgvector_service.hybrid_search(
+                query, self.knowledge_base_id, k, candidate_pool=pool
+            ), queries
+        )
+
+        overlap = statistics.mean(
+            len(set(a) & set(b)) / k for a, b in zip(legacy_top, fused_top)
+        )
+        return {
+            'searches': searches,
+            'k': k,
+            'candidate_pool': pool,
+            'legacy': legacy,
+            'rrf': fused,
+            'speedup_p50': legacy['p50_ms'] / fused['p50_ms'] if fused['p50_ms'] else None,
+            'top_k_overlap': overlap
+        }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark hybrid search implementations")
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--searches", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--pool", type=int, default=50)
+    parser.add_argument("--dimensions", type=int, default=1536)
+    args = parser.parse_args()
+
+    benchmark = HybridSearchBenchmark(dimensions=args.dimensions)
+    print(f"\n📊 Seeding {args.chunks} chunks...")
+    await benchmark.seed(args.chunks)
+    try:
+        result = await benchmark.run(args.searches, args.k, args.pool)
+    finally:
+        await benchmark.cleanup()
+
+    print("\n" + "=" * 60)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
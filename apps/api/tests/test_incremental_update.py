@@ -0,0 +1,116 @@
+"""Tests for diff-based document updates"""
+
+import json
+import pytest
+from uuid import uuid4
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.pgvector_service import PGVectorService
+from services.vector_bulk_writer import chunk_content_hash
+
+
+KB_ID = uuid4()
+
+
+def _stored(*contents, kb_id=KB_ID):
+    return [MagicMock(id=uuid4(), content_hash=chunk_content_hash(content), knowledge_base_id=kb_id)
+            for content in contents]
+
+
+def _service(session, rows):
+    session.respond("SELECT id, content_hash", rows=rows)
+    service = PGVectorService.__new__(PGVectorService)
+    service.metrics = {'total_vectors': 0}
+    service.AsyncSessionLocal = MagicMock(return_value=session)
+    service._chunk_text = lambda content: [
+        {'content': line, 'token_count': 1, 'chunk_index': i} for i, line in enumerate(content.split("\n"))
+    ]
+    service._update_document_status = AsyncMock()
+    service.invalidate_semantic_cache = AsyncMock()
+    return service
+
+
+@pytest.fixture
+def embed_env():
+    embed = AsyncMock(side_effect=lambda texts, user_id=None: ([[0.1, 0.2]] * len(texts), {}))
+    write = AsyncMock(side_effect=lambda session, records: [record['id'] for record in records])
+    with patch("services.pgvector_service.embedding_service") as embeddings, \
+         patch("services.pgvector_service.embedding_bulk_writer.write", write):
+        embeddings.generate_embeddings_with_fallback = embed
+        yield {'embed': embed, 'write': write}
+
+
+@pytest.mark.asyncio
+async def test_only_changed_chunks_are_embedded(embed_env, fake_session):
+    rows = _stored("intro", "old clause", "closing")
+    session = fake_session
+    service = _service(session, rows)
+
+    result = await service.update_document(uuid4(), "intro\nnew clause\nextra\nclosing", KB_ID, {'title': 'Policy'})
+
+    assert result['reused_chunks'] == 2
+    assert result['embedded_chunks'] == 2
+    assert result['deleted_chunks'] == 1
+    embed_env['embed'].assert_awaited_once()
+    assert embed_env['embed'].await_args.args[0] == ["new clause", "extra"]
+
+    # Unchanged rows keep their ids and are renumbered
+    assert result['chunk_ids'][0] == rows[0].id
+    assert result['chunk_ids'][3] == rows[2].id
+    update = session.params("UPDATE knowledge_embeddings")
+    assert update['ids'] == [rows[0].id, rows[2].id]
+    assert update['indexes'] == [0, 3]
+    assert json.loads(update['metadata'][1])['total_chunks'] == 4
+
+    delete = session.params("DELETE FROM knowledge_embeddings")
+    assert delete['ids'] == [rows[1].id]
+
+    records = embed_env['write'].await_args.args[1]
+    assert [record['chunk_index'] for record in records] == [1, 2]
+    assert records[0]['content_hash'] == chunk_content_hash("new clause")
+
+
+@pytest.mark.asyncio
+async def test_unchanged_document_embeds_nothing(embed_env, fake_session):
+    rows = _stored("same", "same", "text")
+    service = _service(fake_session, rows)
+
+    result = await service.update_document(uuid4(), "same\nsame\ntext", KB_ID)
+
+    assert result['reused_chunks'] == 3
+    assert result['embedded_chunks'] == 0
+    assert result['deleted_chunks'] == 0
+    assert result['chunk_ids'] == [row.id for row in rows]
+    embed_env['embed'].assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_rows_without_hash_are_replaced(embed_env, fake_session):
+    rows = [MagicMock(id=uuid4(), content_hash=None, knowledge_base_id=KB_ID)]
+    service = _service(fake_session, rows)
+
+    result = await service.update_document(uuid4(), "body", KB_ID)
+
+    assert result['embedded_chunks'] == 1
+    assert result['deleted_chunks'] == 1
+
+
+@pytest.mark.asyncio
+async def test_knowledge_base_change_moves_reused_chunks(embed_env, fake_session):
+    old_kb, new_kb = uuid4(), uuid4()
+    rows = _stored("intro", "closing", kb_id=old_kb)
+    service = _service(fake_session, rows)
+
+    result = await service.update_document(uuid4(), "intro\nclosing", new_kb)
+
+    assert result['reused_chunks'] == 2
+    assert fake_session.params("UPDATE knowledge_embeddings")['kb_id'] == new_kb
+    assert "knowledge_base_id = :kb_id" in fake_session.sql("UPDATE knowledge_embeddings")[0]
+    # The centroid follows the document into the new knowledge base
+    assert fake_session.sql("SET knowledge_base_id = EXCLUDED.knowledge_base_id")
+    service.invalidate_semantic_cache.assert_awaited_once()
+    assert set(service.invalidate_semantic_cache.await_args.args[0]) == {old_kb, new_kb}
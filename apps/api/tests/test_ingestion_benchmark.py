@@ -0,0 +1,173 @@
+"""Embedding Ingestion Benchmark
+
+Compares the legacy per-row INSERT path against the binary COPY bulk writer
+and reports chunks/second at 1k, 10k and 100k chunks. Embeddings are
+synthetic, so only the database write path is measured.
+
+Usage:
+    python tests/test_ingestion_benchmark.py [--sizes 1000,10000,100000] [--dimensions 1536]
+"""
+
+import argparse
+import asyncio
+import json
+import time
+import random
+import string
+from uuid import uuid4
+from datetime import datetime
+from typing import List, Dict, Any
+
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.config import settings
+from services.vector_bulk_writer import EmbeddingBulkWriter
+
+
+class IngestionBenchmark:
+    """Benchmark suite for knowledge_embeddings ingestion"""
+
+    def __init__(self, dimensions: int = 1536, batch_size: int = 100):
+        self.dimensions = dimensions
+        self.batch_size = batch_size
+        self.writer = EmbeddingBulkWriter()
+        async_url = settings.DATABASE_URL.replace('postgresql://', 'postgresql+asyncpg://')
+        self.engine = create_async_engine(async_url, pool_size=5)
+        self.SessionLocal = async_sessionmaker(self.engine, class_=AsyncSession)
+        self.results: List[Dict[str, Any]] = []
+
+    def generate_records(self, count: int, knowledge_base_id, document_id) -> List[Dict[str, Any]]:
+        """Generate synthetic chunk rows"""
+        rng = np.random.default_rng(42)
+        vectors = rng.standard_normal((count, self.dimensions), dtype=np.float32)
+        records = []
+        for i in range(count):
+            content = ' '.join(
+                ''.join(random.choices(string.ascii_lowercase, k=random.randint(3, 10)))
+                for _ in range(120)
+            )
+            records.append(self.writer.build_record(
+                document_id=document_id,
+                knowledge_base_id=knowledge_base_id,
+                chunk_index=i,
+                content=content,
+                embedding=vectors[i],
+                token_count=len(content) // 4,
+                metadata={'benchmark': True, 'chunk_index': i}
+            ))
+        return records
+
+    async def _create_parents(self, session: AsyncSession):
+        """Create the knowledge base and document rows the chunks reference"""
+        knowledge_base_id, document_id = uuid4(), uuid4()
+        now = datetime.utcnow()
+        await session.execute(text("""
+            INSERT INTO knowledge_bases (id, name, type, is_public, is_active, embedding_model,
+                embedding_dimensions, total_documents, total_chunks, total_tokens, created_at, updated_at)
+            VALUES (:id, 'ingestion-benchmark', 'general', false, true, 'text-embedding-3-small',
+                :dims, 0, 0, 0, :now, :now)
+        """), {'id': knowledge_base_id, 'dims': self.dimensions, 'now': now})
+        await session.execute(text("""
+            INSERT INTO knowledge_documents (id, knowledge_base_id, title, source_type,
+                chunk_count, token_count, processing_status, created_at, updated_at)
+            VALUES (:id, :kb_id, 'ingestion-benchmark', 'text', 0, 0, 'processing', :now, :now)
+        """), {'id': document_id, 'kb_id': knowledge_base_id, 'now': now})
+        await session.commit()
+        return knowledge_base_id, document_id
+
+    async def _cleanup(self, knowledge_base_id):
+        async with self.SessionLocal() as session:
+            await session.execute(text("DELETE FROM knowledge_bases WHERE id = :id"), {'id': knowledge_base_id})
+            await session.commit()
+
+    async def run_legacy_insert(self, records: List[Dict[str, Any]]) -> float:
+        """Per-row INSERT with string-formatted vectors (previous implementation)"""
+        start = time.perf_counter()
+        for i in range(0, len(records), self.batch_size):
+            async with self.SessionLocal() as session:
+                for record in records[i:i + self.batch_size]:
+                    await session.execute(
+                        text("""
+                            INSERT INTO knowledge_embeddings
+                            (id, document_id, knowledge_base_id, chunk_index, chunk_size,
+                             content, embedding, token_count, metadata, created_at, updated_at)
+                            VALUES (:id, :document_id, :knowledge_base_id, :chunk_index, :chunk_size,
+                                    :content, :embedding, :token_count, :metadata, :created_at, :updated_at)
+                        """),
+                        {
+                            **record,
+                            'id': uuid4(),
+                            'embedding': f"[{','.join(map(str, record['embedding'].tolist()))}]",
+                            'metadata': json.dumps(record['metadata'])
+                        }
+                    )
+                await session.commit()
+        return time.perf_counter() - start
+
+    async def run_bulk_copy(self, records: List[Dict[str, Any]]) -> float:
+        """Binary COPY through EmbeddingBulkWriter, one COPY per batch"""
+        start = time.perf_counter()
+        for i in range(0, len(records), self.batch_size):
+            async with self.SessionLocal() as session:
+                await self.writer.write(session, records[i:i + self.batch_size])
+                await session.commit()
+        return time.perf_counter() - start
+
+    async def benchmark_size(self, count: int, include_legacy: bool) -> Dict[str, Any]:
+        print(f"\n📊 Ingesting {count} chunks ({self.dimensions} dims)...")
+        async with self.SessionLocal() as session:
+            knowledge_base_id, document_id = await self._create_parents(session)
+
+        try:
+            records = self.generate_records(count, knowledge_base_id, document_id)
+            result = {'chunks': count}
+
+            copy_time = await self.run_bulk_copy(records)
+            result['copy_seconds'] = copy_time
+            result['copy_chunks_per_second'] = count / copy_time
+            print(f"   COPY:   {result['copy_chunks_per_second']:.0f} chunks/s ({copy_time:.2f}s)")
+
+            if include_legacy:
+                legacy_time = await self.run_legacy_insert(records)
+                result['legacy_seconds'] = legacy_time
+                result['legacy_chunks_per_second'] = count / legacy_time
+                result['speedup'] = legacy_time / copy_time
+                print(f"   INSERT: {result['legacy_chunks_per_second']:.0f} chunks/s ({legacy_time:.2f}s)")
+                print(f"   Speedup: {result['speedup']:.1f}x")
+
+            self.results.append(result)
+            return result
+        finally:
+            await self._cleanup(knowledge_base_id)
+
+    async def run(self, sizes: List[int], legacy_limit: int = 10000):
+        for size in sizes:
+            await self.benchmark_size(size, include_legacy=size <= legacy_limit)
+        await self.engine.dispose()
+        return self.results
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark knowledge_embeddings ingestion")
+    parser.add_argument("--sizes", default="1000,10000,100000")
+    parser.add_argument("--dimensions", type=int, default=1536)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--legacy-limit", type=int, default=10000,
+                        help="Skip the per-row INSERT baseline above this many chunks")
+    args = parser.parse_args()
+
+    benchmark = IngestionBenchmark(dimensions=args.dimensions, batch_size=args.batch_size)
+    results = await benchmark.run([int(s) for s in args.sizes.split(",")], args.legacy_limit)
+
+    print("\n" + "=" * 60)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,268 @@
+"""Tests for the staged multi-file ingestion pipeline"""
+
+import asyncio
+import hashlib
+import pytest
+from uuid import UUID, uuid4
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.document_extractor import DocumentExtractor, ExtractionError, extract_text
+from services.ingestion_pipeline import IngestionPipeline
+
+
+class FakeExtractor:
+    """Extractor stand-in; "|" separates pages and files named bad.* fail"""
+
+    def __init__(self, gate=None):
+        self.gate = gate
+
+    async def iter_pages(self, filename, content, file_ext, path=None):
+        if filename.startswith("bad"):
+            raise ExtractionError("No text content could be extracted")
+        if path:
+            with open(path, 'rb') as spool:
+                content = spool.read()
+        for number, page in enumerate(content.decode().split("|"), start=1):
+            yield number, page
+            if self.gate:
+                await asyncio.wait_for(self.gate.wait(), 2)
+
+
+def _chunk(text):
+    words = text.split("\n", 1)[-1].split()
+    return [{'content': part, 'token_count': 1, 'chunk_index': i} for i, part in enumerate(words)]
+
+
+def _files(*specs):
+    return [
+        {'filename': name, 'file_ext': '.txt', 'content': body.encode(), 'content_type': 'text/plain'}
+        for name, body in specs
+    ]
+
+
+@pytest.fixture
+def pipeline_env(fake_session):
+    session = fake_session
+    embed = AsyncMock(side_effect=lambda texts, user_id=None: ([[0.1, 0.2]] * len(texts), {}))
+    write = AsyncMock(side_effect=lambda session, records: [uuid4() for _ in records])
+    with patch("services.ingestion_pipeline.pgvector_service") as pgvector, \
+         patch("services.ingestion_pipeline.embedding_service") as embeddings, \
+         patch("services.ingestion_pipeline.embedding_bulk_writer.write", write), \
+         patch("services.ingestion_pipeline.get_redis", side_effect=RuntimeError("no redis")), \
+         patch("services.knowledge_service.KnowledgeService._update_knowledge_base_stats", new_callable=AsyncMock):
+        pgvector.AsyncSessionLocal = MagicMock(return_value=session)
+        pgvector._chunk_text = _chunk
+        pgvector.invalidate_semantic_cache = AsyncMock()
+        embeddings.generate_embeddings_with_fallback = embed
+        yield {'session': session, 'embed': embed, 'write': write}
+
+
+def _pipeline(extractor=None, **kwargs):
+    pipeline = IngestionPipeline(**kwargs)
+    pipeline.extractor = extractor or FakeExtractor()
+    return pipeline
+
+
+@pytest.mark.asyncio
+async def test_chunks_from_several_files_share_embedding_batches(pipeline_env):
+    pipeline = _pipeline(embed_concurrency=1, embed_batch_size=10, embed_linger_ms=50)
+
+    batch = await pipeline.run(uuid4(), uuid4(), _files(
+        ("a.txt", "one two three"), ("b.txt", "four five"), ("c.txt", "six seven eight")
+    ))
+
+    assert batch['status'] == 'completed'
+    assert pipeline_env['embed'].await_count == 1
+    assert len(pipeline_env['embed'].await_args.args[0]) == 8
+    assert [state['embedded_chunks'] for state in batch['files']] == [3, 2, 3]
+    assert all(len(state['chunk_ids']) == state['chunk_count'] for state in batch['files'])
+
+
+@pytest.mark.asyncio
+async def test_embedding_batches_respect_batch_size(pipeline_env):
+    pipeline = _pipeline(embed_concurrency=2, embed_batch_size=4)
+
+    batch = await pipeline.run(uuid4(), uuid4(), _files(("a.txt", " ".join(f"w{i}" for i in range(10)))))
+
+    sizes = [len(call.args[0]) for call in pipeline_env['embed'].await_args_list]
+    assert sum(sizes) == 10
+    assert max(sizes) <= 4
+    assert batch['files'][0]['status'] == 'completed'
+
+
+@pytest.mark.asyncio
+async def test_embedding_starts_before_extraction_finishes(pipeline_env):
+    gate = asyncio.Event()
+    embed = pipeline_env['embed'].side_effect
+    pipeline_env['embed'].side_effect = lambda texts, user_id=None: (gate.set(), embed(texts))[1]
+    pipeline = _pipeline(FakeExtractor(gate), embed_linger_ms=10)
+
+    # The second page is only produced after the first page has been embedded
+    batch = await pipeline.run(uuid4(), uuid4(), _files(("a.pdf", "one two|three four")))
+
+    assert batch['files'][0]['status'] == 'completed'
+    assert batch['files'][0]['chunk_count'] == 4
+    assert 'three' not in pipeline_env['embed'].await_args_list[0].args[0]
+
+
+@pytest.mark.asyncio
+async def test_spooled_uploads_are_ingested_and_removed(pipeline_env, tmp_path):
+    spool = tmp_path / "upload.txt"
+    spool.write_bytes(b"alpha beta gamma")
+    files = [{'filename': 'a.txt', 'file_ext': '.txt', 'content': None, 'content_type': 'text/plain',
+              'path': str(spool), 'file_size': 16, 'file_hash': 'f' * 64}]
+
+    batch = await _pipeline().run(uuid4(), uuid4(), files)
+
+    assert batch['files'][0]['status'] == 'completed'
+    assert batch['files'][0]['chunk_count'] == 3
+    assert batch['files'][0]['file_size'] == 16
+    assert not spool.exists()
+
+
+@pytest.mark.asyncio
+async def test_failed_file_does_not_stop_the_batch(pipeline_env):
+    pipeline = _pipeline()
+
+    files = _files(("good.txt", "alpha beta"), ("bad.txt", "x"))
+    files.append({'filename': 'notes.exe', 'file_ext': '.exe', 'content': None,
+                  'content_type': None, 'error': "File type .exe not supported"})
+    batch = await pipeline.run(uuid4(), uuid4(), files)
+
+    assert batch['status'] == 'partial'
+    assert [state['status'] for state in batch['files']] == ['completed', 'failed', 'failed']
+    assert "No text content" in batch['files'][1]['error']
+
+
+@pytest.mark.asyncio
+async def test_failed_file_leaves_no_chunks_behind(pipeline_env):
+    session = pipeline_env['session']
+    calls = []
+
+    async def embed(texts, user_id=None):
+        calls.append(texts)
+        if len(calls) == 2:
+            raise RuntimeError("provider down")
+        return [[0.1, 0.2]] * len(texts), {}
+
+    pipeline_env['embed'].side_effect = embed
+    batch = await _pipeline(embed_concurrency=1, embed_batch_size=2).run(
+        uuid4(), uuid4(), _files(("a.txt", "one two three four"))
+    )
+
+    state = batch['files'][0]
+    assert state['status'] == 'failed'
+    assert pipeline_env['write'].await_count == 1
+    assert session.params("DELETE FROM knowledge_embeddings") == {'id': UUID(state['document_id'])}
+    assert session.sql("DELETE FROM knowledge_document_centroids")
+
+
+@pytest.mark.asyncio
+async def test_chunks_written_after_a_failure_are_discarded(pipeline_env):
+    session = pipeline_env['session']
+
+    class FailingExtractor:
+        async def iter_pages(self, filename, content, file_ext, path=None):
+            yield 1, "one two"
+            # Fails while the first page is still being embedded
+            await asyncio.sleep(0.05)
+            raise ExtractionError("Extraction of a.pdf timed out after 120s")
+
+    async def embed(texts, user_id=None):
+        await asyncio.sleep(0.1)
+        return [[0.1, 0.2]] * len(texts), {}
+
+    async def write(session, records):
+        session.statements.append(("COPY knowledge_embeddings", None))
+        return [uuid4() for _ in records]
+
+    pipeline_env['embed'].side_effect = embed
+    pipeline_env['write'].side_effect = write
+    batch = await _pipeline(FailingExtractor(), embed_concurrency=1, embed_linger_ms=20).run(uuid4(), uuid4(), _files(("a.pdf", "")))
+
+    assert batch['files'][0]['status'] == 'failed'
+    statements = [sql.split(" WHERE")[0].strip() for sql in session.sql(" knowledge_embeddings")
+                  if not sql.lstrip().startswith("SELECT")]
+    assert statements == [
+        "DELETE FROM knowledge_embeddings", "COPY knowledge_embeddings", "DELETE FROM knowledge_embeddings"
+    ]
+    assert batch['files'][0]['embedded_chunks'] == 0
+
+
+@pytest.mark.asyncio
+async def test_duplicate_files_in_one_batch_are_rejected(pipeline_env):
+    pipeline = _pipeline()
+
+    batch = await pipeline.run(uuid4(), uuid4(), _files(("a.txt", "same text"), ("b.txt", "same text")))
+
+    assert sorted(state['status'] for state in batch['files']) == ['completed', 'failed']
+    assert sum(len(call.args[0]) for call in pipeline_env['embed'].await_args_list) == 2
+
+
+@pytest.mark.asyncio
+async def test_files_are_deduplicated_on_extracted_text(pipeline_env):
+    session = pipeline_env['session']
+
+    batch = await _pipeline().run(uuid4(), uuid4(), _files(("a.txt", "alpha beta")))
+
+    # Same hash basis as KnowledgeService.upload_document_text
+    stored = session.params("SET content = :content")
+    assert batch['files'][0]['status'] == 'completed'
+    assert stored['hash'] == hashlib.sha256(stored['content'].encode()).hexdigest()
+
+    session.reset()
+    session.respond("AND file_hash = :hash", rows=[(uuid4(),)])
+    batch = await _pipeline().run(uuid4(), uuid4(), _files(("a.txt", "alpha beta")))
+
+    assert batch['files'][0]['status'] == 'failed'
+    assert "same content" in batch['files'][0]['error']
+    assert session.sql("DELETE FROM knowledge_embeddings")
+    assert not session.sql("SET content = :content")
+
+
+@pytest.mark.asyncio
+async def test_reuploaded_file_is_rejected_before_embedding(pipeline_env):
+    session = pipeline_env['session']
+    session.respond("metadata->>'file_hash' = :file_hash", rows=[(uuid4(),)])
+
+    batch = await _pipeline().run(uuid4(), uuid4(), _files(("a.txt", "alpha beta")))
+
+    assert batch['files'][0]['status'] == 'failed'
+    assert "same content" in batch['files'][0]['error']
+    assert session.params("metadata->>'file_hash'")['file_hash'] == hashlib.sha256(b"alpha beta").hexdigest()
+    assert not session.sql("INSERT INTO knowledge_documents")
+    pipeline_env['embed'].assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_submit_returns_before_processing(pipeline_env):
+    pipeline = _pipeline()
+
+    summary = await pipeline.submit(uuid4(), uuid4(), _files(("a.txt", "one two")))
+
+    assert summary['status'] == 'pending'
+    assert summary['files'][0]['progress'] == 0
+    await asyncio.gather(*pipeline._tasks)
+    status = await pipeline.get_batch_status(summary['batch_id'])
+    assert status['status'] == 'completed'
+    assert status['files'][0]['progress'] == 100
+    assert 'chunk_ids' not in status['files'][0]
+
+
+def test_extract_text_rejects_unsupported_type():
+    with pytest.raises(ExtractionError) as error:
+        extract_text("file.exe", b"data", ".exe")
+    assert error.value.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_extractor_runs_in_worker_process():
+    extractor = DocumentExtractor(max_workers=1)
+    try:
+        assert await extractor.extract("notes.txt", b"hello world", ".txt") == "hello world"
+    finally:
+        extractor.shutdown()
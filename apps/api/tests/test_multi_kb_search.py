@@ -0,0 +1,115 @@
+"""Tests for multi-knowledge-base retrieval"""
+
+import pytest
+from uuid import uuid4
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.knowledge_service import KnowledgeService
+from services.pgvector_service import PGVectorService
+from services.vector_index_manager import VectorIndexManager
+
+
+def _result(rows):
+    result = MagicMock()
+    result.fetchall.return_value = rows
+    return result
+
+
+@pytest.mark.asyncio
+async def test_query_is_embedded_once_for_all_knowledge_bases():
+    service = PGVectorService.__new__(PGVectorService)
+    service.metrics = {'search_times': []}
+    service._embed_query = AsyncMock(return_value=[0.1, 0.2])
+    service.index_manager = VectorIndexManager(MagicMock())
+
+    kb_a, kb_b, doc_id = uuid4(), uuid4(), uuid4()
+    rows = [
+        MagicMock(content="close", metadata={'chunk_index': 1}, document_id=doc_id,
+                  knowledge_base_id=kb_b, title="Doc", similarity=0.9),
+        MagicMock(content="far", metadata={}, document_id=doc_id,
+                  knowledge_base_id=kb_a, title="Doc", similarity=0.5),
+    ]
+    session = MagicMock()
+    session.execute = AsyncMock(return_value=_result(rows))
+    session_cm = MagicMock()
+    session_cm.__aenter__ = AsyncMock(return_value=session)
+    session_cm.__aexit__ = AsyncMock(return_value=False)
+    service.AsyncSessionLocal = MagicMock(return_value=session_cm)
+
+    results = await service.search_similar_multi("query", [kb_a, kb_b], k=6, score_threshold=0.7)
+
+    service._embed_query.assert_awaited_once()
+    session.execute.assert_awaited_once()
+    params = session.execute.call_args[0][1]
+    assert params['kb_ids'] == [kb_a, kb_b]
+    assert params['k'] == 6
+    assert len(results) == 1
+    assert results[0][0]['document_title'] == "Doc"
+    assert results[0][0]['knowledge_base_id'] == kb_b
+
+
+@pytest.mark.asyncio
+async def test_inaccessible_knowledge_bases_are_skipped():
+    service = KnowledgeService()
+    kb_ok, kb_denied, doc_id = uuid4(), uuid4(), uuid4()
+
+    db = MagicMock()
+    db.execute = AsyncMock(return_value=_result([MagicMock(id=kb_ok)]))
+    user = MagicMock(id=uuid4())
+    service._log_search = AsyncMock()
+
+    hits = [({
+        'page_content': "chunk text",
+        'metadata': {'chunk_index': 2},
+        'document_id': doc_id,
+        'knowledge_base_id': kb_ok,
+        'document_title': "Title"
+    }, 0.88)]
+
+    with patch("services.knowledge_service.pgvector_service") as pgvector:
+        pgvector.search_similar_multi = AsyncMock(return_value=hits)
+        response = await service.multi_knowledge_base_search(
+            db, user, "query", [kb_ok, kb_denied], k=3
+        )
+
+    pgvector.search_similar_multi.assert_awaited_once_with("query", [kb_ok], 3, 0.7)
+    assert response["total_results"] == 1
+    result = response["results"][0]
+    assert result["document_id"] == doc_id
+    assert result["document_title"] == "Title"
+    assert result["chunk_index"] == 2
+    service._log_search.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_fallback_hits_keep_their_knowledge_base(fake_session):
+    service = KnowledgeService()
+    kb_a, kb_b = uuid4(), uuid4()
+    service._get_accessible_knowledge_base_ids = AsyncMock(return_value=[kb_a, kb_b])
+    service._log_search = AsyncMock()
+    fake_session.respond("ts_rank", rows=lambda params: [MagicMock(
+        id=uuid4(), knowledge_base_id=params['kb_id'], title="Doc", content="text",
+        created_at=None, score=0.4 if params['kb_id'] == str(kb_a) else 0.6
+    )])
+
+    with patch("services.knowledge_service.pgvector_service") as pgvector:
+        pgvector.search_similar_multi = AsyncMock(side_effect=RuntimeError("pgvector down"))
+        response = await service.multi_knowledge_base_search(
+            fake_session, MagicMock(id=uuid4()), "query", [kb_a, kb_b], k=3
+        )
+
+    assert [result["knowledge_base_id"] for result in response["results"]] == [kb_b, kb_a]
+    logged = {call.args[2]: call.args[4] for call in service._log_search.await_args_list}
+    assert logged == {kb_a: 1, kb_b: 1}
+
+
+def test_malformed_assistant_knowledge_base_ids_are_skipped():
+    from routers.chat import _rag_knowledge_base_ids
+
+    kb_id = uuid4()
+    assert _rag_knowledge_base_ids([str(kb_id), "not-a-uuid", ""]) == [kb_id]
+    assert _rag_knowledge_base_ids(None) == []
@@ -0,0 +1,165 @@
+"""Tests for SimHash near-duplicate detection"""
+
+import pytest
+from uuid import uuid4
+from unittest.mock import AsyncMock, MagicMock
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.near_duplicate import (
+    NearDuplicateIndex, SimHashLSH, simhash, to_signed, hamming_distance, bands
+)
+
+MANUAL = (
+    "To reset the router hold the power button for ten seconds until the status light "
+    "blinks amber, then release it and wait for the device to restart. Reconnect every "
+    "client after the restart and confirm that the firmware version shown in the admin "
+    "console matches the version listed in the release notes for your hardware model. "
+    "If the light keeps blinking after five minutes, unplug the router, wait thirty "
+    "seconds and plug it back in. Settings made before the reset are lost, so restore "
+    "the backup you exported from the admin console or configure the wireless network "
+    "name, the password and the guest network again by hand. Contact support with the "
+    "serial number printed on the label under the device if the reset does not finish."
+)
+
+
+def _stored_session(session, stored):
+    """Serve stored (fingerprint, embedding) pairs keyed by chunk id"""
+    session.respond("simhash IS NOT NULL", rows=[
+        MagicMock(id=chunk_id, simhash=to_signed(fingerprint)) for chunk_id, (fingerprint, _) in stored.items()
+    ])
+    session.rows = lambda params: [
+        MagicMock(id=chunk_id, embedding="[" + ",".join(map(str, stored[chunk_id][1])) + "]")
+        for chunk_id in params['ids']
+    ]
+    return session
+
+
+def test_small_edits_stay_within_distance():
+    edited = MANUAL.replace("ten seconds", "10 seconds")
+
+    assert hamming_distance(simhash(MANUAL), simhash(edited)) <= NearDuplicateIndex().max_distance
+    assert hamming_distance(simhash(MANUAL), simhash("Quarterly revenue grew in every region.")) > 10
+
+
+def test_case_and_whitespace_do_not_change_fingerprint():
+    assert simhash(MANUAL) == simhash("  " + MANUAL.upper().replace(" ", "\n"))
+
+
+def test_signed_round_trip():
+    fingerprint = (1 << 64) - 5
+    assert to_signed(fingerprint) == -5
+    assert to_signed(fingerprint) & ((1 << 64) - 1) == fingerprint
+
+
+def test_lsh_finds_neighbours_sharing_a_band():
+    table = SimHashLSH()
+    base = simhash(MANUAL)
+    table.add(base, "stored")
+
+    # Flip one bit in each of three bands; one band still matches exactly
+    neighbour = base ^ (1 << 63) ^ (1 << 40) ^ (1 << 20)
+
+    assert table.nearest(neighbour, 3) == ("stored", 3)
+    assert table.nearest(base ^ 0b1111, 3) is None
+    assert len(bands(base)) == 4
+
+
+@pytest.mark.asyncio
+async def test_stored_near_duplicates_reuse_embeddings(fake_session):
+    stored_id = uuid4()
+    session = _stored_session(fake_session, {stored_id: (simhash(MANUAL), [0.5, 0.25])})
+    embed = AsyncMock(side_effect=lambda texts: ([[0.1, 0.1]] * len(texts), {}))
+    index = NearDuplicateIndex()
+
+    contents = [MANUAL.replace("ten seconds", "10 seconds"), "An unrelated paragraph about expenses."]
+    kb_id = uuid4()
+    embeddings, links = await index.embed(contents, embed, MagicMock(return_value=session), kb_id)
+
+    assert embeddings == [[0.5, 0.25], [0.1, 0.1]]
+    assert links == [str(stored_id), None]
+    embed.assert_awaited_once_with(["An unrelated paragraph about expenses."])
+    # Candidates and their vectors come only from the target knowledge base
+    assert all(params['kb_id'] == kb_id for _, params in session.statements)
+    assert all("knowledge_base_id = :kb_id" in sql for sql in session.sql())
+
+
+@pytest.mark.asyncio
+async def test_near_duplicates_within_a_batch_are_embedded_once(fake_session):
+    embed = AsyncMock(side_effect=lambda texts: ([[float(i)] for i in range(len(texts))], {}))
+    index = NearDuplicateIndex()
+
+    embeddings, links = await index.embed(
+        [MANUAL, "Something else entirely.", MANUAL + " "],
+        embed,
+        MagicMock(return_value=_stored_session(fake_session, {})),
+        uuid4()
+    )
+
+    assert embed.await_args.args[0] == [MANUAL, "Something else entirely."]
+    assert embeddings[2] == embeddings[0]
+    assert links == [None, None, None]
+
+
+@pytest.mark.asyncio
+async def test_lookup_failure_falls_back_to_embedding():
+    failing = MagicMock(side_effect=RuntimeError("database down"))
+    embed = AsyncMock(side_effect=lambda texts: ([[1.0]] * len(texts), {}))
+    index = NearDuplicateIndex()
+
+    embeddings, links = await index.embed([MANUAL], embed, failing, uuid4())
+
+    assert embeddings == [[1.0]]
+    assert index.stats['lookup_errors'] == 1
+
+
+def test_collapse_keeps_the_highest_ranked_copy():
+    results = [
+        ({'page_content': MANUAL}, 0.93),
+        ({'page_content': MANUAL.replace("amber", "orange")}, 0.92),
+        ({'page_content': "Expense reports are due monthly."}, 0.81),
+    ]
+
+    collapsed = NearDuplicateIndex().collapse(results, limit=5)
+
+    assert [score for _, score in collapsed] == [0.93, 0.81]
+
+
+@pytest.mark.asyncio
+async def test_chunks_without_words_are_never_matched(fake_session):
+    embed = AsyncMock(side_effect=lambda texts: ([[float(i)] for i in range(len(texts))], {}))
+    index = NearDuplicateIndex()
+    stored_id = uuid4()
+    session = _stored_session(fake_session, {stored_id: (0, [9.0])})
+
+    embeddings, links = await index.embed(["| --- | --- |", "***", "---"], embed, MagicMock(return_value=session), uuid4())
+
+    assert embed.await_args.args[0] == ["| --- | --- |", "***", "---"]
+    assert embeddings == [[0.0], [1.0], [2.0]]
+    assert links == [None, None, None]
+    assert not session.statements
+    collapsed = index.collapse([({'page_content': "***"}, 0.9), ({'page_content': "==="}, 0.8)])
+    assert [score for _, score in collapsed] == [0.9, 0.8]
+
+
+@pytest.mark.asyncio
+async def test_search_collapses_duplicates_from_a_larger_candidate_set(fake_session):
+    from tests.test_semantic_cache import _cache_session, _service
+
+    rows = [
+        MagicMock(content=content, metadata={}, document_id=uuid4(), knowledge_base_id=uuid4(),
+                  title="Doc", similarity=score)
+        for content, score in [(MANUAL, 0.95), (MANUAL.replace("amber", "orange"), 0.94),
+                               ("Expense reports are due monthly.", 0.90)]
+    ]
+    session = _cache_session(fake_session, rows=rows)
+    service = _service(session)
+
+    hits = await service.search_similar("reset router", uuid4(), k=2, collapse_duplicates=True)
+
+    assert [score for _, score in hits] == [0.95, 0.90]
+    search_params = next(params for sql, params in session.statements if "knowledge_embeddings" in sql)
+    assert search_params['k'] == 4
+    assert not any("semantic_cache" in sql for sql, _ in session.statements)
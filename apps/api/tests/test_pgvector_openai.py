@@ -265,7 +265,7 @@ async def test_search_similar_with_embeddings(pgvector_service):
             ]
             mock_session_instance.execute.return_value = mock_result
             
-            with patch.object(pgvector_service, '_update_semantic_cache', new_callable=AsyncMock):
+            with patch.object(pgvector_service, '_store_semantic_cache', new_callable=AsyncMock):
                 with patch.object(pgvector_service, '_log_search_history', new_callable=AsyncMock):
                     results = await pgvector_service.search_similar(
                         query, knowledge_base_id, user_id=user_id
@@ -0,0 +1,168 @@
+"""Tests for adaptive embedding provider routing"""
+
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, patch
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.provider_router import ProviderRouter
+from services.embedding_service import EmbeddingService, EmbeddingProvider, EmbeddingRateLimitError
+from core.config import settings
+
+
+class NoCache:
+    """Embedding cache stand-in that never hits"""
+
+    def cache_key(self, model, text):
+        return f"{model}:{text}"
+
+    async def get_many(self, keys):
+        return {}
+
+    async def set_many(self, vectors):
+        pass
+
+
+def _service(generate, router=None):
+    service = EmbeddingService()
+    if router is not None:
+        service.provider_router = router
+    service.get_active_api_key = AsyncMock(return_value="key")
+    service.rate_limiter.check_rate_limit = AsyncMock(return_value=(True, {}))
+    service._update_usage_metrics = AsyncMock()
+    service._tiktoken_len = lambda text: 1
+    service._generate_embeddings = AsyncMock(side_effect=generate)
+    return service
+
+
+def test_circuit_opens_and_recovers_through_a_probe():
+    router = ProviderRouter(failure_threshold=2, cooldown=30)
+    for _ in range(2):
+        router.record_failure("a", 0.1)
+
+    assert router.rank(["a", "b"]) == ["b", "a"]
+
+    router.providers["a"].open_until -= 31
+    assert router.rank(["a", "b"]) == ["a", "b"]  # probe at its usual position
+    assert router.rank(["a", "b"]) == ["b", "a"]  # only one probe per cooldown
+    assert router.stats['probes'] == 1
+
+    router.record_success("a", 0.05)
+    assert router.rank(["a", "b"]) == ["a", "b"]
+    assert router.get_stats()['providers']['a']['circuit'] == 'closed'
+
+
+def test_failed_probe_doubles_cooldown():
+    router = ProviderRouter(failure_threshold=1, cooldown=10)
+    router.record_failure("a", 0.1)
+    router.providers["a"].open_until -= 11
+    router.rank(["a"])
+    router.record_failure("a", 0.1)
+
+    assert router.providers["a"].cooldown == 20
+
+
+def test_low_headroom_and_errors_demote_provider():
+    router = ProviderRouter(min_samples=5, degraded_error_rate=0.2, failure_threshold=100)
+    router.record_headroom("a", 0.05)
+    for i in range(10):
+        router.record_success("b", 0.1) if i % 3 else router.record_failure("b", 0.1)
+
+    assert router.rank(["a", "b", "c"]) == ["c", "a", "b"]
+
+
+def test_hedge_delay_tracks_p95():
+    router = ProviderRouter(hedge_after_ms=100, min_samples=5)
+    assert router.hedge_delay("a") == 0.1
+    for latency in [0.2] * 10:
+        router.record_success("a", latency)
+    assert router.hedge_delay("a") == pytest.approx(0.2)
+    assert ProviderRouter(hedge_after_ms=0).hedge_delay("a") is None
+
+
+@pytest.mark.asyncio
+async def test_slow_provider_is_hedged():
+    async def generate(texts, provider, model, api_key, config):
+        if provider == EmbeddingProvider.OPENAI:
+            await asyncio.sleep(5)
+        return [[1.0] * 3 for _ in texts]
+
+    service = _service(generate, ProviderRouter(hedge_after_ms=50))
+    service.provider_priority = [EmbeddingProvider.OPENAI, EmbeddingProvider.LOCAL]
+
+    with patch("services.embedding_service.embedding_cache", NoCache()):
+        embeddings, meta = await asyncio.wait_for(service.generate_embeddings_with_fallback(["text"]), 2)
+
+    assert meta['provider'] == EmbeddingProvider.LOCAL
+    assert service.provider_router.stats['hedged'] == 1
+    assert service.provider_router.stats['hedge_wins'] == 1
+
+
+@pytest.mark.asyncio
+async def test_failing_provider_is_skipped_once_its_circuit_opens():
+    async def generate(texts, provider, model, api_key, config):
+        if provider == EmbeddingProvider.OPENAI:
+            raise RuntimeError("boom")
+        return [[1.0] * 3 for _ in texts]
+
+    service = _service(generate, ProviderRouter(failure_threshold=2, hedge_after_ms=0))
+    service.provider_priority = [EmbeddingProvider.OPENAI, EmbeddingProvider.LOCAL]
+
+    with patch("services.embedding_service.embedding_cache", NoCache()):
+        for _ in range(3):
+            _, meta = await service.generate_embeddings_with_fallback(["text"])
+
+    assert meta['provider'] == EmbeddingProvider.LOCAL
+    openai_calls = [call for call in service._generate_embeddings.await_args_list
+                    if call.args[1] == EmbeddingProvider.OPENAI]
+    assert len(openai_calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_routing_never_switches_model_or_dimensions():
+    async def generate(texts, provider, model, api_key, config):
+        raise RuntimeError("down")
+
+    service = _service(generate, ProviderRouter(hedge_after_ms=0))
+
+    with patch("services.embedding_service.embedding_cache", NoCache()):
+        await service.generate_embeddings_with_fallback(["text"], preferred_model="embed-english-v3.0")
+        tried_for_model = {call.args[1] for call in service._generate_embeddings.await_args_list}
+        service._generate_embeddings.reset_mock()
+        await service.generate_embeddings_with_fallback(["text"])
+        tried_by_default = {call.args[1] for call in service._generate_embeddings.await_args_list}
+
+    assert tried_for_model == {EmbeddingProvider.COHERE}
+    # Only providers producing vectors as wide as the vector store
+    assert tried_by_default == {EmbeddingProvider.OPENAI, EmbeddingProvider.LOCAL}
+
+
+@pytest.mark.asyncio
+async def test_rate_limited_providers_raise_instead_of_falling_back():
+    service = _service(lambda *args: None, ProviderRouter(hedge_after_ms=0))
+    service.provider_priority = [EmbeddingProvider.OPENAI]
+    service.rate_limiter.check_rate_limit = AsyncMock(return_value=(False, {'reason': "token_limit_exceeded"}))
+
+    with patch("services.embedding_service.embedding_cache", NoCache()):
+        _, meta = await service.generate_embeddings_with_fallback(["text"])
+        with pytest.raises(EmbeddingRateLimitError) as error:
+            await service.generate_embeddings_with_fallback(["text"], raise_on_rate_limit=True)
+
+    assert meta['fallback_reason'] == "all_providers_failed"
+    assert error.value.providers == ["openai"]
+
+
+def test_batch_limits_fit_every_compatible_provider():
+    service = EmbeddingService()
+
+    limits = service.batch_limits(concurrency=4)
+    cohere = service.batch_limits(concurrency=4, preferred_model="embed-english-v3.0")
+
+    # OpenAI and the local provider serve 1536-wide vectors; OpenAI is tighter
+    assert limits['max_batch'] == 100
+    assert limits['max_tokens'] == min(settings.EMBEDDING_BATCH_MAX_TOKENS, 1000000 // 8)
+    # 100k tokens per minute shared by four requests in flight
+    assert cohere == {'max_batch': 96, 'max_tokens': 12500}
@@ -0,0 +1,144 @@
+"""Queue Statistics and Key Pattern Benchmark at 100k keys
+
+Seeds a live Redis with task hashes and cache keys, then compares:
+
+- queue statistics from KEYS plus one HGET per task (the previous
+  get_queue_status) against the maintained status counters
+- KEYS/DEL against the SCAN/UNLINK implementations of RedisCache.get_keys
+  and RedisCache.flush_pattern
+
+For each operation it reports the wall time and the worst PING latency a
+concurrent client saw while the operation ran, which is how long Redis
+stopped serving everyone else.
+
+Usage:
+    python tests/test_queue_stats_benchmark.py [--keys 100000]
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from typing import Dict, Any, Callable, Awaitable
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.redis import init_redis, close_redis, get_redis, RedisCache
+from services.embedding_task_service import embedding_task_service, TaskStatus
+
+TASK_PREFIX = "bench_embedding_task:"
+CACHE_PREFIX = "bench_cache:"
+STATUSES = [status.value for status in TaskStatus]
+
+
+async def seed(count: int):
+    redis = get_redis()
+    for start in range(0, count, 1000):
+        async with redis.pipeline(transaction=False) as pipe:
+            for i in range(start, min(start + 1000, count)):
+                pipe.hset(f"{TASK_PREFIX}{i}", mapping={'status': STATUSES[i % len(STATUSES)], 'progress': 0})
+                pipe.set(f"{CACHE_PREFIX}{i}", "x" * 64)
+            await pipe.execute()
+
+
+async def legacy_queue_status() -> Dict[str, int]:
+    """The previous count: KEYS, then one round-trip per task"""
+    redis = get_redis()
+    counts = {status: 0 for status in STATUSES}
+    for key in await redis.keys(f"{TASK_PREFIX}*"):
+        status = await redis.hget(key, 'status')
+        if status in counts:
+            counts[status] += 1
+    return counts
+
+
+async def legacy_get_keys():
+    return await get_redis().keys(f"{CACHE_PREFIX}*")
+
+
+async def legacy_flush_pattern():
+    redis = get_redis()
+    keys = await redis.keys(f"{CACHE_PREFIX}*")
+    return await redis.delete(*keys) if keys else 0
+
+
+async def timed(operation: Callable[[], Awaitable[Any]]) -> Dict[str, Any]:
+    """Run an operation while a second client pings Redis continuously"""
+    # A dedicated connection, so pings do not queue behind the operation
+    # in the shared pool
+    probe = get_redis().client()
+    worst = 0.0
+    done = asyncio.Event()
+
+    async def ping():
+        nonlocal worst
+        while not done.is_set():
+            start = time.perf_counter()
+            await probe.ping()
+            worst = max(worst, time.perf_counter() - start)
+            await asyncio.sleep(0.001)
+
+    pinger = asyncio.create_task(ping())
+    start = time.perf_counter()
+    result = await operation()
+    elapsed = time.perf_counter() - start
+    done.set()
+    await pinger
+    await probe.aclose()
+    return {
+        'seconds': round(elapsed, 3),
+        'worst_ping_ms': round(worst * 1000, 2),
+        'result': result if isinstance(result, (int, dict)) else len(result)
+    }
+
+
+async def cleanup():
+    cache = RedisCache()
+    await cache.flush_pattern(f"{TASK_PREFIX}*")
+    await cache.flush_pattern(f"{CACHE_PREFIX}*")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark queue statistics and key pattern utilities")
+    parser.add_argument("--keys", type=int, default=100000)
+    args = parser.parse_args()
+
+    await init_redis()
+    cache = RedisCache()
+    results = {}
+    try:
+        await cleanup()
+        print(f"\n🌱 Seeding {args.keys} task hashes and {args.keys} cache keys...")
+        await seed(args.keys)
+
+        for name, operation in (
+            ('queue_status_keys_scan', legacy_queue_status),
+            ('queue_status_counters', embedding_task_service.get_queue_status),
+            ('get_keys_keys', legacy_get_keys),
+            ('get_keys_scan', lambda: cache.get_keys(f"{CACHE_PREFIX}*")),
+        ):
+            print(f"\n⏱  {name}...")
+            results[name] = await timed(operation)
+            print(f"   {results[name]['seconds']}s, worst ping {results[name]['worst_ping_ms']}ms")
+
+        # Each flush needs a fresh set of keys
+        for name, operation in (
+            ('flush_pattern_keys_del', legacy_flush_pattern),
+            ('flush_pattern_scan_unlink', lambda: cache.flush_pattern(f"{CACHE_PREFIX}*")),
+        ):
+            await seed(args.keys)
+            print(f"\n⏱  {name}...")
+            results[name] = await timed(operation)
+            print(f"   {results[name]['seconds']}s, worst ping {results[name]['worst_ping_ms']}ms")
+    finally:
+        await cleanup()
+        await close_redis()
+
+    print("\n" + "=" * 60)
+    print(json.dumps(results, indent=2, default=str))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,94 @@
+"""Tests for the single round-trip sliding-window rate limiter"""
+
+import time
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.embedding_service import RateLimiter
+
+
+def _limiter(*results, **kwargs):
+    """Limiter whose Lua script returns the given replies in order"""
+    script = AsyncMock(side_effect=list(results))
+    redis = MagicMock()
+    redis.register_script.return_value = script
+    limiter = RateLimiter(**kwargs)
+    patcher = patch("services.embedding_service.get_redis", return_value=redis)
+    patcher.start()
+    return limiter, script, patcher
+
+
+@pytest.mark.asyncio
+async def test_check_is_one_script_call():
+    limiter, script, patcher = _limiter([1, 0, 1, 100, 0, 0, b"0"], lease_fraction=0)
+    try:
+        allowed, info = await limiter.check_rate_limit("user", "openai", 10, 1000, 100)
+    finally:
+        patcher.stop()
+
+    assert allowed
+    assert info == {"requests_remaining": 9, "tokens_remaining": 900}
+    script.assert_awaited_once()
+    keys = script.call_args.kwargs["keys"]
+    assert keys == ["rate_limit:{user:openai}:window", "rate_limit:{user:openai}:totals"]
+    assert script.call_args.kwargs["args"][5:7] == [0, 0]
+
+
+@pytest.mark.asyncio
+async def test_denial_reports_reason_and_reset():
+    oldest = str(time.time() - 50).encode()
+    limiter, _, patcher = _limiter([0, 2, 3, 990, 0, 0, oldest])
+    try:
+        allowed, info = await limiter.check_rate_limit("user", "openai", 10, 1000, 50)
+    finally:
+        patcher.stop()
+
+    assert not allowed
+    assert info["reason"] == "token_limit_exceeded"
+    assert info["current"] == 990 and info["requested"] == 50
+    assert 9 <= info["reset_in"] <= 10.5
+
+
+@pytest.mark.asyncio
+async def test_lease_serves_later_checks_locally():
+    limiter, script, patcher = _limiter(
+        [1, 0, 3, 600, 2, 500, b"0"],  # admits the call and leases 2 requests / 500 tokens
+        [1, 0, 4, 900, 0, 0, b"0"],
+        lease_fraction=0.2
+    )
+    try:
+        results = [await limiter.check_rate_limit("user", "openai", 10, 2500, 100) for _ in range(3)]
+        # Lease exhausted: back to Redis
+        results.append(await limiter.check_rate_limit("user", "openai", 10, 2500, 100))
+    finally:
+        patcher.stop()
+
+    assert all(allowed for allowed, _ in results)
+    assert script.await_count == 2
+    assert script.call_args_list[0].kwargs["args"][5:7] == [2, 500]
+    assert limiter.stats["local_checks"] == 2
+
+
+@pytest.mark.asyncio
+async def test_lease_is_bypassed_when_tokens_or_time_run_out():
+    limiter, script, patcher = _limiter(
+        [1, 0, 3, 600, 5, 150, b"0"],
+        [1, 0, 4, 1000, 5, 150, b"0"],
+        [1, 0, 5, 1100, 0, 0, b"0"],
+        lease_fraction=0.2, lease_ttl=60
+    )
+    try:
+        await limiter.check_rate_limit("user", "openai", 10, 2500, 100)
+        # More tokens than the lease holds
+        await limiter.check_rate_limit("user", "openai", 10, 2500, 400)
+        limiter._leases["rate_limit:{user:openai}"]["expires"] = time.monotonic() - 1
+        await limiter.check_rate_limit("user", "openai", 10, 2500, 10)
+    finally:
+        patcher.stop()
+
+    assert script.await_count == 3
+    assert limiter.stats["local_checks"] == 0
@@ -0,0 +1,110 @@
+"""Rate Limiter Microbenchmark: sequential Redis commands vs one Lua call
+
+Measures rate-limit checks per second against a live Redis for the previous
+implementation (zremrangebyscore/zcount/zadd/expire as separate round-trips),
+the Lua sliding window, and the Lua window with local leases. Limits are set
+high enough that every check is admitted, which is the hot path.
+
+Usage:
+    python tests/test_rate_limiter_benchmark.py [--checks 20000] [--concurrency 50] [--users 10]
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from typing import Dict, Any
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.redis import init_redis, close_redis, get_redis
+from services.embedding_service import RateLimiter
+
+REQUESTS_LIMIT = 10_000_000
+TOKENS_LIMIT = 10_000_000_000
+TOKENS_PER_CHECK = 500
+
+
+class LegacyRateLimiter:
+    """The previous check: up to six sequential commands, not atomic"""
+
+    window_size = 60
+
+    async def check_rate_limit(self, user_id, provider, requests_limit, tokens_limit, tokens_to_add=0):
+        redis = get_redis()
+        now = time.time()
+        window_start = now - self.window_size
+        counts = []
+        for key in (f"bench_legacy:{user_id}:{provider}:requests", f"bench_legacy:{user_id}:{provider}:tokens"):
+            await redis.zremrangebyscore(key, 0, window_start)
+            counts.append(await redis.zcount(key, window_start, now) or 0)
+        if counts[0] >= requests_limit or counts[1] + tokens_to_add > tokens_limit:
+            return False, {}
+        for key, value in ((f"bench_legacy:{user_id}:{provider}:requests", 1),
+                           (f"bench_legacy:{user_id}:{provider}:tokens", tokens_to_add)):
+            await redis.zadd(key, {f"{now}:{value}:{os.urandom(4).hex()}": now})
+            await redis.expire(key, self.window_size * 2)
+        return True, {}
+
+
+async def run(limiter, checks: int, concurrency: int, users: int) -> Dict[str, Any]:
+    """Issue ``checks`` checks from ``concurrency`` tasks and time them"""
+    per_task = checks // concurrency
+
+    async def worker(worker_id: int):
+        for i in range(per_task):
+            allowed, _ = await limiter.check_rate_limit(
+                f"bench-{(worker_id + i) % users}", "openai", REQUESTS_LIMIT, TOKENS_LIMIT, TOKENS_PER_CHECK
+            )
+            assert allowed
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(n) for n in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {
+        'checks': per_task * concurrency,
+        'seconds': round(elapsed, 3),
+        'checks_per_second': round(per_task * concurrency / elapsed),
+        'stats': getattr(limiter, 'stats', None)
+    }
+
+
+async def cleanup():
+    redis = get_redis()
+    async for key in redis.scan_iter(match="bench_legacy:*"):
+        await redis.unlink(key)
+    async for key in redis.scan_iter(match="rate_limit:{bench-*"):
+        await redis.unlink(key)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark rate limiter checks per second")
+    parser.add_argument("--checks", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--users", type=int, default=10)
+    args = parser.parse_args()
+
+    await init_redis()
+    results = {}
+    try:
+        for name, limiter in (
+            ('legacy', LegacyRateLimiter()),
+            ('lua', RateLimiter(lease_fraction=0)),
+            ('lua_with_leases', RateLimiter(lease_fraction=0.0001, lease_below=0.5, lease_ttl=1.0)),
+        ):
+            await cleanup()
+            print(f"\n⏱  {name}...")
+            results[name] = await run(limiter, args.checks, args.concurrency, args.users)
+            print(f"   {results[name]['checks_per_second']} checks/s")
+    finally:
+        await cleanup()
+        await close_redis()
+
+    print("\n" + "=" * 60)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
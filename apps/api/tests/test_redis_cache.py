@@ -0,0 +1,54 @@
+"""Tests for the SCAN-based key pattern utilities in RedisCache"""
+
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.redis import RedisCache
+
+
+def _redis(keys):
+    redis = MagicMock()
+    redis.keys = AsyncMock()
+
+    async def scan_iter(match=None, count=None):
+        for key in keys:
+            yield key
+
+    redis.scan_iter = MagicMock(side_effect=scan_iter)
+    redis.unlink = AsyncMock(side_effect=lambda *batch: len(set(batch)))
+    return redis
+
+
+@pytest.mark.asyncio
+async def test_get_keys_scans_and_drops_duplicates():
+    redis = _redis(["a", "b", "a", "c"])
+    with patch("core.redis.get_redis", return_value=redis):
+        keys = await RedisCache(scan_batch_size=2).get_keys("cache:*")
+
+    assert keys == ["a", "b", "c"]
+    redis.keys.assert_not_called()
+    redis.scan_iter.assert_called_once_with(match="cache:*", count=2)
+
+
+@pytest.mark.asyncio
+async def test_get_keys_stops_at_limit():
+    redis = _redis([f"k{i}" for i in range(10)])
+    with patch("core.redis.get_redis", return_value=redis):
+        keys = await RedisCache().get_keys(limit=3)
+
+    assert keys == ["k0", "k1", "k2"]
+
+
+@pytest.mark.asyncio
+async def test_flush_pattern_unlinks_in_batches():
+    redis = _redis([f"k{i}" for i in range(5)])
+    with patch("core.redis.get_redis", return_value=redis):
+        deleted = await RedisCache(scan_batch_size=2).flush_pattern("k*")
+
+    assert deleted == 5
+    assert [call.args for call in redis.unlink.call_args_list] == [("k0", "k1"), ("k2", "k3"), ("k4",)]
+    redis.keys.assert_not_called()
@@ -0,0 +1,112 @@
+"""Tests for route-labelled request metrics"""
+
+import asyncio
+import random
+import pytest
+import numpy as np
+from unittest.mock import patch
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import FastAPI, BackgroundTasks
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from core import monitoring
+from core.monitoring import MetricsMiddleware, PerformanceMonitor, LatencyHistogram, UNMATCHED_ROUTE
+
+
+def _app():
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get("/documents/{document_id}")
+    async def get_document(document_id: str, background_tasks: BackgroundTasks):
+        background_tasks.add_task(asyncio.sleep, 0.2)
+        return {"id": document_id}
+
+    @app.get("/stream")
+    async def stream():
+        async def chunks():
+            yield b"first"
+            await asyncio.sleep(0.1)
+            yield b"last"
+        return StreamingResponse(chunks())
+
+    @app.get("/boom")
+    async def boom():
+        raise RuntimeError("boom")
+
+    return app
+
+
+@pytest.fixture
+def monitor():
+    monitor = PerformanceMonitor()
+    with patch.object(monitoring, "performance_monitor", monitor):
+        yield monitor
+
+
+def test_metrics_are_keyed_by_route_template(monitor):
+    client = TestClient(_app())
+    for document_id in ("a1", "b2", "c3"):
+        assert client.get(f"/documents/{document_id}").status_code == 200
+    client.get("/no/such/path")
+    client.request("PROPFIND", "/documents/a1")
+
+    stats = monitor.get_performance_stats()["endpoint_stats"]
+
+    assert stats["GET /documents/{document_id}"]["total_requests"] == 3
+    assert stats[f"GET {UNMATCHED_ROUTE}"]["error_count"] == 1
+    assert "OTHER /documents/{document_id}" in stats
+    assert not any("a1" in endpoint for endpoint in stats)
+
+
+def test_background_tasks_are_not_timed(monitor):
+    TestClient(_app()).get("/documents/a1")
+
+    stats = monitor.get_performance_stats()["endpoint_stats"]["GET /documents/{document_id}"]
+    assert stats["max_time"] < 0.2
+
+
+def test_streaming_response_is_timed_to_last_chunk(monitor):
+    response = TestClient(_app()).get("/stream")
+
+    assert response.content == b"firstlast"
+    stats = monitor.get_performance_stats()["endpoint_stats"]["GET /stream"]
+    assert stats["min_time"] >= 0.1
+
+
+def test_unhandled_error_is_recorded(monitor):
+    client = TestClient(_app(), raise_server_exceptions=False)
+    assert client.get("/boom").status_code == 500
+
+    stats = monitor.get_performance_stats()
+    assert stats["endpoint_stats"]["GET /boom"]["error_count"] == 1
+    assert stats["error_rates"] == {"500": 1}
+
+
+def test_histogram_percentiles_are_within_one_bucket():
+    rng = random.Random(7)
+    samples = [rng.lognormvariate(-3, 1) for _ in range(20000)]
+    histogram = LatencyHistogram()
+    for sample in samples:
+        histogram.observe(sample)
+
+    for q in (50, 95, 99):
+        exact = np.percentile(samples, q)
+        assert histogram.percentile(q / 100) == pytest.approx(exact, rel=0.1)
+    assert len(histogram.counts) == len(histogram.bounds) + 1
+    assert histogram.count == len(samples)
+
+
+def test_histogram_single_sample_and_overflow():
+    histogram = LatencyHistogram()
+    histogram.observe(0.042)
+    assert histogram.percentile(0.5) == pytest.approx(0.042)
+
+    histogram.observe(1000.0)
+    assert histogram.percentile(0.99) <= 1000.0
+    assert histogram.percentile(1.0) == 1000.0
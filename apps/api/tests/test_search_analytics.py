@@ -0,0 +1,87 @@
+"""Tests for the batched search analytics sink"""
+
+import asyncio
+import pytest
+from uuid import uuid4
+from unittest.mock import MagicMock
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.search_analytics import SearchAnalyticsSink
+
+
+class InsertRecorder:
+    """Session factory stand-in that records INSERT statements"""
+
+    def __init__(self, delay: float = 0, fail: bool = False):
+        self.delay = delay
+        self.fail = fail
+        self.inserts = []
+
+    def __call__(self):
+        return self
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return False
+
+    async def execute(self, statement, params=None):
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("database unavailable")
+        self.inserts.append((str(statement), params))
+        return MagicMock()
+
+    async def commit(self):
+        pass
+
+
+@pytest.mark.asyncio
+async def test_rows_are_written_in_multi_row_batches():
+    recorder = InsertRecorder()
+    sink = SearchAnalyticsSink(batch_size=10, flush_interval_ms=20, session_factory=recorder)
+
+    for i in range(25):
+        assert sink.record(uuid4(), f"query {i}", results_count=i, user_id=uuid4())
+    await sink.stop()
+
+    assert [len(params) // 10 for _, params in recorder.inserts] == [10, 10, 5]
+    assert recorder.inserts[0][0].count("), (") == 9
+    assert sink.stats['written'] == 25
+    assert sink.stats['dropped'] == 0
+
+
+@pytest.mark.asyncio
+async def test_full_queue_drops_instead_of_blocking():
+    recorder = InsertRecorder(delay=0.05)
+    sink = SearchAnalyticsSink(max_queue_size=5, batch_size=5, flush_interval_ms=10,
+                               session_factory=recorder)
+
+    accepted = [sink.record(uuid4(), "query", results_count=1) for _ in range(20)]
+    await sink.stop()
+
+    assert accepted.count(False) == sink.stats['dropped'] > 0
+    assert sink.stats['written'] == accepted.count(True)
+
+
+@pytest.mark.asyncio
+async def test_rows_without_knowledge_base_are_skipped():
+    sink = SearchAnalyticsSink(session_factory=InsertRecorder())
+
+    assert sink.record(None, "query", results_count=0) is False
+    assert sink._task is None
+
+
+@pytest.mark.asyncio
+async def test_failed_flush_is_counted_not_raised():
+    sink = SearchAnalyticsSink(flush_interval_ms=10, session_factory=InsertRecorder(fail=True))
+
+    sink.record(uuid4(), "query", results_count=1)
+    await sink.stop()
+
+    assert sink.stats['failed'] == 1
+    assert sink.stats['written'] == 0
@@ -0,0 +1,160 @@
+"""Semantic Search Latency Benchmark
+
+Seeds a knowledge base with synthetic chunks, then measures
+PGVectorService.search_similar latency (p50/p95) while counting the SQL
+statements each search issues against the read path. The run fails if a
+search needs more than one SELECT, so COUNT pre-queries or per-result
+title lookups creeping back in are caught.
+
+Query embeddings are synthetic; only the database path is measured.
+
+Usage:
+    python tests/test_search_benchmark.py [--chunks 10000] [--documents 100] [--searches 200]
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from datetime import datetime
+from typing import List, Dict, Any
+from unittest.mock import patch
+from uuid import uuid4
+
+import numpy as np
+from sqlalchemy import event, text
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.pgvector_service import pgvector_service
+from services.vector_bulk_writer import embedding_bulk_writer
+
+MAX_SELECTS_PER_SEARCH = 1
+
+
+class SearchBenchmark:
+    """Latency and query-count benchmark for semantic search"""
+
+    def __init__(self, dimensions: int = 1536):
+        self.dimensions = dimensions
+        self.rng = np.random.default_rng(7)
+        self.statements: List[str] = []
+        self.knowledge_base_id = uuid4()
+        self.document_ids: List = []
+
+    def _record_statement(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def _random_vector(self) -> List[float]:
+        vector = self.rng.standard_normal(self.dimensions).astype(np.float32)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    async def seed(self, chunks: int, documents: int):
+        """Create a knowledge base with documents and chunk embeddings"""
+        now = datetime.utcnow()
+        async with pgvector_service.AsyncSessionLocal() as session:
+            await session.execute(text("""
+                INSERT INTO knowledge_bases (id, name, type, is_public, is_active, embedding_model,
+                    embedding_dimensions, total_documents, total_chunks, total_tokens, created_at, updated_at)
+                VALUES (:id, 'search-benchmark', 'general', false, true, 'text-embedding-3-small',
+                    :dims, 0, 0, 0, :now, :now)
+            """), {'id': self.knowledge_base_id, 'dims': self.dimensions, 'now': now})
+            for i in range(documents):
+                document_id = uuid4()
+                self.document_ids.append(document_id)
+                await session.execute(text("""
+                    INSERT INTO knowledge_documents (id, knowledge_base_id, title, source_type,
+                        chunk_count, token_count, processing_status, created_at, updated_at)
+                    VALUES (:id, :kb_id, :title, 'text', 0, 0, 'completed', :now, :now)
+                """), {'id': document_id, 'kb_id': self.knowledge_base_id, 'title': f"Document {i}", 'now': now})
+
+            vectors = self.rng.standard_normal((chunks, self.dimensions), dtype=np.float32)
+            records = [
+                embedding_bulk_writer.build_record(
+                    document_id=self.document_ids[i % documents],
+                    knowledge_base_id=self.knowledge_base_id,
+                    chunk_index=i // documents,
+                    content=f"Benchmark chunk {i}",
+                    embedding=vectors[i] / np.linalg.norm(vectors[i]),
+                    token_count=3
+                )
+                for i in range(chunks)
+            ]
+            await embedding_bulk_writer.write(session, records)
+            await session.commit()
+
+    async def cleanup(self):
+        async with pgvector_service.AsyncSessionLocal() as session:
+            await session.execute(text("DELETE FROM knowledge_bases WHERE id = :id"), {'id': self.knowledge_base_id})
+            await session.commit()
+
+    async def run_searches(self, searches: int, k: int) -> Dict[str, Any]:
+        """Time searches and count SELECT statements issued per search"""
+        latencies = []
+        selects_per_search = []
+
+        sync_engine = pgvector_service.async_engine.sync_engine
+        event.listen(sync_engine, "before_cursor_execute", self._record_statement)
+        try:
+            for _ in range(searches):
+                query_vector = self._random_vector()
+                self.statements.clear()
+                # Skip analytics and result cache so only the similarity query is counted
+                with patch.object(pgvector_service, '_embed_query', return_value=query_vector), \
+                     patch.object(pgvector_service, '_log_search_history'), \
+                     patch.object(pgvector_service, '_lookup_semantic_cache', return_value=(None, None)), \
+                     patch.object(pgvector_service, '_run_in_background', side_effect=lambda coro: coro.close()):
+                    start = time.perf_counter()
+                    await pgvector_service.search_similar(
+                        "benchmark query", self.knowledge_base_id, k=k, score_threshold=-1.0
+                    )
+                    latencies.append((time.perf_counter() - start) * 1000)
+                selects_per_search.append(
+                    sum(1 for sql in self.statements if sql.lstrip().upper().startswith("SELECT"))
+                )
+        finally:
+            event.remove(sync_engine, "before_cursor_execute", self._record_statement)
+
+        latencies.sort()
+        return {
+            'searches': searches,
+            'k': k,
+            'p50_ms': statistics.median(latencies),
+            'p95_ms': latencies[int(len(latencies) * 0.95) - 1],
+            'mean_ms': statistics.mean(latencies),
+            'max_selects_per_search': max(selects_per_search)
+        }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark semantic search latency and query count")
+    parser.add_argument("--chunks", type=int, default=10000)
+    parser.add_argument("--documents", type=int, default=100)
+    parser.add_argument("--searches", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--dimensions", type=int, default=1536)
+    args = parser.parse_args()
+
+    benchmark = SearchBenchmark(dimensions=args.dimensions)
+    print(f"\n📊 Seeding {args.chunks} chunks across {args.documents} documents...")
+    await benchmark.seed(args.chunks, args.documents)
+    try:
+        result = await benchmark.run_searches(args.searches, args.k)
+    finally:
+        await benchmark.cleanup()
+
+    print("\n" + "=" * 60)
+    print(json.dumps(result, indent=2))
+
+    assert result['max_selects_per_search'] <= MAX_SELECTS_PER_SEARCH, (
+        f"search_similar issued {result['max_selects_per_search']} SELECTs per search "
+        f"(expected at most {MAX_SELECTS_PER_SEARCH})"
+    )
+    print(f"\n✅ Query count OK ({result['max_selects_per_search']} SELECT per search)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,82 @@
+"""Query-count regression tests for the semantic search path"""
+
+import pytest
+from uuid import uuid4
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.knowledge_service import KnowledgeService
+from services.pgvector_service import PGVectorService
+from services.vector_index_manager import VectorIndexManager
+
+
+def _chunk_row(similarity, title="Doc"):
+    return MagicMock(
+        content="chunk", metadata={'chunk_index': 0}, document_id=uuid4(),
+        knowledge_base_id=uuid4(), title=title, similarity=similarity
+    )
+
+
+def _service(session):
+    service = PGVectorService.__new__(PGVectorService)
+    service.metrics = {'search_times': [], 'cache_hits': 0, 'cache_misses': 0}
+    service._embed_query = AsyncMock(return_value=[0.1, 0.2])
+    service._lookup_semantic_cache = AsyncMock(return_value=(None, None))
+    service._run_in_background = lambda coro: coro.close()
+    service._log_search_history = AsyncMock()
+    service.AsyncSessionLocal = MagicMock(return_value=session)
+    service.index_manager = VectorIndexManager(MagicMock())
+    return service
+
+
+@pytest.mark.asyncio
+async def test_search_similar_issues_a_single_select(fake_session):
+    session = fake_session
+    session.rows = [_chunk_row(0.9), _chunk_row(0.8), _chunk_row(0.75)]
+    service = _service(session)
+
+    results = await service.search_similar("query", uuid4(), k=3, score_threshold=0.7,
+                                           filters={'document_id': str(uuid4()), 'source': 'pdf'})
+
+    assert len(results) == 3
+    selects = session.selects()
+    assert len(selects) == 1
+    assert "COUNT(" not in selects[0].upper()
+    assert "JOIN knowledge_documents" in selects[0]
+    assert results[0][0]['document_title'] == "Doc"
+
+
+@pytest.mark.asyncio
+async def test_search_similar_empty_result_needs_no_extra_query(fake_session):
+    session = fake_session
+    service = _service(session)
+
+    assert await service.search_similar("query", uuid4()) == []
+    assert len(session.statements) == 1
+
+
+@pytest.mark.asyncio
+async def test_semantic_search_does_not_query_titles_per_result(fake_session):
+    service = KnowledgeService()
+    service._verify_knowledge_base_access = AsyncMock()
+    service._log_search = AsyncMock()
+    db = fake_session
+    user = MagicMock(id=uuid4())
+
+    hits = [({
+        'page_content': f"chunk {i}",
+        'metadata': {'chunk_index': i},
+        'document_id': uuid4(),
+        'knowledge_base_id': uuid4(),
+        'document_title': f"Title {i}"
+    }, 0.9) for i in range(5)]
+
+    with patch("services.knowledge_service.pgvector_service") as pgvector:
+        pgvector.search_similar = AsyncMock(return_value=hits)
+        response = await service.semantic_search(db, user, "query", knowledge_base_id=uuid4(), k=5)
+
+    assert db.statements == []
+    assert [result["document_title"] for result in response["results"]] == [f"Title {i}" for i in range(5)]
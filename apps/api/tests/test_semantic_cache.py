@@ -0,0 +1,160 @@
+"""Tests for the semantic search result cache"""
+
+import json
+import asyncio
+import pytest
+from uuid import UUID, uuid4
+from unittest.mock import AsyncMock, MagicMock
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.pgvector_service import PGVectorService
+from services.vector_index_manager import VectorIndexManager
+
+
+def _cache_session(session, cache_row=None, rows=None):
+    """Serve ``cache_row`` to the semantic cache lookup and ``rows`` to everything else"""
+    session.rows = rows or []
+    return session.respond("FROM semantic_cache", "similarity", rows=[cache_row or MagicMock(generation=3, id=None)])
+
+
+def _cached(results, similarity=0.99, k=5, score_threshold=0.7):
+    return MagicMock(
+        generation=3, id=uuid4(), response=json.dumps(results), similarity=similarity,
+        metadata={'k': k, 'score_threshold': score_threshold}
+    )
+
+
+def _service(session):
+    service = PGVectorService.__new__(PGVectorService)
+    service.metrics = {'search_times': [], 'cache_hits': 0, 'cache_misses': 0, 'background_dropped': 0}
+    service.embedding_model = "text-embedding-3-small"
+    service._embed_query = AsyncMock(return_value=[0.1, 0.2])
+    service._log_search_history = AsyncMock()
+    service._background_tasks = set()
+    service.max_background_tasks = 10
+    service._semantic_cache_writes = 0
+    service.AsyncSessionLocal = MagicMock(return_value=session)
+    service.index_manager = VectorIndexManager(MagicMock())
+    return service
+
+
+@pytest.mark.asyncio
+async def test_cache_hit_skips_similarity_query(fake_session):
+    results = [[{'page_content': f"chunk {i}"}, score] for i, score in enumerate([0.95, 0.85, 0.72])]
+    session = _cache_session(fake_session, cache_row=_cached(results))
+    service = _service(session)
+    service._run_in_background = lambda coro: coro.close()
+
+    hits = await service.search_similar("query", uuid4(), k=2, score_threshold=0.8)
+
+    assert [score for _, score in hits] == [0.95, 0.85]
+    assert service.metrics['cache_hits'] == 1
+    assert not any("knowledge_embeddings" in sql for sql, _ in session.statements)
+
+
+@pytest.mark.asyncio
+async def test_cache_hit_has_the_types_of_a_miss(fake_session):
+    kb_id = uuid4()
+    row = MagicMock(content="chunk", metadata={'chunk_index': 0}, document_id=uuid4(),
+                    knowledge_base_id=kb_id, title="Doc")
+    miss = PGVectorService._row_to_document(row)
+    # What _store_semantic_cache writes
+    stored = json.loads(json.dumps([[miss, 0.9]], default=str))
+    service = _service(_cache_session(fake_session, cache_row=_cached(stored)))
+    service._run_in_background = lambda coro: coro.close()
+
+    [(hit, score)] = await service.search_similar("query", kb_id, k=5, score_threshold=0.7)
+
+    assert hit == miss
+    assert isinstance(hit['document_id'], UUID) and isinstance(hit['knowledge_base_id'], UUID)
+
+
+@pytest.mark.asyncio
+async def test_lookup_compares_the_knowledge_base_entries_exactly(fake_session):
+    session = _cache_session(fake_session)
+    service = _service(session)
+
+    await service._lookup_semantic_cache(session, uuid4(), "[0.1,0.2]", 5, 0.7)
+
+    [lookup] = session.sql("FROM semantic_cache")
+    # Candidates come from the knowledge base's own entries, not the global ANN index
+    assert "WHERE knowledge_base_id = kb.id" in lookup
+    assert "ORDER BY expires_at DESC" in lookup
+    assert session.params("FROM semantic_cache")['scan_limit'] > 0
+
+
+@pytest.mark.asyncio
+async def test_cache_entry_with_fewer_results_is_not_served(fake_session):
+    session = _cache_session(fake_session, cache_row=_cached([], k=3))
+    service = _service(session)
+    service._run_in_background = lambda coro: coro.close()
+
+    await service.search_similar("query", uuid4(), k=10, score_threshold=0.7)
+
+    assert service.metrics['cache_misses'] == 1
+    assert any("knowledge_embeddings" in sql for sql, _ in session.statements)
+
+
+@pytest.mark.asyncio
+async def test_miss_stores_results_in_background(fake_session):
+    row = MagicMock(content="chunk", metadata={}, document_id=uuid4(),
+                    knowledge_base_id=uuid4(), title="Doc", similarity=0.9)
+    session = _cache_session(fake_session, rows=[row])
+    service = _service(session)
+    kb_id = uuid4()
+
+    await service.search_similar("query", kb_id, k=5, score_threshold=0.7)
+    await asyncio.gather(*service._background_tasks)
+
+    inserts = [params for sql, params in session.statements if "INSERT INTO semantic_cache" in sql]
+    assert len(inserts) == 1
+    assert inserts[0]['kb_id'] == kb_id
+    assert inserts[0]['generation'] == 3
+    assert json.loads(inserts[0]['metadata']) == {'k': 5, 'score_threshold': 0.7}
+    assert json.loads(inserts[0]['response'])[0][1] == 0.9
+
+
+@pytest.mark.asyncio
+async def test_invalidation_drops_in_flight_writes(fake_session):
+    session = fake_session
+    service = _service(session)
+    kb_id = uuid4()
+
+    # The generation lives on the knowledge base row, so workers and other
+    # API processes see the bump
+    await service.invalidate_semantic_cache([kb_id])
+    bump, delete = session.sql()
+    assert "SET cache_generation = cache_generation + 1" in bump
+    assert "DELETE FROM semantic_cache" in delete
+    assert session.params("cache_generation + 1") == {'kb_ids': [kb_id]}
+    assert session.commits == 1
+
+    await service._store_semantic_cache(kb_id, 3, "query", "[0.1,0.2]", [], 5, 0.7)
+    insert = session.sql("INSERT INTO semantic_cache")[0]
+    assert "kb.cache_generation = :generation" in insert
+    assert "FOR SHARE" in insert
+
+
+@pytest.mark.asyncio
+async def test_failed_lookup_skips_the_cache_write(fake_session):
+    session = fake_session.respond("FROM semantic_cache", "similarity", rows=[])
+    service = _service(session)
+    service._run_in_background = MagicMock(side_effect=lambda coro: coro.close())
+
+    await service.search_similar("query", uuid4(), k=5, score_threshold=0.7)
+
+    service._run_in_background.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_background_work_is_dropped_when_saturated(fake_session):
+    service = _service(fake_session)
+    service.max_background_tasks = 0
+
+    service._run_in_background(asyncio.sleep(0))
+
+    assert service.metrics['background_dropped'] == 1
+    assert not service._background_tasks
@@ -0,0 +1,43 @@
+"""Tests for the raw SQL compile/type check used by the fake session"""
+
+import pytest
+from uuid import uuid4
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+
+from services.document_centroids import DocumentCentroidIndex
+from tests.conftest import check_sql
+
+
+def test_untyped_arithmetic_parameter_is_rejected():
+    with pytest.raises(AssertionError, match="semantic_weight"):
+        check_sql(text("SELECT :semantic_weight / (:rrf_k + rank) FROM ranks"),
+                  {'semantic_weight': 0.7, 'rrf_k': 60})
+
+    check_sql(text("SELECT CAST(:w AS double precision) / (CAST(:k AS double precision) + rank) FROM ranks"),
+              {'w': 0.7, 'k': 60})
+    check_sql(text("SELECT id FROM t WHERE metadata->>'task_id' = :task_id LIMIT :limit"),
+              {'task_id': "t1", 'limit': 5})
+
+
+def test_missing_parameter_is_rejected():
+    with pytest.raises(AssertionError, match="cursor_id"):
+        check_sql(text("SELECT id FROM t WHERE (a, id) < (:cursor_value, :cursor_id)"), {'cursor_value': 1})
+
+
+@pytest.mark.asyncio
+async def test_centroid_statements_type_check(fake_session):
+    index = DocumentCentroidIndex()
+    document_id = uuid4()
+
+    await index.add_chunks(fake_session, [
+        {'document_id': document_id, 'knowledge_base_id': uuid4(), 'embedding': [0.1, 0.2]}
+    ])
+    await index.recompute(fake_session, [document_id])
+    await index.remove(fake_session, [document_id])
+
+    assert len(fake_session.statements) == 4
@@ -0,0 +1,146 @@
+"""Task State Benchmark: JSON blob rewrites vs progress fields in a hash
+
+Compares the cost of one embedding task's progress updates on large
+documents. The previous record kept the document content inside the
+``embedding_task:{id}`` JSON value and re-encoded and SETEXed all of it after
+every 50-chunk batch; the hash record only sends HINCRBY/HSET for the
+progress fields.
+
+Without ``--redis`` the commands are encoded with the client's wire format
+but not sent, which measures encode time, bytes on the wire and peak
+allocation per update. With ``--redis`` they are also executed against the
+configured Redis.
+
+Usage:
+    python tests/test_task_state_benchmark.py [--sizes-mb 1 5 20] [--updates 20] [--redis]
+"""
+
+import argparse
+import asyncio
+import json
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Dict, Any, List
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from redis.connection import Connection
+
+from services.embedding_task_service import EmbeddingTaskService, TASK_TTL
+
+CHARS_PER_CHUNK = 1200  # ~300 tokens
+CHUNKS_PER_UPDATE = 50
+
+WORDS = ["embedding", "vector", "document", "retrieval", "latency", "index", "chunk", "query", "stream"]
+
+
+def make_task(size_mb: float) -> Dict[str, Any]:
+    target = int(size_mb * 1024 * 1024)
+    sentence = " ".join(WORDS) + ". "
+    content = (sentence * (target // len(sentence) + 1))[:target]
+    return {
+        'task_id': "bench", 'document_id': "doc", 'knowledge_base_id': "kb",
+        'content': content, 'metadata': {'source': "benchmark"}, 'priority': "normal",
+        'user_id': None, 'status': "processing", 'progress': 0,
+        'total_chunks': len(content) // CHARS_PER_CHUNK, 'processed_chunks': 0,
+        'error_message': None, 'created_at': datetime.utcnow().isoformat(),
+        'started_at': datetime.utcnow().isoformat(), 'completed_at': None, 'retry_count': 0
+    }
+
+
+def legacy_commands(key: str, task: Dict[str, Any]) -> List[tuple]:
+    return [("SETEX", key, TASK_TTL, json.dumps(task))]
+
+
+def hash_commands(key: str, task: Dict[str, Any]) -> List[tuple]:
+    return [
+        ("HINCRBY", key, 'processed_chunks', CHUNKS_PER_UPDATE),
+        ("HSET", key, 'progress', task['progress'])
+    ]
+
+
+def measure(build, task: Dict[str, Any], updates: int) -> Dict[str, Any]:
+    """Encode ``updates`` progress updates and report per-update costs"""
+    connection = Connection()
+    key = "embedding_task:bench"
+    wire_bytes = 0
+    tracemalloc.start()
+    start = time.perf_counter()
+    for _ in range(updates):
+        task['processed_chunks'] += CHUNKS_PER_UPDATE
+        task['progress'] = int(task['processed_chunks'] / task['total_chunks'] * 100)
+        for command in build(key, task):
+            wire_bytes += sum(len(part) for part in connection.pack_command(*command))
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    total_updates = task['total_chunks'] // CHUNKS_PER_UPDATE
+    return {
+        'ms_per_update': round(elapsed * 1000 / updates, 3),
+        'bytes_per_update': wire_bytes // updates,
+        'peak_alloc_mb': round(peak / 1024 / 1024, 2),
+        'updates_per_task': total_updates,
+        'task_wire_mb': round(wire_bytes / updates * total_updates / 1024 / 1024, 2)
+    }
+
+
+async def measure_redis(build, task: Dict[str, Any], updates: int) -> Dict[str, Any]:
+    """Send the updates to Redis and report progress updates per second"""
+    from core.redis import get_redis
+
+    redis = get_redis()
+    key = "bench_task_state"
+    if build is hash_commands:
+        await redis.hset(key, mapping=EmbeddingTaskService._encode_fields(
+            {name: value for name, value in task.items() if name != 'content'}
+        ))
+    start = time.perf_counter()
+    for _ in range(updates):
+        task['processed_chunks'] += CHUNKS_PER_UPDATE
+        task['progress'] = int(task['processed_chunks'] / task['total_chunks'] * 100)
+        async with redis.pipeline(transaction=False) as pipe:
+            for command in build(key, task):
+                pipe.execute_command(*command)
+            await pipe.execute()
+    elapsed = time.perf_counter() - start
+    await redis.delete(key)
+    return {'updates_per_second': round(updates / elapsed, 1)}
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark embedding task progress updates")
+    parser.add_argument("--sizes-mb", type=float, nargs="+", default=[1, 5, 20])
+    parser.add_argument("--updates", type=int, default=20)
+    parser.add_argument("--redis", action="store_true", help="Also send the updates to Redis")
+    args = parser.parse_args()
+
+    if args.redis:
+        from core.redis import init_redis
+        await init_redis()
+
+    results = {}
+    try:
+        for size in args.sizes_mb:
+            results[f"{size:g}MB"] = {}
+            for name, build in (('json_blob', legacy_commands), ('hash_fields', hash_commands)):
+                print(f"\n⏱  {size:g}MB {name}...")
+                result = measure(build, make_task(size), args.updates)
+                if args.redis:
+                    result.update(await measure_redis(build, make_task(size), args.updates))
+                results[f"{size:g}MB"][name] = result
+                print(f"   {result['ms_per_update']} ms/update, {result['bytes_per_update']} bytes/update")
+    finally:
+        if args.redis:
+            from core.redis import close_redis
+            await close_redis()
+
+    print("\n" + "=" * 60)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
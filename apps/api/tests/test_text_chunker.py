@@ -0,0 +1,146 @@
+"""Tests for the token-aware text chunker"""
+
+import re
+import pytest
+from uuid import uuid4
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.text_chunker import RecursiveTokenChunker, get_chunker, total_tokens
+
+
+def word_offsets(text):
+    """Whitespace tokenizer so tests do not need tiktoken data files"""
+    return [match.start() for match in re.finditer(r"\S+", text)]
+
+
+def make_chunker(chunk_size=20, chunk_overlap=5, **kwargs):
+    return RecursiveTokenChunker(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        token_offsets=word_offsets,
+        **kwargs
+    )
+
+
+def test_short_text_is_single_chunk():
+    chunks = make_chunker().split("Just a short sentence.")
+
+    assert len(chunks) == 1
+    assert chunks[0]['content'] == "Just a short sentence."
+    assert chunks[0]['token_count'] == 4
+    assert chunks[0]['overlap_tokens'] == 0
+
+
+def test_empty_text_has_no_chunks():
+    assert make_chunker().split("") == []
+    assert make_chunker().split("  \n\n ") == []
+
+
+def test_chunks_respect_token_budget_and_word_boundaries():
+    words = [f"word{i}" for i in range(500)]
+    text = " ".join(words)
+
+    chunks = make_chunker().split(text)
+
+    for chunk in chunks:
+        assert chunk['token_count'] <= 20
+        assert len(chunk['content'].split()) == chunk['token_count']
+        for token in chunk['content'].split():
+            assert token in words
+    assert total_tokens(chunks) == 500
+
+
+def test_paragraphs_are_preferred_split_points():
+    paragraph_a = " ".join(["alpha"] * 12) + "."
+    paragraph_b = " ".join(["beta"] * 12) + "."
+    text = f"{paragraph_a}\n\n{paragraph_b}"
+
+    chunks = make_chunker(chunk_overlap=0).split(text)
+
+    assert [chunk['content'] for chunk in chunks] == [paragraph_a, paragraph_b]
+
+
+def test_sentences_are_kept_whole_when_they_fit():
+    sentences = [" ".join([f"s{n}"] * 6) + "." for n in range(8)]
+    text = " ".join(sentences)
+
+    chunks = make_chunker(chunk_overlap=0).split(text)
+
+    for chunk in chunks:
+        assert chunk['content'].endswith(".")
+
+
+def test_overlap_repeats_trailing_tokens():
+    sentences = [" ".join([f"s{n}"] * 4) + "." for n in range(12)]
+    chunks = make_chunker(chunk_size=12, chunk_overlap=4).split(" ".join(sentences))
+
+    assert len(chunks) > 1
+    for previous, current in zip(chunks, chunks[1:]):
+        assert current['overlap_tokens'] <= 4
+        if current['overlap_tokens']:
+            tail = previous['content'].split()[-current['overlap_tokens']:]
+            assert current['content'].split()[:current['overlap_tokens']] == tail
+
+
+def test_page_markers_are_hard_boundaries():
+    text = (
+        "--- Page 1 ---\nFirst page text.\n\n"
+        "--- Page 2 ---\nSecond page text.\n"
+    )
+
+    chunks = make_chunker().split(text)
+
+    assert [chunk['page'] for chunk in chunks] == [1, 2]
+    assert chunks[0]['content'] == "First page text."
+    assert chunks[1]['content'] == "Second page text."
+    assert all("--- Page" not in chunk['content'] for chunk in chunks)
+
+
+def test_unbreakable_text_is_split_by_tokens():
+    chunker = RecursiveTokenChunker(
+        chunk_size=10,
+        chunk_overlap=0,
+        token_offsets=lambda text: list(range(0, len(text), 4))
+    )
+
+    chunks = chunker.split("x" * 100)
+
+    assert [chunk['token_count'] for chunk in chunks] == [10, 10, 5]
+    assert "".join(chunk['content'] for chunk in chunks) == "x" * 100
+
+
+def test_chunk_indexes_are_sequential():
+    text = "\n\n".join(" ".join(["word"] * 15) for _ in range(6))
+    chunks = make_chunker().split(text)
+
+    assert [chunk['chunk_index'] for chunk in chunks] == list(range(len(chunks)))
+
+
+def test_invalid_configuration():
+    with pytest.raises(ValueError):
+        make_chunker(chunk_size=10, chunk_overlap=10)
+    with pytest.raises(ValueError):
+        get_chunker("unknown")
+
+
+@pytest.mark.asyncio
+async def test_upload_survives_tokenizer_failure(fake_session):
+    from services.knowledge_service import KnowledgeService
+
+    with patch("services.knowledge_service.pgvector_service") as pgvector, \
+         patch.object(KnowledgeService, "_verify_knowledge_base_access", new_callable=AsyncMock), \
+         patch.object(KnowledgeService, "_update_knowledge_base_stats", new_callable=AsyncMock), \
+         patch("services.knowledge_service.get_langchain_client"):
+        pgvector._chunk_text.side_effect = RuntimeError("tokenizer unavailable")
+        pgvector.add_documents = AsyncMock(return_value=["c1"])
+        result = await KnowledgeService().upload_document_text(
+            fake_session, MagicMock(id=uuid4()), uuid4(), "Notes", "one two three"
+        )
+
+    assert result['status'] == "completed"
+    assert result['token_count'] == 3
+    assert pgvector.add_documents.await_args.kwargs['chunks'] is None
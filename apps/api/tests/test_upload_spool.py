@@ -0,0 +1,64 @@
+"""Tests for streaming uploads to spool files"""
+
+import hashlib
+import os
+import pytest
+from io import BytesIO
+
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import UploadFile
+
+from services.upload_spool import spool_upload, discard_spool, UploadTooLargeError
+
+
+class CountingFile(BytesIO):
+    """File that records the largest single read"""
+
+    largest_read = 0
+
+    def read(self, size=-1):
+        data = super().read(size)
+        self.largest_read = max(self.largest_read, len(data))
+        return data
+
+
+@pytest.mark.asyncio
+async def test_spool_hashes_while_copying():
+    body = os.urandom(300_000)
+    source = CountingFile(body)
+
+    spool = await spool_upload(UploadFile(source, filename="report.pdf"), max_size=1_000_000, chunk_size=64 * 1024)
+    try:
+        assert spool['file_size'] == len(body)
+        assert spool['file_hash'] == hashlib.sha256(body).hexdigest()
+        assert spool['path'].endswith(".pdf")
+        with open(spool['path'], 'rb') as copy:
+            assert copy.read() == body
+        # Never read more than one chunk at a time
+        assert source.largest_read == 64 * 1024
+    finally:
+        discard_spool(spool['path'])
+
+
+@pytest.mark.asyncio
+async def test_oversized_upload_stops_reading_and_leaves_no_spool(tmp_path, monkeypatch):
+    monkeypatch.setattr("tempfile.tempdir", str(tmp_path))
+    source = CountingFile(b"x" * 500_000)
+
+    with pytest.raises(UploadTooLargeError):
+        await spool_upload(UploadFile(source, filename="big.txt"), max_size=100_000, chunk_size=32 * 1024)
+
+    assert source.tell() < 200_000
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.mark.asyncio
+async def test_declared_size_is_rejected_before_reading():
+    source = CountingFile(b"x" * 10)
+
+    with pytest.raises(UploadTooLargeError):
+        await spool_upload(UploadFile(source, size=10_000_000, filename="big.txt"), max_size=1_000)
+
+    assert source.tell() == 0
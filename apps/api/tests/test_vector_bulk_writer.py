@@ -0,0 +1,124 @@
+"""Tests for the binary COPY embedding writer"""
+
+import pytest
+import struct
+from uuid import uuid4
+from unittest.mock import AsyncMock, MagicMock
+
+import numpy as np
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.vector_bulk_writer import EmbeddingBulkWriter, encode_vector
+
+
+def _record(writer, **overrides):
+    values = {
+        'document_id': uuid4(),
+        'knowledge_base_id': uuid4(),
+        'chunk_index': 0,
+        'content': "Hello world",
+        'embedding': [0.5, -1.25, 3.0],
+        'token_count': 2,
+        'metadata': {'source': 'test'}
+    }
+    values.update(overrides)
+    return writer.build_record(**values)
+
+
+def test_encode_vector_matches_pgvector_wire_format():
+    """Vectors are encoded as dim/unused header plus big-endian float32"""
+    payload = encode_vector([1.0, 2.0, -0.5])
+
+    dim, unused = struct.unpack(">HH", payload[:4])
+    values = np.frombuffer(payload, dtype=">f4", offset=4)
+
+    assert dim == 3
+    assert unused == 0
+    assert values.tolist() == [1.0, 2.0, -0.5]
+
+
+def test_encode_vector_rejects_matrix():
+    with pytest.raises(ValueError):
+        encode_vector([[1.0, 2.0], [3.0, 4.0]])
+
+
+def test_encode_rows_emits_one_tuple_per_record():
+    """Each tuple starts with the column count and carries every column"""
+    writer = EmbeddingBulkWriter()
+    record = _record(writer)
+
+    payload = writer.encode_rows([record])
+
+    (field_count,) = struct.unpack(">h", payload[:2])
+    assert field_count == len(EmbeddingBulkWriter.COLUMNS)
+
+    # id is the first field: 16 byte UUID
+    (length,) = struct.unpack(">i", payload[2:6])
+    assert length == 16
+    assert payload[6:22] == record['id'].bytes
+
+
+def test_encode_rows_writes_null_metadata():
+    writer = EmbeddingBulkWriter()
+    with_meta = writer.encode_rows([_record(writer)])
+    without_meta = writer.encode_rows([_record(writer, metadata=None)])
+
+    assert struct.pack(">i", -1) in without_meta
+    assert len(without_meta) < len(with_meta)
+
+
+@pytest.mark.asyncio
+async def test_write_uses_copy_on_asyncpg_connections():
+    writer = EmbeddingBulkWriter(rows_per_copy=2)
+    records = [_record(writer, chunk_index=i) for i in range(5)]
+
+    chunks = []
+
+    async def fake_copy(table, source, columns, format):
+        async for part in source:
+            chunks.append(part)
+
+    driver_connection = MagicMock()
+    driver_connection.copy_to_table = AsyncMock(side_effect=fake_copy)
+    driver_connection.is_in_transaction.return_value = True
+
+    raw_connection = MagicMock(driver_connection=driver_connection)
+    connection = MagicMock()
+    connection.get_raw_connection = AsyncMock(return_value=raw_connection)
+    session = MagicMock()
+    session.connection = AsyncMock(return_value=connection)
+
+    chunk_ids = await writer.write(session, records)
+
+    assert chunk_ids == [record['id'] for record in records]
+    assert chunks[0].startswith(b"PGCOPY\n\xff\r\n\x00")
+    assert chunks[-1] == struct.pack(">h", -1)
+    # header + three row buffers (2 + 2 + 1) + trailer
+    assert len(chunks) == 5
+    assert writer.metrics['copy_batches'] == 1
+    assert writer.metrics['rows_written'] == 5
+
+
+@pytest.mark.asyncio
+async def test_write_falls_back_to_executemany():
+    writer = EmbeddingBulkWriter()
+    records = [_record(writer, chunk_index=i) for i in range(3)]
+
+    raw_connection = MagicMock(spec=[])
+    connection = MagicMock()
+    connection.get_raw_connection = AsyncMock(return_value=raw_connection)
+    session = MagicMock()
+    session.connection = AsyncMock(return_value=connection)
+    session.execute = AsyncMock()
+
+    chunk_ids = await writer.write(session, records)
+
+    assert len(chunk_ids) == 3
+    session.execute.assert_awaited_once()
+    params = session.execute.call_args[0][1]
+    assert len(params) == 3
+    assert params[0]['embedding'] == "[0.5,-1.25,3.0]"
+    assert writer.metrics['fallback_batches'] == 1
@@ -0,0 +1,171 @@
+"""ANN Index Recall vs Latency Benchmark
+
+Seeds knowledge_embeddings with clustered synthetic vectors, computes exact
+top-k neighbours with numpy, then sweeps ``hnsw.ef_search`` (and
+``ivfflat.probes`` when an IVFFlat index is built) and reports recall@k
+against p50/p95 query latency for each setting.
+
+Usage:
+    python tests/test_vector_index_benchmark.py [--vectors 100000] [--queries 100] [--method hnsw]
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from datetime import datetime
+from typing import List, Dict, Any
+from uuid import uuid4
+
+import numpy as np
+from sqlalchemy import text
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.pgvector_service import pgvector_service
+from services.vector_bulk_writer import embedding_bulk_writer
+
+
+class VectorIndexBenchmark:
+    """Recall/latency sweep for ANN search parameters"""
+
+    def __init__(self, dimensions: int = 1536, k: int = 10, clusters: int = 100):
+        self.dimensions = dimensions
+        self.k = k
+        self.clusters = clusters
+        self.rng = np.random.default_rng(11)
+        self.knowledge_base_id = uuid4()
+        self.document_id = uuid4()
+        self.ids: List = []
+        self.vectors = None
+        self.centers = None
+
+    def _clustered(self, count: int, centers: np.ndarray) -> np.ndarray:
+        labels = self.rng.integers(0, len(centers), count)
+        noise = self.rng.standard_normal((count, self.dimensions), dtype=np.float32) * 0.3
+        vectors = centers[labels] + noise
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    async def seed(self, count: int):
+        """Insert clustered vectors under a dedicated knowledge base"""
+        self.centers = self.rng.standard_normal((self.clusters, self.dimensions), dtype=np.float32)
+        self.vectors = self._clustered(count, self.centers).astype(np.float32)
+
+        now = datetime.utcnow()
+        async with pgvector_service.AsyncSessionLocal() as session:
+            await session.execute(text("""
+                INSERT INTO knowledge_bases (id, name, type, is_public, is_active, embedding_model,
+                    embedding_dimensions, total_documents, total_chunks, total_tokens, created_at, updated_at)
+                VALUES (:id, 'index-benchmark', 'general', false, true, 'text-embedding-3-small',
+                    :dims, 0, 0, 0, :now, :now)
+            """), {'id': self.knowledge_base_id, 'dims': self.dimensions, 'now': now})
+            await session.execute(text("""
+                INSERT INTO knowledge_documents (id, knowledge_base_id, title, source_type,
+                    chunk_count, token_count, processing_status, created_at, updated_at)
+                VALUES (:id, :kb_id, 'index-benchmark', 'text', 0, 0, 'completed', :now, :now)
+            """), {'id': self.document_id, 'kb_id': self.knowledge_base_id, 'now': now})
+            await session.commit()
+
+        for start in range(0, count, 5000):
+            records = [
+                embedding_bulk_writer.build_record(
+                    document_id=self.document_id,
+                    knowledge_base_id=self.knowledge_base_id,
+                    chunk_index=i,
+                    content=f"vector {i}",
+                    embedding=self.vectors[i],
+                    token_count=2
+                )
+                for i in range(start, min(start + 5000, count))
+            ]
+            async with pgvector_service.AsyncSessionLocal() as session:
+                self.ids.extend(await embedding_bulk_writer.write(session, records))
+                await session.commit()
+
+        async with pgvector_service.AsyncSessionLocal() as session:
+            await session.execute(text("ANALYZE knowledge_embeddings"))
+            await session.commit()
+
+    async def cleanup(self):
+        async with pgvector_service.AsyncSessionLocal() as session:
+            await session.execute(text("DELETE FROM knowledge_bases WHERE id = :id"), {'id': self.knowledge_base_id})
+            await session.commit()
+
+    def ground_truth(self, queries: np.ndarray) -> List[set]:
+        """Exact cosine top-k by brute force"""
+        scores = queries @ self.vectors.T
+        top = np.argpartition(-scores, self.k, axis=1)[:, :self.k]
+        return [{self.ids[i] for i in row} for row in top]
+
+    async def sweep(self, queries: np.ndarray, truth: List[set], param: str, values: List[int]) -> List[Dict[str, Any]]:
+        results = []
+        for value in values:
+            latencies = []
+            recalls = []
+            for query, expected in zip(queries, truth):
+                embedding = '[' + ','.join(map(str, query.tolist())) + ']'
+                async with pgvector_service.AsyncSessionLocal() as session:
+                    await pgvector_service.index_manager.apply_search_params(session, **{param: value})
+                    start = time.perf_counter()
+                    result = await session.execute(text("""
+                        SELECT id FROM knowledge_embeddings
+                        WHERE knowledge_base_id = :kb_id
+                        ORDER BY embedding <=> :embedding
+                        LIMIT :k
+                    """), {'kb_id': self.knowledge_base_id, 'embedding': embedding, 'k': self.k})
+                    found = {row.id for row in result.fetchall()}
+                    latencies.append((time.perf_counter() - start) * 1000)
+                recalls.append(len(found & expected) / self.k)
+
+            latencies.sort()
+            row = {
+                param: value,
+                'recall': statistics.mean(recalls),
+                'p50_ms': statistics.median(latencies),
+                'p95_ms': latencies[max(int(len(latencies) * 0.95) - 1, 0)]
+            }
+            print(f"   {param}={value:<4} recall@{self.k}={row['recall']:.3f} "
+                  f"p50={row['p50_ms']:.2f}ms p95={row['p95_ms']:.2f}ms")
+            results.append(row)
+        return results
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark ANN recall vs latency")
+    parser.add_argument("--vectors", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--dimensions", type=int, default=1536)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--method", choices=["hnsw", "ivfflat"], default="hnsw")
+    args = parser.parse_args()
+
+    benchmark = VectorIndexBenchmark(dimensions=args.dimensions, k=args.k)
+    print(f"\n📊 Seeding {args.vectors} vectors ({args.dimensions} dims)...")
+    await benchmark.seed(args.vectors)
+
+    try:
+        print(f"🔧 Ensuring {args.method} index...")
+        index = await pgvector_service.index_manager.create_index(method=args.method)
+        print(f"   {index['name']} {index.get('options')}")
+
+        queries = benchmark._clustered(args.queries, benchmark.centers).astype(np.float32)
+        truth = benchmark.ground_truth(queries)
+
+        if args.method == "hnsw":
+            results = await benchmark.sweep(queries, truth, 'ef_search', [10, 20, 40, 80, 160, 320])
+        else:
+            lists = index['options'].get('lists', 100)
+            probes = sorted({p for p in [1, 2, 4, 8, 16, 32, 64] if p <= lists} | {lists})
+            results = await benchmark.sweep(queries, truth, 'probes', probes)
+    finally:
+        await benchmark.cleanup()
+
+    print("\n" + "=" * 60)
+    print(json.dumps({'index': index, 'results': results}, indent=2, default=str))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
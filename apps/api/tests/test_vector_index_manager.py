@@ -0,0 +1,115 @@
+"""Tests for ANN index management"""
+
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.vector_index_manager import VectorIndexManager, recommended_lists
+
+
+def _engine(conn):
+    connect_cm = MagicMock()
+    connect_cm.__aenter__ = AsyncMock(return_value=conn)
+    connect_cm.__aexit__ = AsyncMock(return_value=False)
+    engine = MagicMock()
+    engine.connect.return_value = connect_cm
+    return engine
+
+
+def test_recommended_lists_follows_pgvector_guidance():
+    assert recommended_lists(0) == 10
+    assert recommended_lists(500_000) == 500
+    assert recommended_lists(4_000_000) == 2000
+
+
+def test_create_sql_is_concurrent_cosine_index():
+    manager = VectorIndexManager(MagicMock())
+    sql = manager._create_sql("idx_test", "hnsw", {'m': 16, 'ef_construction': 64})
+
+    assert sql.startswith("CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_test")
+    assert "USING hnsw (embedding vector_cosine_ops)" in sql
+    assert "WITH (m = 16, ef_construction = 64)" in sql
+
+
+@pytest.mark.asyncio
+async def test_index_status_flags_undersized_ivfflat_lists():
+    rows = [
+        MagicMock(method="ivfflat", options=["lists=10"], size_bytes=1024,
+                  is_valid=True, definition="..."),
+        MagicMock(method="hnsw", options=["m=16", "ef_construction=64"], size_bytes=2048,
+                  is_valid=True, definition="..."),
+    ]
+    # "name" is reserved by MagicMock's constructor
+    rows[0].name, rows[1].name = "idx_ivf", "idx_hnsw"
+    conn = MagicMock()
+    conn.execute = AsyncMock(side_effect=[
+        MagicMock(scalar=MagicMock(return_value=200_000)),
+        MagicMock(scalar=MagicMock(return_value=1536)),
+        MagicMock(fetchall=MagicMock(return_value=rows)),
+    ])
+    manager = VectorIndexManager(_engine(conn))
+
+    status = await manager.get_index_status()
+
+    ivf, hnsw = status
+    assert ivf['options'] == {'lists': 10}
+    assert ivf['recommended_lists'] == 200
+    assert ivf['needs_rebuild'] is True
+    assert hnsw['options'] == {'m': 16, 'ef_construction': 64}
+    assert 'needs_rebuild' not in hnsw
+    assert hnsw['dimensions'] == 1536
+
+
+@pytest.mark.asyncio
+async def test_create_index_rejects_dimension_mismatch():
+    conn = MagicMock()
+    conn.execute = AsyncMock(side_effect=[
+        MagicMock(scalar=MagicMock(return_value=1536)),
+        MagicMock(scalar=MagicMock(return_value=0)),
+    ])
+    manager = VectorIndexManager(_engine(conn))
+
+    with pytest.raises(ValueError):
+        await manager.create_index("hnsw", dimensions=3072)
+
+
+@pytest.mark.asyncio
+async def test_search_params_are_transaction_local():
+    session = MagicMock()
+    session.execute = AsyncMock()
+
+    await VectorIndexManager.apply_search_params(session, ef_search=100, probes=8)
+
+    calls = session.execute.await_args_list
+    assert len(calls) == 2
+    assert "set_config('hnsw.ef_search', :value, true)" in str(calls[0].args[0])
+    assert calls[0].args[1] == {'value': '100'}
+    assert "ivfflat.probes" in str(calls[1].args[0])
+
+
+@pytest.mark.asyncio
+async def test_search_params_skipped_when_unset():
+    session = MagicMock()
+    session.execute = AsyncMock()
+
+    await VectorIndexManager.apply_search_params(session)
+
+    session.execute.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_index_status_is_admin_only():
+    from fastapi import HTTPException
+    from routers.vector import get_vector_indexes
+
+    with patch("routers.vector.pgvector_service") as pgvector:
+        pgvector.index_manager.get_index_status = AsyncMock(return_value=[])
+        with pytest.raises(HTTPException) as error:
+            await get_vector_indexes(current_user=MagicMock(role="user"))
+        assert error.value.status_code == 403
+        pgvector.index_manager.get_index_status.assert_not_awaited()
+
+        assert await get_vector_indexes(current_user=MagicMock(role="admin")) == {"indexes": []}
@@ -0,0 +1,4 @@
+"""
+Workers package for Arketic AI Backend
+Standalone background processes run alongside the API
+"""
@@ -0,0 +1,74 @@
+"""Embedding Task Worker
+
+Consumes the embedding task streams in a process of its own, so embedding
+throughput scales with the number of worker processes instead of API pods:
+
+    python -m workers.embedding_worker --concurrency 8
+
+Each process joins the ``embedding_workers`` consumer group under a unique
+consumer name. On SIGINT/SIGTERM the worker stops claiming tasks and
+finishes the ones it is running; if it is killed instead, its tasks are
+reclaimed by other workers after the visibility timeout.
+"""
+
+import signal
+import asyncio
+import logging
+import argparse
+from typing import Optional
+
+from core.config import settings
+from core.database import init_database, close_database
+from core.redis import init_redis, close_redis
+from services.embedding_task_service import embedding_task_service
+
+logger = logging.getLogger(__name__)
+
+
+async def run(consumer: Optional[str] = None, concurrency: Optional[int] = None):
+    """Consume embedding tasks until the process is signalled to stop
+
+    Args:
+        consumer: Consumer name; defaults to ``<hostname>-<pid>``
+        concurrency: Tasks run at once; defaults to EMBEDDING_WORKER_CONCURRENCY
+    """
+    await init_database()
+    await init_redis()
+
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop_event.set)
+
+    consumer = consumer or embedding_task_service.consumer_name
+    logger.info(
+        f"Embedding worker {consumer} started "
+        f"(concurrency {concurrency or embedding_task_service.max_concurrent_tasks})"
+    )
+    try:
+        await embedding_task_service.process_queue(consumer, concurrency, stop_event)
+    finally:
+        await close_redis()
+        await close_database()
+        logger.info(f"Embedding worker {consumer} stopped")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run an embedding task worker")
+    parser.add_argument("--consumer", help="Consumer name, unique per worker process")
+    parser.add_argument(
+        "--concurrency", type=int, default=settings.EMBEDDING_WORKER_CONCURRENCY,
+        help="Tasks run at once"
+    )
+    parser.add_argument("--log-level", default="INFO")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=args.log_level.upper(),
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    asyncio.run(run(args.consumer, args.concurrency))
+
+
+if __name__ == "__main__":
+    main()